@@ -0,0 +1,229 @@
+import logging
+
+from eth_abi import decode
+from eth_account import Account
+
+from CodificadorABI import CodificadorABI
+from ContractUtils import cargar_abi
+from Registros import Cliente, Prestamo
+from RpcBatch import ejecutar_lote
+
+# Dirección en la que está desplegado Multicall3 en la mayoría de redes (la misma interfaz `aggregate3` que
+# Multicall.sol). En una red local hay que desplegar Multicall.sol y usar la dirección resultante.
+DIRECCION_MULTICALL3 = '0xcA11bde05977b3631167028862bE2a173976CA11'
+# Llamadas agrupadas en cada `aggregate3`. Cada `eth_call` está limitado por el gas máximo que admite el nodo
+# (el límite de gas del bloque en Ganache), y leer un préstamo cuesta unos 20.000 de gas.
+TAMANO_LOTE_MULTICALL = 250
+# Selector de `Error(string)`, el motivo que devuelve un `require` fallido.
+SELECTOR_ERROR = bytes.fromhex('08c379a0')
+
+def motivo_reversion(datos):
+    """Extrae el mensaje de un `require` fallido de los datos devueltos por la llamada, si lo tiene."""
+    if datos[:4] == SELECTOR_ERROR:
+        try:
+            return decode(['string'], datos[4:])[0]
+        except Exception:
+            pass
+    return '0x' + datos.hex() if datos else 'sin motivo'
+
+class AgregadorLecturas:
+    """
+        Agrupa muchas llamadas de consulta al contrato PrestamoDeFi en muy pocas llamadas al nodo.
+
+        Si el contrato auxiliar Multicall (Multicall.sol o Multicall3) está desplegado, las llamadas se envían
+        en bloques de `tamano_lote` dentro de una única llamada `aggregate3`, y todos esos `eth_call` viajan a su
+        vez en una sola petición JSON-RPC por lotes: comprobar 10.000 clientes supone 40 llamadas `eth_call` en
+        una petición HTTP. Si el contrato auxiliar no está desplegado, cada consulta es un `eth_call` propio y
+        se agrupan solo en peticiones JSON-RPC por lotes. En ambos casos los resultados se decodifican con el
+        `codificador` del manager.
+
+        Atributos:
+        - manager (BlockchainManager): Manager con la conexión, la dirección del contrato y el codificador.
+        - direccion_multicall (str): Dirección del contrato auxiliar.
+        - tamano_lote (int): Llamadas agrupadas en cada `aggregate3`.
+
+        Métodos:
+        - disponible(self): Indica si el contrato auxiliar está desplegado en la red.
+        - usar_contrato(self, direccion): Cambia la dirección del contrato auxiliar.
+        - invalidar(self): Vuelve a comprobar si el contrato auxiliar está desplegado en la siguiente consulta.
+        - consultar(self, llamadas, permitir_fallos): Resultados de una lista de llamadas (función, argumentos).
+        - consultar_funcion(self, nombre_funcion, lista_args, permitir_fallos): Resultados de una misma función.
+        - clientes(self, direcciones): Registro `Cliente` (activación y garantía) de cada dirección.
+        - empleados(self, direcciones): Si cada dirección es prestamista.
+        - detalles_prestamos(self, prestamos): Registro `Prestamo` de cada préstamo.
+    """
+    def __init__(self, manager, direccion_multicall=DIRECCION_MULTICALL3, abi_path='Multicall.json',
+                 tamano_lote=TAMANO_LOTE_MULTICALL):
+        self.manager = manager
+        self.direccion_multicall = direccion_multicall
+        self.tamano_lote = tamano_lote
+        self.codificador_multicall = CodificadorABI(cargar_abi(abi_path))
+        self._disponible = None
+
+    def usar_contrato(self, direccion):
+        """Usa el contrato auxiliar desplegado en `direccion` (por ejemplo, tras `desplegar_multicall`)."""
+        self.direccion_multicall = self.manager.direccion_checksum(direccion)
+        self._disponible = None
+
+    def invalidar(self):
+        """Descarta la comprobación de despliegue del contrato auxiliar (por ejemplo, al cambiar de nodo)."""
+        self._disponible = None
+
+    def disponible(self):
+        """Indica si hay código en la dirección del contrato auxiliar. Se consulta al nodo una sola vez."""
+        if self._disponible is None:
+            try:
+                self._disponible = bool(self.manager.web3.eth.get_code(self.direccion_multicall))
+            except Exception as e:
+                logging.error(f"No se pudo comprobar el contrato Multicall en {self.direccion_multicall}: {e}")
+                self._disponible = False
+            if not self._disponible:
+                logging.info(f"Contrato Multicall no desplegado en {self.direccion_multicall}, "
+                             "se usan peticiones JSON-RPC por lotes")
+        return self._disponible
+
+    # ------------------------------------------------------------------ consultas
+
+    def consultar(self, llamadas, permitir_fallos=False, tamano_lote=None, bloque='latest'):
+        """
+            Ejecuta muchas funciones de consulta del contrato con el mínimo número de viajes al nodo.
+
+            Parámetros:
+            - llamadas (list): Lista de tuplas (nombre_funcion, args) con las direcciones en formato checksum.
+            - permitir_fallos (bool, opcional): Si es True, las llamadas que se revierten devuelven None en lugar
+            de lanzar una excepción.
+            - tamano_lote (int, opcional): Llamadas por petición JSON-RPC cuando no hay contrato Multicall (por
+            defecto, `TAMANO_LOTE_PRESTAMOS` del manager).
+            - bloque (int o str, opcional): Bloque en el que se evalúan todas las llamadas (por defecto, 'latest').
+
+            Retorna:
+            Una lista con el resultado decodificado de cada llamada, en el mismo orden que `llamadas`.
+
+            Excepciones:
+            - Exception: Se lanza si una llamada se revierte (y no se permiten fallos) o si falla la consulta al nodo.
+        """
+        llamadas = list(llamadas)
+        if not llamadas:
+            return []
+        codificador = self.manager.codificador
+        datos = [codificador.codificar_llamada(nombre, args) for nombre, args in llamadas]
+        if self.disponible():
+            crudos = self._consultar_multicall(datos, bloque)
+        else:
+            crudos = self._consultar_por_lotes(datos, tamano_lote or self.manager.TAMANO_LOTE_PRESTAMOS, bloque)
+
+        resultados = []
+        for (nombre, args), (exito, crudo) in zip(llamadas, crudos):
+            if exito:
+                resultados.append(codificador.decodificar_resultado(nombre, crudo))
+            elif permitir_fallos:
+                resultados.append(None)
+            else:
+                raise Exception(f"Error en {nombre}{tuple(args)}: {crudo}")
+        return resultados
+
+    def consultar_funcion(self, nombre_funcion, lista_args, permitir_fallos=False, tamano_lote=None, bloque='latest'):
+        """Igual que `consultar` para muchas llamadas a la misma función del contrato."""
+        return self.consultar([(nombre_funcion, args) for args in lista_args], permitir_fallos, tamano_lote, bloque)
+
+    def _consultar_multicall(self, datos, bloque):
+        """Devuelve (exito, datos o motivo) de cada llamada agrupándolas en llamadas `aggregate3`."""
+        destino = self.manager.contract_address
+        peticiones = []
+        for inicio in range(0, len(datos), self.tamano_lote):
+            llamadas = [(destino, True, bytes.fromhex(d[2:])) for d in datos[inicio:inicio + self.tamano_lote]]
+            peticiones.append(('eth_call', [{
+                'to': self.direccion_multicall,
+                'data': self.codificador_multicall.codificar_llamada('aggregate3', (llamadas,)),
+            }, bloque if isinstance(bloque, str) else hex(bloque)]))
+        crudos = []
+        for respuesta in ejecutar_lote(self.manager.web3, peticiones):
+            if 'error' in respuesta:
+                raise Exception(f"Error en aggregate3: {respuesta['error'].get('message')}")
+            for exito, devuelto in self.codificador_multicall.decodificar_resultado('aggregate3', respuesta['result']):
+                crudos.append((True, devuelto) if exito else (False, motivo_reversion(devuelto)))
+        return crudos
+
+    def _consultar_por_lotes(self, datos, tamano_lote, bloque):
+        """Devuelve (exito, datos o motivo) de cada llamada con un `eth_call` por llamada en peticiones por lotes."""
+        bloque = bloque if isinstance(bloque, str) else hex(bloque)
+        peticiones = [('eth_call', [{'to': self.manager.contract_address, 'data': d}, bloque]) for d in datos]
+        crudos = []
+        for respuesta in ejecutar_lote(self.manager.web3, peticiones, tamano_lote):
+            if 'error' in respuesta:
+                crudos.append((False, respuesta['error'].get('message')))
+            else:
+                crudos.append((True, respuesta['result']))
+        return crudos
+
+    # ------------------------------------------------------------------ consultas habituales
+
+    def clientes(self, direcciones):
+        """
+            Consulta el getter público `clientes(address)` de muchas direcciones.
+
+            Retorna:
+            Un diccionario {direccion: Cliente} con las direcciones en formato checksum. Cada registro se puede
+            desempaquetar como la tupla (activado, saldoGarantia) del getter.
+        """
+        direcciones = [self.manager.direccion_checksum(d) for d in direcciones]
+        resultados = self.consultar_funcion('clientes', [(d,) for d in direcciones])
+        return {d: Cliente(d, activado, saldo) for d, (activado, saldo) in zip(direcciones, resultados)}
+
+    def empleados(self, direcciones):
+        """
+            Consulta el getter público `empleadosPrestamista(address)` de muchas direcciones.
+
+            Retorna:
+            Un diccionario {direccion: bool} con las direcciones en formato checksum.
+        """
+        direcciones = [self.manager.direccion_checksum(d) for d in direcciones]
+        return dict(zip(direcciones, self.consultar_funcion('empleadosPrestamista', [(d,) for d in direcciones])))
+
+    def detalles_prestamos(self, prestamos):
+        """
+            Obtiene el registro `Prestamo` (ver Registros) de muchos préstamos.
+
+            Parámetros:
+            - prestamos (list): Lista de tuplas (prestatario, id).
+        """
+        args = [(self.manager.direccion_checksum(prestatario), prestamo_id) for prestatario, prestamo_id in prestamos]
+        return [Prestamo(*p) for p in self.consultar_funcion('obtenerDetalleDePrestamo', args)]
+
+def desplegar_multicall(manager, direccion, clave_privada, bytecode):
+    """
+        Despliega el contrato auxiliar Multicall en la red del manager (por ejemplo, en Ganache) y hace que su
+        agregador de lecturas lo use.
+
+        Parámetros:
+        - manager (BlockchainManager): Manager conectado a la red.
+        - direccion (str): Cuenta que paga el despliegue.
+        - clave_privada (str): Clave privada de la cuenta.
+        - bytecode (str): Bytecode de Multicall.sol compilado (campo `bytecode` de Remix, solc o Hardhat).
+
+        Retorna:
+        La dirección del contrato desplegado.
+
+        Excepciones:
+        - ValueError: Se lanza si la transacción de despliegue falla.
+    """
+    direccion = manager.direccion_checksum(direccion)
+    bytecode = bytecode if bytecode.startswith('0x') else '0x' + bytecode
+    transaccion = {'from': direccion, 'data': bytecode, 'value': 0}
+    transaccion.update(gas=manager.web3.eth.estimate_gas(transaccion), chainId=manager.chain_id,
+                       **manager.estrategia_gas.tarifas())
+    del transaccion['from']
+    nonce = manager.nonce_manager.reserve_nonce(direccion)
+    try:
+        firmada = Account.sign_transaction(dict(transaccion, nonce=nonce), clave_privada)
+        tx_hash = manager.web3.eth.send_raw_transaction(firmada.rawTransaction)
+    except Exception:
+        manager.nonce_manager.release_nonce(direccion, nonce)
+        raise
+    manager.nonce_manager.confirm_nonce(direccion, nonce)
+    recibo = manager.web3.eth.wait_for_transaction_receipt(tx_hash)
+    if recibo.status == 0 or not recibo.contractAddress:
+        logging.error(f"Falló el despliegue del contrato Multicall: {recibo}")
+        raise ValueError("Falló el despliegue del contrato Multicall.")
+    manager.agregador.usar_contrato(recibo.contractAddress)
+    return recibo.contractAddress
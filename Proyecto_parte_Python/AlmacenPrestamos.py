@@ -0,0 +1,362 @@
+import logging
+import sqlite3
+import threading
+
+from IndexadorPrestamos import IndexadorPrestamos, ESTADO_APROBADO
+from RpcBatch import ejecutar_lote
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sync_estado (
+    clave TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bloques (
+    numero INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS eventos (
+    bloque INTEGER NOT NULL,
+    indice_log INTEGER NOT NULL,
+    hash_bloque TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    evento TEXT NOT NULL,
+    prestatario TEXT NOT NULL,
+    prestamo_id INTEGER NOT NULL,
+    estado INTEGER NOT NULL,
+    monto TEXT NOT NULL,
+    plazo TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (bloque, indice_log)
+);
+CREATE INDEX IF NOT EXISTS idx_eventos_prestatario ON eventos (prestatario, bloque, indice_log);
+CREATE TABLE IF NOT EXISTS prestamos (
+    prestatario TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    monto TEXT NOT NULL,
+    plazo TEXT NOT NULL,
+    tiempo_solicitud INTEGER NOT NULL,
+    tiempo_limite INTEGER NOT NULL,
+    estado INTEGER NOT NULL,
+    bloque INTEGER NOT NULL,
+    PRIMARY KEY (prestatario, id)
+);
+CREATE INDEX IF NOT EXISTS idx_prestamos_estado ON prestamos (estado, tiempo_limite);
+CREATE INDEX IF NOT EXISTS idx_prestamos_tiempo_limite ON prestamos (tiempo_limite);
+CREATE TABLE IF NOT EXISTS clientes (
+    direccion TEXT PRIMARY KEY,
+    activado INTEGER NOT NULL,
+    saldo_garantia TEXT NOT NULL,
+    bloque INTEGER NOT NULL
+);
+"""
+
+# Los importes en wei y los plazos (uint256) pueden superar el rango de INTEGER de SQLite (64 bits), por lo que se
+# guardan como texto. Los tiempos se guardan como INTEGER para ordenarlos y compararlos; uno que no cabe se guarda
+# como TIEMPO_SIN_LIMITE, que equivale a "no vence nunca".
+TIEMPO_SIN_LIMITE = 2 ** 63 - 1
+COLUMNAS_PRESTAMO = 'prestatario, id, monto, plazo, tiempo_solicitud, tiempo_limite, estado'
+
+def _fila_a_prestamo(fila):
+    return {
+        'id': fila[1],
+        'prestatario': fila[0],
+        'monto': int(fila[2]),
+        'plazo': int(fila[3]),
+        'tiempoSolicitud': fila[4],
+        'tiempoLimite': fila[5],
+        'estado': fila[6],
+    }
+
+def _tiempo(valor):
+    return min(valor, TIEMPO_SIN_LIMITE)
+
+class AlmacenPrestamos:
+    """
+        Almacén persistente en SQLite del estado del contrato que lee BlockchainManager (clientes, saldo de
+        garantía y préstamos con su EstadoPrestamo), sincronizado de forma incremental a partir de los eventos.
+
+        Guarda el último bloque procesado (checkpoint), los eventos aplicados y el hash de los últimos bloques
+        procesados. Al arrancar basta con abrir la base de datos y continuar desde el checkpoint, sin volver a
+        leer toda la cadena. Antes de cada sincronización se compara el hash guardado del checkpoint con el del
+        nodo: si no coinciden (reorganización de la cadena) se busca el último bloque común, se borran los eventos
+        posteriores y se reconstruyen los préstamos de los prestatarios afectados.
+
+        Los eventos se decodifican con IndexadorPrestamos y se escriben con inserciones masivas (`executemany`)
+        en una única transacción por rango de bloques. Hay índices por prestatario, estado y `tiempo_limite`.
+
+        Como en IndexadorPrestamos, `desde_bloque` puede ser posterior al despliegue: la primera vez que aparece un
+        prestatario sin préstamos en el almacén se importan sus préstamos leídos del contrato. Una solicitud toma
+        el ID del préstamo importado con la misma fecha, monto y plazo, y un cambio de estado de un préstamo que no
+        está en el almacén lo crea antes de aplicarse.
+
+        Atributos:
+        - manager (BlockchainManager): Gestor usado para leer eventos, bloques y el mapping `clientes`.
+        - ruta (str): Ruta del archivo SQLite.
+        - desde_bloque (int): Bloque de despliegue del contrato, desde el que se indexa la primera vez.
+        - confirmaciones (int): Número de bloques recientes que no se sincronizan todavía.
+
+        Métodos:
+        - sincronizar(self): Detecta reorganizaciones y procesa los eventos nuevos.
+        - actualizar_clientes(self, direcciones): Refresca desde el contrato los datos de varios clientes.
+        - importar_prestamos(self, prestamos, bloque): Inserción masiva de préstamos leídos del almacenamiento.
+        - prestamos_de, prestamos_en_estado, prestamos_vencidos, todos_los_prestamos, cliente, garantias:
+        Consultas locales.
+    """
+    # Número de bloques recientes cuyo hash se conserva para detectar reorganizaciones.
+    PROFUNDIDAD_REORG = 256
+
+    def __init__(self, manager, ruta='prestamos.db', desde_bloque=0, confirmaciones=0):
+        self.manager = manager
+        self.web3 = manager.web3
+        self.ruta = ruta
+        self.desde_bloque = desde_bloque
+        self.confirmaciones = confirmaciones
+        self.indexador = IndexadorPrestamos(manager, desde_bloque)
+        self._lock = threading.RLock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.execute('PRAGMA journal_mode=WAL')
+        self.conexion.execute('PRAGMA synchronous=NORMAL')
+        self.conexion.executescript(ESQUEMA)
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos."""
+        with self._lock:
+            self.conexion.close()
+
+    # ------------------------------------------------------------------ checkpoint
+
+    @property
+    def ultimo_bloque(self):
+        """Último bloque procesado (checkpoint), o `desde_bloque - 1` si aún no se ha sincronizado nada."""
+        fila = self.conexion.execute("SELECT valor FROM sync_estado WHERE clave = 'ultimo_bloque'").fetchone()
+        return fila[0] if fila else self.desde_bloque - 1
+
+    def _guardar_checkpoint(self, numero, hash_bloque):
+        self.conexion.execute("INSERT OR REPLACE INTO sync_estado (clave, valor) VALUES ('ultimo_bloque', ?)", (numero,))
+        self.conexion.execute("INSERT OR REPLACE INTO bloques (numero, hash) VALUES (?, ?)", (numero, hash_bloque))
+        self.conexion.execute("DELETE FROM bloques WHERE numero < ?", (numero - self.PROFUNDIDAD_REORG,))
+
+    # ------------------------------------------------------------------ sincronización
+
+    def sincronizar(self):
+        """
+            Sincroniza el almacén con la cadena: deshace los bloques reorganizados (si los hay) y aplica los
+            eventos desde el checkpoint hasta el último bloque con `confirmaciones` confirmaciones. Después refresca
+            el saldo de garantía de los prestatarios afectados.
+
+            Retorna:
+            El número de eventos aplicados.
+        """
+        with self._lock:
+            self._detectar_reorganizacion()
+            hasta_bloque = self.web3.eth.block_number - self.confirmaciones
+            desde = self.ultimo_bloque + 1
+            aplicados, afectados = 0, set()
+            while desde <= hasta_bloque:
+                hasta = min(desde + self.indexador.TAMANO_RANGO - 1, hasta_bloque)
+                eventos = self.indexador.obtener_eventos(desde, hasta)
+                hash_hasta = self.web3.to_hex(self.web3.eth.get_block(hasta)['hash'])
+                with self.conexion:
+                    self._aplicar_eventos(eventos)
+                    for evento in eventos:
+                        self.conexion.execute("INSERT OR REPLACE INTO bloques (numero, hash) VALUES (?, ?)",
+                                              (evento['bloque'], evento['hash_bloque']))
+                    self._guardar_checkpoint(hasta, hash_hasta)
+                afectados.update(evento['args']['prestatario'] for evento in eventos)
+                aplicados += len(eventos)
+                desde = hasta + 1
+            if afectados:
+                self.actualizar_clientes(sorted(afectados))
+            return aplicados
+
+    def _aplicar_eventos(self, eventos):
+        """Inserta los eventos y actualiza los préstamos con inserciones masivas. Debe ir dentro de una transacción."""
+        if eventos:
+            self._leer_prestatarios_nuevos([evento['args']['prestatario'] for evento in eventos], eventos[-1]['bloque'])
+        siguiente_id, sin_solicitud = {}, {}
+        filas_eventos, nuevos, desconocidos, cambios = [], [], [], []
+        for evento in eventos:
+            args = evento['args']
+            prestatario = args['prestatario']
+            if evento['evento'] == 'SolicitudPrestamo':
+                if prestatario not in siguiente_id:
+                    fila = self.conexion.execute("SELECT COALESCE(MAX(id), 0) FROM prestamos WHERE prestatario = ?",
+                                                 (prestatario,)).fetchone()
+                    siguiente_id[prestatario] = fila[0] + 1
+                    sin_solicitud[prestatario] = self._prestamos_sin_solicitud(prestatario)
+                candidatos = sin_solicitud[prestatario].get((evento['timestamp'], str(args['monto']),
+                                                             str(args['plazo'])))
+                if 'id' in args:
+                    # Evento guardado que se vuelve a aplicar al deshacer una reorganización: conserva su ID.
+                    prestamo_id = args['id']
+                elif candidatos:
+                    prestamo_id = candidatos.pop(0)
+                else:
+                    prestamo_id = siguiente_id[prestatario]
+                    siguiente_id[prestatario] += 1
+                estado, plazo = 0, args['plazo']
+                nuevos.append((prestatario, prestamo_id, str(args['monto']), str(plazo), evento['timestamp'], 0, 0,
+                               evento['bloque']))
+            else:
+                prestamo_id, estado, plazo = args['id'], args['estado'], 0
+                desconocidos.append((prestatario, prestamo_id, str(args['monto']), '0', 0, 0, 0, evento['bloque']))
+                cambios.append((estado, TIEMPO_SIN_LIMITE - evento['timestamp'], TIEMPO_SIN_LIMITE,
+                                evento['timestamp'], evento['bloque'], prestatario, prestamo_id))
+            filas_eventos.append((evento['bloque'], evento['indice_log'], evento['hash_bloque'], evento['tx_hash'],
+                                  evento['evento'], prestatario, prestamo_id, estado, str(args['monto']), str(plazo),
+                                  evento['timestamp']))
+        self.conexion.executemany("INSERT OR REPLACE INTO eventos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  filas_eventos)
+        # Cada cambio de estado sigue a la solicitud de su préstamo, así que basta con insertar primero todas las
+        # solicitudes y aplicar después los cambios en orden. Al aprobar, un plazo que llevaría `tiempo_limite` más
+        # allá de TIEMPO_SIN_LIMITE se queda en TIEMPO_SIN_LIMITE (CAST satura los textos fuera de rango).
+        self.conexion.executemany("INSERT OR REPLACE INTO prestamos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", nuevos)
+        # Un préstamo que no está en el almacén (no se pudo leer del contrato) se crea con los datos del evento para
+        # no perder el cambio de estado.
+        self.conexion.executemany("INSERT OR IGNORE INTO prestamos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", desconocidos)
+        self.conexion.executemany(
+            "UPDATE prestamos SET estado = ?1, "
+            "tiempo_limite = CASE WHEN ?1 != %d THEN tiempo_limite WHEN CAST(plazo AS INTEGER) > ?2 THEN ?3 "
+            "ELSE ?4 + CAST(plazo AS INTEGER) END, bloque = ?5 "
+            "WHERE prestatario = ?6 AND id = ?7" % ESTADO_APROBADO, cambios)
+
+    def _leer_prestatarios_nuevos(self, prestatarios, bloque):
+        """Importa los préstamos leídos del contrato de los prestatarios que aún no tienen préstamos en el almacén."""
+        prestatarios = list(dict.fromkeys(prestatarios))
+        conocidos = {fila[0] for fila in self.conexion.execute(
+            "SELECT DISTINCT prestatario FROM prestamos WHERE prestatario IN (%s)" % ', '.join('?' * len(prestatarios)),
+            prestatarios)}
+        nuevos = [p for p in prestatarios if p not in conocidos]
+        if not nuevos:
+            return
+        listas_ids = self.manager.consultar_por_lotes('obtenerPrestamosPorPrestatario', [(p,) for p in nuevos])
+        args = [(p, prestamo_id) for p, ids in zip(nuevos, listas_ids) for prestamo_id in ids]
+        if args:
+            self._insertar_prestamos(self.manager.consultar_por_lotes('obtenerDetalleDePrestamo', args), bloque)
+
+    def _prestamos_sin_solicitud(self, prestatario):
+        """
+            IDs de los préstamos importados del contrato cuya solicitud aún no se ha aplicado, agrupados por
+            (tiempo_solicitud, monto, plazo) y ordenados.
+        """
+        candidatos = {}
+        for prestamo_id, tiempo_solicitud, monto, plazo in self.conexion.execute(
+                "SELECT id, tiempo_solicitud, monto, plazo FROM prestamos WHERE prestatario = ?1 AND id NOT IN "
+                "(SELECT prestamo_id FROM eventos WHERE prestatario = ?1 AND evento = 'SolicitudPrestamo') "
+                "ORDER BY id", (prestatario,)):
+            candidatos.setdefault((tiempo_solicitud, monto, plazo), []).append(prestamo_id)
+        return candidatos
+
+    def _insertar_prestamos(self, prestamos, bloque):
+        self.conexion.executemany(
+            "INSERT OR REPLACE INTO prestamos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((p[1], p[0], str(p[2]), str(p[3]), _tiempo(p[4]), _tiempo(p[5]), p[6], bloque) for p in prestamos))
+
+    def _detectar_reorganizacion(self):
+        """Comprueba el hash del checkpoint y, si la cadena ha cambiado, deshace hasta el último bloque común."""
+        guardados = self.conexion.execute("SELECT numero, hash FROM bloques ORDER BY numero DESC").fetchall()
+        if not guardados:
+            return
+        respuestas = ejecutar_lote(self.web3, [('eth_getBlockByNumber', [hex(n), False]) for n, _ in guardados])
+        for (numero, hash_guardado), respuesta in zip(guardados, respuestas):
+            bloque = respuesta.get('result')
+            if bloque and bloque['hash'] == hash_guardado:
+                if numero != guardados[0][0]:
+                    logging.error(f"Reorganización detectada: se deshacen los bloques posteriores al {numero}.")
+                    self.deshacer_hasta(numero)
+                return
+        logging.error("Reorganización más profunda que los bloques guardados: se reconstruye el almacén completo.")
+        self.deshacer_hasta(self.desde_bloque - 1)
+
+    def deshacer_hasta(self, numero):
+        """
+            Deshace todos los eventos posteriores al bloque `numero` y reconstruye los préstamos de los
+            prestatarios afectados a partir de los eventos que quedan.
+        """
+        with self._lock, self.conexion:
+            afectados = [fila[0] for fila in self.conexion.execute(
+                "SELECT DISTINCT prestatario FROM eventos WHERE bloque > ?", (numero,))]
+            self.conexion.execute("DELETE FROM eventos WHERE bloque > ?", (numero,))
+            self.conexion.execute("DELETE FROM bloques WHERE numero > ?", (numero,))
+            self.conexion.executemany("DELETE FROM prestamos WHERE prestatario = ?", [(p,) for p in afectados])
+            for prestatario in afectados:
+                eventos = [{
+                    'evento': fila[0],
+                    'args': {'prestatario': prestatario, 'id': fila[1], 'estado': fila[2], 'monto': int(fila[3]),
+                             'plazo': int(fila[4])},
+                    'bloque': fila[5], 'indice_log': fila[6], 'hash_bloque': fila[7], 'tx_hash': fila[8],
+                    'timestamp': fila[9],
+                } for fila in self.conexion.execute(
+                    "SELECT evento, prestamo_id, estado, monto, plazo, bloque, indice_log, hash_bloque, tx_hash, "
+                    "timestamp FROM eventos WHERE prestatario = ? ORDER BY bloque, indice_log", (prestatario,))]
+                self._aplicar_eventos(eventos)
+            self.conexion.execute("INSERT OR REPLACE INTO sync_estado (clave, valor) VALUES ('ultimo_bloque', ?)",
+                                  (numero,))
+
+    # ------------------------------------------------------------------ clientes y cargas masivas
+
+    def actualizar_clientes(self, direcciones):
+        """
+            Lee `clientes(address)` del contrato para las direcciones indicadas (en peticiones por lotes) y guarda
+            su estado de activación y su saldo de garantía. Se usa para los prestatarios con eventos nuevos y para
+            los clientes dados de alta, ya que `altaCliente` y `depositarGarantia` no emiten eventos.
+        """
+        direcciones = [self.web3.to_checksum_address(d) for d in direcciones]
+        if not direcciones:
+            return
+        bloque = self.web3.eth.block_number
+        resultados = self.manager.consultar_por_lotes('clientes', [(d,) for d in direcciones])
+        with self._lock, self.conexion:
+            self.conexion.executemany(
+                "INSERT OR REPLACE INTO clientes (direccion, activado, saldo_garantia, bloque) VALUES (?, ?, ?, ?)",
+                [(d, int(activado), str(saldo), bloque) for d, (activado, saldo) in zip(direcciones, resultados)])
+
+    def importar_prestamos(self, prestamos, bloque):
+        """
+            Inserción masiva de préstamos leídos directamente del almacenamiento del contrato (por ejemplo con
+            `obtener_cartera_prestatario`), como alternativa a reconstruirlos desde los eventos.
+
+            Parámetros:
+            - prestamos (iterable): Tuplas de la struct Prestamo (id, prestatario, monto, plazo, tiempoSolicitud,
+            tiempoLimite, estado).
+            - bloque (int): Bloque en el que se leyeron.
+        """
+        with self._lock, self.conexion:
+            self._insertar_prestamos(prestamos, bloque)
+
+    # ------------------------------------------------------------------ consultas
+
+    def _consultar(self, condicion, parametros):
+        with self._lock:
+            filas = self.conexion.execute(
+                f"SELECT {COLUMNAS_PRESTAMO} FROM prestamos WHERE {condicion}", parametros).fetchall()
+        return [_fila_a_prestamo(fila) for fila in filas]
+
+    def prestamos_de(self, prestatario):
+        """Devuelve los préstamos de un prestatario ordenados por ID."""
+        return self._consultar("prestatario = ? ORDER BY id", (self.web3.to_checksum_address(prestatario),))
+
+    def prestamos_en_estado(self, estado):
+        """Devuelve los préstamos en el estado indicado (código numérico de EstadoPrestamo)."""
+        return self._consultar("estado = ? ORDER BY prestatario, id", (estado,))
+
+    def prestamos_vencidos(self, ahora):
+        """Devuelve los préstamos aprobados con `tiempoLimite` anterior a `ahora`, ordenados por vencimiento."""
+        return self._consultar("estado = ? AND tiempo_limite < ? ORDER BY tiempo_limite", (ESTADO_APROBADO, ahora))
+
+    def todos_los_prestamos(self):
+        """Devuelve todos los préstamos del almacén ordenados por prestatario e ID."""
+        return self._consultar("1 ORDER BY prestatario, id", ())
+
+    def garantias(self):
+        """Devuelve {direccion: saldoGarantia} de todos los clientes del almacén."""
+        with self._lock:
+            filas = self.conexion.execute("SELECT direccion, saldo_garantia FROM clientes").fetchall()
+        return {direccion: int(saldo) for direccion, saldo in filas}
+
+    def cliente(self, direccion):
+        """Devuelve {'activado', 'saldoGarantia'} del cliente o None si no está en el almacén."""
+        with self._lock:
+            fila = self.conexion.execute("SELECT activado, saldo_garantia FROM clientes WHERE direccion = ?",
+                                         (self.web3.to_checksum_address(direccion),)).fetchone()
+        return {'activado': bool(fila[0]), 'saldoGarantia': int(fila[1])} if fila else None
@@ -0,0 +1,299 @@
+import time
+
+import numpy as np
+
+from ContractUtils import ESTADOS_PRESTAMO
+from IndexadorPrestamos import ESTADO_APROBADO
+
+SEGUNDOS_DIA = 86400
+# Los importes en wei (uint256) no caben en int64: cada importe se guarda como una fila de "limbs" de 32 bits en
+# columnas uint64 (el menos significativo primero). Así las sumas son exactas y vectorizadas: sumar hasta 2**32
+# limbs de 32 bits no desborda un uint64, y el acarreo se resuelve al convertir el total a entero de Python.
+BITS_LIMB = 32
+MASCARA_LIMB = np.uint64((1 << BITS_LIMB) - 1)
+# Límites en días de los tramos de `distribucion_vencimientos` (el primer tramo son los ya vencidos).
+LIMITES_VENCIMIENTO = (0, 1, 7, 30, 90, 365)
+# Los plazos y tiempos son uint256 en el contrato: los que no caben en int64 se guardan como este valor, que
+# equivale a "no vence nunca" (el mismo que TIEMPO_SIN_LIMITE en AlmacenPrestamos).
+TIEMPO_SIN_LIMITE = np.iinfo(np.int64).max
+
+def columna_wei(valores):
+    """
+        Convierte una lista de importes en wei (enteros de Python) en una matriz (n, k) uint64 de limbs de 32 bits,
+        con k el mínimo necesario para el mayor importe.
+    """
+    n = len(valores)
+    maximo = max(valores, default=0)
+    k = max(1, -(-maximo.bit_length() // BITS_LIMB))
+    limbs = np.empty((n, k), dtype=np.uint64)
+    if maximo < 1 << 64:
+        base = np.array(valores, dtype=np.uint64)
+        for i in range(k):
+            limbs[:, i] = (base >> np.uint64(BITS_LIMB * i)) & MASCARA_LIMB
+    else:
+        for i in range(k):
+            desplazamiento = BITS_LIMB * i
+            limbs[:, i] = np.fromiter(((v >> desplazamiento) & 0xFFFFFFFF for v in valores), np.uint64, n)
+    return limbs
+
+def columna_tiempo(valores):
+    """Convierte plazos o tiempos (enteros de Python o un vector entero) en int64, limitados a TIEMPO_SIN_LIMITE."""
+    if isinstance(valores, np.ndarray) and valores.dtype.kind == 'u':
+        return np.minimum(valores, np.uint64(TIEMPO_SIN_LIMITE)).astype(np.int64)
+    if isinstance(valores, np.ndarray) and valores.dtype.kind == 'i':
+        return valores.astype(np.int64)
+    return np.fromiter((min(valor, TIEMPO_SIN_LIMITE) for valor in valores), np.int64, len(valores))
+
+def a_entero(limbs):
+    """Convierte una fila de limbs (posiblemente mayores de 32 bits, tras sumar) en un entero de Python exacto."""
+    return sum(int(limb) << (BITS_LIMB * i) for i, limb in enumerate(limbs))
+
+def a_ether(limbs):
+    """Convierte una matriz (n, k) de limbs en un vector float64 de importes en ether (aproximados)."""
+    resultado = np.zeros(len(limbs))
+    for i in range(limbs.shape[1]):
+        resultado += limbs[:, i].astype(np.float64) * float(2 ** (BITS_LIMB * i))
+    return resultado / 1e18
+
+def sumar_por_grupo(limbs, grupos, num_grupos):
+    """
+        Suma exacta de importes por grupo.
+
+        Parámetros:
+        - limbs (ndarray): Matriz (n, k) de limbs (ver `columna_wei`).
+        - grupos (ndarray): Grupo de cada fila, entero entre 0 y `num_grupos` - 1.
+        - num_grupos (int): Número de grupos.
+
+        Retorna:
+        Una matriz (num_grupos, k) con la suma de los limbs de cada grupo (ceros en los grupos vacíos).
+    """
+    totales = np.zeros((num_grupos, limbs.shape[1]), dtype=np.uint64)
+    if len(grupos) == 0:
+        return totales
+    if num_grupos <= 1 << 16:
+        grupos = grupos.astype(np.uint16)  # la ordenación estable de enteros de 16 bits es radix sort, O(n)
+    orden = np.argsort(grupos, kind='stable')
+    ordenados = grupos[orden]
+    inicios = np.flatnonzero(np.r_[True, ordenados[1:] != ordenados[:-1]])
+    totales[ordenados[inicios]] = np.add.reduceat(limbs[orden], inicios, axis=0)
+    return totales
+
+class AnaliticaRiesgo:
+    """
+        Métricas de riesgo de la cartera de préstamos calculadas con NumPy sobre columnas, sin bucles de Python
+        por préstamo: garantía total, principal por EstadoPrestamo, distribución del tiempo hasta `tiempoLimite`,
+        volumen de liquidaciones previsto por día y cobertura de garantía de cada prestatario.
+
+        Los préstamos se cargan una vez en columnas (prestatario como índice en `prestatarios`, importes en wei
+        como limbs de 32 bits para que las sumas de uint256 sean exactas) y cada informe es un recorrido
+        vectorizado de esas columnas.
+
+        Atributos:
+        - prestatarios (ndarray): Direcciones de los prestatarios (el índice de cada una es su código).
+        - codigo, ids, plazo, tiempo_solicitud, tiempo_limite, estado (ndarray): Columnas de los préstamos (los
+        plazos y tiempos que no caben en int64 valen TIEMPO_SIN_LIMITE).
+        - monto (ndarray): Matriz (n, k) de limbs con el monto de cada préstamo en wei.
+        - garantia (ndarray): Matriz (num_prestatarios, k) de limbs con el `saldoGarantia` de cada prestatario.
+        - ahora (int): Marca de tiempo de referencia para vencimientos y liquidaciones.
+
+        Métodos:
+        - desde_prestamos(cls, prestamos, garantias, ahora): Carga diccionarios de préstamos (exportador, almacén).
+        - desde_coleccion(cls, coleccion, garantias, ahora): Carga una ColeccionPrestamos sin recorrerla en Python.
+        - desde_almacen(cls, almacen, ahora): Carga los préstamos y garantías de un AlmacenPrestamos.
+        - desde_contrato(cls, manager, desde_bloque): Carga toda la cartera directamente del contrato.
+        - garantia_total(self): Suma de `saldoGarantia` en wei.
+        - principal_por_estado(self): Suma del monto en wei de los préstamos de cada estado.
+        - distribucion_vencimientos(self, limites_dias): Préstamos aprobados por tramo de días hasta su vencimiento.
+        - liquidaciones_por_dia(self, dias): Préstamos y monto en wei que vencen cada uno de los próximos días.
+        - cobertura(self): Garantía, principal aprobado y cobertura de cada prestatario.
+        - informe(self, dias): Todas las métricas anteriores en un diccionario.
+    """
+    def __init__(self, prestatarios, codigo, ids, monto, plazo, tiempo_solicitud, tiempo_limite, estado,
+                 garantias=None, ahora=None):
+        self.prestatarios = np.asarray(prestatarios, dtype=object)
+        self.codigo = np.array(codigo, dtype=np.int64)
+        self.ids = np.array(ids, dtype=np.uint64)
+        self.monto = monto
+        self.plazo = columna_tiempo(plazo)
+        self.tiempo_solicitud = columna_tiempo(tiempo_solicitud)
+        self.tiempo_limite = columna_tiempo(tiempo_limite)
+        self.estado = np.array(estado, dtype=np.int64)
+        self.ahora = int(time.time()) if ahora is None else int(ahora)
+        self.usar_garantias(garantias or {})
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ------------------------------------------------------------------ carga
+
+    @classmethod
+    def desde_prestamos(cls, prestamos, garantias=None, ahora=None):
+        """
+            Carga los préstamos en columnas.
+
+            Parámetros:
+            - prestamos (iterable): Diccionarios con las claves prestatario, id, monto, plazo, tiempoSolicitud,
+            tiempoLimite y estado (los de `ExportadorPrestamos.prestamos` o `AlmacenPrestamos`).
+            - garantias (dict, opcional): {direccion: saldoGarantia en wei}.
+            - ahora (int, opcional): Marca de tiempo de referencia (por defecto, la hora actual).
+        """
+        indices = {}
+        codigo, ids, montos, plazo, tiempo_solicitud, tiempo_limite, estado = [], [], [], [], [], [], []
+        for prestamo in prestamos:
+            codigo.append(indices.setdefault(prestamo['prestatario'], len(indices)))
+            ids.append(prestamo['id'])
+            montos.append(prestamo['monto'])
+            plazo.append(prestamo['plazo'])
+            tiempo_solicitud.append(prestamo['tiempoSolicitud'])
+            tiempo_limite.append(prestamo['tiempoLimite'])
+            estado.append(prestamo['estado'])
+        return cls(list(indices), codigo, ids, columna_wei(montos), plazo, tiempo_solicitud, tiempo_limite, estado,
+                   garantias, ahora)
+
+    @classmethod
+    def desde_coleccion(cls, coleccion, garantias=None, ahora=None):
+        """Carga una ColeccionPrestamos (ver Registros) copiando sus columnas, sin crear un objeto por préstamo."""
+        columnas = coleccion.columnas_numpy()
+        limbs = columnas['monto']
+        usados = np.flatnonzero(limbs.any(axis=0))
+        monto = limbs[:, :usados[-1] + 1 if len(usados) else 1].astype(np.uint64)
+        return cls(coleccion.direcciones, columnas['prestatario'], columnas['id'], monto, columnas['plazo'],
+                   columnas['tiempo_solicitud'], columnas['tiempo_limite'], columnas['estado'], garantias, ahora)
+
+    @classmethod
+    def desde_almacen(cls, almacen, ahora=None):
+        """Carga los préstamos y los saldos de garantía guardados en un AlmacenPrestamos."""
+        return cls.desde_prestamos(almacen.todos_los_prestamos(), almacen.garantias(), ahora)
+
+    @classmethod
+    def desde_contrato(cls, manager, desde_bloque=0, tamano_lote=500):
+        """
+            Carga toda la cartera del contrato (ver ExportadorPrestamos) y los saldos de garantía de sus
+            prestatarios, con el último bloque como foto y su marca de tiempo como `ahora`.
+        """
+        from ExportadorPrestamos import ExportadorPrestamos
+        from Registros import ColeccionPrestamos
+        bloque = manager.web3.eth.get_block('latest')
+        exportador = ExportadorPrestamos(manager, desde_bloque=desde_bloque, tamano_lote=tamano_lote)
+        coleccion = ColeccionPrestamos(exportador.structs(bloque['number']))
+        analitica = cls.desde_coleccion(coleccion, ahora=bloque['timestamp'])
+        garantias = {}
+        for inicio in range(0, len(analitica.prestatarios), tamano_lote):
+            direcciones = list(analitica.prestatarios[inicio:inicio + tamano_lote])
+            resultados = manager.agregador.consultar_funcion('clientes', [(d,) for d in direcciones],
+                                                              bloque=bloque['number'])
+            garantias.update((d, saldo) for d, (_, saldo) in zip(direcciones, resultados))
+        analitica.usar_garantias(garantias)
+        return analitica
+
+    def usar_garantias(self, garantias):
+        """Asigna a cada prestatario su `saldoGarantia` en wei ({direccion: saldo}; 0 si no aparece)."""
+        self.garantia = columna_wei([garantias.get(direccion, 0) for direccion in self.prestatarios])
+        # Garantía de los clientes sin préstamos: cuenta en el total pero no en la cobertura.
+        con_prestamos = set(self.prestatarios)
+        self._garantia_sin_prestamos = sum(saldo for direccion, saldo in garantias.items()
+                                           if direccion not in con_prestamos)
+
+    # ------------------------------------------------------------------ métricas
+
+    def garantia_total(self):
+        """Suma en wei de `saldoGarantia` de todos los clientes conocidos (con o sin préstamos)."""
+        return a_entero(self.garantia.sum(axis=0)) + self._garantia_sin_prestamos
+
+    def principal_por_estado(self):
+        """
+            Retorna:
+            Un diccionario {nombre del estado: {'prestamos': número, 'monto': suma en wei}}.
+        """
+        estados = max(ESTADOS_PRESTAMO) + 1
+        totales = sumar_por_grupo(self.monto, self.estado, estados)
+        cuentas = np.bincount(self.estado, minlength=estados)
+        return {nombre: {'prestamos': int(cuentas[codigo]), 'monto': a_entero(totales[codigo])}
+                for codigo, nombre in ESTADOS_PRESTAMO.items()}
+
+    def _aprobados(self):
+        return self.estado == ESTADO_APROBADO
+
+    def distribucion_vencimientos(self, limites_dias=LIMITES_VENCIMIENTO):
+        """
+            Distribución del tiempo que falta hasta `tiempoLimite` de los préstamos aprobados.
+
+            Parámetros:
+            - limites_dias (tuple, opcional): Límites de los tramos en días. Los préstamos con menos de
+            `limites_dias[0]` días (ya vencidos si es 0) van al primer tramo y los que superan el último al último.
+
+            Retorna:
+            Un diccionario con 'tramos' (lista de {'desde', 'hasta', 'prestamos', 'monto'}, con días y monto en
+            wei) y 'percentiles' ({50, 90, 99: días}), o percentiles vacíos si no hay préstamos aprobados.
+        """
+        aprobados = self._aprobados()
+        dias = (self.tiempo_limite[aprobados] - self.ahora) / SEGUNDOS_DIA
+        limites = np.asarray(limites_dias, dtype=np.float64)
+        tramos = np.searchsorted(limites, dias, side='right')
+        totales = sumar_por_grupo(self.monto[aprobados], tramos, len(limites) + 1)
+        cuentas = np.bincount(tramos, minlength=len(limites) + 1)
+        bordes = [None] + list(limites_dias) + [None]
+        percentiles = {}
+        if len(dias):
+            percentiles = dict(zip((50, 90, 99), (float(p) for p in np.percentile(dias, (50, 90, 99)))))
+        return {
+            'tramos': [{'desde': bordes[i], 'hasta': bordes[i + 1], 'prestamos': int(cuentas[i]),
+                        'monto': a_entero(totales[i])} for i in range(len(limites) + 1)],
+            'percentiles': percentiles,
+        }
+
+    def liquidaciones_por_dia(self, dias=30):
+        """
+            Volumen de liquidaciones previsto: préstamos aprobados que vencen cada uno de los próximos `dias` días,
+            si no se reembolsan antes. El día 0 incluye los ya vencidos, que se pueden liquidar desde ahora.
+
+            Retorna:
+            Una lista de `dias` diccionarios {'dia', 'desde' (marca de tiempo del inicio del día), 'prestamos',
+            'monto' (wei)}.
+        """
+        aprobados = self._aprobados()
+        dia = np.maximum(self.tiempo_limite[aprobados] - self.ahora, 0) // SEGUNDOS_DIA
+        dentro = dia < dias
+        dia = dia[dentro]
+        totales = sumar_por_grupo(self.monto[aprobados][dentro], dia, dias)
+        cuentas = np.bincount(dia, minlength=dias)
+        return [{'dia': d, 'desde': self.ahora + d * SEGUNDOS_DIA, 'prestamos': int(cuentas[d]),
+                 'monto': a_entero(totales[d])} for d in range(dias)]
+
+    def cobertura(self):
+        """
+            Cobertura de garantía de cada prestatario: `saldoGarantia` entre la suma del monto de sus préstamos
+            aprobados (infinito si no tiene ninguno).
+
+            Retorna:
+            Un diccionario de vectores alineados con `prestatarios`: 'garantia' y 'principal' (en ether, float64)
+            y 'cobertura'.
+        """
+        aprobados = self._aprobados()
+        principal = a_ether(sumar_por_grupo(self.monto[aprobados], self.codigo[aprobados], len(self.prestatarios)))
+        garantia = a_ether(self.garantia)
+        cobertura = np.divide(garantia, principal, out=np.full(len(garantia), np.inf), where=principal > 0)
+        return {'garantia': garantia, 'principal': principal, 'cobertura': cobertura}
+
+    def informe(self, dias=30, umbral_cobertura=1.0, max_descubiertos=100):
+        """
+            Todas las métricas de la cartera en un diccionario (importes en wei salvo la cobertura), con el número
+            de prestatarios cuya cobertura es inferior a `umbral_cobertura` y los `max_descubiertos` de menor
+            cobertura.
+        """
+        cobertura = self.cobertura()
+        descubiertos = np.flatnonzero(cobertura['cobertura'] < umbral_cobertura)
+        peores = descubiertos[np.argsort(cobertura['cobertura'][descubiertos], kind='stable')[:max_descubiertos]]
+        return {
+            'ahora': self.ahora,
+            'prestamos': len(self),
+            'prestatarios': len(self.prestatarios),
+            'garantia_total': self.garantia_total(),
+            'principal_por_estado': self.principal_por_estado(),
+            'vencimientos': self.distribucion_vencimientos(),
+            'liquidaciones_por_dia': self.liquidaciones_por_dia(dias),
+            'num_descubiertos': len(descubiertos),
+            'descubiertos': [{'prestatario': self.prestatarios[i], 'cobertura': float(cobertura['cobertura'][i]),
+                              'garantia': float(cobertura['garantia'][i]),
+                              'principal': float(cobertura['principal'][i])} for i in peores],
+        }
@@ -0,0 +1,374 @@
+import asyncio
+import logging
+
+from web3 import AsyncWeb3
+from web3.exceptions import (
+    TransactionNotFound,
+    TimeExhausted,
+    ContractLogicError,
+    InvalidAddress
+)
+
+from ContractUtils import is_valid_ethereum_address, format_transaction_receipt, cargar_abi
+from NonceManager import AsyncNonceManager, NonceManager
+from CodificadorABI import CodificadorABI
+from EstrategiaGas import AsyncEstrategiaGas
+from ProveedorRPC import TAMANO_POOL_DEFECTO, configurar_sesion_async
+from Registros import Prestamo
+from RpcBatch import ejecutar_lote_async
+
+class AsyncBlockchainManager:
+    """
+        Versión asíncrona (asyncio) de BlockchainManager construida sobre AsyncWeb3 y un proveedor HTTP asíncrono.
+
+        Ofrece las mismas operaciones que BlockchainManager, pero como corrutinas: mientras una operación espera
+        la respuesta del nodo, el bucle de eventos atiende las demás, de modo que un único hilo puede mantener
+        miles de consultas y envíos concurrentes (por ejemplo, con `asyncio.gather`). La carga de la ABI y el
+        formateo de resultados se comparten con la clase síncrona a través de ContractUtils.
+
+        Atributos:
+        - web3 (AsyncWeb3): Instancia de AsyncWeb3 utilizada para interactuar con la blockchain de Ethereum.
+        - contract (AsyncContract): Una instancia del contrato inteligente con el que se interactuará.
+        - contract_address (str): La dirección del contrato inteligente en la red Ethereum.
+        - contract_abi (json): La ABI del contrato inteligente.
+        - nonce_manager (AsyncNonceManager): Asigna localmente los nonces de cada cuenta emisora.
+        - estrategia_gas (AsyncEstrategiaGas): Estima el límite de gas y calcula las tarifas de cada transacción.
+
+        Métodos:
+        - conectar(self): Comprueba la conexión con el nodo. Debe esperarse antes de operar.
+        - crear(cls, ganache_url, contract_address, abi_path): Crea el gestor y comprueba la conexión.
+        - cerrar(self): Cierra la sesión aiohttp y sus conexiones. El gestor también puede usarse con
+        `async with`, que lo conecta al entrar y lo cierra al salir.
+        - sign_and_send_transaction(...), alta_prestamista(...), alta_cliente(...), depositar_garantia(...),
+        solicitar_prestamo(...), aprobar_prestamo(...), reembolsar_prestamo(...), liquidar_garantia(...),
+        obtener_prestamos_por_prestatario(...), obtener_detalle_de_prestamo(...): Equivalentes asíncronos de
+        los métodos de BlockchainManager.
+    """
+    MAX_REINTENTOS_NONCE = 3
+    TAMANO_LOTE_PRESTAMOS = 500
+
+    def __init__(self, ganache_url='http://127.0.0.1:7545', contract_address=None, abi_path='PrestamoDeFi.json',
+                 tamano_pool=TAMANO_POOL_DEFECTO):
+        """
+            Crea el gestor asíncrono. No realiza ninguna petición al nodo: la conexión se comprueba al esperar
+            `conectar()` (o usando `AsyncBlockchainManager.crear`).
+
+            Parámetros:
+            - ganache_url (str, opcional): La URL HTTP del nodo Ethereum.
+            - contract_address (str): La dirección del contrato PrestamoDeFi.
+            - abi_path (str, opcional): La ruta al archivo JSON con la ABI del contrato.
+            - tamano_pool (int, opcional): Conexiones HTTP persistentes de la sesión aiohttp.
+        """
+        self.tamano_pool = tamano_pool
+        self.sesion = None
+        self.web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(ganache_url))
+        self.nonce_manager = AsyncNonceManager(self.web3)
+        self.estrategia_gas = AsyncEstrategiaGas(self.web3)
+        try:
+            self.contract_address = self.web3.to_checksum_address(contract_address)
+            self.contract_abi = cargar_abi(abi_path)
+            self.contract = self.web3.eth.contract(address=self.contract_address, abi=self.contract_abi)
+            self.codificador = CodificadorABI(self.contract_abi)
+        except Exception as e:
+            logging.error(f"Error al cargar el contrato: {e}")
+            raise
+
+    @classmethod
+    async def crear(cls, ganache_url='http://127.0.0.1:7545', contract_address=None, abi_path='PrestamoDeFi.json',
+                    tamano_pool=TAMANO_POOL_DEFECTO):
+        """Crea un AsyncBlockchainManager y espera a comprobar su conexión con el nodo."""
+        manager = cls(ganache_url, contract_address, abi_path, tamano_pool)
+        await manager.conectar()
+        return manager
+
+    async def conectar(self):
+        """
+            Asigna al proveedor la sesión aiohttp con el pool de conexiones y comprueba que el nodo responde.
+
+            Excepciones:
+            - ConnectionError: Se lanza si la conexión con el nodo no puede ser establecida.
+        """
+        try:
+            if self.sesion is None:
+                self.sesion = await configurar_sesion_async(self.web3.provider, self.tamano_pool)
+            if not await self.web3.is_connected():
+                raise ConnectionError("No se pudo conectar a Ganache.")
+        except ConnectionError as e:
+            logging.error(f"Error al conectar con Ganache: {e}")
+            raise
+
+    async def cerrar(self):
+        """Cierra la sesión aiohttp del proveedor y libera las conexiones de su pool."""
+        if self.sesion is not None:
+            await self.sesion.close()
+            self.sesion = None
+
+    async def __aenter__(self):
+        await self.conectar()
+        return self
+
+    async def __aexit__(self, tipo, valor, traza):
+        await self.cerrar()
+
+    async def sign_and_send_transaction(self, function_call, account_address, private_key, ether_value=0, gas_limit=None,
+                                        wait_for_receipt=True):
+        """
+            Firma y envía una transacción que invoca una función del contrato. Es el equivalente asíncrono de
+            BlockchainManager.sign_and_send_transaction, con la misma validación, asignación local de nonces y
+            reintentos ante nonces rechazados.
+
+            Parámetros:
+            - function_call (AsyncContractFunction): La función del contrato a invocar.
+            - account_address (str): La dirección Ethereum desde la cual se envía la transacción.
+            - private_key (str): La clave privada asociada a `account_address`, que debe empezar con '0x'.
+            - ether_value (int): El valor de la transacción en wei.
+            - gas_limit (int, opcional): El límite de gas de la transacción. Por defecto lo calcula `estrategia_gas`.
+            - wait_for_receipt (bool, opcional): Si es False, no espera a que la transacción se mine y retorna un
+            `asyncio.Task` que se resuelve con el mensaje de éxito.
+
+            Retorna:
+            Una cadena con un mensaje de éxito y el resumen del recibo de la transacción.
+
+            Excepciones:
+            - ValueError, InvalidAddress, TransactionNotFound, TimeExhausted, ContractLogicError, Exception: Igual
+            que en BlockchainManager.sign_and_send_transaction.
+        """
+        try:
+            account_address = self.web3.to_checksum_address(account_address.strip())
+            if not is_valid_ethereum_address(account_address):
+                raise ValueError(f"La dirección {account_address} no es válida.")
+
+            if not isinstance(private_key, str) or not private_key.startswith('0x'):
+                raise ValueError("La clave privada debe ser una cadena hexadecimal que comience con 0x.")
+
+            if gas_limit is None:
+                gas_limit = await self.estrategia_gas.estimar_gas(function_call.fn_name, function_call.args, {
+                    'from': account_address,
+                    'to': self.contract_address,
+                    'data': self.codificador.codificar_llamada(function_call.fn_name, function_call.args),
+                    'value': ether_value,
+                })
+            tarifas = await self.estrategia_gas.tarifas()
+            chain_id = await self.web3.eth.chain_id
+            for intento in range(1, self.MAX_REINTENTOS_NONCE + 1):
+                nonce = await self.nonce_manager.reserve_nonce(account_address)
+                try:
+                    transaction = await function_call.build_transaction({
+                        'from': account_address,
+                        'chainId': chain_id,
+                        'gas': gas_limit,
+                        'nonce': nonce,
+                        'value': ether_value,
+                        **tarifas,
+                    })
+                    signed_txn = self.web3.eth.account.sign_transaction(transaction, private_key)
+                    txn_hash = await self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+                except Exception as e:
+                    if not NonceManager.is_nonce_error(e):
+                        self.nonce_manager.release_nonce(account_address, nonce)
+                        raise
+                    logging.error(f"Nonce {nonce} rechazado para {account_address} (intento {intento}): {e}")
+                    self.nonce_manager.confirm_nonce(account_address, nonce)
+                    await self.nonce_manager.resync(account_address)
+                    if intento == self.MAX_REINTENTOS_NONCE:
+                        raise
+                    continue
+                self.nonce_manager.confirm_nonce(account_address, nonce)
+                break
+
+            if not wait_for_receipt:
+                return asyncio.ensure_future(self._esperar_recibo(txn_hash))
+            return await self._esperar_recibo(txn_hash)
+        except ValueError as e:
+            logging.error(f"Error de valor: {e}")
+            raise e
+
+        except InvalidAddress as e:
+            logging.error(f"Dirección inválida: {e}")
+            raise e
+
+        except TransactionNotFound as e:
+            logging.error(f"Transacción no encontrada: {e}")
+            raise e
+
+        except TimeExhausted as e:
+            logging.error(f"Tiempo agotado esperando la transacción: {e}")
+            raise e
+
+        except ContractLogicError as e:
+            logging.error(f"Error de lógica del contrato: {e}")
+            raise e
+
+        except Exception as e:
+            logging.error(f"Error al realizar la transacción: {e}")
+            raise e
+
+    async def _esperar_recibo(self, txn_hash):
+        receipt = await self.web3.eth.wait_for_transaction_receipt(txn_hash)
+        if receipt.status == 0:
+            logging.error("La transacción falló. Recibo: {}".format(receipt))
+            raise ValueError("La transacción falló.")
+        logging.info("Transacción exitosa. Recibo: {}".format(receipt))
+        return "Transacción exitosa. Recibo: {}".format(format_transaction_receipt(receipt))
+
+    async def alta_prestamista(self, direccion_prestamista, clave_privada, nueva_direccion, esperar_recibo=True):
+        """Registra un nuevo prestamista (ver BlockchainManager.alta_prestamista)."""
+        if not is_valid_ethereum_address(nueva_direccion):
+            raise ValueError("La nueva dirección no es válida.")
+        try:
+            function_call = self.contract.functions.altaPrestamista(self.web3.to_checksum_address(nueva_direccion))
+            return await self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada, 0,
+                                                        wait_for_receipt=esperar_recibo)
+        except Exception as e:
+            logging.error("Error en alta_prestamista: %s", str(e))
+            raise Exception(f"Error al dar de alta al prestamista: {e}")
+
+    async def alta_cliente(self, direccion_prestamista, clave_privada, nueva_direccion, esperar_recibo=True):
+        """Registra un nuevo cliente (ver BlockchainManager.alta_cliente)."""
+        try:
+            if not is_valid_ethereum_address(nueva_direccion):
+                raise ValueError(f"La dirección {nueva_direccion} no es válida.")
+
+            function_call = self.contract.functions.altaCliente(self.web3.to_checksum_address(nueva_direccion))
+            return await self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada, 0,
+                                                        wait_for_receipt=esperar_recibo)
+        except ValueError as e:
+            logging.error(f"Error de valor: {e}")
+            raise e
+        except InvalidAddress as e:
+            logging.error(f"Dirección inválida: {e}")
+            raise e
+        except ContractLogicError as e:
+            logging.error(f"Error de lógica del contrato: {e}")
+            raise e
+        except Exception as e:
+            logging.error("Error al registrar al cliente: %s", str(e))
+            raise Exception(f"Error al registrar al cliente: {e}")
+
+    async def depositar_garantia(self, direccion_cliente, clave_privada, valor_ether, esperar_recibo=True):
+        """Deposita garantía en el contrato; `valor_ether` se expresa en wei (ver BlockchainManager.depositar_garantia)."""
+        try:
+            direccion_cliente = self.web3.to_checksum_address(direccion_cliente)
+            if not is_valid_ethereum_address(direccion_cliente):
+                raise ValueError(f"La dirección {direccion_cliente} no es válida.")
+
+            function_call = self.contract.functions.depositarGarantia()
+            return await self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, valor_ether,
+                                                        wait_for_receipt=esperar_recibo)
+        except ValueError as e:
+            logging.error(f"Error de valor: {e}")
+            raise e
+
+        except InvalidAddress as e:
+            logging.error(f"Dirección inválida: {e}")
+            raise e
+
+        except ContractLogicError as e:
+            logging.error(f"Error de lógica del contrato: {e}")
+            raise e
+
+        except Exception as e:
+            logging.error("Error al depositar garantia: %s", str(e))
+            raise Exception(f"Error al depositar garantia: {e}")
+
+    async def solicitar_prestamo(self, direccion_cliente, clave_privada, monto, plazo, esperar_recibo=True):
+        """Solicita un préstamo de `monto` wei a `plazo` segundos (ver BlockchainManager.solicitar_prestamo)."""
+        try:
+            function_call = self.contract.functions.solicitarPrestamo(monto, plazo)
+            return await self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, 0,
+                                                        wait_for_receipt=esperar_recibo)
+        except Exception as e:
+            logging.error("Error al solicitar prestamo: %s", str(e))
+            raise Exception(f"Error al solicitar prestamo: {e}")
+
+    async def aprobar_prestamo(self, direccion_prestamista, clave_privada, direccion_prestatario, prestamo_id,
+                               esperar_recibo=True):
+        """Aprueba un préstamo pendiente de un prestatario (ver BlockchainManager.aprobar_prestamo)."""
+        if not is_valid_ethereum_address(direccion_prestatario):
+            raise ValueError("La dirección del prestatario no es válida.")
+        try:
+            function_call = self.contract.functions.aprobarPrestamo(
+                self.web3.to_checksum_address(direccion_prestatario), prestamo_id)
+            return await self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada,
+                                                        wait_for_receipt=esperar_recibo)
+        except Exception as e:
+            logging.error("Error al aprobar prestamo: %s", str(e))
+            raise Exception(f"Error al aprobar prestamo: {e}")
+
+    async def reembolsar_prestamo(self, direccion_cliente, clave_privada, prestamo_id, valor_ether, esperar_recibo=True):
+        """Reembolsa un préstamo aprobado (ver BlockchainManager.reembolsar_prestamo)."""
+        try:
+            function_call = self.contract.functions.reembolsarPrestamo(prestamo_id)
+            return await self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, valor_ether,
+                                                        wait_for_receipt=esperar_recibo)
+        except Exception as e:
+            logging.error("Error al reembolsar prestamo: %s", str(e))
+            raise Exception(f"Error al reembolsar prestamo: {e}")
+
+    async def liquidar_garantia(self, direccion_prestamista, clave_privada, direccion_prestatario, prestamo_id,
+                                esperar_recibo=True):
+        """Liquida la garantía de un préstamo vencido (ver BlockchainManager.liquidar_garantia)."""
+        if not is_valid_ethereum_address(direccion_prestatario):
+            raise ValueError("La dirección del prestatario no es válida.")
+        try:
+            function_call = self.contract.functions.liquidarGarantia(
+                self.web3.to_checksum_address(direccion_prestatario), prestamo_id)
+            return await self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada,
+                                                        wait_for_receipt=esperar_recibo)
+        except Exception as e:
+            logging.error("Error al liquidar garantia: %s", str(e))
+            raise Exception(f"Error al liquidar garantia: {e}")
+
+    async def obtener_prestamos_por_prestatario(self, direccion_prestatario, tamano_lote=TAMANO_LOTE_PRESTAMOS):
+        """
+            Recupera todos los préstamos de un prestatario. Obtiene la lista de IDs y después envía las consultas
+            de detalle en peticiones JSON-RPC por lotes de `tamano_lote` llamadas, como
+            BlockchainManager.obtener_cartera_prestatario, en lugar de un `eth_call` por préstamo.
+
+            Retorna:
+            Una lista con el registro `Prestamo` de cada préstamo (ver Registros).
+
+            Excepciones:
+            - ValueError: Se lanza si la dirección del prestatario no es válida.
+            - Exception: Captura y maneja cualquier otro error que pueda ocurrir durante la recuperación.
+        """
+        if not is_valid_ethereum_address(direccion_prestatario):
+            raise ValueError("La dirección del prestatario no es válida.")
+        try:
+            direccion_prestatario = self.web3.to_checksum_address(direccion_prestatario)
+            ids = await self.contract.functions.obtenerPrestamosPorPrestatario(direccion_prestatario).call()
+            if not ids:
+                return []
+            if self.sesion is None:
+                self.sesion = await configurar_sesion_async(self.web3.provider, self.tamano_pool)
+            llamadas = [('eth_call', [{
+                'to': self.contract_address,
+                'data': self.codificador.codificar_llamada('obtenerDetalleDePrestamo',
+                                                           (direccion_prestatario, prestamo_id)),
+            }, 'latest']) for prestamo_id in ids]
+            respuestas = await ejecutar_lote_async(self.sesion, self.web3.provider.endpoint_uri, llamadas,
+                                                   tamano_lote)
+            prestamos = []
+            for prestamo_id, respuesta in zip(ids, respuestas):
+                if 'error' in respuesta:
+                    raise Exception(f"Error en obtenerDetalleDePrestamo({prestamo_id}): "
+                                    f"{respuesta['error'].get('message')}")
+                prestamos.append(Prestamo(*self.codificador.decodificar_resultado('obtenerDetalleDePrestamo',
+                                                                                  respuesta['result'])))
+            return prestamos
+        except Exception as e:
+            logging.error(f"Error al obtener préstamos por prestatario: {e}")
+            raise Exception(f"Error al obtener préstamos por prestatario: {e}")
+
+    async def obtener_detalle_de_prestamo(self, direccion_prestatario, prestamo_id):
+        """Obtiene el registro `Prestamo` de un préstamo (ver BlockchainManager.obtener_detalle_de_prestamo)."""
+        if not is_valid_ethereum_address(direccion_prestatario):
+            raise ValueError("La dirección del prestatario no es válida.")
+
+        try:
+            prestamo = await self.contract.functions.obtenerDetalleDePrestamo(
+                self.web3.to_checksum_address(direccion_prestatario), prestamo_id).call()
+            return Prestamo(*prestamo)
+        except Exception as e:
+            logging.error("Error al obtener detalle de préstamo: %s", str(e))
+            raise Exception(f"Error al obtener detalle de préstamo: {e}")
@@ -1,9 +1,24 @@
 import logging
+from functools import lru_cache
 from web3 import Web3, HTTPProvider, exceptions
 import json
+import threading
 import time
 from datetime import datetime
-from ContractUtils import ether_to_wei, wei_to_ether, is_valid_ethereum_address, format_transaction_receipt, log_transaction_receipt
+from ContractUtils import (ether_to_wei, wei_to_ether, is_valid_ethereum_address, format_transaction_receipt,
+                           log_transaction_receipt, cargar_abi, mapear_estado_prestamo)
+from NonceManager import NonceManager
+from ReceiptTracker import ReceiptTracker, TransactionHandle
+from CodificadorABI import CodificadorABI, LlamadaContrato
+from EstrategiaGas import EstrategiaGas
+from AgregadorLecturas import AgregadorLecturas
+from CacheLecturas import CacheLecturas
+from Registros import Prestamo
+from ProveedorRPC import crear_proveedor
+from RpcBatch import ejecutar_lote
+from Metricas import Metricas, METRICAS_MANAGER, middleware_rpc
+from FirmadorProcesos import firmar_transacciones
+from DiarioTransacciones import TIEMPO_ATASCO, INCREMENTO_TARIFA, aumentar_tarifas
 from web3.exceptions import (
     TransactionNotFound,
     TimeExhausted,
@@ -15,13 +30,6 @@ from web3.exceptions import (
 logging.basicConfig(filename='blockchain_errors.log', level=logging.ERROR,
                     format='%(asctime)s:%(levelname)s:%(message)s')
 
-ESTADOS_PRESTAMO = {
-    0: 'Pendiente',
-    1: 'Aprobado',
-    2: 'Reembolsado',
-    3: 'Liquidado',
-}
-
 class BlockchainManager:
     """
         Gestiona la conexión y las interacciones con un contrato inteligente en la red Ethereum,
@@ -38,15 +46,56 @@ class BlockchainManager:
         - contract_address (str): La dirección del contrato inteligente en la red Ethereum.
         - contract_abi (json): La Interfaz Binaria de Aplicación (ABI) del contrato inteligente, necesaria
         para interactuar con sus funciones.
+        - nonce_manager (NonceManager): Asigna localmente los nonces de cada cuenta emisora para poder tener
+        varias transacciones de la misma cuenta en vuelo a la vez.
+        - codificador (CodificadorABI): Codifica y decodifica en crudo las llamadas al contrato, para las
+        consultas agrupadas en peticiones JSON-RPC por lotes.
+        - receipt_tracker (ReceiptTracker): Sigue en segundo plano los recibos de las transacciones enviadas sin
+        esperar (`esperar_recibo=False`) y resuelve sus manejadores.
+        - estrategia_gas (EstrategiaGas): Estima el límite de gas de cada llamada y calcula sus tarifas
+        (EIP-1559 cuando la red lo aplica).
+        - chain_id (int): Identificador de la cadena, consultado una sola vez por conexión.
+        - agregador (AgregadorLecturas): Agrupa las consultas masivas en llamadas al contrato auxiliar Multicall
+        (o en peticiones JSON-RPC por lotes si no está desplegado).
+        - cache (CacheLecturas): Caché por bloque de las consultas al contrato (`consultar` y `consultar_por_lotes`),
+        que se invalida con los eventos de cada prestatario y con las transacciones propias.
+        - direccion_checksum (callable): `to_checksum_address` con una caché LRU acotada, ya que las mismas
+        pocas direcciones (cuentas de operador, prestatarios) se normalizan en cada operación.
+        - metricas (Metricas): Tiempos por etapa de las transacciones, latencia de eth_call y de cada petición
+        JSON-RPC, reintentos, reversiones, errores y gas usado (ver Metricas.METRICAS_MANAGER).
+        - firmador (FirmadorProcesos o None): Firma en paralelo, en varios procesos, las transacciones de los
+        envíos masivos. Con None se firman en el propio proceso.
+        - sesion (SesionClaves o None): Cuentas desbloqueadas de la sesión. Las operaciones que reciben la clave
+        privada como None firman con la cuenta de la sesión, ya derivada, en lugar de interpretar la clave.
+        - diario (DiarioTransacciones o None): Diario en disco donde se anota cada transacción firmada antes de
+        difundirla y su resultado, para reanudar con `reconciliar_diario` tras una caída.
+
+        Los metadatos en caché (chain_id, direcciones normalizadas, estimaciones de gas) solo se descartan al
+        volver a conectar con el nodo (`init_web3` o `reconectar`). Las transacciones se construyen con los
+        selectores y codificadores que `codificador` calcula al cargar la ABI, sin crear un ContractFunction de
+        Web3 por operación.
 
         Métodos:
         - __init__(self, ganache_url, contract_address, abi_path): Constructor de la clase.
         - init_web3(self, ganache_url): Inicializa la conexión con la red Ethereum utilizando Web3.
         - load_contract(self, contract_address, abi_path): Carga el contrato inteligente especificado
         por su dirección y ABI para interactuar con él.
+        - reconectar(self, ganache_url): Vuelve a conectar con el nodo y descarta los metadatos en caché.
+        - reconciliar_diario(self, account_address, private_key): Comprueba contra la cadena las transacciones
+        pendientes del diario y vuelve a difundir o reemplaza las perdidas y las atascadas.
         
     """
-    def __init__(self, ganache_url='http://127.0.0.1:7545', contract_address=None, abi_path='PrestamoDeFi.json'):
+    # Número máximo de veces que se reintenta un envío rechazado por el nodo por un nonce desincronizado.
+    MAX_REINTENTOS_NONCE = 3
+    # Número máximo de préstamos consultados en cada petición por lotes de obtener_cartera_prestatario.
+    TAMANO_LOTE_PRESTAMOS = 500
+    # Número máximo de transacciones difundidas en cada petición por lotes de las operaciones masivas.
+    TAMANO_LOTE_ENVIO = 100
+    # Número máximo de direcciones normalizadas (checksum) que se guardan en caché.
+    TAMANO_CACHE_DIRECCIONES = 1024
+
+    def __init__(self, ganache_url='http://127.0.0.1:7545', contract_address=None, abi_path='PrestamoDeFi.json',
+                 opciones_proveedor=None, metricas=None, firmador=None, sesion=None, diario=None):
         """
             Constructor para la clase BlockchainManager, que inicializa la conexión con la red Ethereum local
             utilizando Ganache y carga un contrato inteligente especificado para su interacción.
@@ -64,6 +113,14 @@ class BlockchainManager:
             - abi_path (str, opcional): La ruta al archivo JSON que contiene la ABI del contrato inteligente.
             Por defecto, se usa 'PrestamoDeFi.json'. La ABI es necesaria para que Web3.py sepa cómo interactuar
             con el contrato (por ejemplo, qué funciones se pueden llamar).
+            - opciones_proveedor (dict, opcional): Opciones del transporte con el nodo (`tamano_pool`, `timeout`,
+            `http2`), ver ProveedorRPC.crear_proveedor. La URL también puede ser 'ws://...' o la ruta de un socket IPC,
+            o una lista de URLs: las lecturas se reparten entre los nodos y las escrituras van a uno fijo (RouterRPC).
+            - metricas (Metricas, opcional): Registro donde se anotan las métricas. Por defecto, uno nuevo;
+            `MetricasNulas()` desactiva la medición.
+            - firmador (FirmadorProcesos, opcional): Firmador de los envíos masivos (`enviar_transacciones_lote`).
+            - sesion (SesionClaves, opcional): Sesión de claves con la que firmar cuando no se pasa la clave privada.
+            - diario (DiarioTransacciones, opcional): Diario de las transacciones firmadas.
 
             Proceso:
             1. Inicializa la conexión con Ganache utilizando la URL proporcionada.
@@ -72,7 +129,20 @@ class BlockchainManager:
             externamente antes de interactuar con él.
             
         """
+        self.metricas = metricas if metricas is not None else Metricas()
+        for nombre, (ayuda, limites) in METRICAS_MANAGER.items():
+            self.metricas.describir(nombre, ayuda, limites)
+        self.opciones_proveedor = opciones_proveedor or {}
+        self.firmador = firmador
+        self.sesion = sesion
+        self.diario = diario
         self.init_web3(ganache_url)
+        self.agregador = AgregadorLecturas(self)
+        self.cache = CacheLecturas(self)
+        self.metricas.registrar_coleccion('cache', self.cache.metricas)
+        self.metricas.registrar_coleccion('recibos', lambda: {'pendientes': self.receipt_tracker.pending_count()})
+        if diario is not None:
+            self.metricas.registrar_coleccion('diario', lambda: {'pendientes': len(self.diario.pendientes())})
         self.load_contract(contract_address, abi_path)
         
     def init_web3(self, ganache_url):
@@ -98,9 +168,16 @@ class BlockchainManager:
             
         """
         try:
-            self.web3 = Web3(Web3.HTTPProvider(ganache_url))
+            self.web3 = Web3(crear_proveedor(ganache_url, **self.opciones_proveedor))
+            self.web3.middleware_onion.add(middleware_rpc(self.metricas), 'metricas')
             if not self.web3.is_connected():
                 raise ConnectionError("No se pudo conectar a Ganache.")
+            self.ganache_url = ganache_url
+            self._chain_id = None
+            self.direccion_checksum = lru_cache(maxsize=self.TAMANO_CACHE_DIRECCIONES)(self.web3.to_checksum_address)
+            self.nonce_manager = NonceManager(self.web3)
+            self.receipt_tracker = ReceiptTracker(self.web3)
+            self.estrategia_gas = EstrategiaGas(self.web3)
         except ConnectionError as e:
             logging.error(f"Error al conectar con Ganache: {e}")
             raise
@@ -126,36 +203,129 @@ class BlockchainManager:
             
         """
         try:
-            self.contract_address = self.web3.to_checksum_address(contract_address)
-            with open(abi_path, 'r') as abi_file:
-                self.contract_abi = json.load(abi_file)
+            self.contract_address = self.direccion_checksum(contract_address)
+            self.contract_abi = cargar_abi(abi_path)
             self.contract = self.web3.eth.contract(address=self.contract_address, abi=self.contract_abi)
+            self.codificador = CodificadorABI(self.contract_abi)
         except Exception as e:
             logging.error(f"Error al cargar el contrato: {e}")
             raise
 
-    def sign_and_send_transaction(self, function_call, account_address, private_key, ether_value=0, gas_limit=None):
+    def reconectar(self, ganache_url=None):
+        """
+            Vuelve a conectar con el nodo (el mismo u otro) y descarta todos los metadatos en caché: chain_id,
+            direcciones normalizadas, estimaciones de gas, tarifas y nonces locales. Las transacciones cuyo recibo
+            se estaba esperando pasan al seguimiento de la nueva conexión; si no se puede conectar, sus
+            `TransactionHandle` terminan con el error de conexión.
+
+            Parámetros:
+            - ganache_url (str o list, opcional): Nueva URL del nodo (o lista de URLs). Por defecto, la de la
+            conexión actual.
+        """
+        anterior = self.receipt_tracker
+        anterior.stop()
+        if hasattr(self.web3.provider, 'detener'):
+            self.web3.provider.detener()
+        try:
+            self.init_web3(ganache_url or self.ganache_url)
+        except Exception as e:
+            anterior.abandonar(e)
+            raise
+        anterior.trasladar(self.receipt_tracker)
+        self.contract = self.web3.eth.contract(address=self.contract_address, abi=self.contract_abi)
+        self.agregador.invalidar()
+        self.cache.vaciar()
+
+    @property
+    def chain_id(self):
+        """Identificador de la cadena, consultado al nodo solo la primera vez tras cada conexión."""
+        if self._chain_id is None:
+            self._chain_id = self.web3.eth.chain_id
+        return self._chain_id
+
+    def consultar(self, nombre_funcion, args=()):
+        """
+            Ejecuta una función de consulta del contrato con `eth_call`, codificando la llamada con `codificador`.
+            El resultado se sirve desde `cache` mientras siga siendo válido.
+
+            Parámetros:
+            - nombre_funcion (str): Nombre de la función de consulta del contrato.
+            - args (tuple, opcional): Argumentos de la llamada (direcciones en formato checksum).
+
+            Retorna:
+            El resultado decodificado (ver CodificadorABI.decodificar_resultado).
+        """
+        def cargar(bloque):
+            with self.metricas.cronometro('eth_call_segundos', funcion=nombre_funcion):
+                try:
+                    datos = self.web3.eth.call({'to': self.contract_address,
+                                                'data': self.codificador.codificar_llamada(nombre_funcion, args)},
+                                               block_identifier=bloque)
+                except ContractLogicError:
+                    self.metricas.incrementar('reversiones_total', operacion=nombre_funcion, origen='llamada')
+                    raise
+            return self.codificador.decodificar_resultado(nombre_funcion, datos)
+        return self.cache.obtener(nombre_funcion, args, cargar)
+
+    def _invalidar_cache(self, account_address, args):
+        """Descarta de la caché las lecturas de la cuenta emisora y de las direcciones de los argumentos."""
+        self.cache.invalidar_direcciones([account_address] + [
+            self.direccion_checksum(arg) for arg in args if isinstance(arg, str) and Web3.is_address(arg)])
+
+    def _clave_firma(self, account_address, private_key):
+        """
+            Devuelve la clave con la que firmar: `private_key` si se indica o, si es None, la clave ya derivada
+            de `account_address` en `sesion`.
+
+            Excepciones:
+            - ValueError: Se lanza si la clave no es una cadena hexadecimal con 0x o no hay sesión.
+            - SesionBloqueada: Se lanza si la cuenta no está desbloqueada en la sesión.
+        """
+        if private_key is None:
+            if self.sesion is None:
+                raise ValueError("Falta la clave privada y no hay ninguna sesión de claves abierta.")
+            return self.sesion.clave_firma(account_address)
+        if not isinstance(private_key, str) or not private_key.startswith('0x'):
+            raise ValueError("La clave privada debe ser una cadena hexadecimal que comience con 0x.")
+        return private_key
+
+    def sign_and_send_transaction(self, function_call, account_address, private_key, ether_value=0, gas_limit=None,
+                                  wait_for_receipt=True):
         """Firma y envía una transacción al blockchain, invocando una función específica de un contrato inteligente
             y asegurando que el emisor tenga fondos suficientes para cubrir el costo de gas y el valor de la transacción.
             Esta función es genérica y se puede utilizar para cualquier llamada a función de contrato que requiera
             una transacción, asegurando la flexibilidad en su uso.
 
             Parámetros:
-            - function_call (ContractFunction): Una instancia de la función del contrato a ser invocada. 
-            Esto se obtiene llamando al método de función correspondiente del objeto de contrato de Web3.py.
+            - function_call (LlamadaContrato o ContractFunction): La función del contrato a ser invocada, con sus
+            atributos `fn_name` y `args`. Los datos de la transacción se codifican con `codificador`.
             - account_address (str): La dirección Ethereum desde la cual se envía la transacción. Debe ser una
             dirección válida que el usuario controle y por la cual pueda firmar transacciones.
             - private_key (str): La clave privada del emisor asociada a `account_address`, utilizada para firmar 
-            la transacción. Debe empezar con '0x' y ser una cadena hexadecimal válida.
+            la transacción. Debe empezar con '0x' y ser una cadena hexadecimal válida. Con None se firma con la
+            cuenta desbloqueada en `sesion`.
             - ether_value (int): El valor de la transacción en wei. Aunque denominado `ether_value`, este parámetro
             debe estar ya convertido a wei. Es el valor enviado junto con la llamada a la función del contrato.
-            - gas_limit (int, opcional): El límite de gas para la transacción. Si no se proporciona, se estima un valor
-            por defecto o se utiliza uno proporcionado por el usuario para asegurar que la transacción no falle por
-            falta de gas.
+            - gas_limit (int, opcional): El límite de gas para la transacción. Si no se proporciona, lo calcula
+            `estrategia_gas` a partir de `eth_estimateGas` con un margen de seguridad. Las tarifas
+            (`maxFeePerGas`/`maxPriorityFeePerGas` o `gasPrice`) también las decide `estrategia_gas`.
+            - wait_for_receipt (bool, opcional): Si es True (por defecto), espera a que la transacción se mine. Si es
+            False, retorna inmediatamente después de `send_raw_transaction` un `TransactionHandle` cuyo recibo
+            resuelve `receipt_tracker` en segundo plano.
+
+            El nonce se reserva localmente con `nonce_manager`, por lo que varias llamadas desde distintos hilos con
+            la misma cuenta pueden estar en vuelo a la vez. Si el nodo rechaza el nonce (por ejemplo, "nonce too low"
+            porque otra aplicación usó la misma cuenta), se resincroniza la cuenta y se reintenta hasta
+            `MAX_REINTENTOS_NONCE` veces. Si el envío falla por un error de transporte, la transacción puede haber
+            llegado al nodo: el nonce no se devuelve para otra transacción y la cuenta se resincroniza con el nodo.
 
             Retorna:
             Una cadena de texto que representa un mensaje de éxito y un resumen del recibo de la transacción si esta
             es exitosa. El resumen del recibo incluye detalles relevantes para su revisión y seguimiento.
+            Con `wait_for_receipt=False` retorna el `TransactionHandle` de la transacción difundida.
+
+            La duración de cada etapa (construir, firmar, enviar y esperar el recibo) se anota en `metricas`, con la
+            función del contrato como etiqueta `operacion`, junto con el gas usado, los reintentos y los errores.
 
             Excepciones:
             - ValueError: Se lanza si la dirección Ethereum no es válida, la clave privada no está en el formato correcto,
@@ -167,30 +337,96 @@ class BlockchainManager:
             - Exception: Captura y lanza cualquier otro error no especificado que pueda ocurrir durante el proceso
             de firma y envío de la transacción.
         """     
+        operacion = function_call.fn_name
         try:
-            account_address = self.web3.to_checksum_address(account_address.strip())
+            account_address = self.direccion_checksum(account_address.strip())
             if not is_valid_ethereum_address(account_address):
                 raise ValueError(f"La dirección {account_address} no es válida.")
-            
-            nonce = self.web3.eth.get_transaction_count(account_address)
+
+            clave = self._clave_firma(account_address, private_key)
+
             value_in_wei = ether_value
-            gas_limit = gas_limit if gas_limit is not None else 2000000
-            gas_price = self.web3.eth.gas_price
-            transaction = function_call.build_transaction({
-                'from': account_address,
-                'chainId': self.web3.eth.chain_id,
-                'gas': gas_limit,
-                'gasPrice': self.web3.to_wei('50', 'gwei'),
-                'nonce': nonce,
-                'value': value_in_wei,
-            })
-            
-            if not isinstance(private_key, str) or not private_key.startswith('0x'):
-                raise ValueError("La clave privada debe ser una cadena hexadecimal que comience con 0x.")
-            
-            signed_txn = self.web3.eth.account.sign_transaction(transaction, private_key)
-            txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            with self.metricas.cronometro('etapa_segundos', operacion=operacion, etapa='construir'):
+                datos = self.codificador.codificar_llamada(function_call.fn_name, function_call.args)
+                if gas_limit is None:
+                    gas_limit = self.estrategia_gas.estimar_gas(function_call.fn_name, function_call.args, {
+                        'from': account_address,
+                        'to': self.contract_address,
+                        'data': datos,
+                        'value': value_in_wei,
+                    })
+                tarifas = self.estrategia_gas.tarifas()
+            for intento in range(1, self.MAX_REINTENTOS_NONCE + 1):
+                nonce = self.nonce_manager.reserve_nonce(account_address)
+                tx_hash = None
+                difundiendo = False
+                try:
+                    transaction = {
+                        'to': self.contract_address,
+                        'data': datos,
+                        'chainId': self.chain_id,
+                        'gas': gas_limit,
+                        'nonce': nonce,
+                        'value': value_in_wei,
+                        **tarifas,
+                    }
+                    with self.metricas.cronometro('etapa_segundos', operacion=operacion, etapa='firmar'):
+                        signed_txn = self.web3.eth.account.sign_transaction(transaction, clave)
+                    tx_hash = self.web3.to_hex(signed_txn.hash)
+                    if self.diario is not None:
+                        self.diario.registrar_firmadas([{
+                            'remitente': account_address, 'nonce': nonce, 'tx_hash': tx_hash,
+                            'raw_transaction': self.web3.to_hex(signed_txn.rawTransaction),
+                            'intencion': {'operacion': operacion, 'args': list(function_call.args),
+                                          'transaccion': transaction},
+                        }])
+                    difundiendo = True
+                    with self.metricas.cronometro('etapa_segundos', operacion=operacion, etapa='enviar'):
+                        txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+                except Exception as e:
+                    # Solo un error del nodo (ValueError) asegura que no se difundió; un error de transporte deja
+                    # la transacción pendiente en el diario hasta reconciliarla.
+                    if self.diario is not None and tx_hash is not None and isinstance(e, ValueError):
+                        self.diario.registrar_rechazada(tx_hash, e)
+                    if difundiendo and not isinstance(e, ValueError):
+                        # La transacción puede haber llegado al nodo: su nonce no se vuelve a entregar hasta que
+                        # el nodo diga que está libre.
+                        self.nonce_manager.confirm_nonce(account_address, nonce)
+                        try:
+                            self.nonce_manager.resync(account_address)
+                        except Exception as error_resync:
+                            logging.error(f"No se pudo resincronizar el nonce de {account_address}: {error_resync}")
+                        raise
+                    if not NonceManager.is_nonce_error(e):
+                        self.nonce_manager.release_nonce(account_address, nonce)
+                        raise
+                    # El nodo ya conoce ese nonce: se descarta y se resincroniza la cuenta antes de reintentar.
+                    logging.error(f"Nonce {nonce} rechazado para {account_address} (intento {intento}): {e}")
+                    self.nonce_manager.confirm_nonce(account_address, nonce)
+                    self.nonce_manager.resync(account_address)
+                    if intento == self.MAX_REINTENTOS_NONCE:
+                        raise
+                    self.metricas.incrementar('reintentos_total', operacion=operacion, motivo='nonce')
+                    continue
+                self.nonce_manager.confirm_nonce(account_address, nonce)
+                break
+
+            # Las lecturas en caché de las direcciones afectadas dejan de valer al enviar y al minar la transacción.
+            self._invalidar_cache(account_address, function_call.args)
+            if not wait_for_receipt:
+                def al_resolver(manejador):
+                    self._invalidar_cache(account_address, function_call.args)
+                    self._anotar_recibo(manejador.tx_hash, manejador.receipt)
+                    self._registrar_recibo(operacion, manejador.receipt, time.monotonic() - manejador.sent_at)
+                manejador = self.receipt_tracker.track(txn_hash, account_address, nonce)
+                manejador.add_done_callback(al_resolver)
+                return manejador
+
+            enviada = time.monotonic()
             receipt = self.web3.eth.wait_for_transaction_receipt(txn_hash)
+            self._invalidar_cache(account_address, function_call.args)
+            self._anotar_recibo(tx_hash, receipt)
+            self._registrar_recibo(operacion, receipt, time.monotonic() - enviada)
             
             if receipt.status == 0:
                 logging.error("La transacción falló. Recibo: {}".format(receipt))
@@ -202,29 +438,50 @@ class BlockchainManager:
                 return success_message 
         except ValueError as e:
             logging.error(f"Error de valor: {e}")
+            self.metricas.incrementar('errores_total', operacion=operacion, tipo=type(e).__name__)
             raise e
 
         except InvalidAddress as e:
             logging.error(f"Dirección inválida: {e}")
+            self.metricas.incrementar('errores_total', operacion=operacion, tipo=type(e).__name__)
             raise e
 
         except TransactionNotFound as e:
             logging.error(f"Transacción no encontrada: {e}")
+            self.metricas.incrementar('errores_total', operacion=operacion, tipo=type(e).__name__)
             raise e
 
         except TimeExhausted as e:
             logging.error(f"Tiempo agotado esperando la transacción: {e}")
+            self.metricas.incrementar('errores_total', operacion=operacion, tipo=type(e).__name__)
             raise e
 
         except ContractLogicError as e:
             logging.error(f"Error de lógica del contrato: {e}")
+            self.metricas.incrementar('reversiones_total', operacion=operacion, origen='estimacion')
+            self.metricas.incrementar('errores_total', operacion=operacion, tipo=type(e).__name__)
             raise e
 
         except Exception as e:
             logging.error(f"Error al realizar la transacción: {e}")
+            self.metricas.incrementar('errores_total', operacion=operacion, tipo=type(e).__name__)
             raise e    
+
+    def _registrar_recibo(self, operacion, receipt, segundos):
+        """Anota en `metricas` el tiempo hasta el recibo, el gas usado y, si se revirtió, la reversión."""
+        if receipt is None:
+            return
+        self.metricas.observar('etapa_segundos', segundos, operacion=operacion, etapa='recibo')
+        self.metricas.observar('gas_usado', receipt.gasUsed, operacion=operacion)
+        if receipt.status == 0:
+            self.metricas.incrementar('reversiones_total', operacion=operacion, origen='recibo')
+
+    def _anotar_recibo(self, tx_hash, receipt):
+        """Anota en `diario` que la transacción se minó (si hay diario y se conoce el recibo)."""
+        if self.diario is not None and receipt is not None:
+            self.diario.registrar_minada(tx_hash, receipt)
                         
-    def alta_prestamista(self, direccion_prestamista, clave_privada, nueva_direccion):
+    def alta_prestamista(self, direccion_prestamista, clave_privada, nueva_direccion, esperar_recibo=True):
         """
         Registra un nuevo prestamista en el contrato inteligente del sistema. Este método
         invoca la función altaPrestamista del contrato inteligente, la cual debe estar
@@ -239,6 +496,8 @@ class BlockchainManager:
                         Debe corresponder a la dirección_prestamista.
         - nueva_direccion: La dirección Ethereum del nuevo prestamista a registrar. Esta dirección
                         debe ser válida y no previamente registrada como prestamista en el contrato.
+        - esperar_recibo: Si es False, no espera a que la transacción se mine y retorna su
+                        `TransactionHandle` (ver `sign_and_send_transaction`).
 
         Retorna:
         Una representación formateada del recibo de la transacción si esta es exitosa. La
@@ -256,14 +515,14 @@ class BlockchainManager:
         if not is_valid_ethereum_address(nueva_direccion):
             raise ValueError("La nueva dirección no es válida.")
         try:
-            function_call = self.contract.functions.altaPrestamista(self.web3.to_checksum_address(nueva_direccion))
-            receipt = self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada, 0)
-            return format_transaction_receipt(receipt)
+            function_call = LlamadaContrato('altaPrestamista', (self.direccion_checksum(nueva_direccion),))
+            return self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada, 0,
+                                                  wait_for_receipt=esperar_recibo)
         except Exception as e:
             logging.error("Error en alta_prestamista: %s", str(e))
             raise Exception(f"Error al dar de alta al prestamista: {e}")
         
-    def alta_cliente(self, direccion_prestamista, clave_privada, nueva_direccion):
+    def alta_cliente(self, direccion_prestamista, clave_privada, nueva_direccion, esperar_recibo=True):
         """
         Registra un nuevo cliente en el sistema mediante la invocación de la función
         del contrato inteligente destinada a este fin. La transacción es firmada y enviada
@@ -276,6 +535,8 @@ class BlockchainManager:
         la transacción. Debe comenzar con '0x'.
         - nueva_direccion (str): La dirección Ethereum del nuevo cliente que se está
         registrando en el sistema.
+        - esperar_recibo (bool, opcional): Si es False, no espera a que la transacción se mine
+        y retorna su `TransactionHandle` (ver `sign_and_send_transaction`).
 
         Retorna:
         - str: Una representación formateada del recibo de la transacción, que incluye
@@ -289,14 +550,12 @@ class BlockchainManager:
         interacción con el contrato inteligente.        
         """
         try:
-            direccion_cliente = self.web3.to_checksum_address(direccion_cliente)
-            if not is_valid_ethereum_address(direccion_cliente):
-                raise ValueError(f"La dirección {direccion_cliente} no es válida.")
+            if not is_valid_ethereum_address(nueva_direccion):
+                raise ValueError(f"La dirección {nueva_direccion} no es válida.")
 
-            function_call = self.contract.functions.altaCliente(self.web3.to_checksum_address(nueva_direccion))
-            receipt = self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada, 0)
-            
-            return format_transaction_receipt(receipt)
+            function_call = LlamadaContrato('altaCliente', (self.direccion_checksum(nueva_direccion),))
+            return self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada, 0,
+                                                  wait_for_receipt=esperar_recibo)
         except ValueError as e:
             logging.error(f"Error de valor: {e}")
             raise e
@@ -310,7 +569,7 @@ class BlockchainManager:
             logging.error("Error al registrar al cliente: %s", str(e))
             raise Exception(f"Error al registrar al cliente: {e}")
         
-    def depositar_garantia(self, direccion_cliente, clave_privada, valor_ether):
+    def depositar_garantia(self, direccion_cliente, clave_privada, valor_ether, esperar_recibo=True):
         """ Permite a un cliente depositar garantía en el contrato, llamando a la función depositarGarantia del contrato inteligente.    
             Esta función envuelve la lógica necesaria para preparar, firmar y enviar la transacción que invoca la función de depositar garantía en el contrato. Asume que el valor de ether ya ha sido convertido a wei antes de ser pasado a esta función.
             
@@ -318,6 +577,7 @@ class BlockchainManager:
             - direccion_cliente: La dirección Ethereum del cliente que deposita la garantía.
             - clave_privada: La clave privada del cliente para firmar la transacción.
             - valor_ether: El valor de la garantía a depositar, expresado en wei. Aunque el nombre del parámetro sugiere 'ether', se espera que este valor ya esté convertido a wei.
+            - esperar_recibo: Si es False, no espera a que la transacción se mine y retorna su `TransactionHandle` (ver `sign_and_send_transaction`).
             
             Retorna:
             Una representación formateada del recibo de la transacción si esta es exitosa. La representación incluye detalles clave del recibo para facilitar su revisión y seguimiento.
@@ -329,15 +589,14 @@ class BlockchainManager:
             - Exception: Captura y lanza cualquier otra excepción general que pueda ocurrir durante el proceso de la transacción.
         """
         try:
-            direccion_cliente = self.web3.to_checksum_address(direccion_cliente)
+            direccion_cliente = self.direccion_checksum(direccion_cliente)
             if not is_valid_ethereum_address(direccion_cliente):
                 raise ValueError(f"La dirección {direccion_cliente} no es válida.")
             
             valor_wei = valor_ether
-            function_call = self.contract.functions.depositarGarantia()
-            receipt = self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, valor_wei, gas_limit=2000000)
-            
-            return format_transaction_receipt(receipt)
+            function_call = LlamadaContrato('depositarGarantia', ())
+            return self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, valor_wei,
+                                                  wait_for_receipt=esperar_recibo)
         except ValueError as e:
             logging.error(f"Error de valor: {e}")
             raise e
@@ -354,7 +613,7 @@ class BlockchainManager:
             logging.error("Error al depositar garantia: %s", str(e))
             raise Exception(f"Error al depositar garantia: {e}")
         
-    def solicitar_prestamo(self, direccion_cliente, clave_privada, monto, plazo):
+    def solicitar_prestamo(self, direccion_cliente, clave_privada, monto, plazo, esperar_recibo=True):
         """
             Permite a un cliente solicitar un préstamo en el contrato.
 
@@ -363,20 +622,21 @@ class BlockchainManager:
             - clave_privada: La clave privada del cliente para firmar la transacción.
             - monto_wei: El monto del préstamo solicitado, expresado en wei.
             - plazo_segundos: El plazo del préstamo, expresado en segundos.
+            - esperar_recibo: Si es False, retorna el `TransactionHandle` sin esperar a que la transacción se mine.
 
             Retorna:
             Una representación formateada del recibo de la transacción si esta es exitosa.
         """
         monto_wei = monto
         try:
-            function_call = self.contract.functions.solicitarPrestamo(monto_wei, plazo)
-            receipt = self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, 0)
-            return format_transaction_receipt(receipt)
+            function_call = LlamadaContrato('solicitarPrestamo', (monto_wei, plazo))
+            return self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, 0,
+                                                  wait_for_receipt=esperar_recibo)
         except Exception as e:
             logging.error("Error al solicitar prestamo: %s", str(e))
             raise Exception(f"Error al solicitar prestamo: {e}")
         
-    def aprobar_prestamo(self, direccion_prestamista, clave_privada, direccion_prestatario, prestamo_id):
+    def aprobar_prestamo(self, direccion_prestamista, clave_privada, direccion_prestatario, prestamo_id, esperar_recibo=True):
         """
             Aprueba un préstamo específico para un prestatario, identificado por su dirección y el ID del préstamo.
 
@@ -385,6 +645,7 @@ class BlockchainManager:
             - clave_privada: La clave privada del prestamista para firmar la transacción.
             - direccion_prestatario: La dirección Ethereum del prestatario cuyo préstamo se está aprobando.
             - prestamo_id: El identificador del préstamo a aprobar.
+            - esperar_recibo: Si es False, retorna el `TransactionHandle` sin esperar a que la transacción se mine.
 
             Retorna:
             Un recibo de la transacción formateado que proporciona detalles del resultado de la transacción.
@@ -396,14 +657,14 @@ class BlockchainManager:
         if not is_valid_ethereum_address(direccion_prestatario):
             raise ValueError("La dirección del prestatario no es válida.")
         try:
-            function_call = self.contract.functions.aprobarPrestamo(self.web3.to_checksum_address(direccion_prestatario), prestamo_id)
-            receipt = self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada)
-            return format_transaction_receipt(receipt)
+            function_call = LlamadaContrato('aprobarPrestamo', (self.direccion_checksum(direccion_prestatario), prestamo_id))
+            return self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada,
+                                                  wait_for_receipt=esperar_recibo)
         except Exception as e:
             logging.error("Error al aprobar prestamo: %s", str(e))
             raise Exception(f"Error al aprobar prestamo: {e}")
 
-    def reembolsar_prestamo(self, direccion_cliente, clave_privada, prestamo_id, valor_ether):
+    def reembolsar_prestamo(self, direccion_cliente, clave_privada, prestamo_id, valor_ether, esperar_recibo=True):
         """
             Aprueba un préstamo específico para un prestatario, identificado por su dirección y el ID del préstamo.
 
@@ -412,6 +673,7 @@ class BlockchainManager:
             - clave_privada: La clave privada del prestamista para firmar la transacción.
             - direccion_prestatario: La dirección Ethereum del prestatario cuyo préstamo se está aprobando.
             - prestamo_id: El identificador del préstamo a aprobar.
+            - esperar_recibo: Si es False, retorna el `TransactionHandle` sin esperar a que la transacción se mine.
 
             Retorna:
             Un recibo de la transacción formateado que proporciona detalles del resultado de la transacción.
@@ -422,14 +684,14 @@ class BlockchainManager:
         """
         valor_wei = valor_ether
         try:
-            function_call = self.contract.functions.reembolsarPrestamo(prestamo_id)
-            receipt = self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, valor_wei)
-            return format_transaction_receipt(receipt)
+            function_call = LlamadaContrato('reembolsarPrestamo', (prestamo_id,))
+            return self.sign_and_send_transaction(function_call, direccion_cliente, clave_privada, valor_wei,
+                                                  wait_for_receipt=esperar_recibo)
         except Exception as e:
             logging.error("Error al reembolsar prestamo: %s", str(e))
             raise Exception(f"Error al reembolsar prestamo: {e}")
 
-    def liquidar_garantia(self, direccion_prestamista, clave_privada, direccion_prestatario, prestamo_id):
+    def liquidar_garantia(self, direccion_prestamista, clave_privada, direccion_prestatario, prestamo_id, esperar_recibo=True):
         """
             Ejecuta la liquidación de la garantía asociada a un préstamo específico en caso de incumplimiento
             por parte del prestatario.
@@ -439,6 +701,7 @@ class BlockchainManager:
             - clave_privada: La clave privada del prestamista para firmar la transacción.
             - direccion_prestatario: La dirección Ethereum del prestatario cuya garantía se va a liquidar.
             - prestamo_id: El identificador del préstamo asociado a la garantía a liquidar.
+            - esperar_recibo: Si es False, retorna el `TransactionHandle` sin esperar a que la transacción se mine.
 
             Retorna:
             Un recibo de la transacción formateado que proporciona detalles sobre el resultado de la transacción,
@@ -451,13 +714,448 @@ class BlockchainManager:
         if not is_valid_ethereum_address(direccion_prestatario):
             raise ValueError("La dirección del prestatario no es válida.")
         try:
-            function_call = self.contract.functions.liquidarGarantia(self.web3.to_checksum_address(direccion_prestatario), prestamo_id)
-            receipt = self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada)
-            return format_transaction_receipt(receipt)
+            function_call = LlamadaContrato('liquidarGarantia', (self.direccion_checksum(direccion_prestatario), prestamo_id))
+            return self.sign_and_send_transaction(function_call, direccion_prestamista, clave_privada,
+                                                  wait_for_receipt=esperar_recibo)
         except Exception as e:
             logging.error("Error al liquidar garantia: %s", str(e))
             raise Exception(f"Error al liquidar garantia: {e}")
 
+    def enviar_transacciones_lote(self, account_address, private_key, nombre_funcion, lista_args, valores=None,
+                                  gas_limit=None, tamano_lote=TAMANO_LOTE_ENVIO):
+        """
+            Envía muchas llamadas a una misma función del contrato desde una cuenta: construye todas las
+            transacciones por adelantado con nonces consecutivos (`construir_transacciones_lote`), las firma de una
+            vez (con `firmador` en varios procesos si lo hay), las difunde en peticiones JSON-RPC por lotes
+            (`difundir_transacciones`) y espera a la vez todos los recibos con `receipt_tracker`.
+
+            Si el nodo rechaza alguna transacción al difundirla, su nonce quedaría como un hueco que bloquea todas
+            las siguientes, así que se ocupa con una transferencia de 0 ether a la propia cuenta. Si la firma o la
+            difusión lanzan una excepción, los nonces reservados se devuelven (o, si parte del lote pudo llegar al
+            nodo, la cuenta se resincroniza) antes de relanzarla.
+
+            El gas se obtiene de `estrategia_gas`, que consulta `eth_estimateGas` en cada llamada a una función
+            cuyo gas depende del estado y, en las demás, solo la primera vez que ve una forma de argumentos: una
+            llamada que se estima y que se revertiría se marca como fallida sin llegar a enviarse, pero una que
+            usa la estimación guardada se envía y, si se revierte, falla al minarse.
+
+            Parámetros:
+            - account_address (str): Dirección que firma y envía las transacciones.
+            - private_key (str): Clave privada de `account_address`, o None para usar la cuenta de `sesion`.
+            - nombre_funcion (str): Nombre de la función del contrato (por ejemplo, 'altaCliente').
+            - lista_args (list): Tupla de argumentos de cada llamada.
+            - valores (list, opcional): Valor en wei de cada transacción. Por defecto, 0.
+            - gas_limit (int, opcional): Límite de gas de cada transacción. Por defecto, el de `estrategia_gas`.
+            - tamano_lote (int, opcional): Número máximo de transacciones por petición de difusión.
+
+            Retorna:
+            Una lista con un diccionario por llamada, en el mismo orden que `lista_args`, con las claves 'args',
+            'exito' (bool), 'tx_hash', 'recibo' (o None) y 'error' (mensaje o None).
+
+            Excepciones:
+            - ValueError: Se lanza si la dirección o la clave privada no son válidas.
+        """
+        account_address = self.direccion_checksum(account_address.strip())
+        clave = self._clave_firma(account_address, private_key)
+        preparadas = self.construir_transacciones_lote(account_address, nombre_funcion, lista_args, valores,
+                                                       gas_limit)
+        informe = [{'args': preparada['args'], 'exito': False, 'tx_hash': None, 'recibo': None,
+                    'error': preparada['error']} for preparada in preparadas]
+        indices = [indice for indice, preparada in enumerate(preparadas) if preparada['transaccion'] is not None]
+        nonces = [preparadas[indice]['transaccion']['nonce'] for indice in indices]
+        try:
+            with self.metricas.cronometro('etapa_segundos', operacion=nombre_funcion, etapa='firmar_lote'):
+                firmadas = self.firmar_transacciones([preparadas[indice]['transaccion'] for indice in indices],
+                                                     clave)
+        except Exception:
+            for nonce in reversed(nonces):
+                self.nonce_manager.release_nonce(account_address, nonce)
+            raise
+        if self.diario is not None:
+            for indice, firmada in zip(indices, firmadas):
+                firmada['intencion'] = {'operacion': nombre_funcion, 'args': list(preparadas[indice]['args']),
+                                        'transaccion': preparadas[indice]['transaccion']}
+        try:
+            with self.metricas.cronometro('etapa_segundos', operacion=nombre_funcion, etapa='enviar_lote'):
+                difundidas = self.difundir_transacciones(firmadas, tamano_lote)
+        except Exception:
+            # No se sabe qué parte del lote llegó al nodo: se dan los nonces por consumidos y se toma del nodo el
+            # siguiente, de modo que los que no llegaron se vuelvan a usar.
+            for nonce in nonces:
+                self.nonce_manager.confirm_nonce(account_address, nonce)
+            try:
+                self.nonce_manager.resync(account_address)
+            except Exception as e:
+                logging.error(f"No se pudo resincronizar el nonce de {account_address}: {e}")
+            raise
+
+        manejadores = []
+        huecos = []
+        for indice, difundida in zip(indices, difundidas):
+            informe[indice]['tx_hash'] = difundida['tx_hash']
+            if difundida['error']:
+                informe[indice]['error'] = difundida['error']
+                logging.error(f"Transacción {nombre_funcion}{tuple(lista_args[indice])} rechazada: {difundida['error']}")
+                huecos.append(difundida['nonce'])
+                continue
+            manejador = difundida['manejador']
+            manejador.add_done_callback(
+                lambda m: self._registrar_recibo(nombre_funcion, m.receipt, time.monotonic() - m.sent_at))
+            manejadores.append((indice, manejador))
+
+        if huecos:
+            tarifas = self.estrategia_gas.tarifas()
+            for nonce in huecos:
+                self._ocupar_nonce(account_address, clave, nonce, tarifas, self.chain_id)
+
+        for indice, manejador in manejadores:
+            try:
+                informe[indice]['recibo'] = manejador.result()
+                informe[indice]['exito'] = True
+            except Exception as e:
+                informe[indice]['error'] = str(e) or type(e).__name__
+                self.metricas.incrementar('errores_total', operacion=nombre_funcion, tipo=type(e).__name__)
+            self._invalidar_cache(account_address, lista_args[indice])
+        return informe
+
+    def construir_transacciones_lote(self, account_address, nombre_funcion, lista_args, valores=None,
+                                     gas_limit=None):
+        """
+            Construye sin firmar las transacciones de muchas llamadas a una misma función del contrato desde una
+            cuenta, con nonces consecutivos de `nonce_manager`, el gas de `estrategia_gas` (ver
+            `enviar_transacciones_lote`) y las tarifas actuales. Las estimaciones que hay que pedir al nodo se
+            envían en una sola petición por lotes (`EstrategiaGas.estimar_gas_lote`). Una llamada que se estima con
+            el nodo y se revertiría no se construye; una que usa la estimación guardada de su forma de argumentos
+            se construye sin comprobarla.
+
+            Los nonces quedan reservados: las transacciones se deben firmar y difundir (`difundir_transacciones`,
+            aquí o desde otra máquina) o, si se descartan, devolver con `nonce_manager.release_nonce`.
+
+            Parámetros:
+            - account_address (str): Dirección que enviará las transacciones.
+            - nombre_funcion (str): Nombre de la función del contrato (por ejemplo, 'aprobarPrestamo').
+            - lista_args (list): Tupla de argumentos de cada llamada.
+            - valores (list, opcional): Valor en wei de cada transacción. Por defecto, 0.
+            - gas_limit (int, opcional): Límite de gas de cada transacción. Por defecto, el de `estrategia_gas`.
+
+            Retorna:
+            Una lista con un diccionario por llamada, en el mismo orden que `lista_args`, con las claves 'args',
+            'transaccion' (lista para firmar, o None si no se pudo construir) y 'error' (mensaje o None).
+        """
+        account_address = self.direccion_checksum(account_address.strip())
+        valores = valores if valores is not None else [0] * len(lista_args)
+        tarifas = self.estrategia_gas.tarifas()
+        chain_id = self.chain_id
+        transacciones = [{
+            'from': account_address,
+            'to': self.contract_address,
+            'data': self.codificador.codificar_llamada(nombre_funcion, args),
+            'value': valor,
+        } for args, valor in zip(lista_args, valores)]
+        if gas_limit:
+            gases = [gas_limit] * len(transacciones)
+        else:
+            gases = self.estrategia_gas.estimar_gas_lote([(nombre_funcion, args, transaccion)
+                                                          for args, transaccion in zip(lista_args, transacciones)])
+        preparadas = []
+        for args, transaccion, gas in zip(lista_args, transacciones, gases):
+            if isinstance(gas, Exception):
+                logging.error(f"Transacción {nombre_funcion}{tuple(args)} descartada al estimar el gas: {gas}")
+                if isinstance(gas, ContractLogicError):
+                    self.metricas.incrementar('reversiones_total', operacion=nombre_funcion, origen='estimacion')
+                preparadas.append({'args': args, 'transaccion': None, 'error': str(gas)})
+                continue
+            nonce = self.nonce_manager.reserve_nonce(account_address)
+            del transaccion['from']
+            transaccion.update(tarifas, gas=gas, nonce=nonce, chainId=chain_id)
+            preparadas.append({'args': args, 'transaccion': transaccion, 'error': None})
+        return preparadas
+
+    def firmar_transacciones(self, transacciones, private_key):
+        """
+            Firma transacciones construidas con `construir_transacciones_lote`, en varios procesos si el manager
+            tiene `firmador`. La clave puede ser la cadena hexadecimal o la de `sesion.clave_firma(direccion)`.
+
+            Retorna:
+            Las transacciones firmadas en el mismo orden, como diccionarios serializables en JSON con 'remitente',
+            'nonce', 'raw_transaction' y 'tx_hash' (ver FirmadorProcesos.firmar_transacciones).
+        """
+        if self.firmador is not None:
+            return self.firmador.firmar(transacciones, private_key)
+        return firmar_transacciones(transacciones, private_key)
+
+    def difundir_transacciones(self, firmadas, tamano_lote=TAMANO_LOTE_ENVIO):
+        """
+            Difunde transacciones ya firmadas (por `firmar_transacciones`, o en otra máquina y leídas con
+            `FirmadorProcesos.leer_firmadas`) en peticiones JSON-RPC por lotes y sigue sus recibos con
+            `receipt_tracker`. No necesita la clave privada.
+
+            Parámetros:
+            - firmadas (list): Diccionarios con 'remitente', 'nonce', 'raw_transaction' y 'tx_hash'.
+            - tamano_lote (int, opcional): Número máximo de transacciones por petición.
+
+            Retorna:
+            Una lista con un diccionario por transacción, en el mismo orden, con 'tx_hash', 'nonce', 'manejador'
+            (el `TransactionHandle`, o None si el nodo la rechazó) y 'error' (mensaje o None). Una transacción que
+            el nodo ya conocía ('already known') no es un error.
+
+            Con `diario`, todas las transacciones se anotan con una sola escritura antes de difundirlas (con su
+            'intencion', si la tienen) y después se anotan su rechazo o su recibo.
+        """
+        if self.diario is not None:
+            self.diario.registrar_firmadas(firmadas)
+        llamadas = [('eth_sendRawTransaction', [firmada['raw_transaction']]) for firmada in firmadas]
+        difundidas = []
+        for firmada, respuesta in zip(firmadas, ejecutar_lote(self.web3, llamadas, tamano_lote)):
+            remitente = self.direccion_checksum(firmada['remitente'])
+            self.nonce_manager.confirm_nonce(remitente, firmada['nonce'])
+            difundida = {'tx_hash': firmada['tx_hash'], 'nonce': firmada['nonce'], 'manejador': None, 'error': None}
+            error = respuesta.get('error')
+            if error and 'already known' not in error.get('message', ''):
+                difundida['error'] = error.get('message')
+                self.metricas.incrementar('errores_rpc_total', metodo='eth_sendRawTransaction', tipo='respuesta')
+                if self.diario is not None:
+                    self.diario.registrar_rechazada(firmada['tx_hash'], difundida['error'])
+            else:
+                difundida['manejador'] = self.receipt_tracker.track(firmada['tx_hash'], remitente, firmada['nonce'])
+                if self.diario is not None:
+                    difundida['manejador'].add_done_callback(lambda m: self._anotar_recibo(m.tx_hash, m.receipt))
+            difundidas.append(difundida)
+        return difundidas
+
+    def _ocupar_nonce(self, account_address, private_key, nonce, tarifas, chain_id):
+        """Envía una transferencia de 0 ether a la propia cuenta con `nonce` para que no quede un hueco."""
+        transaccion = dict(tarifas, to=account_address, value=0, gas=21000, nonce=nonce, chainId=chain_id)
+        try:
+            firmada = self.web3.eth.account.sign_transaction(transaccion, private_key)
+            self.web3.eth.send_raw_transaction(firmada.rawTransaction)
+        except Exception as e:
+            if not NonceManager.is_nonce_error(e):
+                logging.error(f"No se pudo ocupar el nonce {nonce} de {account_address}: {e}")
+                self.nonce_manager.resync(account_address)
+
+    def reconciliar_diario(self, account_address=None, private_key=None, tiempo_atasco=TIEMPO_ATASCO,
+                           incremento_tarifa=INCREMENTO_TARIFA):
+        """
+            Comprueba contra la cadena las transacciones que `diario` tiene pendientes, por ejemplo al reanudar
+            un proceso que terminó entre la difusión y el recibo, y las lleva a un estado final o las vuelve a
+            poner en marcha. Para cada nonce pendiente (la transacción original y sus reemplazos):
+            1. Si alguna tiene recibo, se anota como minada.
+            2. Si la cuenta ya usó el nonce con otra transacción, se anotan como descartadas.
+            3. Si lleva más de `tiempo_atasco` segundos sin minarse, se reemplaza por la misma transacción con el
+            mismo nonce y las tarifas aumentadas (ver DiarioTransacciones.aumentar_tarifas).
+            4. Si el nodo no la conoce (se perdió del mempool), se vuelve a difundir con los mismos bytes firmados,
+            de modo que no se puede aplicar dos veces.
+            Las consultas se agrupan en peticiones JSON-RPC por lotes.
+
+            Parámetros:
+            - account_address (str, opcional): Solo se revisan las transacciones de esta cuenta. Por defecto, todas.
+            - private_key (str, opcional): Clave de `account_address` para firmar los reemplazos. Con None se usa
+            la cuenta de `sesion`; si no hay clave, las transacciones atascadas solo se vuelven a difundir.
+            - tiempo_atasco (float, opcional): Segundos sin minarse tras los que una transacción se reemplaza.
+            - incremento_tarifa (float, opcional): Aumento mínimo de las tarifas de cada reemplazo.
+
+            Retorna:
+            Un diccionario con los hashes 'minadas', 'descartadas', 'redifundidas', 'reemplazadas' (los de los
+            reemplazos) y 'pendientes', y 'manejadores': un `TransactionHandle` por nonce todavía en vuelo, que
+            se resuelve con el recibo de la transacción de ese nonce que se mine.
+
+            Excepciones:
+            - ValueError: Se lanza si el manager no tiene diario.
+        """
+        if self.diario is None:
+            raise ValueError("El manager no tiene diario de transacciones.")
+        resultado = {'minadas': [], 'descartadas': [], 'redifundidas': [], 'reemplazadas': [], 'pendientes': [],
+                     'manejadores': []}
+        grupos = self.diario.pendientes(account_address)
+        if not grupos:
+            return resultado
+
+        # El número de transacciones se consulta antes que los recibos: un nonce ya usado cuyo recibo no aparece
+        # es de otra transacción.
+        remitentes = sorted({remitente for remitente, _ in grupos})
+        hashes = [registro['tx_hash'] for grupo in grupos.values() for registro in grupo]
+        respuestas = ejecutar_lote(self.web3, [('eth_getTransactionCount', [remitente, 'latest'])
+                                               for remitente in remitentes]
+                                   + [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in hashes])
+        siguientes = {remitente: int(respuesta['result'], 16)
+                      for remitente, respuesta in zip(remitentes, respuestas) if respuesta.get('result')}
+        recibos = {tx_hash: respuesta.get('result') for tx_hash, respuesta in zip(hashes, respuestas[len(remitentes):])}
+
+        en_vuelo = []
+        for (remitente, nonce), grupo in grupos.items():
+            minada = next((registro for registro in grupo if recibos[registro['tx_hash']]), None)
+            if minada is not None:
+                recibo = recibos[minada['tx_hash']]
+                self.diario.registrar_minada(minada['tx_hash'], {'blockNumber': int(recibo['blockNumber'], 16),
+                                                                 'status': int(recibo['status'], 16)})
+                resultado['minadas'].append(minada['tx_hash'])
+            elif remitente in siguientes and nonce < siguientes[remitente]:
+                for registro in grupo:
+                    self.diario.registrar_descartada(registro['tx_hash'], f"El nonce {nonce} lo usó otra transacción.")
+                    resultado['descartadas'].append(registro['tx_hash'])
+            else:
+                en_vuelo.append(grupo)
+        if not en_vuelo:
+            return resultado
+
+        conocidas = ejecutar_lote(self.web3, [('eth_getTransactionByHash', [grupo[-1]['tx_hash']])
+                                              for grupo in en_vuelo])
+        ahora = time.time()
+        redifundir = []
+        for grupo, conocida in zip(en_vuelo, conocidas):
+            ultima = grupo[-1]
+            reemplazo = None
+            if ahora - ultima['instante'] > tiempo_atasco:
+                reemplazo = self._reemplazar(ultima, account_address, private_key, incremento_tarifa)
+            if reemplazo is not None:
+                grupo.append(reemplazo)
+                resultado['reemplazadas'].append(reemplazo['tx_hash'])
+            elif not conocida.get('result'):
+                redifundir.append(ultima)
+        if redifundir:
+            llamadas = [('eth_sendRawTransaction', [registro['raw_transaction']]) for registro in redifundir]
+            for registro, respuesta in zip(redifundir, ejecutar_lote(self.web3, llamadas)):
+                error = (respuesta.get('error') or {}).get('message', '')
+                if error and 'already known' not in error:
+                    # Con el nonce ya usado, el recibo que sigue `_seguir_nonce` dirá si fue esta transacción.
+                    if not NonceManager.is_nonce_error(ValueError(error)):
+                        logging.error(f"No se pudo volver a difundir la transacción {registro['tx_hash']}: {error}")
+                    continue
+                self.diario.registrar_redifundida(registro['tx_hash'])
+                self.metricas.incrementar('reintentos_total', operacion='diario', motivo='redifusion')
+                resultado['redifundidas'].append(registro['tx_hash'])
+
+        for grupo in en_vuelo:
+            resultado['pendientes'].extend(registro['tx_hash'] for registro in grupo)
+            resultado['manejadores'].append(self._seguir_nonce(grupo))
+        return resultado
+
+    def _reemplazar(self, registro, account_address, private_key, incremento_tarifa):
+        """
+            Firma, anota en el diario y difunde la transacción de `registro` con el mismo nonce y más tarifa.
+
+            Retorna:
+            Los datos de la transacción de reemplazo ('tx_hash', 'instante'...), o None si no se pudo reemplazar
+            (sin transacción original en el diario, sin clave o rechazada por el nodo).
+        """
+        remitente = registro['remitente']
+        transaccion = (registro.get('intencion') or {}).get('transaccion')
+        if transaccion is None:
+            logging.error(f"La transacción {registro['tx_hash']} no se puede reemplazar: el diario no la guarda "
+                          f"sin firmar.")
+            return None
+        try:
+            propia = account_address is not None and self.direccion_checksum(account_address) == remitente
+            clave = self._clave_firma(remitente, private_key if propia else None)
+        except Exception as e:
+            logging.error(f"La transacción {registro['tx_hash']} no se puede reemplazar sin la clave: {e}")
+            return None
+        nueva = aumentar_tarifas(transaccion, self.estrategia_gas.tarifas(), incremento_tarifa)
+        firmada = self.web3.eth.account.sign_transaction(nueva, clave)
+        reemplazo = {'remitente': remitente, 'nonce': registro['nonce'], 'tx_hash': self.web3.to_hex(firmada.hash),
+                     'raw_transaction': self.web3.to_hex(firmada.rawTransaction), 'reemplaza': registro['tx_hash'],
+                     'intencion': dict(registro['intencion'], transaccion=nueva)}
+        self.diario.registrar_firmadas([reemplazo])
+        try:
+            self.web3.eth.send_raw_transaction(firmada.rawTransaction)
+        except Exception as e:
+            logging.error(f"Reemplazo de la transacción {registro['tx_hash']} rechazado: {e}")
+            if isinstance(e, ValueError):
+                self.diario.registrar_rechazada(reemplazo['tx_hash'], e)
+            return None
+        self.metricas.incrementar('reintentos_total', operacion='diario', motivo='reemplazo')
+        return self.diario.registro(reemplazo['tx_hash'])
+
+    def _seguir_nonce(self, grupo):
+        """
+            Sigue con `receipt_tracker` todas las transacciones de un mismo nonce y devuelve un `TransactionHandle`
+            que se resuelve con el recibo de la primera que se mine (o falla si no se mina ninguna).
+        """
+        ultima = grupo[-1]
+        combinado = TransactionHandle(ultima['tx_hash'], ultima['remitente'], ultima['nonce'])
+        restantes = [len(grupo)]
+        lock = threading.Lock()
+
+        def al_resolver(manejador):
+            self._anotar_recibo(manejador.tx_hash, manejador.receipt)
+            with lock:
+                restantes[0] -= 1
+                if combinado.done():
+                    return
+                if manejador.receipt is not None or restantes[0] == 0:
+                    combinado.tx_hash, combinado.receipt = manejador.tx_hash, manejador.receipt
+                    if manejador.exception() is not None:
+                        combinado.set_exception(manejador.exception())
+                    else:
+                        combinado.set_result(manejador.result())
+
+        for registro in grupo:
+            self.receipt_tracker.track(registro['tx_hash'], registro['remitente'], registro['nonce']).add_done_callback(
+                al_resolver)
+        return combinado
+
+    def alta_clientes_bulk(self, direccion_prestamista, clave_privada, direcciones):
+        """
+            Registra muchos clientes a la vez (ver `enviar_transacciones_lote`).
+
+            Parámetros:
+            - direccion_prestamista: La dirección Ethereum del prestamista que realiza las altas.
+            - clave_privada: La clave privada del prestamista para firmar las transacciones.
+            - direcciones (list): Direcciones Ethereum de los nuevos clientes.
+
+            Retorna:
+            Una lista con el resultado de cada alta, en el mismo orden que `direcciones`. Las direcciones no
+            válidas se marcan como fallidas sin enviar ninguna transacción.
+        """
+        return self._enviar_validando(direccion_prestamista, clave_privada, 'altaCliente',
+                                      [(direccion,) for direccion in direcciones])
+
+    def aprobar_prestamos_bulk(self, direccion_prestamista, clave_privada, prestamos):
+        """
+            Aprueba muchos préstamos a la vez (ver `enviar_transacciones_lote`).
+
+            Parámetros:
+            - direccion_prestamista: La dirección Ethereum del prestamista que aprueba los préstamos.
+            - clave_privada: La clave privada del prestamista para firmar las transacciones.
+            - prestamos (list): Tuplas (direccion_prestatario, prestamo_id).
+
+            Retorna:
+            Una lista con el resultado de cada aprobación, en el mismo orden que `prestamos`.
+        """
+        return self._enviar_validando(direccion_prestamista, clave_privada, 'aprobarPrestamo', prestamos)
+
+    def liquidar_garantias_bulk(self, direccion_prestamista, clave_privada, prestamos):
+        """
+            Liquida la garantía de muchos préstamos a la vez (ver `enviar_transacciones_lote`).
+
+            Parámetros:
+            - direccion_prestamista: La dirección Ethereum del prestamista que inicia las liquidaciones.
+            - clave_privada: La clave privada del prestamista para firmar las transacciones.
+            - prestamos (list): Tuplas (direccion_prestatario, prestamo_id).
+
+            Retorna:
+            Una lista con el resultado de cada liquidación, en el mismo orden que `prestamos`.
+        """
+        return self._enviar_validando(direccion_prestamista, clave_privada, 'liquidarGarantia', prestamos)
+
+    def _enviar_validando(self, account_address, private_key, nombre_funcion, lista_args):
+        """Valida la dirección que encabeza cada tupla de argumentos y envía por lotes solo las válidas."""
+        informe = [None] * len(lista_args)
+        validos = []
+        for indice, args in enumerate(lista_args):
+            if not is_valid_ethereum_address(args[0]):
+                informe[indice] = {'args': tuple(args), 'exito': False, 'tx_hash': None, 'recibo': None,
+                                   'error': "La dirección no es válida."}
+            else:
+                validos.append((indice, (self.direccion_checksum(args[0]),) + tuple(args[1:])))
+        if validos:
+            resultados = self.enviar_transacciones_lote(account_address, private_key, nombre_funcion,
+                                                        [args for _, args in validos])
+            for (indice, _), resultado in zip(validos, resultados):
+                informe[indice] = resultado
+        return informe
+
     def mapear_estado_prestamo(self, estado):
         """
             Convierte un código numérico de estado de préstamo en una descripción textual legible.
@@ -474,19 +1172,19 @@ class BlockchainManager:
             Una cadena de texto que describe el estado del préstamo. Si el código de estado no
             se reconoce, retorna 'Desconocido'.
         """
-        return ESTADOS_PRESTAMO.get(estado, 'Desconocido')
+        return mapear_estado_prestamo(estado)
     
     def obtener_prestamos_por_prestatario(self, direccion_prestatario):
         """
-            Recupera todos los préstamos asociados con un prestatario específico y los formatea para una fácil lectura.
+            Recupera todos los préstamos asociados con un prestatario específico.
 
             Parámetros:
             - direccion_prestatario: La dirección Ethereum del prestatario cuyos préstamos se quieren consultar.
 
             Retorna:
-            Una lista de diccionarios que representan los detalles de cada préstamo asociado al prestatario.
-            Cada diccionario contiene el id del préstamo, el monto en ether, el plazo del préstamo, la fecha de inicio,
-            y el estado actual del préstamo.
+            Una lista de registros `Prestamo` (ver Registros) con el id del préstamo, el prestatario, el monto en
+            wei, el plazo, los tiempos de solicitud y límite y el estado actual del préstamo. `formatear()` y
+            `str()` los convierten en texto legible (ver `obtener_cartera_prestatario`).
 
             Excepciones:
             - ValueError: Se lanza si la dirección del prestatario no es válida.
@@ -495,19 +1193,63 @@ class BlockchainManager:
         if not is_valid_ethereum_address(direccion_prestatario):
             raise ValueError("La dirección del prestatario no es válida.")
         try:
-            prestamos_raw = self.contract.functions.obtenerPrestamosPorPrestatario(self.web3.toChecksumAddress(direccion_prestatario)).call()
-            prestamos_format = [{
-                "id_prestamo": prestamo[0],
-                "monto": wei_to_ether(prestamo[1]),
-                "plazo": prestamo[2],
-                "fecha_inicio": datetime.utcfromtimestamp(prestamo[3]).strftime('%Y-%m-%d %H:%M:%S'),
-                "estado": self.mapear_estado_prestamo(prestamo[4]),
-            } for prestamo in prestamos_raw]
-            return prestamos_format
+            return self.obtener_cartera_prestatario(direccion_prestatario)
         except Exception as e:
             logging.error(f"Error al obtener préstamos por prestatario: {e}")
             raise Exception(f"Error al obtener préstamos por prestatario: {e}")
         
+    def consultar_por_lotes(self, nombre_funcion, lista_args, tamano_lote=TAMANO_LOTE_PRESTAMOS):
+        """
+            Ejecuta muchas llamadas de consulta a una misma función del contrato con `agregador`: agrupadas en
+            llamadas `aggregate3` al contrato Multicall si está desplegado o, si no, en peticiones JSON-RPC por
+            lotes, en lugar de un viaje al nodo por llamada. Solo se consultan al nodo las que no están en `cache`.
+
+            Parámetros:
+            - nombre_funcion (str): Nombre de la función de consulta del contrato (por ejemplo,
+            'obtenerDetalleDePrestamo').
+            - lista_args (list): Lista con la tupla de argumentos de cada llamada (direcciones en formato checksum).
+            - tamano_lote (int, opcional): Número máximo de llamadas por petición JSON-RPC cuando no hay
+            contrato Multicall.
+
+            Retorna:
+            Una lista con el resultado decodificado de cada llamada, en el mismo orden que `lista_args`.
+
+            Excepciones:
+            - Exception: Se lanza si el nodo devuelve un error para alguna de las llamadas.
+        """
+        return self.cache.obtener_varios(
+            nombre_funcion, lista_args,
+            lambda faltan, bloque: self.agregador.consultar_funcion(nombre_funcion, faltan, tamano_lote=tamano_lote,
+                                                                    bloque=bloque))
+
+    def obtener_cartera_prestatario(self, direccion_prestatario, tamano_lote=TAMANO_LOTE_PRESTAMOS):
+        """
+            Recupera todos los préstamos de un prestatario con el mínimo número de viajes al nodo.
+
+            El contrato solo devuelve la lista de IDs en `obtenerPrestamosPorPrestatario`, así que el detalle de
+            cada préstamo requiere un `obtenerDetalleDePrestamo`. En lugar de una llamada por ID, todas las
+            consultas de detalle se envían en peticiones JSON-RPC por lotes de `tamano_lote` llamadas: un
+            prestatario con 500 préstamos se resuelve en dos peticiones HTTP (IDs y detalles).
+
+            Parámetros:
+            - direccion_prestatario (str): La dirección Ethereum del prestatario.
+            - tamano_lote (int, opcional): Número máximo de préstamos por petición.
+
+            Retorna:
+            Una lista con el registro `Prestamo` de cada préstamo, con importes en wei y tiempos en segundos.
+
+            Excepciones:
+            - ValueError: Se lanza si la dirección del prestatario no es válida.
+            - Exception: Se lanza si falla alguna de las consultas al nodo.
+        """
+        if not is_valid_ethereum_address(direccion_prestatario):
+            raise ValueError("La dirección del prestatario no es válida.")
+        direccion_prestatario = self.direccion_checksum(direccion_prestatario)
+        ids = self.consultar('obtenerPrestamosPorPrestatario', (direccion_prestatario,))
+        prestamos = self.consultar_por_lotes('obtenerDetalleDePrestamo',
+                                             [(direccion_prestatario, prestamo_id) for prestamo_id in ids], tamano_lote)
+        return [Prestamo(*prestamo) for prestamo in prestamos]
+
     def obtener_detalle_de_prestamo(self, direccion_prestatario, prestamo_id):
         """
             Obtiene los detalles completos de un préstamo específico asociado con un prestatario.
@@ -517,8 +1259,8 @@ class BlockchainManager:
             - prestamo_id: El identificador único del préstamo cuyos detalles se desean obtener.
 
             Retorna:
-            Un diccionario que contiene los detalles del préstamo, incluyendo ID, prestatario, monto, plazo,
-            fecha de solicitud, fecha límite y estado. Si el préstamo no se encuentra, puede retornar None o un diccionario vacío.
+            Un registro `Prestamo` con el ID, el prestatario, el monto en wei, el plazo, los tiempos de solicitud y
+            límite y el estado. Si el préstamo no existe, el contrato devuelve la struct vacía (ID 0).
 
             Excepciones:
             - ValueError: Se lanza si la dirección del prestatario no es válida o si el ID del préstamo no es positivo.
@@ -529,21 +1271,10 @@ class BlockchainManager:
 
         try:
             # Obtener los detalles del préstamo desde el contrato
-            prestamo = self.contract.functions.obtenerDetalleDePrestamo(
-                self.web3.toChecksumAddress(direccion_prestatario), prestamo_id).call()
-
-            # Formatear los detalles del préstamo
-            detalle_prestamo = {
-                "id": prestamo[0],
-                "prestatario": prestamo[1],
-                "monto": wei_to_ether(prestamo[2]),  # Convertir de Wei a Ether
-                "plazo": prestamo[3],
-                "fecha_solicitud": datetime.utcfromtimestamp(prestamo[4]).strftime('%Y-%m-%d %H:%M:%S'),
-                "fecha_limite": datetime.utcfromtimestamp(prestamo[5]).strftime('%Y-%m-%d %H:%M:%S'),
-                "estado": self.mapear_estado_prestamo(prestamo[6]) 
-            }
-
-            return detalle_prestamo
+            prestamo = self.consultar('obtenerDetalleDePrestamo',
+                                      (self.direccion_checksum(direccion_prestatario), prestamo_id))
+
+            return Prestamo(*prestamo)
         except Exception as e:
             logging.error("Error al obtener detalle de préstamo: %s", str(e))
             raise Exception(f"Error al obtener detalle de préstamo: {e}")
@@ -0,0 +1,253 @@
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Funciones de consulta cuyo resultado solo cambia cuando el contrato emite `SolicitudPrestamo` o
+# `CambioEstadoPrestamo` para el prestatario (su primer argumento). Las demás (`clientes`, `empleadosPrestamista`...)
+# pueden cambiar sin eventos (alta de clientes, depósitos de garantía) y se descartan en cada bloque nuevo.
+FUNCIONES_CON_EVENTOS = {'obtenerPrestamosPorPrestatario', 'obtenerDetalleDePrestamo'}
+
+def tamano_aproximado(valor):
+    """Estima la memoria ocupada por un resultado decodificado (tuplas, listas, enteros, cadenas y bytes)."""
+    tamano = sys.getsizeof(valor)
+    if isinstance(valor, (tuple, list)):
+        tamano += sum(tamano_aproximado(v) for v in valor)
+    return tamano
+
+class CacheLecturas:
+    """
+        Caché de lectura (read-through) de las consultas al contrato, válida por bloque.
+
+        Cada entrada guarda el resultado de (función, argumentos) junto con el bloque en el que se leyó. La
+        lectura se hace en ese bloque y no en 'latest', para que un nodo que va por detrás (por ejemplo, con
+        RouterRPC) no guarde un valor anterior a los eventos ya aplicados. El número de bloque se consulta al nodo
+        como mucho cada `intervalo_bloque` segundos; cuando avanza, los eventos `SolicitudPrestamo` y
+        `CambioEstadoPrestamo` de los bloques nuevos se leen con un único `eth_getLogs` y se descartan solo las
+        entradas de los prestatarios afectados: el resto de préstamos sigue siendo válido en el bloque nuevo. Las
+        entradas de funciones que pueden cambiar sin eventos se descartan en cada bloque nuevo. Las transacciones
+        propias (`sign_and_send_transaction`) descartan al momento las entradas de las direcciones que
+        intervienen, al enviarse y al minarse.
+
+        La caché es un LRU acotado por número de entradas (`max_entradas`) y por memoria aproximada (`max_bytes`).
+
+        Atributos:
+        - manager (BlockchainManager): Manager con la conexión, la dirección del contrato y el codificador.
+        - intervalo_bloque (float): Segundos durante los que se da por bueno el último número de bloque leído.
+        - bloque (int): Último bloque conocido.
+
+        Métodos:
+        - obtener(self, nombre_funcion, args, cargar): Resultado de una consulta, leyéndolo con `cargar` si falta.
+        - obtener_varios(self, nombre_funcion, lista_args, cargar_lote): Igual para muchas consultas a la vez.
+        - invalidar_direcciones(self, direcciones): Descarta las entradas en las que interviene alguna dirección.
+        - aplicar_eventos(self, eventos): Descarta las entradas de los prestatarios de unos eventos ya leídos.
+        - vaciar(self): Descarta todas las entradas.
+        - metricas(self): Aciertos, fallos, tasa de aciertos, tiempo ahorrado y ocupación.
+    """
+    def __init__(self, manager, max_entradas=4096, max_bytes=16 * 1024 * 1024, intervalo_bloque=1.0):
+        self.manager = manager
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.intervalo_bloque = intervalo_bloque
+        self.bloque = None
+        self._bloque_hasta = 0.0
+        self._entradas = OrderedDict()
+        self._por_direccion = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._aciertos = 0
+        self._fallos = 0
+        self._invalidaciones = 0
+        self._expulsiones = 0
+        self._segundos_ahorrados = 0.0
+
+    # ------------------------------------------------------------------ bloques y eventos
+
+    def _bloque_actual(self):
+        """
+            Devuelve el último bloque, consultándolo al nodo si ha pasado `intervalo_bloque` desde la última vez.
+            Varios hilos pueden consultar a la vez: con el bloqueo adquirido se avanza desde el bloque conocido en
+            ese momento, y un número menor (una respuesta que llega tarde o un nodo por detrás) no lo hace
+            retroceder.
+        """
+        with self._lock:
+            if self.bloque is not None and time.monotonic() < self._bloque_hasta:
+                return self.bloque
+        nuevo = self.manager.web3.eth.block_number
+        with self._lock:
+            self._bloque_hasta = time.monotonic() + self.intervalo_bloque
+            if self.bloque is None:
+                self.bloque = nuevo
+            elif nuevo > self.bloque:
+                self._avanzar(self.bloque, nuevo)
+                self.bloque = nuevo
+            return self.bloque
+
+    def _avanzar(self, anterior, nuevo):
+        """Actualiza las entradas al pasar del bloque `anterior` a uno posterior, `nuevo`."""
+        try:
+            prestatarios = self._prestatarios_con_eventos(anterior + 1, nuevo)
+        except Exception as e:
+            logging.error(f"No se pudieron leer los eventos de los bloques {anterior + 1}-{nuevo}: {e}")
+            self.vaciar()
+            return
+        for clave in [c for c in self._entradas if c[0] not in FUNCIONES_CON_EVENTOS]:
+            self._quitar(clave)
+        self.invalidar_direcciones(prestatarios)
+
+    def _prestatarios_con_eventos(self, desde, hasta):
+        """Lee los eventos de préstamos de un rango de bloques y devuelve los prestatarios afectados."""
+        codificador = self.manager.codificador
+        logs = self.manager.web3.eth.get_logs({
+            'address': self.manager.contract_address,
+            'fromBlock': desde,
+            'toBlock': hasta,
+            'topics': [[codificador.topic('SolicitudPrestamo'), codificador.topic('CambioEstadoPrestamo')]],
+        })
+        # En ambos eventos el prestatario es el primer parámetro indexado (topic 1).
+        return {self.manager.direccion_checksum('0x' + bytes(log['topics'][1])[-20:].hex()) for log in logs}
+
+    def aplicar_eventos(self, eventos):
+        """
+            Descarta las entradas de los prestatarios de unos eventos ya decodificados (por ejemplo, por
+            IndexadorPrestamos), con la forma {'evento', 'args'} de `IndexadorPrestamos.obtener_eventos`.
+        """
+        self.invalidar_direcciones({evento['args']['prestatario'] for evento in eventos})
+
+    # ------------------------------------------------------------------ entradas
+
+    @staticmethod
+    def _direcciones(args):
+        return [arg for arg in args if isinstance(arg, str) and arg.startswith('0x') and len(arg) == 42]
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        self._bytes -= entrada[3]
+        for direccion in self._direcciones(clave[1]):
+            claves = self._por_direccion.get(direccion)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_direccion[direccion]
+
+    def _guardar(self, clave, valor, bloque, segundos):
+        tamano = tamano_aproximado(valor)
+        if tamano > self.max_bytes:
+            return
+        self._quitar(clave)
+        self._entradas[clave] = (valor, bloque, segundos, tamano)
+        self._bytes += tamano
+        for direccion in self._direcciones(clave[1]):
+            self._por_direccion.setdefault(direccion, set()).add(clave)
+        while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+            self._quitar(next(iter(self._entradas)))
+            self._expulsiones += 1
+
+    def _buscar(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self._fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self._aciertos += 1
+        self._segundos_ahorrados += entrada[2]
+        return entrada
+
+    def obtener(self, nombre_funcion, args, cargar):
+        """
+            Devuelve el resultado de una consulta al contrato, desde la caché si es válido en el bloque actual.
+
+            Parámetros:
+            - nombre_funcion (str): Nombre de la función de consulta.
+            - args (tuple): Argumentos de la llamada (direcciones en formato checksum).
+            - cargar (callable): Función `cargar(bloque)` que consulta el nodo en el bloque indicado si el resultado
+            no está en caché.
+
+            Retorna:
+            El resultado decodificado de la consulta.
+        """
+        clave = (nombre_funcion, tuple(args))
+        bloque = self._bloque_actual()
+        with self._lock:
+            entrada = self._buscar(clave)
+            if entrada is not None:
+                return entrada[0]
+        inicio = time.perf_counter()
+        valor = cargar(bloque)
+        with self._lock:
+            # Si mientras tanto llegó un bloque nuevo, el valor leído puede ser ya antiguo: no se guarda.
+            if self.bloque == bloque:
+                self._guardar(clave, valor, bloque, time.perf_counter() - inicio)
+        return valor
+
+    def obtener_varios(self, nombre_funcion, lista_args, cargar_lote):
+        """
+            Igual que `obtener` para muchas consultas a la misma función: las que faltan en la caché se leen con
+            una sola llamada a `cargar_lote(lista_args_que_faltan, bloque)`, que debe devolver sus resultados en
+            orden.
+        """
+        claves = [(nombre_funcion, tuple(args)) for args in lista_args]
+        bloque = self._bloque_actual()
+        resultados = [None] * len(claves)
+        faltan = []
+        with self._lock:
+            for posicion, clave in enumerate(claves):
+                entrada = self._buscar(clave)
+                if entrada is None:
+                    faltan.append(posicion)
+                else:
+                    resultados[posicion] = entrada[0]
+        if not faltan:
+            return resultados
+        inicio = time.perf_counter()
+        valores = cargar_lote([lista_args[posicion] for posicion in faltan], bloque)
+        segundos = (time.perf_counter() - inicio) / len(faltan)
+        with self._lock:
+            guardar = self.bloque == bloque
+            for posicion, valor in zip(faltan, valores):
+                resultados[posicion] = valor
+                if guardar:
+                    self._guardar(claves[posicion], valor, bloque, segundos)
+        return resultados
+
+    def invalidar_direcciones(self, direcciones):
+        """Descarta todas las entradas cuyos argumentos incluyen alguna de las direcciones (en formato checksum)."""
+        with self._lock:
+            for direccion in direcciones:
+                for clave in list(self._por_direccion.get(direccion, ())):
+                    self._quitar(clave)
+                    self._invalidaciones += 1
+
+    def vaciar(self):
+        """Descarta todas las entradas y el último bloque conocido (las métricas se conservan)."""
+        with self._lock:
+            self.bloque = None
+            self._invalidaciones += len(self._entradas)
+            self._entradas.clear()
+            self._por_direccion.clear()
+            self._bytes = 0
+
+    # ------------------------------------------------------------------ métricas
+
+    def metricas(self):
+        """
+            Retorna:
+            Un diccionario con 'aciertos', 'fallos', 'tasa_aciertos' (0 a 1), 'segundos_ahorrados' (suma del tiempo
+            que costó leer del nodo cada resultado servido desde la caché), 'invalidaciones', 'expulsiones',
+            'entradas' y 'bytes'.
+        """
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                'aciertos': self._aciertos,
+                'fallos': self._fallos,
+                'tasa_aciertos': self._aciertos / consultas if consultas else 0.0,
+                'segundos_ahorrados': self._segundos_ahorrados,
+                'invalidaciones': self._invalidaciones,
+                'expulsiones': self._expulsiones,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+            }
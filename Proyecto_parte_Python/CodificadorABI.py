@@ -0,0 +1,173 @@
+from collections import namedtuple
+
+from eth_abi import decode, encode
+from eth_abi.registry import registry
+from eth_utils import keccak, to_checksum_address
+from eth_utils.abi import collapse_if_tuple
+
+# Llamada a una función del contrato (nombre y argumentos), con los mismos atributos `fn_name` y `args` que un
+# ContractFunction de Web3 pero sin su coste de construcción (búsqueda en la ABI y validación de argumentos).
+LlamadaContrato = namedtuple('LlamadaContrato', ['fn_name', 'args'])
+
+def _tipos(parametros):
+    """Devuelve los tipos canónicos de una lista de parámetros de la ABI (las structs como tuplas)."""
+    return [collapse_if_tuple(parametro) for parametro in parametros]
+
+def _firma(entrada):
+    return f"{entrada['name']}({','.join(_tipos(entrada.get('inputs', [])))})"
+
+def _a_bytes(datos):
+    """Convierte datos en hexadecimal (con o sin prefijo 0x) a bytes."""
+    if isinstance(datos, str):
+        return bytes.fromhex(datos[2:] if datos.startswith('0x') else datos)
+    return bytes(datos)
+
+def _normalizar(valor):
+    """Convierte los valores decodificados por eth_abi (bytes, tuplas) a tipos sencillos de Python."""
+    if isinstance(valor, tuple):
+        return tuple(_normalizar(v) for v in valor)
+    if isinstance(valor, list):
+        return [_normalizar(v) for v in valor]
+    if isinstance(valor, str) and valor.startswith('0x') and len(valor) == 42:
+        return to_checksum_address(valor)
+    return valor
+
+class CodificadorABI:
+    """
+        Codifica y decodifica llamadas, resultados y eventos de un contrato a partir de su ABI, sin pasar por
+        los objetos `ContractFunction` de Web3.
+
+        Los selectores de función, los codificadores de argumentos de eth_abi, los topics de los eventos y las
+        listas de tipos se calculan una sola vez al crear el codificador. Se usa allí donde las llamadas se construyen en crudo (peticiones JSON-RPC por
+        lotes, lectura de logs, el nodo simulado de pruebas).
+
+        Atributos:
+        - funciones (dict): Descripción de cada función por nombre (selector, tipos de entrada y de salida).
+        - eventos (dict): Descripción de cada evento por nombre (topic, parámetros indexados y no indexados).
+
+        Métodos:
+        - codificar_llamada(self, nombre, args): Devuelve los datos (hex) de una llamada a la función.
+        - decodificar_llamada(self, datos): Devuelve el nombre y los argumentos de una llamada codificada.
+        - codificar_resultado(self, nombre, valores): Codifica los valores de retorno de una función.
+        - decodificar_resultado(self, nombre, datos): Decodifica los valores de retorno de una función.
+        - decodificar_evento(self, log): Decodifica un log emitido por el contrato.
+    """
+    def __init__(self, abi):
+        self.abi = abi
+        self.funciones = {}
+        self.eventos = {}
+        self._por_selector = {}
+        self._por_topic = {}
+        for entrada in abi:
+            if entrada.get('type') == 'function':
+                funcion = {
+                    'nombre': entrada['name'],
+                    'firma': _firma(entrada),
+                    'tipos_entrada': _tipos(entrada.get('inputs', [])),
+                    'tipos_salida': _tipos(entrada.get('outputs', [])),
+                }
+                funcion['selector'] = keccak(text=funcion['firma'])[:4]
+                funcion['codificador_entrada'] = registry.get_tuple_encoder(*funcion['tipos_entrada'])
+                self.funciones[entrada['name']] = funcion
+                self._por_selector[funcion['selector']] = funcion
+            elif entrada.get('type') == 'event':
+                parametros = entrada.get('inputs', [])
+                evento = {
+                    'nombre': entrada['name'],
+                    'firma': _firma(entrada),
+                    'indexados': [(p['name'], collapse_if_tuple(p)) for p in parametros if p.get('indexed')],
+                    'no_indexados': [(p['name'], collapse_if_tuple(p)) for p in parametros if not p.get('indexed')],
+                }
+                evento['topic'] = '0x' + keccak(text=evento['firma']).hex()
+                self.eventos[entrada['name']] = evento
+                self._por_topic[evento['topic']] = evento
+
+    def selector(self, nombre):
+        """Devuelve el selector de 4 bytes de la función indicada."""
+        return self.funciones[nombre]['selector']
+
+    def topic(self, nombre):
+        """Devuelve el topic (hash de la firma, en hexadecimal) del evento indicado."""
+        return self.eventos[nombre]['topic']
+
+    def codificar_llamada(self, nombre, args=()):
+        """
+            Codifica la llamada a una función del contrato.
+
+            Parámetros:
+            - nombre (str): Nombre de la función en la ABI.
+            - args (tuple): Argumentos en el orden de la ABI (direcciones en formato checksum).
+
+            Retorna:
+            Los datos de la llamada en hexadecimal ('0x' + selector + argumentos).
+        """
+        funcion = self.funciones[nombre]
+        return '0x' + (funcion['selector'] + funcion['codificador_entrada'](list(args))).hex()
+
+    def decodificar_llamada(self, datos):
+        """
+            Decodifica los datos de una llamada.
+
+            Retorna:
+            Una tupla (nombre, args). Lanza KeyError si el selector no pertenece a la ABI.
+        """
+        datos = _a_bytes(datos)
+        funcion = self._por_selector[bytes(datos[:4])]
+        return funcion['nombre'], _normalizar(decode(funcion['tipos_entrada'], datos[4:]))
+
+    def codificar_resultado(self, nombre, valores):
+        """Codifica los valores de retorno de una función y los devuelve en hexadecimal."""
+        return '0x' + encode(self.funciones[nombre]['tipos_salida'], list(valores)).hex()
+
+    def decodificar_resultado(self, nombre, datos):
+        """
+            Decodifica el resultado de un `eth_call` a la función indicada.
+
+            Retorna:
+            El único valor de retorno si la función tiene una sola salida (por ejemplo, la tupla de una struct),
+            o una tupla con todos ellos en otro caso.
+        """
+        tipos = self.funciones[nombre]['tipos_salida']
+        valores = _normalizar(decode(tipos, _a_bytes(datos)))
+        return valores[0] if len(tipos) == 1 else valores
+
+    def codificar_evento(self, nombre, valores):
+        """
+            Codifica un evento como topics y datos de log.
+
+            Parámetros:
+            - nombre (str): Nombre del evento.
+            - valores (dict): Valores de los parámetros del evento por nombre.
+
+            Retorna:
+            Una tupla (topics, datos) en hexadecimal.
+        """
+        evento = self.eventos[nombre]
+        topics = [evento['topic']] + [
+            '0x' + encode([tipo], [valores[n]]).hex() for n, tipo in evento['indexados']
+        ]
+        datos = encode([t for _, t in evento['no_indexados']], [valores[n] for n, _ in evento['no_indexados']])
+        return topics, '0x' + datos.hex()
+
+    def decodificar_evento(self, log):
+        """
+            Decodifica un log del contrato.
+
+            Parámetros:
+            - log (dict): Log tal y como lo devuelve `eth_getLogs` (topics y data en hexadecimal).
+
+            Retorna:
+            Una tupla (nombre, argumentos) con los argumentos en un diccionario, o None si el log no corresponde
+            a ningún evento de la ABI.
+        """
+        topics = [t if isinstance(t, str) else '0x' + bytes(t).hex() for t in log['topics']]
+        evento = self._por_topic.get(topics[0].lower()) if topics else None
+        if evento is None:
+            return None
+        argumentos = {}
+        for (nombre, tipo), topic in zip(evento['indexados'], topics[1:]):
+            argumentos[nombre] = _normalizar(decode([tipo], _a_bytes(topic))[0])
+        valores = decode([t for _, t in evento['no_indexados']], _a_bytes(log['data']))
+        for (nombre, _), valor in zip(evento['no_indexados'], valores):
+            argumentos[nombre] = _normalizar(valor)
+        return evento['nombre'], argumentos
@@ -1,5 +1,14 @@
 from web3 import Web3
+import json
 import logging
+from datetime import datetime
+
+ESTADOS_PRESTAMO = {
+    0: 'Pendiente',
+    1: 'Aprobado',
+    2: 'Reembolsado',
+    3: 'Liquidado',
+}
 
 def ether_to_wei(amount_in_ether):
     """Convierte un valor de Ether a Wei."""
@@ -34,4 +43,29 @@ def log_transaction_receipt(receipt):
     else:
         logging.error(f"Transacción fallida: Hash {receipt.transactionHash.hex()}, Gas Usado {receipt.gasUsed}")
 
+def cargar_abi(abi_path):
+    """Lee la ABI del contrato desde un archivo JSON."""
+    with open(abi_path, 'r') as abi_file:
+        return json.load(abi_file)
+
+def mapear_estado_prestamo(estado):
+    """Convierte el código numérico de estado de un préstamo en su descripción ('Desconocido' si no existe)."""
+    return ESTADOS_PRESTAMO.get(estado, 'Desconocido')
+
+def formatear_fecha(timestamp):
+    """Formatea una marca de tiempo de la blockchain (segundos, UTC) como texto legible."""
+    return datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+def formatear_detalle_prestamo(prestamo):
+    """Formatea la struct Prestamo devuelta por obtenerDetalleDePrestamo como un diccionario legible."""
+    return {
+        "id": prestamo[0],
+        "prestatario": prestamo[1],
+        "monto": wei_to_ether(prestamo[2]),  # Convertir de Wei a Ether
+        "plazo": prestamo[3],
+        "fecha_solicitud": formatear_fecha(prestamo[4]),
+        "fecha_limite": formatear_fecha(prestamo[5]),
+        "estado": mapear_estado_prestamo(prestamo[6]),
+    }
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
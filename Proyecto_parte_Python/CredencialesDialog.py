@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import QDialog, QFormLayout, QLineEdit, QLabel, QPushButton
+from PyQt5.QtWidgets import QDialog, QFormLayout, QLineEdit, QLabel, QPushButton, QHBoxLayout, QFileDialog
 
 class CredencialesDialog(QDialog):
     def __init__(self, parent=None):
@@ -15,15 +15,39 @@ class CredencialesDialog(QDialog):
         self.clavePrivada.setEchoMode(QLineEdit.Password)
         layout.addRow(QLabel("Clave Privada:"), self.clavePrivada)
 
+        # Alternativa a la clave privada: un archivo keystore cifrado, que se desbloquea una vez por sesión
+        layout.addRow(QLabel("O bien un archivo keystore y su contraseña:"))
+        self.rutaKeystore = QLineEdit(self)
+        botonExaminar = QPushButton('Examinar...', self)
+        botonExaminar.clicked.connect(self.elegirKeystore)
+        layoutKeystore = QHBoxLayout()
+        layoutKeystore.addWidget(self.rutaKeystore)
+        layoutKeystore.addWidget(botonExaminar)
+        layout.addRow(QLabel("Keystore:"), layoutKeystore)
+
+        self.contrasenaKeystore = QLineEdit(self)
+        self.contrasenaKeystore.setEchoMode(QLineEdit.Password)
+        layout.addRow(QLabel("Contraseña:"), self.contrasenaKeystore)
+
         botonAceptar = QPushButton('Aceptar', self)
         botonAceptar.clicked.connect(self.accept)
         layout.addRow(botonAceptar)
 
         self.setLayout(layout)
 
+    def elegirKeystore(self):
+        ruta, _ = QFileDialog.getOpenFileName(self, "Archivo keystore", "", "Keystore (*.json);;Todos (*)")
+        if ruta:
+            self.rutaKeystore.setText(ruta)
+
     def getDireccionEthereum(self):
         return self.direccionEthereum.text()
 
     def getClavePrivada(self):
         return self.clavePrivada.text()
-    
\ No newline at end of file
+
+    def getRutaKeystore(self):
+        return self.rutaKeystore.text().strip()
+
+    def getContrasenaKeystore(self):
+        return self.contrasenaKeystore.text()
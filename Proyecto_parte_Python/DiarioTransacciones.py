@@ -0,0 +1,215 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from eth_utils import to_checksum_address, to_hex
+
+# Estados de una transacción del diario. Solo las pendientes se revisan al reconciliar.
+PENDIENTE = 'pendiente'
+MINADA = 'minada'
+RECHAZADA = 'rechazada'
+REEMPLAZADA = 'reemplazada'
+DESCARTADA = 'descartada'
+# Segundos sin minarse tras los que una transacción se considera atascada y se reemplaza con más tarifa.
+TIEMPO_ATASCO = 120
+# Incremento mínimo de las tarifas de un reemplazo (geth y la mayoría de nodos exigen al menos un 10 %).
+INCREMENTO_TARIFA = 0.125
+
+def _serializable(valor):
+    if isinstance(valor, (bytes, bytearray)):
+        return to_hex(valor)
+    raise TypeError(f"Valor no serializable en el diario: {valor!r}")
+
+def aumentar_tarifas(transaccion, tarifas, incremento=INCREMENTO_TARIFA):
+    """
+        Devuelve una copia de `transaccion` con las tarifas necesarias para reemplazarla en el nodo: las
+        originales aumentadas en `incremento` o las actuales de la red (`tarifas`, ver EstrategiaGas.tarifas) si
+        son mayores. Conserva el tipo de tarifa de la transacción original (`gasPrice` o EIP-1559).
+    """
+    nueva = dict(transaccion)
+    if 'gasPrice' in transaccion:
+        actual = tarifas.get('gasPrice', tarifas.get('maxFeePerGas', 0))
+        nueva['gasPrice'] = max(math.ceil(transaccion['gasPrice'] * (1 + incremento)), actual)
+        return nueva
+    propina = max(math.ceil(transaccion['maxPriorityFeePerGas'] * (1 + incremento)),
+                  tarifas.get('maxPriorityFeePerGas', 0))
+    nueva['maxPriorityFeePerGas'] = propina
+    nueva['maxFeePerGas'] = max(math.ceil(transaccion['maxFeePerGas'] * (1 + incremento)),
+                                tarifas.get('maxFeePerGas', tarifas.get('gasPrice', 0)), propina)
+    return nueva
+
+class DiarioTransacciones:
+    """
+        Diario de escritura anticipada (write-ahead log) de las transacciones firmadas, en un archivo JSONL al
+        que solo se añaden líneas.
+
+        Cada transacción se anota con su remitente, nonce, hash, bytes firmados e intención (función del
+        contrato, argumentos y la transacción sin firmar) y se sincroniza con el disco (`fsync`) antes de
+        difundirla; un envío masivo se anota con una sola escritura. Después se añaden, sin sincronizar, los
+        cambios de estado (minada, rechazada por el nodo, descartada), que se pueden reconstruir consultando la
+        cadena. Si el proceso termina entre la difusión y el recibo, al volver a abrir el diario esas
+        transacciones siguen pendientes y `BlockchainManager.reconciliar_diario` las comprueba: las minadas se
+        marcan, las que el nodo perdió se vuelven a difundir con los mismos bytes (mismo hash, así que no se
+        pueden aplicar dos veces) y las atascadas se reemplazan con el mismo nonce y más tarifa.
+
+        Atributos:
+        - ruta (str): Archivo JSONL del diario.
+        - sincronizar (bool): Si es True (por defecto), cada anotación de transacciones firmadas espera a que
+        el sistema operativo las escriba en el disco.
+
+        Métodos:
+        - registrar_firmadas(self, firmadas): Anota transacciones firmadas antes de difundirlas.
+        - registrar_minada(self, tx_hash, recibo): Anota el recibo de una transacción.
+        - registrar_rechazada(self, tx_hash, error): Anota que el nodo rechazó una transacción.
+        - registrar_descartada(self, tx_hash, motivo): Anota que el nonce lo usó otra transacción.
+        - registrar_redifundida(self, tx_hash): Anota que una transacción perdida se volvió a difundir.
+        - pendientes(self, remitente): Transacciones sin resultado, agrupadas por remitente y nonce.
+        - registro(self, tx_hash): Estado y datos de una transacción.
+        - compactar(self): Reescribe el diario solo con las transacciones pendientes.
+        - cerrar(self): Cierra el archivo.
+    """
+    def __init__(self, ruta, sincronizar=True):
+        self.ruta = ruta
+        self.sincronizar = sincronizar
+        self._lock = threading.Lock()
+        self._registros = {}
+        self._por_nonce = {}
+        self._leer()
+        self._archivo = open(ruta, 'a', encoding='utf-8')
+
+    def _leer(self):
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta, encoding='utf-8') as archivo:
+            for numero, linea in enumerate(archivo, 1):
+                if not linea.strip():
+                    continue
+                try:
+                    self._aplicar(json.loads(linea))
+                except (ValueError, KeyError) as e:
+                    # Una línea a medias es la última escritura de un proceso interrumpido.
+                    logging.error(f"Línea {numero} del diario {self.ruta} ignorada: {e}")
+
+    def _aplicar(self, anotacion):
+        tipo = anotacion['tipo']
+        if tipo == 'firmada':
+            registro = dict(anotacion, remitente=to_checksum_address(anotacion['remitente']), estado=PENDIENTE)
+            del registro['tipo']
+            self._registros[registro['tx_hash']] = registro
+            self._por_nonce.setdefault((registro['remitente'], registro['nonce']), []).append(registro)
+            return
+        registro = self._registros.get(anotacion['tx_hash'])
+        if registro is None:
+            return
+        if tipo == 'minada':
+            registro.update(estado=MINADA, bloque=anotacion.get('bloque'), status=anotacion.get('status'))
+            # Las demás transacciones con el mismo nonce ya no se pueden minar.
+            for otro in self._por_nonce[(registro['remitente'], registro['nonce'])]:
+                if otro is not registro and otro['estado'] == PENDIENTE:
+                    otro['estado'] = REEMPLAZADA
+        elif tipo == 'redifundida':
+            registro['redifusiones'] = registro.get('redifusiones', 0) + 1
+        elif registro['estado'] == PENDIENTE:
+            registro.update(estado=RECHAZADA if tipo == 'rechazada' else DESCARTADA, error=anotacion.get('error'))
+
+    def _anotar(self, anotaciones, sincronizar=False):
+        lineas = ''.join(json.dumps(anotacion, default=_serializable) + '\n' for anotacion in anotaciones)
+        with self._lock:
+            for anotacion in anotaciones:
+                self._aplicar(anotacion)
+            self._archivo.write(lineas)
+            self._archivo.flush()
+            if sincronizar and self.sincronizar:
+                os.fsync(self._archivo.fileno())
+
+    def registrar_firmadas(self, firmadas):
+        """
+            Anota transacciones firmadas antes de difundirlas, con una sola escritura sincronizada con el disco.
+
+            Parámetros:
+            - firmadas (list): Diccionarios con 'remitente', 'nonce', 'raw_transaction' y 'tx_hash' (ver
+            FirmadorProcesos.firmar_transacciones) y, opcionalmente, 'intencion' ('operacion', 'args' y
+            'transaccion', la transacción sin firmar que permite reemplazarla con más tarifa) y 'reemplaza'
+            (hash de la transacción que sustituye).
+        """
+        instante = time.time()
+        self._anotar([dict(tipo='firmada', remitente=firmada['remitente'], nonce=firmada['nonce'],
+                           tx_hash=firmada['tx_hash'], raw_transaction=firmada['raw_transaction'],
+                           intencion=firmada.get('intencion'), reemplaza=firmada.get('reemplaza'), instante=instante)
+                      for firmada in firmadas], sincronizar=True)
+
+    def registrar_minada(self, tx_hash, recibo):
+        self._anotar([{'tipo': 'minada', 'tx_hash': tx_hash, 'bloque': recibo['blockNumber'],
+                       'status': recibo['status']}])
+
+    def registrar_rechazada(self, tx_hash, error):
+        self._anotar([{'tipo': 'rechazada', 'tx_hash': tx_hash, 'error': str(error)}])
+
+    def registrar_descartada(self, tx_hash, motivo):
+        self._anotar([{'tipo': 'descartada', 'tx_hash': tx_hash, 'error': motivo}])
+
+    def registrar_redifundida(self, tx_hash):
+        self._anotar([{'tipo': 'redifundida', 'tx_hash': tx_hash}])
+
+    def registro(self, tx_hash):
+        """Retorna una copia del registro de la transacción (con su 'estado'), o None si no está en el diario."""
+        with self._lock:
+            registro = self._registros.get(tx_hash)
+            return dict(registro) if registro is not None else None
+
+    def pendientes(self, remitente=None):
+        """
+            Retorna:
+            Un diccionario (remitente, nonce) -> lista de registros pendientes con ese nonce (la transacción
+            original y sus reemplazos, del más antiguo al más reciente), opcionalmente solo de `remitente`.
+        """
+        remitente = to_checksum_address(remitente) if remitente else None
+        grupos = {}
+        with self._lock:
+            for registro in self._registros.values():
+                if registro['estado'] == PENDIENTE and remitente in (None, registro['remitente']):
+                    grupos.setdefault((registro['remitente'], registro['nonce']), []).append(dict(registro))
+        for grupo in grupos.values():
+            grupo.sort(key=lambda registro: registro['instante'])
+        return grupos
+
+    def compactar(self):
+        """
+            Reescribe el diario (en un archivo temporal que después lo sustituye) solo con las transacciones
+            pendientes, para que no crezca sin límite.
+
+            Retorna:
+            El número de transacciones descartadas del diario.
+        """
+        with self._lock:
+            conservados = {tx_hash: registro for tx_hash, registro in self._registros.items()
+                           if registro['estado'] == PENDIENTE}
+            temporal = self.ruta + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                for registro in conservados.values():
+                    anotacion = {clave: valor for clave, valor in registro.items() if clave != 'estado'}
+                    archivo.write(json.dumps(dict(anotacion, tipo='firmada'), default=_serializable) + '\n')
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            self._archivo.close()
+            os.replace(temporal, self.ruta)
+            self._archivo = open(self.ruta, 'a', encoding='utf-8')
+            eliminados = len(self._registros) - len(conservados)
+            self._registros = conservados
+            self._por_nonce = {}
+            for registro in conservados.values():
+                self._por_nonce.setdefault((registro['remitente'], registro['nonce']), []).append(registro)
+        return eliminados
+
+    def cerrar(self):
+        with self._lock:
+            self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
@@ -0,0 +1,262 @@
+import heapq
+import logging
+import threading
+
+from IndexadorPrestamos import IndexadorPrestamos, ESTADO_APROBADO
+
+# Segundos hasta el primer reintento de una liquidación fallida; la espera se duplica en cada fallo hasta el máximo.
+REINTENTO_INICIAL = 15
+REINTENTO_MAXIMO = 900
+# Motivos de error tras los que un préstamo no se puede liquidar nunca: se retira del montículo.
+ERRORES_DEFINITIVOS = ('no esta aprobado', 'id de prestamo no valido', 'la dirección no es válida')
+
+class EscanerLiquidaciones:
+    """
+        Servicio que detecta los préstamos aprobados con el plazo vencido y envía su `liquidarGarantia`.
+
+        Los préstamos aprobados se guardan en un montículo ordenado por `tiempoLimite`, de modo que el siguiente
+        vencimiento está siempre en la cima: comprobar si hay préstamos liquidables es O(1) y extraer cada uno
+        O(log n), sin recorrer todos los préstamos en cada iteración. Cuando un préstamo deja de estar aprobado
+        (reembolso o liquidación) no se busca en el montículo: se marca como descartado y su entrada se ignora al
+        llegar a la cima (borrado perezoso).
+
+        El montículo se alimenta de los eventos `CambioEstadoPrestamo` a través de un IndexadorPrestamos o de una
+        lectura masiva del almacenamiento del contrato (`cargar_desde_contrato`). El hilo del servicio duerme hasta
+        que vence el siguiente plazo (o hasta la siguiente sincronización de eventos) y entrega los préstamos
+        vencidos a un envío por lotes que firma todas las transacciones sin esperar a que se minen. Una
+        liquidación fallida vuelve al montículo para reintentarse tras una espera que se duplica en cada fallo
+        (de REINTENTO_INICIAL a REINTENTO_MAXIMO segundos), salvo que el contrato indique que el préstamo ya no
+        se puede liquidar (ERRORES_DEFINITIVOS).
+
+        Atributos:
+        - manager (BlockchainManager): Gestor usado para leer la cadena y enviar las liquidaciones.
+        - direccion_prestamista (str): Cuenta de empleado prestamista que firma las liquidaciones.
+        - indexador (IndexadorPrestamos): Índice del que se leen los eventos nuevos.
+        - intervalo_sincronizacion (float): Segundos máximos entre dos lecturas de eventos.
+        - tamano_lote (int): Número máximo de liquidaciones enviadas en cada lote.
+
+        Métodos:
+        - programar(self, prestatario, prestamo_id, tiempo_limite): Añade o actualiza un préstamo aprobado.
+        - descartar(self, prestatario, prestamo_id): Retira un préstamo que ya no es liquidable.
+        - cargar_desde_contrato(self, prestatarios): Lectura masiva de los préstamos de varios prestatarios.
+        - vencidos(self, ahora): Extrae del montículo los préstamos vencidos en `ahora`.
+        - escanear(self): Sincroniza eventos y liquida los préstamos vencidos en una pasada.
+        - iniciar(self), detener(self): Arranca y detiene el hilo del servicio.
+    """
+    def __init__(self, manager, direccion_prestamista, clave_privada, indexador=None, intervalo_sincronizacion=5.0,
+                 tamano_lote=50):
+        self.manager = manager
+        self.web3 = manager.web3
+        self.direccion_prestamista = direccion_prestamista
+        self._clave_privada = clave_privada
+        self.indexador = indexador or IndexadorPrestamos(manager)
+        self.intervalo_sincronizacion = intervalo_sincronizacion
+        self.tamano_lote = tamano_lote
+        self._monticulo = []
+        self._vigentes = {}
+        self._fallos = {}
+        self._condicion = threading.Condition()
+        self._hilo = None
+        self._detenido = False
+        self.cargar_desde_indice()
+
+    # ------------------------------------------------------------------ montículo de vencimientos
+
+    def programar(self, prestatario, prestamo_id, tiempo_limite):
+        """Añade un préstamo aprobado al montículo (o actualiza su vencimiento) y despierta al servicio."""
+        clave = (prestatario, prestamo_id)
+        with self._condicion:
+            if self._vigentes.get(clave) == tiempo_limite:
+                return
+            self._vigentes[clave] = tiempo_limite
+            heapq.heappush(self._monticulo, (tiempo_limite, prestatario, prestamo_id))
+            self._condicion.notify()
+
+    def descartar(self, prestatario, prestamo_id):
+        """Retira un préstamo del servicio; su entrada en el montículo se ignorará al llegar a la cima."""
+        with self._condicion:
+            self._vigentes.pop((prestatario, prestamo_id), None)
+            self._fallos.pop((prestatario, prestamo_id), None)
+
+    def _limpiar_cima(self):
+        """Elimina de la cima las entradas descartadas o con un vencimiento que ya no es el vigente."""
+        while self._monticulo:
+            tiempo_limite, prestatario, prestamo_id = self._monticulo[0]
+            if self._vigentes.get((prestatario, prestamo_id)) == tiempo_limite:
+                return
+            heapq.heappop(self._monticulo)
+
+    def proximo_vencimiento(self):
+        """Devuelve el `tiempoLimite` más próximo de los préstamos vigilados, o None si no hay ninguno."""
+        with self._condicion:
+            self._limpiar_cima()
+            return self._monticulo[0][0] if self._monticulo else None
+
+    def vencidos(self, ahora, limite=None):
+        """
+            Extrae del montículo los préstamos cuyo `tiempoLimite` es anterior a `ahora`.
+
+            Parámetros:
+            - ahora (int): Marca de tiempo de referencia (la del último bloque de la cadena).
+            - limite (int, opcional): Número máximo de préstamos a extraer.
+
+            Retorna:
+            Una lista de tuplas (tiempoLimite, prestatario, prestamo_id) ordenada por vencimiento.
+        """
+        extraidos = []
+        with self._condicion:
+            self._limpiar_cima()
+            while self._monticulo and self._monticulo[0][0] < ahora and (limite is None or len(extraidos) < limite):
+                entrada = heapq.heappop(self._monticulo)
+                del self._vigentes[entrada[1:]]
+                extraidos.append(entrada)
+                self._limpiar_cima()
+        return extraidos
+
+    # ------------------------------------------------------------------ fuentes de préstamos
+
+    def cargar_desde_indice(self):
+        """Programa todos los préstamos aprobados que ya contiene el indexador (sin consultar al nodo)."""
+        for prestamo in self.indexador.prestamos_en_estado(ESTADO_APROBADO):
+            self.programar(prestamo['prestatario'], prestamo['id'], prestamo['tiempoLimite'])
+
+    def cargar_desde_contrato(self, prestatarios):
+        """
+            Lee del almacenamiento del contrato todos los préstamos de los prestatarios indicados (con llamadas
+            por lotes) y programa los que están aprobados. Sirve para arrancar sin recorrer el historial de eventos.
+
+            Retorna:
+            El número de préstamos aprobados programados.
+        """
+        prestatarios = [self.web3.to_checksum_address(p) for p in prestatarios]
+        listas_ids = self.manager.consultar_por_lotes('obtenerPrestamosPorPrestatario', [(p,) for p in prestatarios])
+        args = [(p, prestamo_id) for p, ids in zip(prestatarios, listas_ids) for prestamo_id in ids]
+        programados = 0
+        for prestamo in self.manager.consultar_por_lotes('obtenerDetalleDePrestamo', args):
+            prestamo_id, prestatario, _, _, _, tiempo_limite, estado = prestamo
+            if estado == ESTADO_APROBADO:
+                self.programar(prestatario, prestamo_id, tiempo_limite)
+                programados += 1
+        return programados
+
+    def sincronizar_eventos(self):
+        """
+            Sincroniza el indexador (ver IndexadorPrestamos.sincronizar) y actualiza el montículo con los préstamos
+            que han cambiado.
+
+            Retorna:
+            El número de eventos aplicados.
+        """
+        return self.indexador.sincronizar(al_aplicar=self._actualizar)
+
+    def _actualizar(self, evento, prestamo):
+        if prestamo['estado'] == ESTADO_APROBADO:
+            self.programar(prestamo['prestatario'], prestamo['id'], prestamo['tiempoLimite'])
+        else:
+            self.descartar(prestamo['prestatario'], prestamo['id'])
+
+    # ------------------------------------------------------------------ liquidación
+
+    def _ahora(self):
+        """Marca de tiempo del último bloque, que es la que compara el contrato con `tiempoLimite`."""
+        return self.web3.eth.get_block('latest')['timestamp']
+
+    def liquidar(self, prestamos, ahora=None):
+        """
+            Envía en un solo lote (`liquidar_garantias_bulk`) el `liquidarGarantia` de cada préstamo y espera
+            todos los recibos a la vez.
+
+            Parámetros:
+            - prestamos (list): Tuplas (tiempoLimite, prestatario, prestamo_id) devueltas por `vencidos`.
+            - ahora (int, opcional): Marca de tiempo desde la que se cuentan los reintentos. Por defecto, la del
+            último bloque.
+
+            Retorna:
+            Una lista con el resultado de cada liquidación (ver `BlockchainManager.enviar_transacciones_lote`).
+            Los préstamos con error vuelven al montículo para reintentarse en `ahora` más la espera de su número
+            de fallos, salvo los que fallan por un motivo de ERRORES_DEFINITIVOS.
+        """
+        try:
+            resultados = self.manager.liquidar_garantias_bulk(
+                self.direccion_prestamista, self._clave_privada,
+                [(prestatario, prestamo_id) for _, prestatario, prestamo_id in prestamos])
+        except Exception as e:
+            logging.error(f"Error al enviar el lote de liquidaciones: {e}")
+            resultados = [{'args': entrada[1:], 'exito': False, 'tx_hash': None, 'recibo': None, 'error': str(e)}
+                          for entrada in prestamos]
+        ahora = self._ahora() if ahora is None else ahora
+        for (_, prestatario, prestamo_id), resultado in zip(prestamos, resultados):
+            if resultado['exito']:
+                with self._condicion:
+                    self._fallos.pop((prestatario, prestamo_id), None)
+                continue
+            logging.error(f"La liquidación del préstamo {resultado['args']} ha fallado: {resultado['error']}")
+            self._reintentar(prestatario, prestamo_id, resultado['error'], ahora)
+        return resultados
+
+    def _reintentar(self, prestatario, prestamo_id, error, ahora):
+        """Vuelve a programar una liquidación fallida con espera exponencial, salvo si el fallo es definitivo."""
+        clave = (prestatario, prestamo_id)
+        if any(motivo in str(error).lower() for motivo in ERRORES_DEFINITIVOS):
+            with self._condicion:
+                self._fallos.pop(clave, None)
+            return
+        with self._condicion:
+            fallos = self._fallos.get(clave, 0) + 1
+            self._fallos[clave] = fallos
+        self.programar(prestatario, prestamo_id, ahora + min(REINTENTO_INICIAL * 2 ** (fallos - 1), REINTENTO_MAXIMO))
+
+    def escanear(self):
+        """
+            Realiza una pasada completa: sincroniza los eventos nuevos y liquida por lotes todos los préstamos
+            vencidos según la marca de tiempo del último bloque.
+
+            Retorna:
+            La lista de resultados de `liquidar`.
+        """
+        self.sincronizar_eventos()
+        ahora = self._ahora()
+        resultados = []
+        while True:
+            lote = self.vencidos(ahora, self.tamano_lote)
+            if not lote:
+                return resultados
+            resultados.extend(self.liquidar(lote, ahora))
+
+    # ------------------------------------------------------------------ servicio
+
+    def iniciar(self):
+        """Arranca el hilo del servicio."""
+        with self._condicion:
+            if self._hilo is not None:
+                return
+            self._detenido = False
+            self._hilo = threading.Thread(target=self._ejecutar, name='EscanerLiquidaciones', daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo del servicio y espera a que termine la pasada en curso."""
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify()
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            hilo.join()
+
+    def _ejecutar(self):
+        while True:
+            with self._condicion:
+                if self._detenido:
+                    return
+            try:
+                self.escanear()
+                espera = self.intervalo_sincronizacion
+                proximo = self.proximo_vencimiento()
+                if proximo is not None:
+                    espera = min(espera, max(proximo - self._ahora() + 1, 0))
+            except Exception as e:
+                logging.error(f"Error en el escáner de liquidaciones: {e}")
+                espera = self.intervalo_sincronizacion
+            with self._condicion:
+                if not self._detenido:
+                    self._condicion.wait(espera)
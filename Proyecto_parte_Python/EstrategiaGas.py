@@ -0,0 +1,232 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from web3.exceptions import ContractLogicError
+
+from RpcBatch import ejecutar_lote
+
+# Funciones del contrato cuyo gas depende del estado del almacenamiento (saldos y estado de cada préstamo): la
+# estimación de una llamada no sirve para otra con la misma forma de argumentos, así que no se guardan.
+FUNCIONES_CON_ESTADO = ('depositarGarantia', 'aprobarPrestamo', 'reembolsarPrestamo', 'liquidarGarantia')
+
+class EstrategiaGas:
+    """
+        Calcula el límite de gas y las tarifas de cada transacción en lugar de usar valores fijos.
+
+        - Límite de gas: se estima con `eth_estimateGas` y se le aplica un margen de seguridad. Las estimaciones
+        se guardan por función del contrato y "forma" de los argumentos (tipo de cada argumento y longitud de
+        las listas), de modo que las siguientes llamadas con la misma forma no consultan al nodo. La caché es
+        un LRU acotado y guarda la estimación más alta observada para cada clave. Un acierto de caché no detecta
+        de antemano las llamadas que se van a revertir; esas fallarán al minarse como hasta ahora. Las funciones
+        de `funciones_con_estado` se estiman siempre con el nodo, que también detecta sus reversiones.
+        - Tarifas: si la red aplica EIP-1559 (el historial de `eth_feeHistory` tiene `baseFeePerGas`), se usa
+        `maxPriorityFeePerGas` = mediana del percentil `percentil_propina` de las propinas de los últimos
+        `bloques_historial` bloques y `maxFeePerGas` = `multiplicador_base` x tarifa base del siguiente bloque +
+        propina. Si no, se usa `gasPrice` del nodo. El resultado se reutiliza durante `vigencia_tarifas` segundos
+        para no consultar el historial en cada transacción.
+
+        Atributos:
+        - web3 (Web3): Instancia de Web3 usada para las consultas.
+        - margen_gas (float): Factor aplicado a la estimación de gas.
+        - max_entradas (int): Número máximo de estimaciones guardadas.
+        - funciones_con_estado (tuple): Funciones cuyo gas depende del estado y no se guarda.
+
+        Métodos:
+        - estimar_gas(self, nombre_funcion, args, transaccion): Límite de gas con margen para una llamada.
+        - estimar_gas_lote(self, llamadas): Límite de gas de muchas llamadas con una petición por lotes.
+        - tarifas(self): Campos de tarifa (`gasPrice` o `maxFeePerGas`/`maxPriorityFeePerGas`) para una transacción.
+        - invalidar(self): Vacía las estimaciones y las tarifas guardadas.
+    """
+    def __init__(self, web3, margen_gas=1.2, bloques_historial=10, percentil_propina=50, multiplicador_base=2,
+                 vigencia_tarifas=3.0, max_entradas=256, funciones_con_estado=FUNCIONES_CON_ESTADO):
+        self.web3 = web3
+        self.margen_gas = margen_gas
+        self.bloques_historial = bloques_historial
+        self.percentil_propina = percentil_propina
+        self.multiplicador_base = multiplicador_base
+        self.vigencia_tarifas = vigencia_tarifas
+        self.max_entradas = max_entradas
+        self.funciones_con_estado = frozenset(funciones_con_estado)
+        self._estimaciones = OrderedDict()
+        self._tarifas = None
+        self._tarifas_hasta = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ límite de gas
+
+    @staticmethod
+    def forma_argumentos(args):
+        """Resume los argumentos de una llamada en su tipo y, para listas y bytes, su longitud."""
+        forma = []
+        for arg in args:
+            if isinstance(arg, (list, tuple, bytes, bytearray)):
+                forma.append((type(arg).__name__, len(arg)))
+            else:
+                forma.append(type(arg).__name__)
+        return tuple(forma)
+
+    def _clave(self, nombre_funcion, args, transaccion):
+        """Clave de la caché de estimaciones, o None si la función no se guarda (ver `funciones_con_estado`)."""
+        if nombre_funcion in self.funciones_con_estado:
+            return None
+        return (nombre_funcion, self.forma_argumentos(args), bool(transaccion.get('value')))
+
+    def _estimacion_guardada(self, clave):
+        if clave is None:
+            return None
+        with self._lock:
+            estimacion = self._estimaciones.get(clave)
+            if estimacion is not None:
+                self._estimaciones.move_to_end(clave)
+            return estimacion
+
+    def _guardar_estimacion(self, clave, estimacion):
+        if clave is None:
+            return estimacion
+        with self._lock:
+            self._estimaciones[clave] = max(estimacion, self._estimaciones.get(clave, 0))
+            self._estimaciones.move_to_end(clave)
+            while len(self._estimaciones) > self.max_entradas:
+                self._estimaciones.popitem(last=False)
+            return self._estimaciones[clave]
+
+    def _con_margen(self, estimacion):
+        return math.ceil(estimacion * self.margen_gas)
+
+    def estimar_gas(self, nombre_funcion, args, transaccion):
+        """
+            Devuelve el límite de gas para una llamada al contrato: la estimación del nodo (o la guardada para la
+            misma función y forma de argumentos, salvo en `funciones_con_estado`) multiplicada por `margen_gas`.
+
+            Parámetros:
+            - nombre_funcion (str): Nombre de la función del contrato.
+            - args (tuple): Argumentos de la llamada.
+            - transaccion (dict): Campos 'from', 'to', 'data' y 'value' de la transacción a estimar.
+
+            Retorna:
+            El límite de gas (int).
+
+            Excepciones:
+            - ContractLogicError: Se lanza si el nodo indica que la llamada se revertiría.
+        """
+        clave = self._clave(nombre_funcion, args, transaccion)
+        estimacion = self._estimacion_guardada(clave)
+        if estimacion is None:
+            estimacion = self._guardar_estimacion(clave, self.web3.eth.estimate_gas(transaccion))
+        return self._con_margen(estimacion)
+
+    def estimar_gas_lote(self, llamadas):
+        """
+            Límite de gas de muchas llamadas (ver `estimar_gas`). Las que no tienen estimación guardada se estiman
+            con una sola petición por lotes de `eth_estimateGas` en lugar de un viaje al nodo por llamada.
+
+            Parámetros:
+            - llamadas (list): Tuplas (nombre_funcion, args, transaccion).
+
+            Retorna:
+            Una lista, en el orden de `llamadas`, con el límite de gas de cada una o, si el nodo devolvió un error
+            para ella, la excepción (`ContractLogicError` si la llamada se revertiría, ValueError si no).
+        """
+        resultados = [None] * len(llamadas)
+        pendientes = []
+        for indice, (nombre_funcion, args, transaccion) in enumerate(llamadas):
+            clave = self._clave(nombre_funcion, args, transaccion)
+            estimacion = self._estimacion_guardada(clave)
+            if estimacion is None:
+                pendientes.append((indice, clave))
+            else:
+                resultados[indice] = self._con_margen(estimacion)
+        peticiones = []
+        for indice, _ in pendientes:
+            transaccion = llamadas[indice][2]
+            peticiones.append(('eth_estimateGas', [dict(transaccion, value=hex(transaccion.get('value', 0)))]))
+        for (indice, clave), respuesta in zip(pendientes, ejecutar_lote(self.web3, peticiones)):
+            error = respuesta.get('error')
+            if error:
+                mensaje = error.get('message', str(error))
+                revertida = error.get('code') == 3 or 'revert' in mensaje
+                resultados[indice] = ContractLogicError(mensaje, error.get('data')) if revertida else ValueError(error)
+            else:
+                resultados[indice] = self._con_margen(self._guardar_estimacion(clave, int(respuesta['result'], 16)))
+        return resultados
+
+    # ------------------------------------------------------------------ tarifas
+
+    def _calcular_tarifas(self, historial):
+        """Calcula los campos de tarifa EIP-1559 a partir de un `eth_feeHistory`, o None si la red no lo aplica."""
+        tarifas_base = historial.get('baseFeePerGas') or []
+        if not tarifas_base or not tarifas_base[-1]:
+            return None
+        propinas = sorted(bloque[0] for bloque in (historial.get('reward') or []) if bloque)
+        propina = propinas[len(propinas) // 2] if propinas else 0
+        return {
+            'maxFeePerGas': tarifas_base[-1] * self.multiplicador_base + propina,
+            'maxPriorityFeePerGas': propina,
+        }
+
+    def _tarifas_vigentes(self):
+        with self._lock:
+            if self._tarifas is not None and time.monotonic() < self._tarifas_hasta:
+                return self._tarifas
+            return None
+
+    def _guardar_tarifas(self, tarifas):
+        with self._lock:
+            self._tarifas = tarifas
+            self._tarifas_hasta = time.monotonic() + self.vigencia_tarifas
+        return tarifas
+
+    def tarifas(self):
+        """
+            Devuelve los campos de tarifa para la siguiente transacción: {'maxFeePerGas', 'maxPriorityFeePerGas'}
+            en redes con EIP-1559 o {'gasPrice'} en las demás.
+        """
+        tarifas = self._tarifas_vigentes()
+        if tarifas is not None:
+            return tarifas
+        try:
+            tarifas = self._calcular_tarifas(
+                self.web3.eth.fee_history(self.bloques_historial, 'latest', [self.percentil_propina]))
+        except Exception as e:
+            logging.info(f"eth_feeHistory no disponible, se usa gasPrice: {e}")
+            tarifas = None
+        if tarifas is None:
+            tarifas = {'gasPrice': self.web3.eth.gas_price}
+        return self._guardar_tarifas(tarifas)
+
+    def invalidar(self):
+        """Vacía las estimaciones de gas y las tarifas guardadas (por ejemplo, al cambiar de red)."""
+        with self._lock:
+            self._estimaciones.clear()
+            self._tarifas = None
+
+class AsyncEstrategiaGas(EstrategiaGas):
+    """
+        Variante de `EstrategiaGas` para `AsyncWeb3`: las consultas al nodo se esperan con `await`, mientras que
+        las cachés y los cálculos son los mismos que en la versión síncrona.
+    """
+    async def estimar_gas(self, nombre_funcion, args, transaccion):
+        """Límite de gas con margen para una llamada (ver EstrategiaGas.estimar_gas)."""
+        clave = self._clave(nombre_funcion, args, transaccion)
+        estimacion = self._estimacion_guardada(clave)
+        if estimacion is None:
+            estimacion = self._guardar_estimacion(clave, await self.web3.eth.estimate_gas(transaccion))
+        return self._con_margen(estimacion)
+
+    async def tarifas(self):
+        """Campos de tarifa para la siguiente transacción (ver EstrategiaGas.tarifas)."""
+        tarifas = self._tarifas_vigentes()
+        if tarifas is not None:
+            return tarifas
+        try:
+            tarifas = self._calcular_tarifas(
+                await self.web3.eth.fee_history(self.bloques_historial, 'latest', [self.percentil_propina]))
+        except Exception as e:
+            logging.info(f"eth_feeHistory no disponible, se usa gasPrice: {e}")
+            tarifas = None
+        if tarifas is None:
+            tarifas = {'gasPrice': await self.web3.eth.gas_price}
+        return self._guardar_tarifas(tarifas)
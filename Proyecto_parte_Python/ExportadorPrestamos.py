@@ -0,0 +1,231 @@
+import csv
+import json
+import logging
+import os
+import sqlite3
+
+# Campos de cada préstamo exportado (los de la struct Prestamo del contrato).
+CAMPOS_PRESTAMO = ['prestatario', 'id', 'monto', 'plazo', 'tiempoSolicitud', 'tiempoLimite', 'estado']
+# Filas que se acumulan antes de escribir cada grupo de filas de Parquet.
+FILAS_GRUPO_PARQUET = 50000
+# Campos uint256 que se escriben en Parquet como texto: ni decimal256 (76 dígitos) ni los enteros de 64 bits
+# admiten todos sus valores.
+CAMPOS_TEXTO_PARQUET = ['monto', 'plazo', 'tiempoSolicitud', 'tiempoLimite']
+
+class EscritorJSONL:
+    """Escribe un préstamo por línea en JSON. Los importes en wei se escriben como enteros."""
+    def __init__(self, ruta):
+        self._archivo = open(ruta, 'w', encoding='utf-8')
+
+    def escribir(self, prestamo):
+        self._archivo.write(json.dumps(prestamo) + '\n')
+
+    def cerrar(self):
+        self._archivo.close()
+
+class EscritorCSV:
+    """Escribe los préstamos en CSV con cabecera."""
+    def __init__(self, ruta):
+        self._archivo = open(ruta, 'w', newline='', encoding='utf-8')
+        self._escritor = csv.DictWriter(self._archivo, fieldnames=CAMPOS_PRESTAMO)
+        self._escritor.writeheader()
+
+    def escribir(self, prestamo):
+        self._escritor.writerow(prestamo)
+
+    def cerrar(self):
+        self._archivo.close()
+
+class EscritorParquet:
+    """
+        Escribe los préstamos en Parquet por grupos de `filas_grupo` filas, de modo que la memoria no depende del
+        tamaño total. Requiere el paquete opcional `pyarrow`. El monto, el plazo y los tiempos se guardan como
+        texto porque un uint256 no cabe en ningún tipo entero ni decimal de Parquet (ver CAMPOS_TEXTO_PARQUET).
+    """
+    def __init__(self, ruta, filas_grupo=FILAS_GRUPO_PARQUET):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("La exportación a Parquet requiere el paquete opcional 'pyarrow'.")
+        self._pa = pyarrow
+        self._esquema = pyarrow.schema([
+            ('prestatario', pyarrow.string()),
+            ('id', pyarrow.uint64()),
+            ('monto', pyarrow.string()),
+            ('plazo', pyarrow.string()),
+            ('tiempoSolicitud', pyarrow.string()),
+            ('tiempoLimite', pyarrow.string()),
+            ('estado', pyarrow.uint8()),
+        ])
+        self._escritor = pyarrow.parquet.ParquetWriter(ruta, self._esquema)
+        self.filas_grupo = filas_grupo
+        self._columnas = {campo: [] for campo in CAMPOS_PRESTAMO}
+
+    def escribir(self, prestamo):
+        for campo, columna in self._columnas.items():
+            columna.append(prestamo[campo])
+        if len(self._columnas['id']) >= self.filas_grupo:
+            self._volcar()
+
+    def _volcar(self):
+        if not self._columnas['id']:
+            return
+        for campo in CAMPOS_TEXTO_PARQUET:
+            self._columnas[campo] = [str(valor) for valor in self._columnas[campo]]
+        self._escritor.write_table(self._pa.Table.from_pydict(self._columnas, schema=self._esquema))
+        self._columnas = {campo: [] for campo in CAMPOS_PRESTAMO}
+
+    def cerrar(self):
+        self._volcar()
+        self._escritor.close()
+
+ESCRITORES = {'jsonl': EscritorJSONL, 'csv': EscritorCSV, 'parquet': EscritorParquet}
+
+def crear_escritor(ruta, formato=None):
+    """
+        Crea el escritor del formato indicado o, si no se indica, del que corresponde a la extensión de `ruta`
+        ('.jsonl', '.csv' o '.parquet').
+
+        Excepciones:
+        - ValueError: Se lanza si el formato no está soportado.
+    """
+    formato = (formato or os.path.splitext(ruta)[1].lstrip('.')).lower()
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato de exportación no soportado: {formato} (use jsonl, csv o parquet)")
+    return ESCRITORES[formato](ruta)
+
+class ExportadorPrestamos:
+    """
+        Recorre todos los préstamos del contrato y los entrega uno a uno, sin cargar la cartera en memoria.
+
+        Los prestatarios se obtienen de los eventos `SolicitudPrestamo`, leídos con `eth_getLogs` por rangos de
+        `tamano_rango` bloques. Para no guardar todos los prestatarios vistos en memoria, se descartan los
+        repetidos con una tabla en una base de datos SQLite temporal (en disco). Cada `tamano_lote` prestatarios
+        nuevos se consultan sus IDs y después los detalles de sus préstamos con `manager.agregador` (Multicall o
+        peticiones por lotes), sin pasar por la caché de lecturas. Todas las consultas se evalúan en el mismo
+        bloque (`bloque`), de modo que la exportación es una foto coherente de la cartera aunque la cadena avance
+        mientras tanto (el nodo debe conservar el estado de ese bloque durante la exportación).
+
+        Atributos:
+        - manager (BlockchainManager): Manager con la conexión y el agregador de lecturas.
+        - desde_bloque (int): Bloque desde el que se leen los eventos (el de despliegue del contrato).
+        - tamano_rango (int): Bloques por petición `eth_getLogs`.
+        - tamano_lote (int): Prestatarios consultados en cada tanda.
+
+        Métodos:
+        - prestatarios(self, hasta_bloque): Genera los prestatarios en el orden de su primera solicitud.
+        - structs(self, bloque): Genera todos los préstamos como structs Prestamo decodificadas.
+        - prestamos(self, bloque): Genera todos los préstamos (diccionarios con CAMPOS_PRESTAMO).
+        - exportar(self, ruta, formato, bloque): Escribe todos los préstamos en un archivo y devuelve cuántos son.
+    """
+    def __init__(self, manager, desde_bloque=0, tamano_rango=5000, tamano_lote=500):
+        self.manager = manager
+        self.desde_bloque = desde_bloque
+        self.tamano_rango = tamano_rango
+        self.tamano_lote = tamano_lote
+
+    def _leer_solicitudes(self, desde, hasta):
+        """Lee los logs `SolicitudPrestamo` de un rango, dividiéndolo por la mitad si el nodo lo rechaza."""
+        try:
+            return self.manager.web3.eth.get_logs({
+                'address': self.manager.contract_address,
+                'fromBlock': desde,
+                'toBlock': hasta,
+                'topics': [self.manager.codificador.topic('SolicitudPrestamo')],
+            })
+        except Exception as e:
+            if desde == hasta:
+                raise
+            medio = (desde + hasta) // 2
+            logging.info(f"Rango {desde}-{hasta} rechazado por el nodo ({e}), se divide en dos.")
+            return self._leer_solicitudes(desde, medio) + self._leer_solicitudes(medio + 1, hasta)
+
+    def prestatarios(self, hasta_bloque):
+        """Genera cada prestatario una sola vez, en el orden de su primera solicitud, hasta `hasta_bloque`."""
+        vistos = sqlite3.connect('')  # base de datos temporal en disco, se borra al cerrarla
+        try:
+            vistos.execute('CREATE TABLE vistos (direccion BLOB PRIMARY KEY) WITHOUT ROWID')
+            desde = self.desde_bloque
+            while desde <= hasta_bloque:
+                hasta = min(desde + self.tamano_rango - 1, hasta_bloque)
+                for log in self._leer_solicitudes(desde, hasta):
+                    direccion = bytes(log['topics'][1])[-20:]
+                    if vistos.execute('INSERT OR IGNORE INTO vistos VALUES (?)', (direccion,)).rowcount:
+                        yield self.manager.direccion_checksum('0x' + direccion.hex())
+                desde = hasta + 1
+        finally:
+            vistos.close()
+
+    def _tandas(self, iterable):
+        tanda = []
+        for elemento in iterable:
+            tanda.append(elemento)
+            if len(tanda) == self.tamano_lote:
+                yield tanda
+                tanda = []
+        if tanda:
+            yield tanda
+
+    def structs(self, bloque=None):
+        """
+            Genera todos los préstamos del contrato en el bloque indicado.
+
+            Parámetros:
+            - bloque (int, opcional): Bloque de la foto. Por defecto, el último bloque al empezar.
+
+            Retorna:
+            Un generador de tuplas (id, prestatario, monto, plazo, tiempoSolicitud, tiempoLimite, estado), tal
+            como las devuelve `obtenerDetalleDePrestamo`.
+        """
+        bloque = self.manager.web3.eth.block_number if bloque is None else bloque
+        agregador = self.manager.agregador
+        for prestatarios in self._tandas(self.prestatarios(bloque)):
+            listas_ids = agregador.consultar_funcion('obtenerPrestamosPorPrestatario',
+                                                     [(p,) for p in prestatarios], bloque=bloque)
+            args = [(p, prestamo_id) for p, ids in zip(prestatarios, listas_ids) for prestamo_id in ids]
+            for inicio in range(0, len(args), self.tamano_lote):
+                detalles = agregador.consultar_funcion('obtenerDetalleDePrestamo',
+                                                       args[inicio:inicio + self.tamano_lote], bloque=bloque)
+                yield from detalles
+
+    def prestamos(self, bloque=None):
+        """Igual que `structs`, pero genera diccionarios con las claves de CAMPOS_PRESTAMO."""
+        for prestamo_id, prestatario, monto, plazo, tiempo_solicitud, tiempo_limite, estado in self.structs(bloque):
+            yield {
+                'prestatario': prestatario,
+                'id': prestamo_id,
+                'monto': monto,
+                'plazo': plazo,
+                'tiempoSolicitud': tiempo_solicitud,
+                'tiempoLimite': tiempo_limite,
+                'estado': estado,
+            }
+
+    def exportar(self, ruta, formato=None, bloque=None):
+        """
+            Escribe todos los préstamos en `ruta` a medida que se leen.
+
+            Parámetros:
+            - ruta (str): Archivo de salida.
+            - formato (str, opcional): 'jsonl', 'csv' o 'parquet'. Por defecto, según la extensión de `ruta`.
+            - bloque (int, opcional): Bloque de la foto. Por defecto, el último bloque al empezar.
+
+            Retorna:
+            El número de préstamos exportados.
+
+            Excepciones:
+            - ValueError: Se lanza si el formato no está soportado.
+            - ImportError: Se lanza si se pide Parquet y `pyarrow` no está instalado.
+        """
+        escritor = crear_escritor(ruta, formato)
+        exportados = 0
+        try:
+            for prestamo in self.prestamos(bloque):
+                escritor.escribir(prestamo)
+                exportados += 1
+                if exportados % 100000 == 0:
+                    logging.info(f"{exportados} préstamos exportados a {ruta}")
+        finally:
+            escritor.cerrar()
+        return exportados
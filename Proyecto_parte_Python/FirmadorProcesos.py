@@ -0,0 +1,106 @@
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_account import Account
+from eth_utils import to_hex
+
+# Transacciones por debajo de las cuales se firma en el propio proceso (repartirlas cuesta más que firmarlas).
+MINIMO_PARALELO = 64
+# Número máximo de transacciones que se envían juntas a un proceso de firma.
+TAMANO_TANDA = 256
+
+def firmar_transacciones(transacciones, clave_privada):
+    """
+        Firma transacciones ya construidas (con 'nonce', 'gas', 'chainId' y tarifas, sin 'from') con una clave.
+
+        Parámetros:
+        - transacciones (list): Diccionarios de transacción sin firmar.
+        - clave_privada (str): Clave privada que firma todas las transacciones.
+
+        Retorna:
+        Una lista con un diccionario por transacción, en el mismo orden: 'remitente', 'nonce',
+        'raw_transaction' y 'tx_hash' (ambos en hexadecimal), que se puede serializar en JSON y difundir más
+        tarde o desde otra máquina (ver BlockchainManager.difundir_transacciones).
+    """
+    cuenta = Account.from_key(clave_privada)
+    firmadas = []
+    for transaccion in transacciones:
+        firmada = cuenta.sign_transaction(transaccion)
+        firmadas.append({
+            'remitente': cuenta.address,
+            'nonce': transaccion['nonce'],
+            'raw_transaction': to_hex(firmada.rawTransaction),
+            'tx_hash': to_hex(firmada.hash),
+        })
+    return firmadas
+
+def guardar_firmadas(ruta, firmadas):
+    """Escribe las transacciones firmadas en un archivo JSONL, una por línea."""
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        for firmada in firmadas:
+            archivo.write(json.dumps(firmada) + '\n')
+
+def leer_firmadas(ruta):
+    """Lee las transacciones firmadas que escribió `guardar_firmadas`."""
+    with open(ruta, encoding='utf-8') as archivo:
+        return [json.loads(linea) for linea in archivo if linea.strip()]
+
+class FirmadorProcesos:
+    """
+        Firma transacciones en paralelo en un `ProcessPoolExecutor`, un proceso por núcleo.
+
+        La firma ECDSA y la codificación RLP son cálculo en Python que retiene el GIL, así que con hilos las
+        firmas de un envío masivo se ejecutan una tras otra. Este firmador reparte las transacciones en tandas
+        entre procesos y devuelve las firmadas en el orden original, con lo que el rendimiento de las firmas crece
+        con el número de núcleos. La clave privada viaja a los procesos hijos por una tubería local junto con
+        cada tanda y no se guarda en ellos. Con pocas transacciones se firma en el propio proceso.
+
+        Los procesos se crean al firmar la primera tanda grande y se mantienen hasta `cerrar()` (o al salir del
+        bloque `with`).
+
+        Atributos:
+        - procesos (int): Número de procesos de firma. Por defecto, el número de núcleos.
+        - tamano_tanda (int): Máximo de transacciones por tanda enviada a un proceso.
+        - minimo_paralelo (int): Transacciones a partir de las cuales se firma en paralelo.
+
+        Métodos:
+        - firmar(self, transacciones, clave_privada): Firma las transacciones (ver `firmar_transacciones`).
+        - cerrar(self): Termina los procesos de firma.
+    """
+    def __init__(self, procesos=None, tamano_tanda=TAMANO_TANDA, minimo_paralelo=MINIMO_PARALELO):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.tamano_tanda = tamano_tanda
+        self.minimo_paralelo = minimo_paralelo
+        self._ejecutor = None
+
+    def firmar(self, transacciones, clave_privada):
+        """
+            Firma las transacciones con `clave_privada`, en paralelo si son al menos `minimo_paralelo` y hay
+            más de un proceso.
+
+            Retorna:
+            La lista de transacciones firmadas, en el mismo orden (ver `firmar_transacciones`).
+        """
+        transacciones = list(transacciones)
+        if self.procesos < 2 or len(transacciones) < self.minimo_paralelo:
+            return firmar_transacciones(transacciones, clave_privada)
+        if self._ejecutor is None:
+            self._ejecutor = ProcessPoolExecutor(max_workers=self.procesos)
+        # Al menos una tanda por proceso para repartir el trabajo entre todos.
+        tamano = max(1, min(self.tamano_tanda, math.ceil(len(transacciones) / self.procesos)))
+        tandas = [transacciones[inicio:inicio + tamano] for inicio in range(0, len(transacciones), tamano)]
+        futuros = [self._ejecutor.submit(firmar_transacciones, tanda, clave_privada) for tanda in tandas]
+        return [firmada for futuro in futuros for firmada in futuro.result()]
+
+    def cerrar(self):
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown()
+            self._ejecutor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
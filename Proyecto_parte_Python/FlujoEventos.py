@@ -0,0 +1,313 @@
+import functools
+import json
+import logging
+import queue
+import threading
+
+from IndexadorPrestamos import IndexadorPrestamos, ESTADO_PENDIENTE
+
+# Marca que detiene el hilo de un consumidor.
+_FIN = object()
+
+class Suscripcion:
+    """
+        Consumidor registrado en un FlujoEventos: su cola acotada, el hilo que lo ejecuta y sus contadores.
+
+        Atributos:
+        - nombre (str): Nombre del consumidor (para los mensajes de error).
+        - eventos (set): Eventos que recibe (None para todos).
+        - bloquear (bool): Si es True y la cola está llena, el flujo espera a que haya sitio (no se pierde
+        ningún evento); si es False, el evento se descarta para este consumidor.
+        - procesados, errores, descartados (int): Contadores de eventos.
+    """
+    def __init__(self, nombre, consumidor, eventos, tamano_cola, bloquear):
+        self.nombre = nombre
+        self.consumidor = consumidor
+        self.eventos = set(eventos) if eventos else None
+        self.bloquear = bloquear
+        self.cola = queue.Queue(tamano_cola)
+        self.procesados = 0
+        self.errores = 0
+        self.descartados = 0
+        self._hilo = threading.Thread(target=self._consumir, name=f'FlujoEventos-{nombre}', daemon=True)
+        self._hilo.start()
+
+    def _consumir(self):
+        while True:
+            evento = self.cola.get()
+            if evento is _FIN:
+                return
+            try:
+                self.consumidor(evento)
+                self.procesados += 1
+            except Exception as e:
+                self.errores += 1
+                logging.error(f"Error en el consumidor de eventos {self.nombre}: {e}")
+
+    def metricas(self):
+        return {'procesados': self.procesados, 'errores': self.errores, 'descartados': self.descartados,
+                'en_cola': self.cola.qsize()}
+
+class FlujoEventos:
+    """
+        Sigue los bloques nuevos de la cadena y reparte los eventos `SolicitudPrestamo` y `CambioEstadoPrestamo`
+        del contrato, decodificados con su ABI, entre los consumidores registrados.
+
+        Un hilo espera cada bloque nuevo, consultando `eth_blockNumber` cada `intervalo` segundos o, si se indica
+        `url_websocket`, despertando con cada cabecera de la suscripción `newHeads` del nodo (el sondeo sigue
+        activo como respaldo). Los eventos de los bloques nuevos se leen con `eth_getLogs` por rango
+        (IndexadorPrestamos.obtener_eventos), en lugar de con un filtro del nodo, para que el flujo sobreviva a
+        reinicios del nodo y a cambios de endpoint. Si se pasa un `indexador`, los bloques se leen con su
+        `sincronizar` (que lee del contrato los préstamos de los prestatarios nuevos) y cada evento se entrega
+        con el préstamo afectado en la clave 'prestamo' (con su ID, que el evento `SolicitudPrestamo` no
+        incluye).
+
+        Cada consumidor tiene su propia cola de `tamano_cola` eventos y su propio hilo, de modo que uno lento no
+        retrasa a los demás. Si la cola de un consumidor que bloquea está llena, el flujo deja de leer bloques
+        hasta que haya sitio (contrapresión), sin perder eventos. Si se detiene mientras espera, `siguiente_bloque`
+        y el `ultimo_bloque` del indexador se quedan en el bloque anterior al del primer evento sin encolar, así
+        que al reanudar desde el checkpoint del indexador se vuelve a leer ese bloque entero (los consumidores
+        pueden recibir otra vez los eventos del bloque que ya se encolaron).
+
+        Atributos:
+        - manager (BlockchainManager): Manager con la conexión y el contrato.
+        - indexador (IndexadorPrestamos): Índice que se mantiene al día con los eventos (opcional).
+        - intervalo (float): Segundos entre consultas del último bloque.
+        - confirmaciones (int): Bloques recientes que se esperan antes de repartir sus eventos.
+        - siguiente_bloque (int): Primer bloque que queda por leer.
+
+        Métodos:
+        - suscribir(self, consumidor, eventos, nombre, tamano_cola, bloquear): Registra un consumidor.
+        - iniciar(self): Arranca el hilo que sigue la cadena.
+        - procesar_nuevos(self): Lee y reparte los eventos de los bloques nuevos (una pasada).
+        - detener(self): Detiene el flujo y los consumidores.
+        - metricas(self): Eventos repartidos, último bloque y contadores de cada consumidor.
+    """
+    def __init__(self, manager, indexador=None, desde_bloque=None, intervalo=1.0, confirmaciones=0,
+                 url_websocket=None, tamano_rango=IndexadorPrestamos.TAMANO_RANGO):
+        self.manager = manager
+        self.indexador = indexador
+        self.intervalo = intervalo
+        self.confirmaciones = confirmaciones
+        self.url_websocket = url_websocket
+        self.tamano_rango = tamano_rango
+        self._lector = indexador if indexador is not None else IndexadorPrestamos(manager)
+        if indexador is not None:
+            self.siguiente_bloque = indexador.ultimo_bloque + 1
+        elif desde_bloque is not None:
+            self.siguiente_bloque = desde_bloque
+        else:
+            self.siguiente_bloque = manager.web3.eth.block_number + 1
+        self.suscripciones = []
+        self.repartidos = 0
+        self._detener = threading.Event()
+        self._nuevo_bloque = threading.Event()
+        self._hilos = []
+
+    def suscribir(self, consumidor, eventos=None, nombre=None, tamano_cola=1000, bloquear=True):
+        """
+            Registra un consumidor de eventos.
+
+            Parámetros:
+            - consumidor (callable): Función que recibe cada evento (diccionario con 'evento', 'args', 'bloque',
+            'hash_bloque', 'indice_log', 'tx_hash', 'timestamp' y, con indexador, 'prestamo'). Se ejecuta en un
+            hilo propio del consumidor.
+            - eventos (iterable, opcional): Nombres de los eventos que recibe (por defecto, todos).
+            - nombre (str, opcional): Nombre para los mensajes de error y las métricas.
+            - tamano_cola (int, opcional): Eventos pendientes como máximo en su cola.
+            - bloquear (bool, opcional): Si es False, los eventos que no caben en la cola se descartan en lugar
+            de frenar el flujo (útil para la interfaz).
+
+            Retorna:
+            La Suscripcion creada.
+        """
+        nombre = nombre or getattr(consumidor, '__name__', type(consumidor).__name__)
+        suscripcion = Suscripcion(nombre, consumidor, eventos, tamano_cola, bloquear)
+        self.suscripciones.append(suscripcion)
+        return suscripcion
+
+    # ------------------------------------------------------------------ lectura de bloques
+
+    def procesar_nuevos(self):
+        """
+            Lee los eventos de los bloques nuevos (menos `confirmaciones`) y los reparte a los consumidores. Si el
+            flujo se detiene, termina en el primer evento que no se ha encolado para todos los consumidores.
+
+            Retorna:
+            El número de eventos repartidos a todos los consumidores.
+        """
+        ultimo = self.manager.web3.eth.block_number - self.confirmaciones
+        if self.indexador is not None:
+            repartidos = self.indexador.sincronizar(ultimo, self._entregar, self.tamano_rango)
+            self.siguiente_bloque = self.indexador.ultimo_bloque + 1
+            self.repartidos += repartidos
+            return repartidos
+        repartidos = 0
+        while self.siguiente_bloque <= ultimo and not self._detener.is_set():
+            hasta = min(self.siguiente_bloque + self.tamano_rango - 1, ultimo)
+            for evento in self._lector.obtener_eventos(self.siguiente_bloque, hasta):
+                if not self._detener.is_set() and self._repartir(evento):
+                    repartidos += 1
+                    continue
+                self.siguiente_bloque = evento['bloque']
+                self.repartidos += repartidos
+                return repartidos
+            self.siguiente_bloque = hasta + 1
+        self.repartidos += repartidos
+        return repartidos
+
+    def _entregar(self, evento, prestamo):
+        """Reparte un evento ya aplicado al indexador; retorna False para detener la sincronización."""
+        if self._detener.is_set():
+            return False
+        evento['prestamo'] = dict(prestamo)
+        return self._repartir(evento)
+
+    def _repartir(self, evento):
+        """
+            Encola el evento para los consumidores. Retorna False si el flujo se detiene mientras espera sitio en
+            la cola de uno que bloquea (el evento no llega a ese consumidor ni a los siguientes).
+        """
+        for suscripcion in self.suscripciones:
+            if suscripcion.eventos is not None and evento['evento'] not in suscripcion.eventos:
+                continue
+            if not suscripcion.bloquear:
+                try:
+                    suscripcion.cola.put_nowait(evento)
+                except queue.Full:
+                    suscripcion.descartados += 1
+                continue
+            while True:
+                if self._detener.is_set():
+                    return False
+                try:
+                    suscripcion.cola.put(evento, timeout=self.intervalo)
+                    break
+                except queue.Full:
+                    logging.info(f"Cola del consumidor {suscripcion.nombre} llena, se espera antes de seguir")
+        return True
+
+    def _seguir(self):
+        while not self._detener.is_set():
+            try:
+                self.procesar_nuevos()
+            except Exception as e:
+                logging.error(f"Error al leer los eventos desde el bloque {self.siguiente_bloque}: {e}")
+            self._nuevo_bloque.wait(self.intervalo)
+            self._nuevo_bloque.clear()
+
+    def _escuchar_cabeceras(self):
+        """Mantiene la suscripción `newHeads` por WebSocket y avisa al hilo principal de cada bloque nuevo."""
+        from websockets.sync.client import connect
+        while not self._detener.is_set():
+            try:
+                with connect(self.url_websocket) as conexion:
+                    conexion.send(json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe',
+                                              'params': ['newHeads']}))
+                    while not self._detener.is_set():
+                        try:
+                            mensaje = json.loads(conexion.recv(timeout=self.intervalo))
+                        except TimeoutError:
+                            continue
+                        if mensaje.get('method') == 'eth_subscription':
+                            self._nuevo_bloque.set()
+            except Exception as e:
+                logging.error(f"Suscripción newHeads en {self.url_websocket} interrumpida: {e}")
+                self._detener.wait(self.intervalo)
+
+    def iniciar(self):
+        """Arranca el hilo que sigue la cadena (y el de la suscripción `newHeads` si hay `url_websocket`)."""
+        objetivos = [self._seguir] + ([self._escuchar_cabeceras] if self.url_websocket else [])
+        for objetivo in objetivos:
+            hilo = threading.Thread(target=objetivo, name='FlujoEventos', daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        return self
+
+    def detener(self, esperar=True):
+        """Detiene la lectura de bloques y los hilos de los consumidores (tras vaciar sus colas si `esperar`)."""
+        self._detener.set()
+        self._nuevo_bloque.set()
+        for hilo in self._hilos:
+            hilo.join()
+        for suscripcion in self.suscripciones:
+            if not esperar:
+                while not suscripcion.cola.empty():
+                    suscripcion.cola.get_nowait()
+            suscripcion.cola.put(_FIN)
+        if esperar:
+            for suscripcion in self.suscripciones:
+                suscripcion._hilo.join()
+
+    def metricas(self):
+        return {
+            'siguiente_bloque': self.siguiente_bloque,
+            'repartidos': self.repartidos,
+            'consumidores': {s.nombre: s.metricas() for s in self.suscripciones},
+        }
+
+# ---------------------------------------------------------------------- consumidores habituales
+
+def consumidor_cache(manager):
+    """Consumidor que descarta de `manager.cache` las lecturas de los prestatarios de cada evento."""
+    def invalidar_cache(evento):
+        manager.cache.aplicar_eventos([evento])
+    return invalidar_cache
+
+class PoliticaAprobacion:
+    """
+        Consumidor que aprueba automáticamente las solicitudes de préstamo que cumplen una política: monto y
+        plazo máximos y una garantía del prestatario de al menos `cobertura_minima` veces el monto.
+
+        Al recibir un `SolicitudPrestamo` lee del contrato los préstamos pendientes del prestatario (agrupando las
+        consultas con el agregador de lecturas, sin caché) y aprueba los que cumplen la política, sin esperar al
+        recibo. Si la aprobación falla (se revierte o no se mina a tiempo), el préstamo deja de contar como
+        aprobado y se vuelve a evaluar con la siguiente solicitud del prestatario. No necesita el ID del evento,
+        por lo que funciona con o sin indexador.
+
+        Atributos:
+        - manager (BlockchainManager): Manager con el que se consulta y se aprueba.
+        - cuenta, clave_privada (str): Prestamista que aprueba.
+        - monto_maximo (int): Monto máximo en wei.
+        - plazo_maximo (int): Plazo máximo en segundos.
+        - cobertura_minima (float): Garantía mínima del prestatario respecto al monto.
+        - aprobados (set): Préstamos (prestatario, id) aprobados por la política cuya transacción no ha fallado.
+    """
+    def __init__(self, manager, cuenta, clave_privada, monto_maximo, plazo_maximo, cobertura_minima=1.0):
+        self.manager = manager
+        self.cuenta = cuenta
+        self.clave_privada = clave_privada
+        self.monto_maximo = monto_maximo
+        self.plazo_maximo = plazo_maximo
+        self.cobertura_minima = cobertura_minima
+        self.aprobados = set()
+
+    def cumple(self, prestamo, garantia):
+        """Indica si un registro `Prestamo` cumple la política con la garantía (en wei) de su prestatario."""
+        return (prestamo.estado == ESTADO_PENDIENTE and prestamo.monto <= self.monto_maximo and
+                prestamo.plazo <= self.plazo_maximo and garantia >= prestamo.monto * self.cobertura_minima)
+
+    def __call__(self, evento):
+        if evento['evento'] != 'SolicitudPrestamo':
+            return
+        prestatario = evento['args']['prestatario']
+        agregador = self.manager.agregador
+        ids, (_, garantia) = agregador.consultar([('obtenerPrestamosPorPrestatario', (prestatario,)),
+                                                  ('clientes', (prestatario,))])
+        pendientes = [i for i in ids if (prestatario, i) not in self.aprobados]
+        for prestamo in agregador.detalles_prestamos([(prestatario, i) for i in pendientes]):
+            if not self.cumple(prestamo, garantia):
+                continue
+            manejador = self.manager.aprobar_prestamo(self.cuenta, self.clave_privada, prestatario, prestamo.id,
+                                                      esperar_recibo=False)
+            self.aprobados.add((prestatario, prestamo.id))
+            manejador.add_done_callback(functools.partial(self._al_resolverse, (prestatario, prestamo.id)))
+            # Las aprobaciones comprometen garantía: la siguiente solicitud se evalúa con la que queda.
+            garantia -= prestamo.monto
+            logging.info(f"Préstamo #{prestamo.id} de {prestatario} aprobado automáticamente")
+
+    def _al_resolverse(self, prestamo, manejador):
+        error = manejador.exception()
+        if error is not None:
+            self.aprobados.discard(prestamo)
+            logging.error(f"Error al aprobar automáticamente el préstamo #{prestamo[1]} de {prestamo[0]}: {error}")
@@ -0,0 +1,356 @@
+import bisect
+import json
+import logging
+import os
+import threading
+
+from RpcBatch import ejecutar_lote
+
+ESTADO_PENDIENTE = 0
+ESTADO_APROBADO = 1
+
+class IndexadorPrestamos:
+    """
+        Índice local de préstamos construido a partir de los eventos del contrato (`SolicitudPrestamo` y
+        `CambioEstadoPrestamo`), para responder consultas sin viajes al nodo.
+
+        Los eventos se leen con `eth_getLogs` por rangos de bloques y se aplican en orden (bloque, índice de log).
+        El contrato no incluye el ID en `SolicitudPrestamo`, pero los IDs son consecutivos por prestatario
+        (1, 2, 3...), por lo que el índice los reconstruye contando las solicitudes de cada prestatario. Como la
+        indexación puede empezar después del despliegue, la primera vez que aparece un prestatario se leen del
+        contrato sus préstamos (`obtenerPrestamosPorPrestatario` y `obtenerDetalleDePrestamo`, con llamadas por
+        lotes): una solicitud toma el ID del préstamo leído con la misma fecha, monto y plazo, y un cambio de
+        estado de un préstamo solicitado antes del bloque inicial conserva su plazo y su fecha de solicitud.
+        La marca de tiempo de cada bloque con eventos se consulta en una única petición por lotes para calcular
+        `tiempoSolicitud` y `tiempoLimite`.
+
+        Mantiene tres vistas del mismo conjunto de préstamos: por prestatario, por estado y, para los préstamos
+        aprobados, una lista ordenada por `tiempoLimite`.
+
+        Los eventos de los bloques posteriores a `ultimo_bloque` se pueden volver a aplicar (por ejemplo, si un
+        FlujoEventos se detuvo a mitad de un bloque): una solicitud ya aplicada devuelve el préstamo que creó y los
+        cambios de estado, reaplicados en orden, dejan el mismo estado final.
+
+        Atributos:
+        - manager (BlockchainManager): Gestor del que se toman la conexión Web3, la dirección y la ABI.
+        - ultimo_bloque (int): Último bloque procesado; la siguiente sincronización continúa desde el siguiente.
+        - ruta_checkpoint (str): Archivo JSON donde se guarda el índice tras cada sincronización (opcional).
+
+        Métodos:
+        - sincronizar(self, hasta_bloque, al_aplicar): Procesa los eventos nuevos hasta el bloque indicado (o el
+        último), avisando de cada uno.
+        - obtener_eventos(self, desde, hasta): Lee y decodifica los eventos de un rango de bloques.
+        - aplicar_evento(self, evento): Aplica un evento decodificado al índice.
+        - prestamos_de(self, prestatario), prestamos_en_estado(self, estado), prestamo(self, prestatario, id),
+        prestamos_vencidos(self, ahora), prestamos_por_vencimiento(self, desde, hasta): Consultas al índice.
+    """
+    # Número máximo de bloques por petición eth_getLogs (se divide automáticamente si el nodo lo rechaza).
+    TAMANO_RANGO = 5000
+
+    def __init__(self, manager, desde_bloque=0, ruta_checkpoint=None):
+        self.manager = manager
+        self.web3 = manager.web3
+        self.codificador = manager.codificador
+        self.ruta_checkpoint = ruta_checkpoint
+        self._lock = threading.RLock()
+        self._solicitudes = {}
+        self.ultimo_bloque = desde_bloque - 1
+        self._por_prestatario = {}
+        self._por_estado = {}
+        self._vencimientos = []
+        self._semillas = {}
+        # Índices derivados de las semillas y de los préstamos (no se guardan en el checkpoint): IDs de las
+        # semillas por (tiempoSolicitud, monto, plazo) y mayor ID conocido de cada prestatario.
+        self._semillas_por_solicitud = {}
+        self._ultimo_id = {}
+        self._topics = [self.codificador.topic('SolicitudPrestamo'), self.codificador.topic('CambioEstadoPrestamo')]
+        if ruta_checkpoint and os.path.exists(ruta_checkpoint):
+            self.cargar_checkpoint(ruta_checkpoint)
+
+    @property
+    def ultimo_bloque(self):
+        return self._ultimo_bloque
+
+    @ultimo_bloque.setter
+    def ultimo_bloque(self, bloque):
+        # Solo se recuerdan las solicitudes aplicadas de bloques que todavía se pueden volver a leer.
+        with self._lock:
+            self._ultimo_bloque = bloque
+            self._solicitudes = {posicion: clave for posicion, clave in self._solicitudes.items()
+                                 if posicion[0] > bloque}
+
+    # ------------------------------------------------------------------ lectura de eventos
+
+    def _leer_logs(self, desde, hasta):
+        """Lee los logs del contrato en un rango, dividiéndolo por la mitad si el nodo lo rechaza por tamaño."""
+        try:
+            return self.web3.eth.get_logs({
+                'address': self.manager.contract_address,
+                'fromBlock': desde,
+                'toBlock': hasta,
+                'topics': [self._topics],
+            })
+        except Exception as e:
+            if desde == hasta:
+                raise
+            medio = (desde + hasta) // 2
+            logging.info(f"Rango {desde}-{hasta} rechazado por el nodo ({e}), se divide en dos.")
+            return self._leer_logs(desde, medio) + self._leer_logs(medio + 1, hasta)
+
+    def _marcas_de_tiempo(self, numeros_bloque):
+        """Devuelve {número de bloque: (timestamp, hash)} consultando todos los bloques en una petición por lotes."""
+        numeros = sorted(set(numeros_bloque))
+        respuestas = ejecutar_lote(self.web3, [('eth_getBlockByNumber', [hex(n), False]) for n in numeros])
+        marcas = {}
+        for numero, respuesta in zip(numeros, respuestas):
+            bloque = respuesta.get('result')
+            if not bloque:
+                raise Exception(f"No se pudo obtener el bloque {numero}: {respuesta.get('error')}")
+            marcas[numero] = (int(bloque['timestamp'], 16), bloque['hash'])
+        return marcas
+
+    def obtener_eventos(self, desde, hasta):
+        """
+            Lee y decodifica los eventos de préstamos del contrato en un rango de bloques.
+
+            Parámetros:
+            - desde (int): Primer bloque del rango (incluido).
+            - hasta (int): Último bloque del rango (incluido).
+
+            Retorna:
+            Una lista de diccionarios ordenada por (bloque, índice de log) con las claves 'evento', 'args',
+            'bloque', 'hash_bloque', 'indice_log', 'tx_hash' y 'timestamp'.
+        """
+        logs = self._leer_logs(desde, hasta)
+        if not logs:
+            return []
+        marcas = self._marcas_de_tiempo(log['blockNumber'] for log in logs)
+        eventos = []
+        for log in logs:
+            decodificado = self.codificador.decodificar_evento(log)
+            if decodificado is None:
+                continue
+            nombre, args = decodificado
+            timestamp, hash_bloque = marcas[log['blockNumber']]
+            eventos.append({
+                'evento': nombre,
+                'args': args,
+                'bloque': log['blockNumber'],
+                'hash_bloque': hash_bloque,
+                'indice_log': log['logIndex'],
+                'tx_hash': self.web3.to_hex(log['transactionHash']),
+                'timestamp': timestamp,
+            })
+        eventos.sort(key=lambda evento: (evento['bloque'], evento['indice_log']))
+        return eventos
+
+    def sincronizar(self, hasta_bloque=None, al_aplicar=None, tamano_rango=None):
+        """
+            Procesa todos los eventos desde el bloque siguiente a `ultimo_bloque` hasta `hasta_bloque`, en rangos
+            de `tamano_rango` bloques (por defecto, TAMANO_RANGO): lee los eventos, lee del contrato los préstamos
+            de los prestatarios nuevos y aplica los eventos en orden. Si hay `ruta_checkpoint`, guarda el índice
+            al terminar.
+
+            Parámetros:
+            - hasta_bloque (int, opcional): Último bloque a procesar. Por defecto, el último bloque de la cadena.
+            - al_aplicar (callable, opcional): Función que recibe cada evento y el registro del préstamo afectado
+            después de aplicarlo. Si devuelve False, la sincronización se detiene y `ultimo_bloque` queda en el
+            bloque anterior al de ese evento (que se vuelve a leer en la siguiente sincronización).
+            - tamano_rango (int, opcional): Bloques por petición `eth_getLogs`.
+
+            Retorna:
+            El número de eventos aplicados (sin contar aquel en que se detuvo `al_aplicar`).
+        """
+        hasta_bloque = self.web3.eth.block_number if hasta_bloque is None else hasta_bloque
+        tamano_rango = tamano_rango or self.TAMANO_RANGO
+        aplicados = 0
+        desde = self.ultimo_bloque + 1
+        if desde > hasta_bloque:
+            return 0
+        try:
+            while desde <= hasta_bloque:
+                hasta = min(desde + tamano_rango - 1, hasta_bloque)
+                eventos = self.obtener_eventos(desde, hasta)
+                self._leer_prestatarios_nuevos(eventos)
+                for evento in eventos:
+                    prestamo = self.aplicar_evento(evento)
+                    if al_aplicar is not None and al_aplicar(evento, prestamo) is False:
+                        self.ultimo_bloque = evento['bloque'] - 1
+                        return aplicados
+                    aplicados += 1
+                self.ultimo_bloque = hasta
+                desde = hasta + 1
+            return aplicados
+        finally:
+            if self.ruta_checkpoint:
+                self.guardar_checkpoint(self.ruta_checkpoint)
+
+    def _leer_prestatarios_nuevos(self, eventos):
+        """Lee del contrato los préstamos de los prestatarios de `eventos` que el índice aún no conoce."""
+        with self._lock:
+            nuevos = list(dict.fromkeys(evento['args']['prestatario'] for evento in eventos
+                                        if evento['args']['prestatario'] not in self._por_prestatario
+                                        and evento['args']['prestatario'] not in self._semillas))
+        if not nuevos:
+            return
+        listas_ids = self.manager.consultar_por_lotes('obtenerPrestamosPorPrestatario', [(p,) for p in nuevos])
+        args = [(p, prestamo_id) for p, ids in zip(nuevos, listas_ids) for prestamo_id in ids]
+        detalles = self.manager.consultar_por_lotes('obtenerDetalleDePrestamo', args) if args else []
+        with self._lock:
+            for prestatario in nuevos:
+                self._semillas.setdefault(prestatario, {})
+            for (prestatario, prestamo_id), detalle in zip(args, detalles):
+                self._agregar_semilla(prestatario, tuple(detalle))
+
+    def _agregar_semilla(self, prestatario, semilla):
+        prestamo_id, _, monto, plazo, tiempo_solicitud, _, _ = semilla
+        self._semillas.setdefault(prestatario, {})[prestamo_id] = semilla
+        ids = self._semillas_por_solicitud.setdefault(prestatario, {}).setdefault((tiempo_solicitud, monto, plazo), [])
+        bisect.insort(ids, prestamo_id)
+        self._ultimo_id[prestatario] = max(self._ultimo_id.get(prestatario, 0), prestamo_id)
+
+    def _id_solicitud(self, prestatario, prestamos, args, timestamp):
+        """ID de una solicitud: el del préstamo leído del contrato con la misma fecha, monto y plazo o el siguiente."""
+        solicitud = (timestamp, args['monto'], args['plazo'])
+        candidatos = self._semillas_por_solicitud.get(prestatario, {}).get(solicitud, ())
+        for prestamo_id in candidatos:
+            if prestamo_id not in prestamos:
+                return prestamo_id
+        return self._ultimo_id.get(prestatario, 0) + 1
+
+    def _agregar_prestamo(self, prestamos, prestamo):
+        prestamos[prestamo['id']] = prestamo
+        self._ultimo_id[prestamo['prestatario']] = max(self._ultimo_id.get(prestamo['prestatario'], 0), prestamo['id'])
+        self._por_estado.setdefault(prestamo['estado'], set()).add((prestamo['prestatario'], prestamo['id']))
+
+    # ------------------------------------------------------------------ actualización del índice
+
+    def aplicar_evento(self, evento):
+        """
+            Aplica al índice un evento devuelto por `obtener_eventos`. Una solicitud (bloque e índice de log) ya
+            aplicada no crea otro préstamo.
+
+            Retorna:
+            El registro del préstamo afectado (diccionario con los campos de la struct Prestamo).
+        """
+        args = evento['args']
+        prestatario = args['prestatario']
+        with self._lock:
+            prestamos = self._por_prestatario.setdefault(prestatario, {})
+            if evento['evento'] == 'SolicitudPrestamo':
+                posicion = (evento['bloque'], evento['indice_log'])
+                if posicion in self._solicitudes:
+                    return prestamos[self._solicitudes[posicion][1]]
+                prestamo = {
+                    'id': self._id_solicitud(prestatario, prestamos, args, evento['timestamp']),
+                    'prestatario': prestatario,
+                    'monto': args['monto'],
+                    'plazo': args['plazo'],
+                    'tiempoSolicitud': evento['timestamp'],
+                    'tiempoLimite': 0,
+                    'estado': ESTADO_PENDIENTE,
+                }
+                self._agregar_prestamo(prestamos, prestamo)
+                if evento['bloque'] > self._ultimo_bloque:
+                    self._solicitudes[posicion] = (prestatario, prestamo['id'])
+                return prestamo
+
+            prestamo = prestamos.get(args['id'])
+            if prestamo is None:
+                # Préstamo solicitado antes del bloque inicial del índice: se registra con los datos leídos del
+                # contrato (o, si no se leyeron, con los del evento).
+                semilla = self._semillas.get(prestatario, {}).get(args['id'])
+                _, _, monto, plazo, tiempo_solicitud, tiempo_limite, _ = semilla or (0, 0, args['monto'], 0, 0, 0, 0)
+                prestamo = {'id': args['id'], 'prestatario': prestatario, 'monto': monto, 'plazo': plazo,
+                            'tiempoSolicitud': tiempo_solicitud, 'tiempoLimite': tiempo_limite,
+                            'estado': ESTADO_PENDIENTE}
+                self._agregar_prestamo(prestamos, prestamo)
+            self._cambiar_estado(prestamo, args['estado'], evento['timestamp'])
+            return prestamo
+
+    def _cambiar_estado(self, prestamo, estado, timestamp):
+        clave = (prestamo['prestatario'], prestamo['id'])
+        self._por_estado.get(prestamo['estado'], set()).discard(clave)
+        if prestamo['estado'] == ESTADO_APROBADO:
+            self._quitar_vencimiento(prestamo)
+        prestamo['estado'] = estado
+        if estado == ESTADO_APROBADO:
+            prestamo['tiempoLimite'] = timestamp + prestamo['plazo']
+            bisect.insort(self._vencimientos, (prestamo['tiempoLimite'],) + clave)
+        self._por_estado.setdefault(estado, set()).add(clave)
+
+    def _quitar_vencimiento(self, prestamo):
+        entrada = (prestamo['tiempoLimite'], prestamo['prestatario'], prestamo['id'])
+        posicion = bisect.bisect_left(self._vencimientos, entrada)
+        if posicion < len(self._vencimientos) and self._vencimientos[posicion] == entrada:
+            del self._vencimientos[posicion]
+
+    # ------------------------------------------------------------------ consultas
+
+    def prestamo(self, prestatario, prestamo_id):
+        """Devuelve el registro de un préstamo o None si no está en el índice."""
+        with self._lock:
+            return self._por_prestatario.get(self.web3.to_checksum_address(prestatario), {}).get(prestamo_id)
+
+    def prestamos_de(self, prestatario):
+        """Devuelve la lista de préstamos de un prestatario, ordenada por ID."""
+        with self._lock:
+            prestamos = self._por_prestatario.get(self.web3.to_checksum_address(prestatario), {})
+            return [prestamos[prestamo_id] for prestamo_id in sorted(prestamos)]
+
+    def prestamos_en_estado(self, estado):
+        """Devuelve los préstamos que están en el estado indicado (código numérico de EstadoPrestamo)."""
+        with self._lock:
+            return [self._por_prestatario[p][i] for p, i in sorted(self._por_estado.get(estado, ()))]
+
+    def prestamos_por_vencimiento(self, desde, hasta):
+        """Devuelve los préstamos aprobados con `tiempoLimite` en [desde, hasta], ordenados por vencimiento."""
+        with self._lock:
+            inicio = bisect.bisect_left(self._vencimientos, (desde,))
+            fin = bisect.bisect_right(self._vencimientos, (hasta, chr(0x10FFFF)))
+            return [self._por_prestatario[p][i] for _, p, i in self._vencimientos[inicio:fin]]
+
+    def prestamos_vencidos(self, ahora):
+        """Devuelve los préstamos aprobados cuyo `tiempoLimite` es anterior a `ahora` (liquidables)."""
+        return self.prestamos_por_vencimiento(0, ahora - 1)
+
+    def prestatarios(self):
+        """Devuelve la lista de prestatarios conocidos por el índice."""
+        with self._lock:
+            return list(self._por_prestatario)
+
+    # ------------------------------------------------------------------ checkpoint
+
+    def guardar_checkpoint(self, ruta):
+        """Guarda el índice y el último bloque procesado en un archivo JSON (escritura atómica)."""
+        with self._lock:
+            datos = {
+                'ultimo_bloque': self.ultimo_bloque,
+                'prestamos': [p for prestamos in self._por_prestatario.values() for p in prestamos.values()],
+                'semillas': {p: list(semillas.values()) for p, semillas in self._semillas.items()},
+                'solicitudes': [list(posicion) + list(clave) for posicion, clave in self._solicitudes.items()],
+            }
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w') as archivo:
+            json.dump(datos, archivo)
+        os.replace(temporal, ruta)
+
+    def cargar_checkpoint(self, ruta):
+        """Reconstruye el índice desde un checkpoint guardado con `guardar_checkpoint`."""
+        with open(ruta, 'r') as archivo:
+            datos = json.load(archivo)
+        with self._lock:
+            self._por_prestatario, self._por_estado, self._vencimientos = {}, {}, []
+            self._semillas, self._semillas_por_solicitud, self._ultimo_id = {}, {}, {}
+            for prestamo in datos['prestamos']:
+                self._agregar_prestamo(self._por_prestatario.setdefault(prestamo['prestatario'], {}), prestamo)
+                if prestamo['estado'] == ESTADO_APROBADO:
+                    self._vencimientos.append((prestamo['tiempoLimite'], prestamo['prestatario'], prestamo['id']))
+            self._vencimientos.sort()
+            for prestatario, semillas in datos.get('semillas', {}).items():
+                self._semillas.setdefault(prestatario, {})
+                for semilla in semillas:
+                    self._agregar_semilla(prestatario, tuple(semilla))
+            self._solicitudes = {(bloque, indice): (prestatario, prestamo_id)
+                                 for bloque, indice, prestatario, prestamo_id in datos.get('solicitudes', [])}
+            self.ultimo_bloque = datos['ultimo_bloque']
@@ -1,11 +1,19 @@
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QMessageBox, QLabel
-from PyQt5.QtCore import Qt, QDate
+import logging
+
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QMessageBox,
+                             QLabel, QListWidget)
+from PyQt5.QtCore import Qt, QDate, QObject, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 
 from DatosDialog import DatosDialog
 from CredencialesDialog import CredencialesDialog
 from MensajesDialog import MensajesDialog
 from BlockchainManager import BlockchainManager
+from TareasBlockchain import GestorTareas, PanelTareas
+from FlujoEventos import FlujoEventos, consumidor_cache
+from IndexadorPrestamos import IndexadorPrestamos, ESTADO_PENDIENTE
+from ContractUtils import wei_to_ether
+from SesionClaves import SesionClaves
 from web3 import Web3 
 
 class HoverButton(QPushButton):
@@ -39,17 +47,30 @@ class HoverExitButton(QPushButton):
         self.setStyleSheet(self.defaultStyleSheet)
         self.setFont(self.defaultFont)
 
+# Acciones que solo consultan el contrato y no necesitan una cuenta que firme
+ACCIONES_CONSULTA = ("Obtener préstamos por prestatario", "Obtener detalle de préstamo")
+
+class SenalesEventos(QObject):
+    # Se emite desde el hilo del consumidor de FlujoEventos y Qt lo entrega en el hilo de la interfaz.
+    evento = pyqtSignal(object)
+
 class MainWindow(QMainWindow):
     def __init__(self, blockchainManager):
         super().__init__()
         self.blockchainManager = blockchainManager
+        # Cuentas desbloqueadas: las credenciales se piden una vez y caducan tras un tiempo sin usarse
+        if blockchainManager.sesion is None:
+            blockchainManager.sesion = SesionClaves()
+        self.sesion = blockchainManager.sesion
+        self.cuentaActiva = None
         self.setWindowTitle('Aplicación DeFi - Gestión de Préstamos')
-        self.setGeometry(100, 100, 800, 600)
+        self.setGeometry(100, 100, 1100, 650)
         self.initUI()
 
     def initUI(self):
         self.centralWidget = QWidget(self)
         self.setCentralWidget(self.centralWidget)
+        layoutPrincipal = QHBoxLayout()
         layout = QVBoxLayout()
 
         # Título
@@ -58,6 +79,11 @@ class MainWindow(QMainWindow):
         titleLabel.setStyleSheet("font-size: 24px; color: #333;")
         layout.addWidget(titleLabel)
 
+        self.cuentaLabel = QLabel("Sin cuenta desbloqueada", self)
+        self.cuentaLabel.setAlignment(Qt.AlignCenter)
+        self.cuentaLabel.setStyleSheet("font-size: 12px; color: #666;")
+        layout.addWidget(self.cuentaLabel)
+
         actions = ["Alta de Prestamista", "Alta de Cliente", "Depositar Garantía", 
                    "Solicitar Préstamo", "Aceptar Préstamo","Reembolsar Préstamo", "Liquidar Garantía",
                     "Obtener préstamos por prestatario", 
@@ -68,6 +94,10 @@ class MainWindow(QMainWindow):
             btn.clicked.connect(lambda checked, a=action: self.onActionClicked(a))
             layout.addWidget(btn)
 
+        bloquearButton = HoverButton("Bloquear Cuenta", self)
+        bloquearButton.clicked.connect(self.bloquearCuenta)
+        layout.addWidget(bloquearButton)
+
         # Botón de Salida
         exitButton = HoverExitButton('Salir', self)
         exitButton.setStyleSheet("font-size: 16px; padding: 15px 25px; border-style: outset;")
@@ -82,84 +112,174 @@ class MainWindow(QMainWindow):
         copyrightLabel.setStyleSheet("font-size: 12px; color: #666;")
         layout.addWidget(copyrightLabel)
 
-        self.centralWidget.setLayout(layout)
+        # Panel de tareas: las operaciones se ejecutan en segundo plano y aquí se sigue su estado
+        layoutTareas = QVBoxLayout()
+        tareasLabel = QLabel("Operaciones", self)
+        tareasLabel.setStyleSheet("font-size: 16px; color: #333;")
+        layoutTareas.addWidget(tareasLabel)
+        self.panelTareas = PanelTareas(self)
+        self.panelTareas.setStyleSheet("background-color: white;")
+        layoutTareas.addWidget(self.panelTareas)
+
+        self.gestorTareas = GestorTareas(self.panelTareas, parent=self)
+        self.gestorTareas.tareaTerminada.connect(self.onTareaTerminada)
+
+        # Solicitudes pendientes de aprobación, actualizadas con los eventos del contrato en cuanto se minan
+        solicitudesLabel = QLabel("Solicitudes pendientes", self)
+        solicitudesLabel.setStyleSheet("font-size: 16px; color: #333;")
+        layoutTareas.addWidget(solicitudesLabel)
+        self.listaSolicitudes = QListWidget(self)
+        self.listaSolicitudes.setStyleSheet("background-color: white;")
+        layoutTareas.addWidget(self.listaSolicitudes)
+        self.itemsSolicitudes = {}
+        self.iniciarFlujoEventos()
+
+        layoutPrincipal.addLayout(layout, 1)
+        layoutPrincipal.addLayout(layoutTareas, 2)
+        self.centralWidget.setLayout(layoutPrincipal)
 
         # Cambiar el color de fondo de la ventana principal
         self.setStyleSheet("background-color: #f0f0f0;")
                 
     def onActionClicked(self, action):
-        credDialog = CredencialesDialog(self)
-        if credDialog.exec_():
-            direccion, clavePrivada = credDialog.getDireccionEthereum(), credDialog.getClavePrivada()
-            
+        # Las consultas no firman; las transacciones usan la cuenta de la sesión y solo piden credenciales si no
+        # hay ninguna desbloqueada (o ha caducado)
+        direccion = None if action in ACCIONES_CONSULTA else self.obtenerCuentaActiva()
+        if action in ACCIONES_CONSULTA or direccion is not None:
+            # Con la clave como None, BlockchainManager firma con la clave ya derivada de la sesión
+            clavePrivada = None
+
             datosDialog = DatosDialog(action, self)
             if datosDialog.exec_():
                 datos = datosDialog.getDatos()
                 
+                # La operación se encola y se ejecuta fuera del hilo de la interfaz; su avance se ve en el panel
                 try:
+                    manager = self.blockchainManager
                     if action == "Alta de Prestamista":
-                        self.blockchainManager.alta_prestamista(direccion, clavePrivada, datos['direccion'])
+                        self.gestorTareas.encolar(f"{action} {datos['direccion']}", manager.alta_prestamista,
+                                                  direccion, clavePrivada, datos['direccion'])
                     elif action == "Alta de Cliente":
-                        self.blockchainManager.alta_cliente(direccion, clavePrivada, datos['direccion']) 
+                        self.gestorTareas.encolar(f"{action} {datos['direccion']}", manager.alta_cliente,
+                                                  direccion, clavePrivada, datos['direccion'])
                     elif action == "Depositar Garantía":
                         valorWei = Web3.to_wei(float(datos['valorDeposito']), 'ether')
-                        self.blockchainManager.depositar_garantia(direccion, clavePrivada, valorWei)
+                        self.gestorTareas.encolar(f"{action} {datos['valorDeposito']} ETH", manager.depositar_garantia,
+                                                  direccion, clavePrivada, valorWei)
                     elif action == "Solicitar Préstamo":
                         montoWei = Web3.to_wei(float(datos['montoPrestamo']), 'ether')
                         plazoSegundos = int(datos['plazoPrestamo']) * 86400  # Convertir días a segundos
-                        self.blockchainManager.solicitar_prestamo(direccion, clavePrivada, 0, montoWei, plazoSegundos)
+                        self.gestorTareas.encolar(f"{action} {datos['montoPrestamo']} ETH", manager.solicitar_prestamo,
+                                                  direccion, clavePrivada, montoWei, plazoSegundos)
                     elif action == "Reembolsar Préstamo":
                         valorWei = Web3.to_wei(float(datos['valorReembolso']), 'ether')
-                        self.blockchainManager.reembolsar_prestamo(direccion, clavePrivada, int(datos['idPrestamo']), valorWei)
+                        self.gestorTareas.encolar(f"{action} #{datos['idPrestamo']}", manager.reembolsar_prestamo,
+                                                  direccion, clavePrivada, int(datos['idPrestamo']), valorWei)
                     elif action == "Liquidar Garantía":
-                        self.blockchainManager.liquidar_garantia(direccion, clavePrivada, datos['direccionPrestatario'], int(datos['idPrestamoLiquidar']))
+                        self.gestorTareas.encolar(f"{action} #{datos['idPrestamoLiquidar']}", manager.liquidar_garantia,
+                                                  direccion, clavePrivada, datos['direccionPrestatario'],
+                                                  int(datos['idPrestamoLiquidar']))
                     elif action == "Aceptar Préstamo":
-                        self.blockchainManager.aprobar_prestamo(direccion, clavePrivada, datos['direccionPrestatario'], int(datos['idPrestamoAceptar']))
+                        self.gestorTareas.encolar(f"{action} #{datos['idPrestamoAceptar']}", manager.aprobar_prestamo,
+                                                  direccion, clavePrivada, datos['direccionPrestatario'],
+                                                  int(datos['idPrestamoAceptar']))
                     elif action == "Obtener préstamos por prestatario":
-                        try:
-                            if not Web3.isAddress(datos['direccionPrestatario']):
-                                raise ValueError("La dirección del prestatario proporcionada no es válida.")
-
-                            prestamos = self.blockchainManager.obtener_prestamos_por_prestatario(datos['direccionPrestatario'])
-                            
-                            if not prestamos:
-                                QMessageBox.information(self, "Préstamos por Prestatario", "No se encontraron préstamos para el prestatario especificado.")
-                            else:
-                                MensajesDialog("Préstamos por Prestatario", str(prestamos), self).exec_()
-                        except ValueError as ve:
-                            QMessageBox.warning(self, "Error de Validación", str(ve))
-                        except Exception as e:
-                            QMessageBox.critical(self, "Error", "Ha ocurrido un error inesperado: " + str(e))
-                        return
-
+                        if not Web3.is_address(datos['direccionPrestatario']):
+                            raise ValueError("La dirección del prestatario proporcionada no es válida.")
+                        self.gestorTareas.encolar(action, manager.obtener_prestamos_por_prestatario,
+                                                  datos['direccionPrestatario'], esTransaccion=False)
                     elif action == "Obtener detalle de préstamo":
-                        try:
-                            idPrestamo = int(datos['idPrestamoDetalle'])
-                            if idPrestamo <= 0:
-                                raise ValueError("El ID del préstamo debe ser un número positivo.")
-                            detalle = self.blockchainManager.obtener_detalle_de_prestamo(datos['direccionPrestatario'], idPrestamo)
-                            
-                            if not detalle:
-                                QMessageBox.information(self, "Detalle del Préstamo", "No se encontró el préstamo especificado.")
-                            else:
-                                MensajesDialog("Detalle del Préstamo", str(detalle), self).exec_()
-                        except ValueError as ve:
-                            QMessageBox.warning(self, "Error de Validación", str(ve))
-                        except Exception as e:
-                            QMessageBox.critical(self, "Error", "Ha ocurrido un error inesperado: " + str(e))
-                        return
-                    
-                    # Muestra un mensaje de éxito al finalizar cualquier acción correctamente
-                    MensajesDialog("Éxito", "La acción se completó con éxito.", self).exec_()
-
+                        idPrestamo = int(datos['idPrestamoDetalle'])
+                        if idPrestamo <= 0:
+                            raise ValueError("El ID del préstamo debe ser un número positivo.")
+                        self.gestorTareas.encolar(action, manager.obtener_detalle_de_prestamo,
+                                                  datos['direccionPrestatario'], idPrestamo, esTransaccion=False)
+                except ValueError as ve:
+                    QMessageBox.warning(self, "Error de Validación", str(ve))
                 except Exception as e:
                     MensajesDialog("Error", str(e), self).exec_()
-                                            
+
+    def obtenerCuentaActiva(self):
+        if self.cuentaActiva and self.sesion.desbloqueada(self.cuentaActiva):
+            return self.cuentaActiva
+        credDialog = CredencialesDialog(self)
+        if not credDialog.exec_():
+            return None
+        try:
+            texto = credDialog.getDireccionEthereum().strip()
+            direccion = Web3.to_checksum_address(texto) if texto else None
+            if credDialog.getRutaKeystore():
+                direcciones = self.sesion.desbloquear(credDialog.getRutaKeystore(), credDialog.getContrasenaKeystore())
+                direccion = direccion or direcciones[0]
+                if direccion not in direcciones:
+                    raise ValueError("El keystore no contiene la dirección indicada.")
+            else:
+                if direccion is None:
+                    raise ValueError("Indique la dirección Ethereum y su clave privada, o un archivo keystore.")
+                clave = credDialog.getClavePrivada().strip()
+                agregada = self.sesion.agregar_clave(clave if clave.startswith('0x') else '0x' + clave)
+                if agregada != direccion:
+                    self.sesion.bloquear(agregada)
+                    raise ValueError("La clave privada no corresponde a la dirección indicada.")
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Error de Credenciales", str(e))
+            return None
+        self.cuentaActiva = direccion
+        self.cuentaLabel.setText(f"Cuenta: {direccion}")
+        return direccion
+
+    def bloquearCuenta(self):
+        self.sesion.bloquear()
+        self.cuentaActiva = None
+        self.cuentaLabel.setText("Sin cuenta desbloqueada")
+
+    def onTareaTerminada(self, idTarea, descripcion, resultado):
+        # Solo las consultas muestran su resultado; las transacciones se siguen en el panel de tareas
+        if descripcion == "Obtener préstamos por prestatario":
+            if not resultado:
+                QMessageBox.information(self, "Préstamos por Prestatario", "No se encontraron préstamos para el prestatario especificado.")
+            else:
+                MensajesDialog("Préstamos por Prestatario", "\n".join(str(p) for p in resultado), self).exec_()
+        elif descripcion == "Obtener detalle de préstamo":
+            if not resultado:
+                QMessageBox.information(self, "Detalle del Préstamo", "No se encontró el préstamo especificado.")
+            else:
+                MensajesDialog("Detalle del Préstamo", str(resultado), self).exec_()
+
+    def iniciarFlujoEventos(self):
+        self.senalesEventos = SenalesEventos(self)
+        self.senalesEventos.evento.connect(self.onEventoPrestamo)
+        manager = self.blockchainManager
+        try:
+            self.flujoEventos = FlujoEventos(manager, indexador=IndexadorPrestamos(manager))
+            self.flujoEventos.suscribir(consumidor_cache(manager), nombre="cache")
+            self.flujoEventos.suscribir(self.senalesEventos.evento.emit, nombre="interfaz")
+            self.flujoEventos.iniciar()
+        except Exception as e:
+            logging.error(f"No se pudo iniciar el seguimiento de eventos: {e}")
+            self.flujoEventos = None
+
+    def onEventoPrestamo(self, evento):
+        prestamo = evento['prestamo']
+        clave = (prestamo['prestatario'], prestamo['id'])
+        if prestamo['estado'] == ESTADO_PENDIENTE:
+            if clave not in self.itemsSolicitudes:
+                texto = (f"{prestamo['prestatario']} #{prestamo['id']}: {wei_to_ether(prestamo['monto'])} ETH, "
+                         f"{prestamo['plazo'] // 86400} días")
+                self.listaSolicitudes.addItem(texto)
+                self.itemsSolicitudes[clave] = self.listaSolicitudes.item(self.listaSolicitudes.count() - 1)
+        elif clave in self.itemsSolicitudes:
+            item = self.itemsSolicitudes.pop(clave)
+            self.listaSolicitudes.takeItem(self.listaSolicitudes.row(item))
+
     def closeApplication(self):
         reply = QMessageBox.question(self, 'Salir', '¿Estás seguro de que quieres salir?',
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
             QMessageBox.information(self, "Despedida", "Gracias por usar la aplicación. ¡Hasta la próxima!")
+            if self.flujoEventos:
+                self.flujoEventos.detener(esperar=False)
+            self.sesion.cerrar()
             QApplication.instance().quit() 
                     
\ No newline at end of file
@@ -0,0 +1,259 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites (en segundos) de los histogramas de latencia.
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Límites de los histogramas de gas usado por transacción.
+LIMITES_GAS = (21000, 30000, 50000, 75000, 100000, 150000, 200000, 300000, 500000, 1000000, 3000000)
+# Puerto por defecto del endpoint /metrics.
+PUERTO_PROMETHEUS = 9108
+
+# Métricas que registra BlockchainManager (sin el prefijo): nombre -> (ayuda, límites del histograma o None).
+METRICAS_MANAGER = {
+    'etapa_segundos': ("Duración de cada etapa de una transacción (construir, firmar, enviar, recibo).",
+                       LIMITES_SEGUNDOS),
+    'eth_call_segundos': ("Latencia de las consultas eth_call al contrato por función (fallos de caché).",
+                          LIMITES_SEGUNDOS),
+    'rpc_segundos': ("Latencia de cada petición JSON-RPC por método.", LIMITES_SEGUNDOS),
+    'gas_usado': ("Gas usado por transacción según su recibo.", LIMITES_GAS),
+    'reintentos_total': ("Reintentos de envío de transacciones.", None),
+    'reversiones_total': ("Llamadas revertidas por el contrato (al estimar el gas, en eth_call o en el recibo).",
+                          None),
+    'errores_total': ("Transacciones fallidas por tipo de excepción.", None),
+    'errores_rpc_total': ("Peticiones JSON-RPC fallidas por método (transporte o respuesta con error).", None),
+}
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatear_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in pares) + '}'
+
+def _formatear_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Metricas:
+    """
+        Registro de métricas en memoria, seguro entre hilos: contadores y histogramas de límites fijos, cada uno
+        con etiquetas (argumentos con nombre), y colecciones de valores instantáneos que se leen al exportar.
+
+        Es la interfaz que usa BlockchainManager; cualquier objeto con los métodos `incrementar`, `observar` y
+        `cronometro` puede sustituirla (por ejemplo, `MetricasNulas` para no medir nada o un adaptador a otro
+        sistema de métricas).
+
+        Atributos:
+        - prefijo (str): Prefijo de los nombres exportados (por ejemplo, 'prestamodefi_etapa_segundos').
+
+        Métodos:
+        - describir(self, nombre, ayuda, limites): Fija el texto de ayuda y los límites de un histograma.
+        - incrementar(self, nombre, valor, **etiquetas): Suma `valor` a un contador.
+        - observar(self, nombre, valor, **etiquetas): Añade una observación a un histograma.
+        - cronometro(self, nombre, **etiquetas): Context manager que observa los segundos que dura el bloque.
+        - registrar_coleccion(self, nombre, funcion): Exporta como gauges el diccionario que devuelve `funcion`.
+        - instantanea(self): Diccionario con el estado actual de todas las métricas.
+        - exportar_prometheus(self): Texto en el formato de exposición de Prometheus.
+    """
+    def __init__(self, prefijo='prestamodefi'):
+        self.prefijo = prefijo
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+        self._limites = {}
+        self._ayudas = {}
+        self._colecciones = {}
+
+    def describir(self, nombre, ayuda, limites=None):
+        """Fija la ayuda de una métrica y, si es un histograma, sus límites (por defecto, LIMITES_SEGUNDOS)."""
+        with self._lock:
+            self._ayudas[nombre] = ayuda
+            if limites is not None:
+                self._limites[nombre] = tuple(limites)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                limites = self._limites.setdefault(nombre, LIMITES_SEGUNDOS)
+                # [cuentas por intervalo (la última, por encima del mayor límite), suma, total]
+                histograma = self._histogramas[clave] = [[0] * (len(limites) + 1), 0, 0]
+            histograma[0][bisect_left(self._limites[nombre], valor)] += 1
+            histograma[1] += valor
+            histograma[2] += 1
+
+    @contextmanager
+    def cronometro(self, nombre, **etiquetas):
+        """Observa en el histograma `nombre` los segundos que tarda el bloque `with`, aunque lance una excepción."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def registrar_coleccion(self, nombre, funcion):
+        """
+            Registra una función sin argumentos que devuelve un diccionario de valores numéricos (por ejemplo,
+            `cache.metricas`). Cada valor se exporta como el gauge '<prefijo>_<nombre>_<clave>'.
+        """
+        with self._lock:
+            self._colecciones[nombre] = funcion
+
+    def _leer_colecciones(self):
+        with self._lock:
+            colecciones = list(self._colecciones.items())
+        leidas = {}
+        for nombre, funcion in colecciones:
+            try:
+                leidas[nombre] = {clave: valor for clave, valor in funcion().items()
+                                  if isinstance(valor, (int, float))}
+            except Exception as e:
+                logging.error(f"Error al leer la colección de métricas {nombre}: {e}")
+        return leidas
+
+    def instantanea(self):
+        """
+            Retorna:
+            Un diccionario con 'contadores' y 'histogramas' (nombre -> lista de series, cada una con sus
+            'etiquetas' y su 'valor', o su 'cuenta', 'suma', 'media' y 'cubetas' acumuladas por límite) y
+            'colecciones' (nombre -> diccionario de valores).
+        """
+        with self._lock:
+            contadores = {}
+            for (nombre, etiquetas), valor in self._contadores.items():
+                contadores.setdefault(nombre, []).append({'etiquetas': dict(etiquetas), 'valor': valor})
+            histogramas = {}
+            for (nombre, etiquetas), (cuentas, suma, total) in self._histogramas.items():
+                acumuladas, acumulado = {}, 0
+                for limite, cuenta in zip(self._limites[nombre] + (float('inf'),), cuentas):
+                    acumulado += cuenta
+                    acumuladas[limite] = acumulado
+                histogramas.setdefault(nombre, []).append({
+                    'etiquetas': dict(etiquetas),
+                    'cuenta': total,
+                    'suma': suma,
+                    'media': suma / total if total else 0.0,
+                    'cubetas': acumuladas,
+                })
+        return {'contadores': contadores, 'histogramas': histogramas, 'colecciones': self._leer_colecciones()}
+
+    def exportar_prometheus(self):
+        """Devuelve todas las métricas en el formato de texto de exposición de Prometheus (versión 0.0.4)."""
+        instantanea = self.instantanea()
+        lineas = []
+
+        def cabecera(nombre, tipo, ayuda=None):
+            ayuda = ayuda if ayuda is not None else self._ayudas.get(nombre)
+            nombre_completo = f'{self.prefijo}_{nombre}'
+            if ayuda:
+                lineas.append(f'# HELP {nombre_completo} {ayuda}')
+            lineas.append(f'# TYPE {nombre_completo} {tipo}')
+            return nombre_completo
+
+        for nombre, series in sorted(instantanea['contadores'].items()):
+            nombre_completo = cabecera(nombre, 'counter')
+            for serie in series:
+                etiquetas = sorted(serie['etiquetas'].items())
+                lineas.append(f"{nombre_completo}{_formatear_etiquetas(etiquetas)} "
+                              f"{_formatear_numero(serie['valor'])}")
+        for nombre, series in sorted(instantanea['histogramas'].items()):
+            nombre_completo = cabecera(nombre, 'histogram')
+            for serie in series:
+                etiquetas = sorted(serie['etiquetas'].items())
+                for limite, acumulado in serie['cubetas'].items():
+                    le = _formatear_numero(limite if limite == float('inf') else float(limite))
+                    lineas.append(f"{nombre_completo}_bucket{_formatear_etiquetas(etiquetas, [('le', le)])} "
+                                  f"{acumulado}")
+                lineas.append(f"{nombre_completo}_sum{_formatear_etiquetas(etiquetas)} "
+                              f"{_formatear_numero(serie['suma'])}")
+                lineas.append(f"{nombre_completo}_count{_formatear_etiquetas(etiquetas)} {serie['cuenta']}")
+        for coleccion, valores in sorted(instantanea['colecciones'].items()):
+            for clave, valor in sorted(valores.items()):
+                nombre_completo = cabecera(f'{coleccion}_{clave}', 'gauge', '')
+                lineas.append(f'{nombre_completo} {_formatear_numero(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+class MetricasNulas:
+    """Implementación de la interfaz de `Metricas` que no registra nada, para no medir en el camino crítico."""
+    def describir(self, nombre, ayuda, limites=None):
+        pass
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        pass
+
+    def observar(self, nombre, valor, **etiquetas):
+        pass
+
+    def cronometro(self, nombre, **etiquetas):
+        return nullcontext()
+
+    def registrar_coleccion(self, nombre, funcion):
+        pass
+
+    def instantanea(self):
+        return {'contadores': {}, 'histogramas': {}, 'colecciones': {}}
+
+    def exportar_prometheus(self):
+        return ''
+
+def middleware_rpc(metricas):
+    """
+        Crea un middleware de Web3 que mide la latencia de cada petición JSON-RPC ('rpc_segundos') y cuenta las
+        que fallan ('errores_rpc_total'), por método: 'transporte' si la petición lanza una excepción (conexión,
+        timeout) y 'respuesta' si el nodo responde con un error. Las peticiones por lotes de RpcBatch no pasan
+        por los middlewares.
+    """
+    def middleware(make_request, w3):
+        def peticion(method, params):
+            inicio = time.perf_counter()
+            try:
+                respuesta = make_request(method, params)
+            except Exception:
+                metricas.incrementar('errores_rpc_total', metodo=method, tipo='transporte')
+                raise
+            finally:
+                metricas.observar('rpc_segundos', time.perf_counter() - inicio, metodo=method)
+            if isinstance(respuesta, dict) and 'error' in respuesta:
+                metricas.incrementar('errores_rpc_total', metodo=method, tipo='respuesta')
+            return respuesta
+        return peticion
+    return middleware
+
+def servir_prometheus(metricas, puerto=PUERTO_PROMETHEUS, host='127.0.0.1'):
+    """
+        Sirve `metricas.exportar_prometheus()` en http://host:puerto/metrics desde un hilo en segundo plano.
+
+        Retorna:
+        El servidor HTTP (ThreadingHTTPServer); `shutdown()` lo detiene.
+    """
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            cuerpo = metricas.exportar_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    threading.Thread(target=servidor.serve_forever, name='MetricasPrometheus', daemon=True).start()
+    return servidor
@@ -0,0 +1,597 @@
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rlp
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import keccak, to_checksum_address
+
+from AgregadorLecturas import DIRECCION_MULTICALL3
+from CodificadorABI import CodificadorABI
+from ContractUtils import cargar_abi
+
+CHAIN_ID_SIMULADO = 1337
+DIRECCION_CONTRATO_SIMULADO = '0x25238d7855c60436DA77483CDEDB037291958023'
+SALDO_INICIAL = 1000 * 10**18
+PRECIO_GAS = 20 * 10**9
+LIMITE_GAS_BLOQUE = 30000000
+
+# Gas consumido por cada función del contrato simulado (aproximado al de la EVM).
+GAS_FUNCIONES = {
+    'altaPrestamista': 46000,
+    'altaCliente': 48000,
+    'depositarGarantia': 44000,
+    'solicitarPrestamo': 140000,
+    'aprobarPrestamo': 62000,
+    'reembolsarPrestamo': 38000,
+    'liquidarGarantia': 45000,
+}
+
+def cuentas_simuladas(numero=10):
+    """
+        Devuelve `numero` cuentas deterministas (LocalAccount) con saldo en el nodo simulado. La primera es el
+        socio principal del contrato, como la cuenta que lo desplegaría en Ganache.
+    """
+    return [Account.from_key(keccak(text=f"nodo-simulado-{i}")) for i in range(numero)]
+
+def _hex(valor):
+    return hex(valor)
+
+def _entero(campo):
+    return int.from_bytes(campo, 'big') if campo else 0
+
+class ReversionContrato(Exception):
+    """Error lanzado por un `require` del contrato simulado."""
+
+class NodoSimulado:
+    """
+        Nodo JSON-RPC local que emula una cadena con el contrato PrestamoDeFi desplegado, para pruebas y
+        benchmarks sin Ganache ni compilador de Solidity.
+
+        Implementa en Python la lógica del contrato (mismos `require`, eventos y structs que PrestamoDeFi.sol) y
+        el subconjunto de métodos JSON-RPC que usan Web3.py y esta aplicación: consultas de cadena, `eth_call`,
+        `eth_estimateGas`, `eth_sendRawTransaction` con transacciones firmadas (legacy y EIP-1559), recibos,
+        bloques y `eth_getLogs`. Cada transacción válida se mina inmediatamente en un bloque nuevo, como el modo
+        automine de Ganache; las transacciones con un nonce futuro quedan en cola hasta que se rellena el hueco.
+        Con `multicall=True` emula también el contrato auxiliar Multicall (`aggregate3`) en DIRECCION_MULTICALL3.
+        Admite peticiones por lotes y una latencia artificial por petición para simular la red.
+
+        Atributos:
+        - url (str): URL HTTP del nodo una vez arrancado.
+        - cuentas (list): Cuentas deterministas con saldo; la primera es el socio principal del contrato.
+        - latencia (float): Segundos de espera añadidos a cada petición HTTP.
+        - capacidad (int): Peticiones que el nodo atiende a la vez (None, sin límite); el resto espera turno,
+        como en un nodo real con un número fijo de hilos de trabajo.
+
+        Métodos:
+        - iniciar(self): Arranca el servidor HTTP en un hilo y devuelve su URL.
+        - detener(self): Detiene el servidor.
+        - avanzar_tiempo(self, segundos): Adelanta el reloj de los bloques siguientes.
+        - procesar(self, peticion): Atiende una petición JSON-RPC (o un lote) sin pasar por HTTP.
+    """
+    def __init__(self, host='127.0.0.1', puerto=0, latencia=0.0, abi_path='PrestamoDeFi.json', numero_cuentas=10,
+                 contract_address=DIRECCION_CONTRATO_SIMULADO, chain_id=CHAIN_ID_SIMULADO, capacidad=None,
+                 multicall=True):
+        self.host = host
+        self.puerto = puerto
+        self.latencia = latencia
+        self.capacidad = capacidad
+        self._turnos = threading.BoundedSemaphore(capacidad) if capacidad else None
+        self.chain_id = chain_id
+        self.contract_address = to_checksum_address(contract_address)
+        self.codificador = CodificadorABI(cargar_abi(abi_path))
+        self.codificador_multicall = CodificadorABI(cargar_abi('Multicall.json')) if multicall else None
+        self.direccion_multicall = to_checksum_address(DIRECCION_MULTICALL3) if multicall else None
+        self.cuentas = cuentas_simuladas(numero_cuentas)
+        self.url = None
+        self.peticiones = 0
+        self._lock = threading.RLock()
+        self._servidor = None
+        self._hilo = None
+        self._desfase_tiempo = 0
+        # Marca de tiempo del bloque en curso: el contrato y el bloque ven el mismo `block.timestamp`.
+        self._marca_bloque = None
+
+        # Estado de la cadena
+        self.saldos = {cuenta.address: SALDO_INICIAL for cuenta in self.cuentas}
+        self.nonces = {}
+        self.cola = {}
+        self.transacciones = {}
+        self.recibos = {}
+        self.logs = []
+        self.bloques = []
+        self._minar_bloque([])
+
+        # Estado del contrato
+        self.socio_principal = self.cuentas[0].address
+        self.empleados = {self.socio_principal: True}
+        self.clientes = {}
+
+        self._metodos = {
+            'web3_clientVersion': lambda params: 'NodoSimulado/PrestamoDeFi',
+            'net_version': lambda params: str(self.chain_id),
+            'net_listening': lambda params: True,
+            'eth_chainId': lambda params: _hex(self.chain_id),
+            'eth_blockNumber': lambda params: _hex(len(self.bloques) - 1),
+            'eth_gasPrice': lambda params: _hex(PRECIO_GAS),
+            'eth_maxPriorityFeePerGas': lambda params: _hex(10**9),
+            'eth_accounts': lambda params: [cuenta.address for cuenta in self.cuentas],
+            'eth_getBalance': lambda params: _hex(self.saldos.get(to_checksum_address(params[0]), 0)),
+            'eth_getCode': self._get_code,
+            'eth_getTransactionCount': self._get_transaction_count,
+            'eth_getBlockByNumber': self._get_block_by_number,
+            'eth_getBlockByHash': self._get_block_by_hash,
+            'eth_call': self._call,
+            'eth_estimateGas': self._estimate_gas,
+            'eth_sendRawTransaction': self._send_raw_transaction,
+            'eth_getTransactionReceipt': lambda params: self.recibos.get(params[0].lower()),
+            'eth_getTransactionByHash': lambda params: self.transacciones.get(params[0].lower()),
+            'eth_getLogs': self._get_logs,
+            'eth_feeHistory': self._fee_history,
+        }
+
+    # ------------------------------------------------------------------ servidor HTTP
+
+    def iniciar(self):
+        """Arranca el servidor HTTP del nodo en un hilo en segundo plano y devuelve su URL."""
+        nodo = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                longitud = int(self.headers.get('Content-Length', 0))
+                peticion = json.loads(self.rfile.read(longitud))
+                if nodo._turnos is not None:
+                    with nodo._turnos:
+                        cuerpo = nodo._atender(peticion)
+                else:
+                    cuerpo = nodo._atender(peticion)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        class Servidor(ThreadingHTTPServer):
+            # La cola de conexiones por defecto (5) descarta conexiones cuando llegan cientos de clientes a la vez.
+            request_queue_size = 1024
+
+        self._servidor = Servidor((self.host, self.puerto), Manejador)
+        self._servidor.daemon_threads = True
+        self.url = f"http://{self.host}:{self._servidor.server_address[1]}"
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name='NodoSimulado', daemon=True)
+        self._hilo.start()
+        return self.url
+
+    def _atender(self, peticion):
+        if self.latencia:
+            time.sleep(self.latencia)
+        return json.dumps(self.procesar(peticion)).encode()
+
+    def detener(self):
+        """Detiene el servidor HTTP del nodo."""
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def avanzar_tiempo(self, segundos):
+        """
+            Adelanta el reloj del nodo y mina un bloque vacío con la nueva marca de tiempo (como
+            `evm_increaseTime` seguido de `evm_mine` en Ganache).
+        """
+        with self._lock:
+            self._desfase_tiempo += segundos
+            self._minar_bloque([])
+
+    def procesar(self, peticion):
+        """Atiende una petición JSON-RPC o un lote de peticiones y devuelve la respuesta."""
+        if isinstance(peticion, list):
+            return [self._procesar_una(p) for p in peticion]
+        return self._procesar_una(peticion)
+
+    def _procesar_una(self, peticion):
+        respuesta = {'jsonrpc': '2.0', 'id': peticion.get('id')}
+        metodo = self._metodos.get(peticion.get('method'))
+        if metodo is None:
+            respuesta['error'] = {'code': -32601, 'message': f"Método no soportado: {peticion.get('method')}"}
+            return respuesta
+        try:
+            with self._lock:
+                self.peticiones += 1
+                respuesta['result'] = metodo(peticion.get('params', []))
+        except ReversionContrato as e:
+            razon = '0x08c379a0' + encode(['string'], [str(e)]).hex()
+            respuesta['error'] = {'code': 3, 'message': f"execution reverted: {e}", 'data': razon}
+        except ValueError as e:
+            respuesta['error'] = {'code': -32000, 'message': str(e)}
+        except Exception as e:
+            logging.error(f"Error en el nodo simulado ({peticion.get('method')}): {e}")
+            respuesta['error'] = {'code': -32603, 'message': str(e)}
+        return respuesta
+
+    # ------------------------------------------------------------------ bloques
+
+    def _ahora(self):
+        if self._marca_bloque is not None:
+            return self._marca_bloque
+        return int(time.time()) + self._desfase_tiempo
+
+    def _minar_bloque(self, hashes):
+        numero = len(self.bloques)
+        padre = self.bloques[-1]['hash'] if self.bloques else '0x' + '00' * 32
+        marca = max(self._ahora(), int(self.bloques[-1]['timestamp'], 16) if self.bloques else 0)
+        bloque = {
+            'number': _hex(numero),
+            'hash': '0x' + keccak(text=f"{padre}{numero}{marca}").hex(),
+            'parentHash': padre,
+            'timestamp': _hex(marca),
+            'gasLimit': _hex(LIMITE_GAS_BLOQUE),
+            'gasUsed': '0x0',
+            'baseFeePerGas': _hex(PRECIO_GAS // 2),
+            'miner': '0x' + '00' * 20,
+            'difficulty': '0x0',
+            'totalDifficulty': '0x0',
+            'extraData': '0x',
+            'size': '0x0',
+            'nonce': '0x0000000000000000',
+            'mixHash': '0x' + '00' * 32,
+            'sha3Uncles': '0x' + '00' * 32,
+            'logsBloom': '0x' + '00' * 256,
+            'transactionsRoot': '0x' + '00' * 32,
+            'stateRoot': '0x' + '00' * 32,
+            'receiptsRoot': '0x' + '00' * 32,
+            'uncles': [],
+            'transactions': hashes,
+        }
+        self.bloques.append(bloque)
+        return bloque
+
+    def _bloque(self, identificador):
+        if identificador in ('latest', 'pending', 'safe', 'finalized', None):
+            return self.bloques[-1]
+        if identificador == 'earliest':
+            return self.bloques[0]
+        numero = int(identificador, 16) if isinstance(identificador, str) else int(identificador)
+        return self.bloques[numero] if 0 <= numero < len(self.bloques) else None
+
+    def _get_block_by_number(self, params):
+        bloque = self._bloque(params[0])
+        if bloque is None:
+            return None
+        if len(params) > 1 and params[1]:
+            return dict(bloque, transactions=[self.transacciones[h] for h in bloque['transactions']])
+        return bloque
+
+    def _get_block_by_hash(self, params):
+        for bloque in self.bloques:
+            if bloque['hash'] == params[0].lower():
+                return self._get_block_by_number([bloque['number']] + list(params[1:]))
+        return None
+
+    def _get_code(self, params):
+        return '0x6080' if to_checksum_address(params[0]) in (self.contract_address, self.direccion_multicall) else '0x'
+
+    def _get_transaction_count(self, params):
+        direccion = to_checksum_address(params[0])
+        return _hex(self.nonces.get(direccion, 0))
+
+    def _fee_history(self, params):
+        bloques = min(int(params[0], 16) if isinstance(params[0], str) else int(params[0]), len(self.bloques))
+        percentiles = params[2] if len(params) > 2 else []
+        return {
+            'oldestBlock': _hex(len(self.bloques) - bloques),
+            'baseFeePerGas': [_hex(PRECIO_GAS // 2)] * (bloques + 1),
+            'gasUsedRatio': [0.5] * bloques,
+            'reward': [[_hex(10**9) for _ in percentiles] for _ in range(bloques)],
+        }
+
+    def _get_logs(self, params):
+        filtro = params[0] if params else {}
+        desde = self._bloque(filtro.get('fromBlock', 'earliest'))
+        hasta = self._bloque(filtro.get('toBlock', 'latest'))
+        desde = int(desde['number'], 16) if desde else 0
+        hasta = int(hasta['number'], 16) if hasta else len(self.bloques) - 1
+        direcciones = filtro.get('address')
+        if isinstance(direcciones, str):
+            direcciones = [direcciones]
+        direcciones = {d.lower() for d in direcciones} if direcciones else None
+        topics = filtro.get('topics') or []
+        resultado = []
+        for log in self.logs:
+            numero = int(log['blockNumber'], 16)
+            if numero < desde or numero > hasta:
+                continue
+            if direcciones is not None and log['address'].lower() not in direcciones:
+                continue
+            if not self._coinciden_topics(log['topics'], topics):
+                continue
+            resultado.append(log)
+        return resultado
+
+    @staticmethod
+    def _coinciden_topics(topics_log, filtro):
+        for posicion, esperado in enumerate(filtro):
+            if esperado is None:
+                continue
+            opciones = [esperado] if isinstance(esperado, str) else esperado
+            if posicion >= len(topics_log) or topics_log[posicion].lower() not in [o.lower() for o in opciones]:
+                return False
+        return True
+
+    # ------------------------------------------------------------------ llamadas y transacciones
+
+    def _call(self, params):
+        transaccion = params[0]
+        destino = to_checksum_address(transaccion.get('to'))
+        if destino == self.direccion_multicall:
+            return self._multicall(transaccion)
+        if destino != self.contract_address:
+            return '0x'
+        remitente = to_checksum_address(transaccion['from']) if transaccion.get('from') else '0x' + '00' * 20
+        nombre, args = self.codificador.decodificar_llamada(transaccion.get('data') or transaccion.get('input'))
+        valor = int(transaccion.get('value', '0x0'), 16)
+        resultado = self._ejecutar(nombre, args, remitente, valor, aplicar=False)
+        return self.codificador.codificar_resultado(nombre, resultado)
+
+    def _multicall(self, transaccion):
+        """Emula `aggregate3`, `getBlockNumber` y `getCurrentBlockTimestamp` del contrato Multicall."""
+        nombre, args = self.codificador_multicall.decodificar_llamada(transaccion.get('data') or transaccion.get('input'))
+        if nombre == 'getBlockNumber':
+            return self.codificador_multicall.codificar_resultado(nombre, [len(self.bloques) - 1])
+        if nombre == 'getCurrentBlockTimestamp':
+            return self.codificador_multicall.codificar_resultado(nombre, [int(self.bloques[-1]['timestamp'], 16)])
+        resultados = []
+        for destino, permitir_fallo, datos in args[0]:
+            try:
+                devuelto = bytes.fromhex(self._call([{'to': destino, 'data': '0x' + datos.hex()}])[2:])
+                resultados.append((True, devuelto))
+            except ReversionContrato as e:
+                if not permitir_fallo:
+                    raise
+                resultados.append((False, bytes.fromhex('08c379a0') + encode(['string'], [str(e)])))
+        return self.codificador_multicall.codificar_resultado(nombre, [resultados])
+
+    def _estimate_gas(self, params):
+        transaccion = params[0]
+        if not transaccion.get('to') or to_checksum_address(transaccion['to']) != self.contract_address:
+            return _hex(21000)
+        remitente = to_checksum_address(transaccion['from'])
+        nombre, args = self.codificador.decodificar_llamada(transaccion.get('data') or transaccion.get('input'))
+        self._ejecutar(nombre, args, remitente, int(transaccion.get('value', '0x0'), 16), aplicar=False)
+        return _hex(GAS_FUNCIONES.get(nombre, 30000))
+
+    def _decodificar_transaccion(self, crudo):
+        """Decodifica una transacción firmada (legacy, EIP-2930 o EIP-1559) y devuelve sus campos."""
+        remitente = Account.recover_transaction(crudo)
+        if crudo[0] == 2:
+            campos = rlp.decode(crudo[1:])
+            nonce, prioridad, precio, gas, destino, valor, datos = campos[1:8]
+            precio_gas = min(_entero(precio), PRECIO_GAS // 2 + _entero(prioridad))
+            tipo = 2
+        elif crudo[0] == 1:
+            campos = rlp.decode(crudo[1:])
+            nonce, precio, gas, destino, valor, datos = campos[1:7]
+            precio_gas = _entero(precio)
+            tipo = 1
+        else:
+            nonce, precio, gas, destino, valor, datos = rlp.decode(crudo)[:6]
+            precio_gas = _entero(precio)
+            tipo = 0
+        return {
+            'from': remitente,
+            'nonce': _entero(nonce),
+            'gas': _entero(gas),
+            'gasPrice': precio_gas,
+            'to': to_checksum_address(destino) if destino else None,
+            'value': _entero(valor),
+            'input': '0x' + bytes(datos).hex(),
+            'type': tipo,
+        }
+
+    def _send_raw_transaction(self, params):
+        crudo = bytes.fromhex(params[0][2:])
+        tx_hash = '0x' + keccak(crudo).hex()
+        transaccion = self._decodificar_transaccion(crudo)
+        transaccion['hash'] = tx_hash
+        esperado = self.nonces.get(transaccion['from'], 0)
+        if transaccion['nonce'] < esperado:
+            raise ValueError(f"nonce too low: next nonce {esperado}, tx nonce {transaccion['nonce']}")
+        if tx_hash in self.transacciones or transaccion['nonce'] in self.cola.get(transaccion['from'], {}):
+            raise ValueError('already known')
+        coste = transaccion['gas'] * transaccion['gasPrice'] + transaccion['value']
+        if self.saldos.get(transaccion['from'], 0) < coste:
+            raise ValueError('insufficient funds for gas * price + value')
+        self.cola.setdefault(transaccion['from'], {})[transaccion['nonce']] = transaccion
+        self._minar_cola(transaccion['from'])
+        return tx_hash
+
+    def _minar_cola(self, remitente):
+        """Mina, cada una en su bloque, las transacciones en cola del remitente cuyo nonce ya toca."""
+        cola = self.cola.get(remitente, {})
+        while self.nonces.get(remitente, 0) in cola:
+            transaccion = cola.pop(self.nonces.get(remitente, 0))
+            self._minar_transaccion(transaccion)
+
+    def _minar_transaccion(self, transaccion):
+        remitente = transaccion['from']
+        self.nonces[remitente] = transaccion['nonce'] + 1
+        estado, logs, gas_usado = 1, [], 21000
+        self._marca_bloque = max(self._ahora(), int(self.bloques[-1]['timestamp'], 16))
+        if transaccion['to'] == self.contract_address:
+            try:
+                nombre, args = self.codificador.decodificar_llamada(transaccion['input'])
+                gas_usado = GAS_FUNCIONES.get(nombre, 30000)
+                if gas_usado > transaccion['gas']:
+                    raise ReversionContrato('out of gas')
+                logs = self._ejecutar(nombre, args, remitente, transaccion['value'], aplicar=True) or []
+            except (ReversionContrato, KeyError) as e:
+                estado, logs, gas_usado = 0, [], min(transaccion['gas'], gas_usado)
+                transaccion['value'] = 0
+                logging.info(f"Transacción revertida en el nodo simulado: {e}")
+        self.saldos[remitente] = self.saldos.get(remitente, 0) - gas_usado * transaccion['gasPrice'] - transaccion['value']
+        if transaccion['to'] is not None:
+            self.saldos[transaccion['to']] = self.saldos.get(transaccion['to'], 0) + transaccion['value']
+
+        bloque = self._minar_bloque([transaccion['hash']])
+        self._marca_bloque = None
+        bloque['gasUsed'] = _hex(gas_usado)
+        comunes = {
+            'blockHash': bloque['hash'],
+            'blockNumber': bloque['number'],
+            'transactionHash': transaccion['hash'],
+            'transactionIndex': '0x0',
+        }
+        logs = [
+            dict(comunes, address=self.contract_address, topics=topics, data=datos, logIndex=_hex(indice), removed=False)
+            for indice, (topics, datos) in enumerate(logs)
+        ]
+        self.logs.extend(logs)
+        self.transacciones[transaccion['hash']] = dict(
+            comunes,
+            hash=transaccion['hash'],
+            nonce=_hex(transaccion['nonce']),
+            gas=_hex(transaccion['gas']),
+            gasPrice=_hex(transaccion['gasPrice']),
+            to=transaccion['to'],
+            value=_hex(transaccion['value']),
+            input=transaccion['input'],
+            type=_hex(transaccion['type']),
+            chainId=_hex(self.chain_id),
+            v='0x0', r='0x0', s='0x0',
+            **{'from': remitente},
+        )
+        self.recibos[transaccion['hash']] = dict(
+            comunes,
+            status=_hex(estado),
+            gasUsed=_hex(gas_usado),
+            cumulativeGasUsed=_hex(gas_usado),
+            effectiveGasPrice=_hex(transaccion['gasPrice']),
+            contractAddress=None,
+            to=transaccion['to'],
+            logs=logs,
+            logsBloom='0x' + '00' * 256,
+            type=_hex(transaccion['type']),
+            **{'from': remitente},
+        )
+
+    # ------------------------------------------------------------------ contrato PrestamoDeFi
+
+    def _cliente(self, direccion):
+        return self.clientes.setdefault(direccion, {'activado': False, 'saldoGarantia': 0, 'prestamos': {}, 'prestamoIds': []})
+
+    def _ejecutar(self, nombre, args, remitente, valor, aplicar):
+        """
+            Ejecuta una función del contrato. Las comprobaciones (`require`) se hacen siempre antes de modificar
+            el estado, por lo que con `aplicar=False` sirve para `eth_call` y `eth_estimateGas`.
+
+            Retorna:
+            Para las funciones de consulta, la lista de valores de retorno. Para las de escritura, la lista de
+            logs (topics, datos) emitidos.
+        """
+        def requiere(condicion, mensaje):
+            if not condicion:
+                raise ReversionContrato(mensaje)
+
+        def evento(nombre_evento, **valores):
+            return self.codificador.codificar_evento(nombre_evento, valores)
+
+        if nombre != 'depositarGarantia':
+            requiere(valor == 0, 'Function is not payable')
+        if nombre == 'socioPrincipal':
+            return [self.socio_principal]
+        if nombre == 'empleadosPrestamista':
+            return [self.empleados.get(args[0], False)]
+        if nombre == 'clientes':
+            cliente = self.clientes.get(args[0])
+            return [cliente['activado'], cliente['saldoGarantia']] if cliente else [False, 0]
+        if nombre == 'obtenerPrestamosPorPrestatario':
+            cliente = self.clientes.get(args[0])
+            return [list(cliente['prestamoIds']) if cliente else []]
+        if nombre == 'obtenerDetalleDePrestamo':
+            cliente = self.clientes.get(args[0])
+            prestamo = cliente['prestamos'].get(args[1]) if cliente else None
+            return [prestamo or (0, '0x' + '00' * 20, 0, 0, 0, 0, 0)]
+
+        if nombre == 'altaPrestamista':
+            requiere(remitente == self.socio_principal, 'No estas autorizado para realizar esta operacion')
+            requiere(not self.empleados.get(args[0]), 'El prestamista ya esta dado de alta')
+            if aplicar:
+                self.empleados[args[0]] = True
+            return []
+        if nombre == 'altaCliente':
+            requiere(self.empleados.get(remitente), 'No tienes el rol de prestamista')
+            requiere(not self._cliente(args[0])['activado'], 'El cliente ya esta registrado')
+            if aplicar:
+                self._cliente(args[0]).update(activado=True, saldoGarantia=0)
+            return []
+
+        cliente_remitente = self.clientes.get(remitente)
+        if nombre in ('depositarGarantia', 'solicitarPrestamo', 'reembolsarPrestamo'):
+            requiere(cliente_remitente and cliente_remitente['activado'], 'No estas registrado como cliente')
+        if nombre == 'depositarGarantia':
+            if aplicar:
+                cliente_remitente['saldoGarantia'] += valor
+            return []
+        if nombre == 'solicitarPrestamo':
+            monto, plazo = args
+            requiere(cliente_remitente['saldoGarantia'] >= monto, 'Saldo de garantia insuficiente')
+            if not aplicar:
+                return [len(cliente_remitente['prestamoIds']) + 1]
+            nuevo_id = len(cliente_remitente['prestamoIds']) + 1
+            cliente_remitente['prestamos'][nuevo_id] = (nuevo_id, remitente, monto, plazo, self._ahora(), 0, 0)
+            cliente_remitente['prestamoIds'].append(nuevo_id)
+            return [evento('SolicitudPrestamo', prestatario=remitente, monto=monto, plazo=plazo)]
+        if nombre == 'reembolsarPrestamo':
+            prestamo = cliente_remitente['prestamos'].get(args[0])
+            requiere(prestamo and prestamo[6] == 1, 'El prestamo no esta aprobado.')
+            requiere(self._ahora() <= prestamo[5], 'Tiempo de pago expirado.')
+            if not aplicar:
+                return []
+            cliente_remitente['saldoGarantia'] += prestamo[2]
+            cliente_remitente['prestamos'][args[0]] = prestamo[:6] + (2,)
+            return [evento('CambioEstadoPrestamo', prestatario=remitente, id=args[0], estado=2, monto=prestamo[2])]
+
+        # aprobarPrestamo y liquidarGarantia
+        requiere(self.empleados.get(remitente), 'No tienes el rol de prestamista')
+        prestatario, id_ = args
+        cliente = self._cliente(prestatario)
+        requiere(0 < id_ <= len(cliente['prestamoIds']), 'ID de prestamo no valido')
+        prestamo = cliente['prestamos'][id_]
+        if nombre == 'aprobarPrestamo':
+            requiere(prestamo[6] == 0, 'El prestamo no esta pendiente de aprobacion')
+            requiere(cliente['saldoGarantia'] >= prestamo[2], 'Garantia insuficiente para cubrir el prestamo')
+            if not aplicar:
+                return []
+            cliente['saldoGarantia'] -= prestamo[2]
+            cliente['prestamos'][id_] = prestamo[:5] + (self._ahora() + prestamo[3], 1)
+            return [evento('CambioEstadoPrestamo', prestatario=prestatario, id=id_, estado=1, monto=prestamo[2])]
+        if nombre == 'liquidarGarantia':
+            requiere(prestamo[6] == 1, 'El prestamo no esta aprobado')
+            requiere(self._ahora() > prestamo[5], 'Tiempo de pago no ha expirado')
+            if not aplicar:
+                return []
+            self.saldos[self.contract_address] = self.saldos.get(self.contract_address, 0) - prestamo[2]
+            self.saldos[self.socio_principal] = self.saldos.get(self.socio_principal, 0) + prestamo[2]
+            cliente['prestamos'][id_] = prestamo[:6] + (3,)
+            return [evento('CambioEstadoPrestamo', prestatario=prestatario, id=id_, estado=3, monto=prestamo[2])]
+        raise ReversionContrato(f"Función desconocida: {nombre}")
+
+if __name__ == "__main__":
+    nodo = NodoSimulado(puerto=7545)
+    print(f"Nodo simulado escuchando en {nodo.iniciar()} con el contrato en {nodo.contract_address}")
+    for cuenta in nodo.cuentas:
+        print(f"{cuenta.address} {cuenta.key.hex()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        nodo.detener()
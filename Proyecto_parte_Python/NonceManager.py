@@ -0,0 +1,167 @@
+import logging
+import threading
+
+# Fragmentos de los mensajes con los que los nodos (Ganache, geth, Anvil...) rechazan un nonce ya usado
+# o desincronizado. Se comparan en minúsculas.
+ERRORES_NONCE = (
+    'nonce too low',
+    'nonce is too low',
+    "doesn't have the correct nonce",
+    'invalid nonce',
+    'replacement transaction underpriced',
+)
+
+class NonceManager:
+    """
+        Asigna nonces localmente para cada cuenta emisora, de forma que varias transacciones de una misma
+        cuenta puedan estar en vuelo a la vez sin consultar `get_transaction_count` antes de cada envío.
+
+        El nonce de cada cuenta se sincroniza con el nodo la primera vez que se usa (contando también las
+        transacciones pendientes) y, a partir de ahí, se reserva en memoria. Si una transacción no llega a
+        difundirse, su nonce se libera y se reutiliza en la siguiente reserva para no dejar huecos. Si el nodo
+        rechaza un nonce ("nonce too low" y similares) se vuelve a sincronizar la cuenta con el nodo.
+
+        Atributos:
+        - web3 (Web3): Instancia de Web3 usada para consultar el número de transacciones de cada cuenta.
+
+        Métodos:
+        - reserve_nonce(self, address): Reserva el siguiente nonce libre de la cuenta.
+        - confirm_nonce(self, address, nonce): Marca un nonce como consumido en el nodo.
+        - release_nonce(self, address, nonce): Devuelve un nonce que no llegó a difundirse.
+        - resync(self, address): Vuelve a sincronizar la cuenta con el nodo.
+        - is_nonce_error(error): Indica si una excepción del nodo se debe a un nonce incorrecto.
+    """
+    def __init__(self, web3):
+        self.web3 = web3
+        self._lock = threading.Lock()
+        self._cuentas = {}
+
+    def _estado(self, address):
+        """
+            Devuelve el estado local de la cuenta, sincronizándolo con el nodo si todavía no existe.
+            Debe llamarse con el bloqueo adquirido.
+        """
+        estado = self._cuentas.get(address)
+        if estado is None:
+            estado = self._inicializar(address, self.web3.eth.get_transaction_count(address, 'pending'))
+        return estado
+
+    def _inicializar(self, address, pendientes):
+        estado = {'siguiente': pendientes, 'liberados': set(), 'en_vuelo': set()}
+        self._cuentas[address] = estado
+        return estado
+
+    def _reservar(self, estado):
+        if estado['liberados']:
+            nonce = min(estado['liberados'])
+            estado['liberados'].discard(nonce)
+        else:
+            nonce = estado['siguiente']
+            estado['siguiente'] += 1
+        estado['en_vuelo'].add(nonce)
+        return nonce
+
+    def reserve_nonce(self, address):
+        """
+            Reserva un nonce para una nueva transacción de la cuenta indicada.
+
+            Se reutiliza primero el nonce liberado más bajo (si lo hay), de modo que no queden huecos que
+            bloqueen las transacciones posteriores de la cuenta en el nodo.
+
+            Parámetros:
+            - address (str): Dirección Ethereum (checksum) de la cuenta emisora.
+
+            Retorna:
+            El nonce reservado (int).
+        """
+        with self._lock:
+            return self._reservar(self._estado(address))
+
+    def confirm_nonce(self, address, nonce):
+        """
+            Marca como consumido el nonce indicado, ya sea porque su transacción se difundió a la red o porque
+            el nodo indica que ya está usado. A partir de aquí el nonce pertenece al nodo y no se vuelve a entregar.
+        """
+        with self._lock:
+            estado = self._cuentas.get(address)
+            if estado is not None:
+                estado['en_vuelo'].discard(nonce)
+
+    def release_nonce(self, address, nonce):
+        """
+            Devuelve un nonce reservado cuya transacción no llegó a enviarse (error al construirla, firmarla o
+            rechazo del nodo por un motivo distinto del nonce), para que lo use la siguiente reserva.
+        """
+        with self._lock:
+            estado = self._cuentas.get(address)
+            if estado is None or nonce not in estado['en_vuelo']:
+                return
+            estado['en_vuelo'].discard(nonce)
+            if nonce == estado['siguiente'] - 1:
+                estado['siguiente'] = nonce
+                # Si el tope baja hasta otros nonces liberados, también se recogen.
+                while estado['siguiente'] - 1 in estado['liberados']:
+                    estado['siguiente'] -= 1
+                    estado['liberados'].discard(estado['siguiente'])
+            else:
+                estado['liberados'].add(nonce)
+
+    def resync(self, address):
+        """
+            Vuelve a sincronizar el nonce de la cuenta con el nodo.
+
+            Se usa cuando el nodo rechaza un nonce o cuando otra aplicación ha enviado transacciones con la
+            misma cuenta. Los nonces que el nodo ya conoce se descartan; si el nodo va por detrás (por ejemplo,
+            porque se descartaron transacciones) y no hay ninguna en vuelo, se retrocede hasta su valor.
+
+            Parámetros:
+            - address (str): Dirección Ethereum (checksum) de la cuenta.
+
+            Retorna:
+            El siguiente nonce que se entregará para la cuenta.
+        """
+        return self._aplicar_resync(address, self.web3.eth.get_transaction_count(address, 'pending'))
+
+    def _aplicar_resync(self, address, pendientes):
+        with self._lock:
+            estado = self._cuentas.get(address)
+            if estado is None:
+                estado = self._inicializar(address, pendientes)
+            elif pendientes >= estado['siguiente'] or not estado['en_vuelo']:
+                estado['siguiente'] = pendientes
+                estado['liberados'] = set()
+            else:
+                estado['liberados'] = {n for n in estado['liberados'] if n >= pendientes}
+            logging.info(f"Nonce de {address} resincronizado con el nodo: {estado['siguiente']}")
+            return estado['siguiente']
+
+    @staticmethod
+    def is_nonce_error(error):
+        """
+            Indica si la excepción devuelta por el nodo al enviar una transacción se debe a un nonce ya usado o
+            desincronizado, en cuyo caso conviene resincronizar la cuenta y reintentar con un nonce nuevo.
+        """
+        detalle = error.args[0] if getattr(error, 'args', None) else error
+        if isinstance(detalle, dict):
+            detalle = detalle.get('message', '')
+        mensaje = str(detalle).lower()
+        return any(fragmento in mensaje for fragmento in ERRORES_NONCE)
+
+class AsyncNonceManager(NonceManager):
+    """
+        Variante de `NonceManager` para `AsyncWeb3`: las consultas al nodo (`get_transaction_count`) se esperan
+        con `await`, mientras que la contabilidad local de nonces es la misma que en la versión síncrona.
+    """
+    async def reserve_nonce(self, address):
+        """Reserva un nonce para la cuenta, sincronizándola con el nodo la primera vez (ver NonceManager)."""
+        if address not in self._cuentas:
+            pendientes = await self.web3.eth.get_transaction_count(address, 'pending')
+            with self._lock:
+                if address not in self._cuentas:
+                    self._inicializar(address, pendientes)
+        with self._lock:
+            return self._reservar(self._cuentas[address])
+
+    async def resync(self, address):
+        """Vuelve a sincronizar el nonce de la cuenta con el nodo (ver NonceManager.resync)."""
+        return self._aplicar_resync(address, await self.web3.eth.get_transaction_count(address, 'pending'))
@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, IPCProvider, WebsocketProvider
+from web3.providers import JSONBaseProvider
+
+# Número de conexiones HTTP que se mantienen abiertas por endpoint (debe cubrir los hilos que llaman a la vez).
+TAMANO_POOL_DEFECTO = 32
+# Tiempo máximo de conexión y de respuesta de cada petición, en segundos.
+TIMEOUT_CONEXION = 3.05
+TIMEOUT_RESPUESTA = 30
+
+_sesiones = {}
+_sesiones_lock = threading.Lock()
+
+def crear_sesion(tamano_pool=TAMANO_POOL_DEFECTO, keep_alive=True):
+    """
+        Crea una sesión HTTP con un pool de `tamano_pool` conexiones persistentes.
+
+        El pool bloquea (`pool_block=True`) cuando todas las conexiones están ocupadas en lugar de abrir
+        conexiones extra que se cierran tras cada petición. Con `keep_alive=False` cada petición usa una
+        conexión nueva (solo tiene sentido para comparar en los benchmarks).
+    """
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamano_pool, pool_block=True)
+    sesion.mount('http://', adaptador)
+    sesion.mount('https://', adaptador)
+    if not keep_alive:
+        sesion.headers['Connection'] = 'close'
+    return sesion
+
+def obtener_sesion(endpoint_uri, tamano_pool=None):
+    """
+        Devuelve la sesión HTTP compartida del endpoint con un pool de `tamano_pool` conexiones, creándola la
+        primera vez. Cada tamaño de pool tiene su propia sesión, de modo que quien pide otro tamaño no recibe el
+        pool de quien llegó antes.
+
+        Sin `tamano_pool` (como las peticiones por lotes de RpcBatch) devuelve la sesión del endpoint con el pool
+        más grande o, si no hay ninguna, una de TAMANO_POOL_DEFECTO conexiones: así el proveedor de Web3 y
+        RpcBatch reutilizan las mismas conexiones.
+    """
+    with _sesiones_lock:
+        if tamano_pool is None:
+            tamano_pool = max((tamano for uri, tamano in _sesiones if uri == endpoint_uri),
+                              default=TAMANO_POOL_DEFECTO)
+        sesion = _sesiones.get((endpoint_uri, tamano_pool))
+        if sesion is None:
+            sesion = crear_sesion(tamano_pool)
+            _sesiones[(endpoint_uri, tamano_pool)] = sesion
+        return sesion
+
+def cerrar_sesiones():
+    """Cierra todas las sesiones compartidas y sus conexiones."""
+    with _sesiones_lock:
+        for sesion in _sesiones.values():
+            sesion.close()
+        _sesiones.clear()
+
+class ProveedorHTTP(HTTPProvider):
+    """
+        HTTPProvider que envía todas las peticiones por una única sesión compartida entre hilos.
+
+        El HTTPProvider de Web3 guarda una sesión distinta por hilo (y como mucho 100, cerrando las que expulsa),
+        así que con muchos hilos abre y cierra conexiones continuamente; aunque se le pase `session=`, solo la
+        usa el hilo que creó el proveedor. Aquí todos los hilos comparten el pool de conexiones de `sesion`.
+    """
+    def __init__(self, endpoint_uri, sesion, timeout=TIMEOUT_RESPUESTA):
+        super().__init__(endpoint_uri, request_kwargs={'timeout': (TIMEOUT_CONEXION, timeout)})
+        self.sesion = sesion
+
+    def make_request(self, method, params):
+        peticion = self.encode_rpc_request(method, params)
+        respuesta = self.sesion.post(self.endpoint_uri, data=peticion, **self.get_request_kwargs())
+        respuesta.raise_for_status()
+        return self.decode_rpc_response(respuesta.content)
+
+class ProveedorHTTP2(JSONBaseProvider):
+    """
+        Proveedor JSON-RPC sobre HTTP/2 (una sola conexión multiplexada para todas las peticiones concurrentes).
+        Requiere el paquete opcional `httpx[http2]`; el nodo debe aceptar HTTP/2 (normalmente detrás de un proxy
+        con TLS).
+    """
+    def __init__(self, endpoint_uri, timeout=TIMEOUT_RESPUESTA):
+        super().__init__()
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("El transporte HTTP/2 requiere el paquete opcional 'httpx[http2]'.")
+        self.endpoint_uri = endpoint_uri
+        self._cliente = httpx.Client(http2=True, timeout=timeout)
+
+    def make_request(self, method, params):
+        peticion = self.encode_rpc_request(method, params)
+        respuesta = self._cliente.post(self.endpoint_uri, content=peticion,
+                                       headers={'Content-Type': 'application/json'})
+        respuesta.raise_for_status()
+        return self.decode_rpc_response(respuesta.content)
+
+def crear_proveedor(url, tamano_pool=TAMANO_POOL_DEFECTO, timeout=TIMEOUT_RESPUESTA, http2=False):
+    """
+        Crea el proveedor de Web3 adecuado para la URL del nodo.
+
+        Parámetros:
+        - url (str o list): 'http(s)://...' para JSON-RPC sobre HTTP, 'ws(s)://...' para WebSocket o la ruta
+        del socket IPC del nodo (por ejemplo, '~/.ethereum/geth.ipc'). Con una lista de URLs se crea un
+        ProveedorRouter que reparte las peticiones entre todos los nodos.
+        - tamano_pool (int, opcional): Conexiones HTTP persistentes compartidas por todos los hilos.
+        - timeout (float, opcional): Tiempo máximo de respuesta de cada petición, en segundos.
+        - http2 (bool, opcional): Usa HTTP/2 (requiere `httpx[http2]`) en lugar de HTTP/1.1.
+
+        Retorna:
+        Un proveedor de Web3 (ProveedorHTTP con la sesión compartida del endpoint, WebsocketProvider,
+        IPCProvider, ProveedorHTTP2 o ProveedorRouter).
+    """
+    if isinstance(url, (list, tuple)):
+        from RouterRPC import ProveedorRouter
+        if len(url) > 1:
+            return ProveedorRouter([(u, crear_proveedor(u, tamano_pool, timeout, http2)) for u in url])
+        url = url[0]
+    if url.startswith(('ws://', 'wss://')):
+        return WebsocketProvider(url, websocket_timeout=timeout)
+    if url.startswith(('http://', 'https://')):
+        if http2:
+            return ProveedorHTTP2(url, timeout)
+        return ProveedorHTTP(url, obtener_sesion(url, tamano_pool), timeout)
+    ruta = os.path.expanduser(url)
+    if os.path.exists(ruta):
+        return IPCProvider(ruta, timeout=timeout)
+    raise ValueError(f"No se reconoce el transporte de la URL del nodo: {url}")
+
+async def configurar_sesion_async(proveedor, tamano_pool=TAMANO_POOL_DEFECTO, keep_alive=True):
+    """
+        Asigna a un AsyncHTTPProvider una sesión aiohttp con un pool de `tamano_pool` conexiones persistentes
+        (por defecto aiohttp limita a 100 conexiones y cada hilo del proveedor crea su propia sesión).
+    """
+    import aiohttp
+    conector = aiohttp.TCPConnector(limit=tamano_pool, force_close=not keep_alive)
+    sesion = aiohttp.ClientSession(connector=conector,
+                                   timeout=aiohttp.ClientTimeout(total=TIMEOUT_RESPUESTA,
+                                                                 connect=TIMEOUT_CONEXION))
+    await proveedor.cache_async_session(sesion)
+    logging.info(f"Sesión aiohttp con {tamano_pool} conexiones asignada a {proveedor.endpoint_uri}")
+    return sesion
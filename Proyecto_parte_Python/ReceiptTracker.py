@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+
+from RpcBatch import ejecutar_lote
+
+class TransactionHandle(Future):
+    """
+        Manejador de una transacción ya difundida a la red cuyo recibo todavía no se conoce.
+
+        Es un `concurrent.futures.Future`: `result(timeout)` bloquea hasta que la transacción se mina y devuelve
+        su recibo, `done()` permite consultar sin bloquear y `add_done_callback` registra funciones que se
+        ejecutan al resolverse. Si la transacción se revierte (estado 0) o no se mina a tiempo, el futuro
+        termina con una excepción (`ValueError` o `TimeExhausted`).
+
+        Atributos:
+        - tx_hash (str): Hash de la transacción en hexadecimal.
+        - account_address (str): Dirección de la cuenta que envió la transacción.
+        - nonce (int): Nonce usado por la transacción.
+        - sent_at (float): Instante (time.monotonic) en que se difundió la transacción.
+        - receipt (AttributeDict): Recibo de la transacción una vez minada (también si se revirtió), o None.
+    """
+    def __init__(self, tx_hash, account_address=None, nonce=None):
+        super().__init__()
+        self.tx_hash = tx_hash
+        self.account_address = account_address
+        self.nonce = nonce
+        self.sent_at = time.monotonic()
+        self.receipt = None
+
+    def __repr__(self):
+        return f"<TransactionHandle {self.tx_hash} nonce={self.nonce} done={self.done()}>"
+
+class ReceiptTracker:
+    """
+        Sigue en segundo plano las transacciones difundidas y resuelve sus `TransactionHandle` cuando aparecen
+        los recibos.
+
+        Un único hilo consulta periódicamente al nodo por todos los hashes pendientes usando peticiones JSON-RPC
+        por lotes (`eth_getTransactionReceipt`), de modo que cientos de operaciones pueden estar en vuelo sin
+        dedicar un hilo bloqueado a cada una.
+
+        Atributos:
+        - web3 (Web3): Instancia de Web3 usada para consultar los recibos.
+        - poll_interval (float): Segundos entre consultas al nodo.
+        - batch_size (int): Número máximo de hashes consultados por petición.
+        - timeout (float): Segundos tras los que una transacción no minada se da por perdida, también si el nodo
+        no responde o devuelve un error al pedir su recibo.
+
+        Métodos:
+        - track(self, tx_hash, account_address, nonce): Empieza a seguir una transacción y devuelve su manejador.
+        - pending_count(self): Número de transacciones todavía pendientes.
+        - stop(self): Detiene el hilo de seguimiento.
+        - trasladar(self, destino): Pasa las transacciones pendientes a otro ReceiptTracker.
+        - abandonar(self, excepcion): Resuelve las transacciones pendientes con una excepción.
+    """
+    def __init__(self, web3, poll_interval=0.5, batch_size=100, timeout=120):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def track(self, tx_hash, account_address=None, nonce=None):
+        """
+            Registra una transacción difundida para seguir su recibo.
+
+            Parámetros:
+            - tx_hash (bytes o str): Hash devuelto por `send_raw_transaction`.
+            - account_address (str, opcional): Cuenta que envió la transacción.
+            - nonce (int, opcional): Nonce de la transacción.
+
+            Retorna:
+            El `TransactionHandle` que se resolverá con el recibo de la transacción. Si ya se está siguiendo (por
+            ejemplo, una transacción que se vuelve a difundir), el mismo manejador de antes.
+        """
+        tx_hash = tx_hash if isinstance(tx_hash, str) else self.web3.to_hex(tx_hash)
+        with self._lock:
+            handle = self._pendientes.get(tx_hash)
+            if handle is not None:
+                return handle
+            handle = TransactionHandle(tx_hash, account_address, nonce)
+            self._pendientes[tx_hash] = handle
+            self._arrancar()
+        self._despertar.set()
+        return handle
+
+    def _arrancar(self):
+        """Arranca el hilo de seguimiento si no está en marcha. Debe llamarse con el bloqueo adquirido."""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name='ReceiptTracker', daemon=True)
+            self._hilo.start()
+
+    def pending_count(self):
+        """Devuelve el número de transacciones cuyo recibo todavía no se ha recibido."""
+        with self._lock:
+            return len(self._pendientes)
+
+    def stop(self):
+        """Detiene el hilo de seguimiento. Las transacciones pendientes quedan sin resolver (ver `trasladar`)."""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def _vaciar(self):
+        self.stop()
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        return pendientes
+
+    def trasladar(self, destino):
+        """
+            Detiene el seguimiento y pasa las transacciones pendientes a `destino` (por ejemplo, el ReceiptTracker
+            de una nueva conexión) con los mismos `TransactionHandle`, que se resolverán cuando `destino` vea sus
+            recibos. El plazo de `timeout` sigue contando desde la difusión de cada transacción.
+
+            Retorna:
+            El número de transacciones trasladadas.
+        """
+        pendientes = self._vaciar()
+        with destino._lock:
+            for tx_hash, handle in pendientes.items():
+                destino._pendientes.setdefault(tx_hash, handle)
+            if pendientes:
+                destino._arrancar()
+        destino._despertar.set()
+        return len(pendientes)
+
+    def abandonar(self, excepcion):
+        """Detiene el seguimiento y resuelve todas las transacciones pendientes con `excepcion`."""
+        for handle in self._vaciar().values():
+            handle.set_exception(excepcion)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            with self._lock:
+                pendientes = list(self._pendientes.items())
+            if pendientes:
+                try:
+                    self._consultar(pendientes)
+                except Exception as e:
+                    logging.error(f"Error al consultar recibos pendientes: {e}")
+                self._caducar(pendientes)
+            self._despertar.wait(self.poll_interval)
+            self._despertar.clear()
+
+    def _consultar(self, pendientes):
+        llamadas = [('eth_getTransactionReceipt', [tx_hash]) for tx_hash, _ in pendientes]
+        respuestas = ejecutar_lote(self.web3, llamadas, self.batch_size)
+        for (tx_hash, handle), respuesta in zip(pendientes, respuestas):
+            if 'error' in respuesta:
+                logging.error(f"Error al obtener el recibo de {tx_hash}: {respuesta['error']}")
+                continue
+            resultado = respuesta.get('result')
+            if resultado:
+                self._resolver(tx_hash, handle, AttributeDict.recursive(receipt_formatter(resultado)))
+
+    def _caducar(self, pendientes):
+        """Da por perdidas las transacciones sin recibo que llevan más de `timeout` segundos difundidas."""
+        ahora = time.monotonic()
+        for tx_hash, handle in pendientes:
+            if not handle.done() and ahora - handle.sent_at > self.timeout:
+                self._retirar(tx_hash)
+                handle.set_exception(TimeExhausted(
+                    f"La transacción {tx_hash} no se minó en {self.timeout} segundos."))
+
+    def _retirar(self, tx_hash):
+        with self._lock:
+            self._pendientes.pop(tx_hash, None)
+
+    def _resolver(self, tx_hash, handle, receipt):
+        self._retirar(tx_hash)
+        handle.receipt = receipt
+        if receipt.status == 0:
+            logging.error("La transacción falló. Recibo: {}".format(receipt))
+            handle.set_exception(ValueError("La transacción falló."))
+        else:
+            logging.info("Transacción exitosa. Recibo: {}".format(receipt))
+            handle.set_result(receipt)
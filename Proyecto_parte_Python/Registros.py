@@ -0,0 +1,216 @@
+from array import array
+
+from ContractUtils import formatear_detalle_prestamo, formatear_fecha, mapear_estado_prestamo, wei_to_ether
+
+# Bytes de cada monto en ColeccionPrestamos: un uint256 en big-endian, como en la ABI.
+BYTES_MONTO = 32
+# Valor que ocupa en las columnas 'Q' de ColeccionPrestamos un plazo o tiempo (uint256) que no cabe en 64 bits; el
+# valor exacto se guarda aparte.
+VALOR_FUERA_DE_RANGO = 2 ** 64 - 1
+
+class Prestamo:
+    """
+        Préstamo tal como lo devuelve `obtenerDetalleDePrestamo`: importes en wei y tiempos en segundos (epoch).
+        Usa `__slots__`, por lo que ocupa una fracción de un diccionario con los mismos campos, y no convierte
+        nada al crearse: el monto en ether, las fechas y el nombre del estado se calculan solo al mostrarlo.
+
+        Atributos:
+        - id (int), prestatario (str), monto (int, wei), plazo (int, segundos), tiempo_solicitud (int),
+        tiempo_limite (int), estado (int, código de EstadoPrestamo).
+
+        Métodos:
+        - desde_tupla(cls, tupla): Crea el registro a partir de la struct decodificada.
+        - formatear(self): Diccionario legible (ver `formatear_detalle_prestamo`).
+    """
+    __slots__ = ('id', 'prestatario', 'monto', 'plazo', 'tiempo_solicitud', 'tiempo_limite', 'estado')
+
+    def __init__(self, id, prestatario, monto, plazo, tiempo_solicitud, tiempo_limite, estado):
+        self.id = id
+        self.prestatario = prestatario
+        self.monto = monto
+        self.plazo = plazo
+        self.tiempo_solicitud = tiempo_solicitud
+        self.tiempo_limite = tiempo_limite
+        self.estado = estado
+
+    @classmethod
+    def desde_tupla(cls, tupla):
+        """Crea el registro a partir de la struct Prestamo decodificada (mismo orden de campos)."""
+        return cls(*tupla)
+
+    def __iter__(self):
+        """Recorre los campos en el orden de la struct, de modo que `tuple(prestamo)` es la struct original."""
+        return iter((self.id, self.prestatario, self.monto, self.plazo, self.tiempo_solicitud, self.tiempo_limite,
+                     self.estado))
+
+    def __eq__(self, otro):
+        return isinstance(otro, Prestamo) and tuple(self) == tuple(otro)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    @property
+    def monto_ether(self):
+        return wei_to_ether(self.monto)
+
+    @property
+    def fecha_solicitud(self):
+        return formatear_fecha(self.tiempo_solicitud)
+
+    @property
+    def fecha_limite(self):
+        return formatear_fecha(self.tiempo_limite)
+
+    @property
+    def nombre_estado(self):
+        return mapear_estado_prestamo(self.estado)
+
+    def formatear(self):
+        """Devuelve el diccionario legible de `formatear_detalle_prestamo` (monto en ether, fechas en texto)."""
+        return formatear_detalle_prestamo(tuple(self))
+
+    def __repr__(self):
+        return (f"Prestamo(id={self.id}, prestatario={self.prestatario!r}, monto={self.monto}, plazo={self.plazo}, "
+                f"tiempo_solicitud={self.tiempo_solicitud}, tiempo_limite={self.tiempo_limite}, estado={self.estado})")
+
+    def __str__(self):
+        limite = self.fecha_limite if self.tiempo_limite else '-'
+        return (f"Préstamo #{self.id} de {self.prestatario}: {self.monto_ether} ETH "
+                f"a {self.plazo / 86400:g} día(s), solicitado el {self.fecha_solicitud}, límite {limite}, "
+                f"{self.nombre_estado}")
+
+class Cliente:
+    """
+        Cliente tal como lo devuelve el getter `clientes(address)`, con el saldo de garantía en wei.
+
+        Atributos:
+        - direccion (str), activado (bool), saldo_garantia (int, wei).
+    """
+    __slots__ = ('direccion', 'activado', 'saldo_garantia')
+
+    def __init__(self, direccion, activado, saldo_garantia):
+        self.direccion = direccion
+        self.activado = activado
+        self.saldo_garantia = saldo_garantia
+
+    def __iter__(self):
+        """Recorre (activado, saldo_garantia), los campos del getter, para poder desempaquetar el registro."""
+        return iter((self.activado, self.saldo_garantia))
+
+    def __eq__(self, otro):
+        return (isinstance(otro, Cliente) and
+                (self.direccion, self.activado, self.saldo_garantia) == (otro.direccion, otro.activado,
+                                                                         otro.saldo_garantia))
+
+    def __hash__(self):
+        return hash((self.direccion, self.activado, self.saldo_garantia))
+
+    @property
+    def saldo_ether(self):
+        return wei_to_ether(self.saldo_garantia)
+
+    def formatear(self):
+        """Devuelve un diccionario legible con el saldo de garantía en ether."""
+        return {'direccion': self.direccion, 'activado': self.activado, 'saldoGarantia': self.saldo_ether}
+
+    def __repr__(self):
+        return f"Cliente(direccion={self.direccion!r}, activado={self.activado}, saldo_garantia={self.saldo_garantia})"
+
+    def __str__(self):
+        activado = 'activado' if self.activado else 'no activado'
+        return f"Cliente {self.direccion}: {activado}, {self.saldo_ether} ETH de garantía"
+
+class ColeccionPrestamos:
+    """
+        Conjunto grande de préstamos guardado por columnas en arrays compactos (módulo `array`), sin un objeto
+        por préstamo: unos 70 bytes por préstamo frente a más de 500 de un diccionario formateado. El prestatario
+        se guarda como índice en `direcciones` y el monto como uint256 de 32 bytes, por lo que no se pierde
+        precisión. Un plazo o tiempo que no cabe en 64 bits ocupa VALOR_FUERA_DE_RANGO en su columna y su valor
+        exacto se guarda en un diccionario aparte. Al acceder a un elemento se crea su `Prestamo`.
+
+        Atributos:
+        - direcciones (list): Direcciones de los prestatarios; `prestatario[i]` es el índice de la del préstamo i.
+        - prestatario (array 'I'), id, plazo, tiempo_solicitud, tiempo_limite (array 'Q'), estado (array 'B').
+
+        Métodos:
+        - agregar(self, tupla): Añade la struct Prestamo decodificada.
+        - extender(self, tuplas): Añade muchas structs.
+        - monto(self, indice): Monto en wei de un préstamo.
+        - columnas_numpy(self): Vistas NumPy de las columnas, sin copiarlas (requiere numpy).
+    """
+    # Columnas uint256 del contrato guardadas en arrays 'Q', con los valores fuera de rango aparte.
+    COLUMNAS_64_BITS = ('plazo', 'tiempo_solicitud', 'tiempo_limite')
+
+    def __init__(self, tuplas=()):
+        self.direcciones = []
+        self._indices = {}
+        self.prestatario = array('I')
+        self.id = array('Q')
+        self._montos = bytearray()
+        self.plazo = array('Q')
+        self.tiempo_solicitud = array('Q')
+        self.tiempo_limite = array('Q')
+        self.estado = array('B')
+        self._fuera_de_rango = {}
+        self.extender(tuplas)
+
+    def agregar(self, tupla):
+        prestamo_id, prestatario, monto, plazo, tiempo_solicitud, tiempo_limite, estado = tupla
+        indice = self._indices.get(prestatario)
+        if indice is None:
+            indice = self._indices[prestatario] = len(self.direcciones)
+            self.direcciones.append(prestatario)
+        self.prestatario.append(indice)
+        self.id.append(prestamo_id)
+        self._montos += monto.to_bytes(BYTES_MONTO, 'big')
+        for nombre, valor in zip(self.COLUMNAS_64_BITS, (plazo, tiempo_solicitud, tiempo_limite)):
+            columna = getattr(self, nombre)
+            if valor >= VALOR_FUERA_DE_RANGO:
+                self._fuera_de_rango[(nombre, len(columna))] = valor
+                valor = VALOR_FUERA_DE_RANGO
+            columna.append(valor)
+        self.estado.append(estado)
+
+    def extender(self, tuplas):
+        for tupla in tuplas:
+            self.agregar(tupla)
+
+    def __len__(self):
+        return len(self.id)
+
+    def monto(self, indice):
+        inicio = indice * BYTES_MONTO
+        return int.from_bytes(self._montos[inicio:inicio + BYTES_MONTO], 'big')
+
+    def _valor(self, nombre, indice):
+        valor = getattr(self, nombre)[indice]
+        return self._fuera_de_rango.get((nombre, indice), valor) if valor == VALOR_FUERA_DE_RANGO else valor
+
+    def __getitem__(self, indice):
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError("Índice de préstamo fuera de rango.")
+        return Prestamo(self.id[indice], self.direcciones[self.prestatario[indice]], self.monto(indice),
+                        self._valor('plazo', indice), self._valor('tiempo_solicitud', indice),
+                        self._valor('tiempo_limite', indice), self.estado[indice])
+
+    def __iter__(self):
+        for indice in range(len(self)):
+            yield self[indice]
+
+    def columnas_numpy(self):
+        """
+            Vistas NumPy de las columnas, sin copiar los datos (no se debe añadir préstamos mientras se usan).
+
+            Retorna:
+            Un diccionario con 'prestatario', 'id', 'plazo', 'tiempo_solicitud', 'tiempo_limite' y 'estado'
+            (vectores; los plazos y tiempos fuera de rango valen VALOR_FUERA_DE_RANGO) y 'monto' (matriz (n, 8)
+            uint32 con los limbs de 32 bits de cada monto, el menos significativo primero).
+        """
+        import numpy as np
+        columnas = {nombre: np.frombuffer(getattr(self, nombre), dtype=getattr(self, nombre).typecode)
+                    for nombre in ('prestatario', 'id', 'plazo', 'tiempo_solicitud', 'tiempo_limite', 'estado')}
+        limbs = np.frombuffer(self._montos, dtype='>u4').reshape(len(self), BYTES_MONTO // 4)
+        columnas['monto'] = limbs[:, ::-1]
+        return columnas
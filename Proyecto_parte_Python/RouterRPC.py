@@ -0,0 +1,236 @@
+import logging
+import random
+import threading
+import time
+
+from web3.providers import JSONBaseProvider
+
+# Métodos que dependen del estado de las transacciones enviadas y deben ir al mismo nodo que las escrituras.
+METODOS_FIJADOS = {
+    'eth_sendRawTransaction',
+    'eth_sendTransaction',
+    'eth_getTransactionCount',
+    'eth_getTransactionReceipt',
+    'eth_getTransactionByHash',
+}
+
+class NodoRPC:
+    """
+        Estado de un endpoint del router: su proveedor, la latencia media observada (media móvil exponencial),
+        las peticiones en curso y los fallos y éxitos consecutivos que deciden si está activo.
+    """
+    def __init__(self, url, proveedor):
+        self.url = url
+        self.proveedor = proveedor
+        self.latencia = None
+        self.en_vuelo = 0
+        self.fallos = 0
+        self.exitos = 0
+        self.activo = True
+        self.ultimo_bloque = None
+
+    def puntuacion(self):
+        """Coste estimado de enviar una petición a este nodo: latencia media por peticiones en cola."""
+        return (self.latencia if self.latencia is not None else 0.0) * (self.en_vuelo + 1)
+
+    def __repr__(self):
+        latencia = f"{self.latencia * 1000:.1f} ms" if self.latencia is not None else "-"
+        return f"<NodoRPC {self.url} activo={self.activo} latencia={latencia} en_vuelo={self.en_vuelo}>"
+
+class ProveedorRouter(JSONBaseProvider):
+    """
+        Proveedor de Web3 que reparte las peticiones entre varios nodos JSON-RPC.
+
+        - Lecturas (`eth_call`, bloques, logs...): se elige entre dos nodos activos al azar el de menor latencia
+        media ponderada por sus peticiones en curso ("power of two choices"), de modo que la carga se reparte
+        y un nodo lento recibe cada vez menos peticiones. Si la petición falla por un error de transporte, se
+        reintenta en otro nodo.
+        - Escrituras y consultas ligadas a ellas (`eth_sendRawTransaction`, nonce, recibos): van siempre al mismo
+        nodo activo (fijado), para que el nonce y los recibos sean coherentes; si cae, se fija otro.
+        - Sondeo de salud: un hilo consulta `eth_blockNumber` a todos los nodos cada `intervalo_sondeo`
+        segundos. Un nodo se retira tras `max_fallos` fallos seguidos o si va más de `max_retraso_bloques`
+        bloques por detrás del más avanzado, y se readmite tras `exitos_readmision` sondeos correctos.
+
+        Atributos:
+        - nodos (list): Lista de NodoRPC en el orden de las URLs recibidas.
+        - endpoint_uri (str): URL del nodo fijado para escrituras.
+
+        Métodos:
+        - make_request(self, method, params): Envía una petición JSON-RPC al nodo que corresponda.
+        - ejecutar_lote(self, llamadas, enviar): Envía un lote JSON-RPC al nodo que corresponda (usado por RpcBatch).
+        - sondear(self): Ejecuta una ronda de sondeo de salud.
+        - detener(self): Detiene el hilo de sondeo.
+    """
+    def __init__(self, proveedores, intervalo_sondeo=5.0, max_fallos=3, exitos_readmision=2, max_retraso_bloques=5,
+                 reintentos=2):
+        super().__init__()
+        if not proveedores:
+            raise ValueError("El router necesita al menos un endpoint.")
+        self.nodos = [NodoRPC(url, proveedor) for url, proveedor in proveedores]
+        self.intervalo_sondeo = intervalo_sondeo
+        self.max_fallos = max_fallos
+        self.exitos_readmision = exitos_readmision
+        self.max_retraso_bloques = max_retraso_bloques
+        self.reintentos = reintentos
+        self._fijado = self.nodos[0]
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._sondear_periodicamente, name='ProveedorRouter', daemon=True)
+        self._hilo.start()
+
+    @property
+    def endpoint_uri(self):
+        return self._nodo_fijado().url
+
+    def __repr__(self):
+        return f"<ProveedorRouter {self.nodos}>"
+
+    # ------------------------------------------------------------------ selección de nodos
+
+    def _activos(self, excluidos=()):
+        activos = [nodo for nodo in self.nodos if nodo.activo and nodo not in excluidos]
+        # Si todos están retirados se sigue intentando con todos antes que fallar sin más.
+        return activos or [nodo for nodo in self.nodos if nodo not in excluidos]
+
+    def _nodo_lectura(self, excluidos=()):
+        with self._lock:
+            candidatos = self._activos(excluidos)
+            if not candidatos:
+                return None
+            # Los nodos todavía sin medir reciben una sola petición a la vez hasta conocer su latencia, para no
+            # mandar una ráfaga entera a un nodo que puede ser lento.
+            sin_medir = [nodo for nodo in candidatos if nodo.latencia is None and not nodo.en_vuelo]
+            if sin_medir:
+                return random.choice(sin_medir)
+            medidos = [nodo for nodo in candidatos if nodo.latencia is not None] or candidatos
+            if len(medidos) == 1:
+                return medidos[0]
+            a, b = random.sample(medidos, 2)
+            return a if a.puntuacion() <= b.puntuacion() else b
+
+    def _nodo_fijado(self, excluidos=()):
+        with self._lock:
+            if self._fijado.activo and self._fijado not in excluidos:
+                return self._fijado
+            candidatos = self._activos(excluidos)
+            if not candidatos:
+                return None
+            nuevo = min(candidatos, key=lambda nodo: nodo.latencia if nodo.latencia is not None else float('inf'))
+            if nuevo is not self._fijado:
+                logging.error(f"Nodo de escrituras {self._fijado.url} no disponible, se fija {nuevo.url}")
+                self._fijado = nuevo
+            return nuevo
+
+    # ------------------------------------------------------------------ estadísticas
+
+    def _registrar_exito(self, nodo, segundos):
+        with self._lock:
+            nodo.latencia = segundos if nodo.latencia is None else 0.8 * nodo.latencia + 0.2 * segundos
+            nodo.fallos = 0
+
+    def _registrar_fallo(self, nodo, error):
+        with self._lock:
+            nodo.fallos += 1
+            nodo.exitos = 0
+            if nodo.activo and nodo.fallos >= self.max_fallos:
+                nodo.activo = False
+                logging.error(f"Nodo {nodo.url} retirado tras {nodo.fallos} fallos: {error}")
+
+    # ------------------------------------------------------------------ peticiones
+
+    def _con_reintentos(self, fijado, descripcion, enviar, propagar=()):
+        """
+            Ejecuta `enviar(nodo)` en el nodo fijado o en uno de lectura y, si falla por un error de transporte,
+            lo reintenta en otro nodo. Las excepciones de `propagar` son respuestas del nodo y no se reintentan.
+        """
+        probados, error = [], None
+        for _ in range(self.reintentos + 1):
+            nodo = self._nodo_fijado(probados) if fijado else self._nodo_lectura(probados)
+            if nodo is None:
+                break
+            probados.append(nodo)
+            with self._lock:
+                nodo.en_vuelo += 1
+            inicio = time.perf_counter()
+            try:
+                respuesta = enviar(nodo)
+            except propagar:
+                raise
+            except Exception as e:
+                # Error de transporte (conexión, timeout, HTTP): se penaliza el nodo y se prueba otro.
+                self._registrar_fallo(nodo, e)
+                error = e
+                continue
+            finally:
+                with self._lock:
+                    nodo.en_vuelo -= 1
+            self._registrar_exito(nodo, time.perf_counter() - inicio)
+            return respuesta
+        raise ConnectionError(f"Ningún nodo pudo atender {descripcion}: {error}")
+
+    def make_request(self, method, params):
+        return self._con_reintentos(method in METODOS_FIJADOS, method,
+                                    lambda nodo: nodo.proveedor.make_request(method, params))
+
+    def ejecutar_lote(self, llamadas, enviar):
+        """
+            Envía un lote JSON-RPC con el mismo reparto, reintentos y estadísticas que `make_request`: al nodo
+            fijado si contiene escrituras o consultas ligadas a ellas y, si no, a un nodo de lectura.
+
+            Parámetros:
+            - llamadas (list): Tuplas (metodo, params) del lote.
+            - enviar (callable): Función `enviar(url, llamadas)` que envía el lote a un nodo y devuelve las
+            respuestas. Un `ValueError` (el nodo no admite lotes) se propaga sin reintentar.
+
+            Retorna:
+            Las respuestas de `enviar`.
+        """
+        fijado = any(metodo in METODOS_FIJADOS for metodo, _ in llamadas)
+        return self._con_reintentos(fijado, f"un lote de {len(llamadas)} llamadas",
+                                    lambda nodo: enviar(nodo.url, llamadas), propagar=ValueError)
+
+    # ------------------------------------------------------------------ sondeo de salud
+
+    def sondear(self):
+        """Consulta `eth_blockNumber` a todos los nodos y actualiza cuáles están activos."""
+        resultados = []
+        for nodo in self.nodos:
+            inicio = time.perf_counter()
+            try:
+                respuesta = nodo.proveedor.make_request('eth_blockNumber', [])
+                bloque = int(respuesta['result'], 16)
+            except Exception as e:
+                self._registrar_fallo(nodo, e)
+                continue
+            self._registrar_exito(nodo, time.perf_counter() - inicio)
+            resultados.append((nodo, bloque))
+        if not resultados:
+            return
+        mejor = max(bloque for _, bloque in resultados)
+        with self._lock:
+            for nodo, bloque in resultados:
+                nodo.ultimo_bloque = bloque
+                if mejor - bloque > self.max_retraso_bloques:
+                    if nodo.activo:
+                        logging.error(f"Nodo {nodo.url} retirado: {mejor - bloque} bloques por detrás")
+                    nodo.activo = False
+                    nodo.exitos = 0
+                    continue
+                nodo.exitos += 1
+                if not nodo.activo and nodo.exitos >= self.exitos_readmision:
+                    nodo.activo = True
+                    logging.info(f"Nodo {nodo.url} readmitido")
+
+    def _sondear_periodicamente(self):
+        while not self._detener.wait(self.intervalo_sondeo):
+            try:
+                self.sondear()
+            except Exception as e:
+                logging.error(f"Error en el sondeo de nodos: {e}")
+
+    def detener(self):
+        """Detiene el hilo de sondeo."""
+        self._detener.set()
+
+    def is_connected(self, show_traceback=False):
+        return any(nodo.proveedor.is_connected() for nodo in self.nodos)
@@ -0,0 +1,116 @@
+import itertools
+import logging
+
+from ProveedorRPC import obtener_sesion
+
+# Tamaño máximo por defecto de cada petición por lotes. Muchos nodos limitan el número de llamadas por lote.
+TAMANO_LOTE_DEFECTO = 100
+TIMEOUT_LOTE = 30
+
+_ids = itertools.count(1)
+
+def _enviar_secuencial(proveedor, llamadas):
+    """Ejecuta las llamadas una a una con el proveedor de Web3 (para proveedores sin soporte de lotes)."""
+    respuestas = []
+    for metodo, params in llamadas:
+        try:
+            respuestas.append(proveedor.make_request(metodo, params))
+        except Exception as e:
+            respuestas.append({'error': {'code': -32603, 'message': str(e)}})
+    return respuestas
+
+def _enviar_lote_http(endpoint_uri, llamadas, timeout):
+    """Envía un único lote JSON-RPC por HTTP y devuelve las respuestas en el orden de las llamadas."""
+    ids = [next(_ids) for _ in llamadas]
+    payload = [
+        {'jsonrpc': '2.0', 'id': id_, 'method': metodo, 'params': params}
+        for id_, (metodo, params) in zip(ids, llamadas)
+    ]
+    respuesta = obtener_sesion(endpoint_uri).post(endpoint_uri, json=payload, timeout=timeout)
+    respuesta.raise_for_status()
+    datos = respuesta.json()
+    if isinstance(datos, dict):
+        # El nodo no admite lotes y devuelve un único error para toda la petición.
+        raise ValueError(f"El nodo no admite peticiones por lotes: {datos.get('error', datos)}")
+    por_id = {r.get('id'): r for r in datos}
+    return [por_id.get(id_, {'error': {'code': -32603, 'message': 'Sin respuesta del nodo'}}) for id_ in ids]
+
+def ejecutar_lote(web3, llamadas, tamano_lote=TAMANO_LOTE_DEFECTO, timeout=TIMEOUT_LOTE):
+    """
+        Ejecuta varias llamadas JSON-RPC en peticiones por lotes (un único viaje HTTP por cada `tamano_lote`
+        llamadas) en lugar de una petición por llamada.
+
+        Parámetros:
+        - web3 (Web3): Instancia de Web3 cuyo proveedor se utiliza. Si el proveedor es HTTP, las llamadas se
+        agrupan en lotes; con cualquier otro proveedor se ejecutan secuencialmente.
+        - llamadas (list): Lista de tuplas (metodo, params) con parámetros ya serializables en JSON
+        (direcciones y cantidades en hexadecimal).
+        - tamano_lote (int, opcional): Número máximo de llamadas por petición.
+        - timeout (int, opcional): Tiempo máximo de espera de cada petición, en segundos.
+
+        Retorna:
+        Una lista con las respuestas JSON-RPC sin procesar (diccionarios con la clave 'result' o 'error'),
+        en el mismo orden que las llamadas.
+
+        Excepciones:
+        - requests.RequestException: Se lanza si falla la comunicación con el nodo.
+        - ConnectionError: Con un ProveedorRouter, se lanza si ningún nodo pudo atender un lote.
+    """
+    llamadas = list(llamadas)
+    if not llamadas:
+        return []
+    proveedor = web3.provider
+    endpoint_uri = getattr(proveedor, 'endpoint_uri', None)
+    if not endpoint_uri or not str(endpoint_uri).startswith('http'):
+        return _enviar_secuencial(proveedor, llamadas)
+
+    respuestas = []
+    for inicio in range(0, len(llamadas), tamano_lote):
+        lote = llamadas[inicio:inicio + tamano_lote]
+        try:
+            if hasattr(proveedor, 'ejecutar_lote'):
+                # ProveedorRouter: elige el nodo, reintenta en otro si falla y actualiza sus estadísticas.
+                respuestas.extend(proveedor.ejecutar_lote(lote, lambda url, l: _enviar_lote_http(url, l, timeout)))
+            else:
+                respuestas.extend(_enviar_lote_http(endpoint_uri, lote, timeout))
+        except ValueError as e:
+            logging.error(f"Error en la petición por lotes, se ejecuta secuencialmente: {e}")
+            respuestas.extend(_enviar_secuencial(proveedor, lote))
+    return respuestas
+
+async def ejecutar_lote_async(sesion, endpoint_uri, llamadas, tamano_lote=TAMANO_LOTE_DEFECTO):
+    """
+        Equivalente asíncrono de `ejecutar_lote` para AsyncBlockchainManager: envía las llamadas en peticiones
+        JSON-RPC por lotes con la sesión aiohttp del proveedor (AsyncWeb3 no admite lotes).
+
+        Parámetros:
+        - sesion (aiohttp.ClientSession): Sesión con el pool de conexiones (ver configurar_sesion_async).
+        - endpoint_uri (str): URL HTTP del nodo.
+        - llamadas (list): Lista de tuplas (metodo, params) con parámetros ya serializables en JSON.
+        - tamano_lote (int, opcional): Número máximo de llamadas por petición.
+
+        Retorna:
+        Una lista con las respuestas JSON-RPC sin procesar, en el mismo orden que las llamadas.
+
+        Excepciones:
+        - aiohttp.ClientError: Se lanza si falla la comunicación con el nodo.
+        - ValueError: Se lanza si el nodo no admite peticiones por lotes.
+    """
+    respuestas = []
+    llamadas = list(llamadas)
+    for inicio in range(0, len(llamadas), tamano_lote):
+        lote = llamadas[inicio:inicio + tamano_lote]
+        ids = [next(_ids) for _ in lote]
+        payload = [
+            {'jsonrpc': '2.0', 'id': id_, 'method': metodo, 'params': params}
+            for id_, (metodo, params) in zip(ids, lote)
+        ]
+        async with sesion.post(endpoint_uri, json=payload) as respuesta:
+            respuesta.raise_for_status()
+            datos = await respuesta.json(content_type=None)
+        if isinstance(datos, dict):
+            raise ValueError(f"El nodo no admite peticiones por lotes: {datos.get('error', datos)}")
+        por_id = {r.get('id'): r for r in datos}
+        respuestas.extend(por_id.get(id_, {'error': {'code': -32603, 'message': 'Sin respuesta del nodo'}})
+                          for id_ in ids)
+    return respuestas
@@ -0,0 +1,179 @@
+import json
+import logging
+import threading
+import time
+
+from eth_account import Account
+from eth_keys import keys
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+
+# Segundos sin usar una cuenta tras los que se descarta de la sesión.
+TIEMPO_INACTIVIDAD = 15 * 60
+
+class SesionBloqueada(Exception):
+    """La cuenta pedida no está desbloqueada en la sesión o ha caducado por inactividad."""
+
+def crear_keystore(ruta, clave_privada, contrasena, iteraciones=None):
+    """
+        Cifra una clave privada con una contraseña y la guarda en un archivo keystore JSON (formato V3, el de
+        Geth, MetaMask o Ganache), que después se abre con `SesionClaves.desbloquear`.
+
+        Retorna:
+        La dirección de la cuenta (checksum).
+    """
+    keystore = Account.encrypt(clave_privada, contrasena, iterations=iteraciones)
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(keystore, archivo)
+    return to_checksum_address(keystore['address'])
+
+class SesionClaves:
+    """
+        Almacén en memoria de las cuentas con las que opera la aplicación durante una sesión.
+
+        Cada clave se descifra (keystore) o se lee una sola vez y se guarda ya derivada: la `LocalAccount` y su
+        `eth_keys.PrivateKey`, que incluye la clave pública. Así, las operaciones se refieren a la cuenta solo
+        por su dirección y la firma no vuelve a interpretar la clave ni a derivar la clave pública, la mitad del
+        coste de cada firma. Las cuentas que no se usan durante `tiempo_inactividad` segundos se descartan (al
+        pedirlas y con un hilo en segundo plano) y hay que volver a desbloquearlas.
+
+        Atributos:
+        - tiempo_inactividad (float o None): Segundos sin usar una cuenta tras los que se descarta. Con None las
+        cuentas no caducan (por ejemplo, en un proceso de la línea de órdenes que dura lo que la sesión).
+
+        Métodos:
+        - desbloquear(self, ruta, contrasena): Descifra un archivo keystore y añade sus cuentas.
+        - agregar_clave(self, clave_privada): Añade una cuenta a partir de su clave privada.
+        - cuenta(self, direccion): `LocalAccount` de una cuenta desbloqueada.
+        - clave_firma(self, direccion): Clave ya derivada para firmar (`web3.eth.account.sign_transaction`).
+        - desbloqueada(self, direccion): Indica si la cuenta está en la sesión y no ha caducado.
+        - direcciones(self): Cuentas desbloqueadas.
+        - bloquear(self, direccion): Descarta una cuenta o, sin dirección, todas.
+        - cerrar(self): Descarta todas las cuentas y detiene el hilo de caducidad.
+    """
+    def __init__(self, tiempo_inactividad=TIEMPO_INACTIVIDAD):
+        self.tiempo_inactividad = tiempo_inactividad
+        self._lock = threading.Lock()
+        self._cuentas = {}
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def desbloquear(self, ruta, contrasena):
+        """
+            Descifra un archivo keystore JSON (una cuenta o una lista de ellas) y añade sus cuentas a la sesión.
+
+            Retorna:
+            La lista de direcciones desbloqueadas.
+
+            Excepciones:
+            - ValueError: Se lanza si la contraseña no es correcta o el archivo no es un keystore válido.
+        """
+        with open(ruta, encoding='utf-8') as archivo:
+            contenido = json.load(archivo)
+        keystores = contenido if isinstance(contenido, list) else [contenido]
+        try:
+            claves = [Account.decrypt(keystore, contrasena) for keystore in keystores]
+        except (ValueError, KeyError, TypeError) as e:
+            logging.error(f"No se pudo descifrar el keystore {ruta}: {e}")
+            raise ValueError(f"No se pudo descifrar el keystore (¿contraseña incorrecta?): {e}")
+        return [self.agregar_clave(clave) for clave in claves]
+
+    def agregar_clave(self, clave_privada):
+        """
+            Añade a la sesión la cuenta de una clave privada (hexadecimal o bytes), derivándola una sola vez.
+
+            Retorna:
+            La dirección de la cuenta (checksum).
+
+            Excepciones:
+            - ValueError: Se lanza si la clave no tiene 32 bytes.
+        """
+        try:
+            clave = keys.PrivateKey(HexBytes(clave_privada))
+        except Exception as e:
+            raise ValueError(f"La clave privada no es válida: {e}")
+        cuenta = Account.from_key(clave)
+        with self._lock:
+            self._cuentas[cuenta.address] = [cuenta, clave, time.monotonic()]
+            if self.tiempo_inactividad is not None and (self._hilo is None or not self._hilo.is_alive()):
+                self._detener.clear()
+                self._hilo = threading.Thread(target=self._vigilar, name='SesionClaves', daemon=True)
+                self._hilo.start()
+        return cuenta.address
+
+    def _entrada(self, direccion):
+        direccion = to_checksum_address(direccion)
+        with self._lock:
+            entrada = self._cuentas.get(direccion)
+            if entrada is None:
+                raise SesionBloqueada(f"La cuenta {direccion} no está desbloqueada.")
+            ahora = time.monotonic()
+            if self.tiempo_inactividad is not None and ahora - entrada[2] > self.tiempo_inactividad:
+                del self._cuentas[direccion]
+                raise SesionBloqueada(f"La sesión de la cuenta {direccion} ha caducado por inactividad.")
+            entrada[2] = ahora
+            return entrada
+
+    def cuenta(self, direccion):
+        """
+            Retorna:
+            La `LocalAccount` de la cuenta, renovando su tiempo de inactividad.
+
+            Excepciones:
+            - SesionBloqueada: Se lanza si la cuenta no está desbloqueada o ha caducado.
+        """
+        return self._entrada(direccion)[0]
+
+    def clave_firma(self, direccion):
+        """
+            Retorna:
+            La `eth_keys.PrivateKey` de la cuenta, que `sign_transaction` acepta en lugar de la clave en
+            hexadecimal sin volver a derivarla.
+
+            Excepciones:
+            - SesionBloqueada: Se lanza si la cuenta no está desbloqueada o ha caducado.
+        """
+        return self._entrada(direccion)[1]
+
+    def desbloqueada(self, direccion):
+        try:
+            self._entrada(direccion)
+            return True
+        except (SesionBloqueada, ValueError):
+            return False
+
+    def direcciones(self):
+        self.caducar()
+        with self._lock:
+            return list(self._cuentas)
+
+    def caducar(self):
+        """Descarta las cuentas que llevan más de `tiempo_inactividad` segundos sin usarse y devuelve cuáles."""
+        if self.tiempo_inactividad is None:
+            return []
+        limite = time.monotonic() - self.tiempo_inactividad
+        with self._lock:
+            caducadas = [direccion for direccion, (_, _, uso) in self._cuentas.items() if uso < limite]
+            for direccion in caducadas:
+                del self._cuentas[direccion]
+        for direccion in caducadas:
+            logging.info(f"Cuenta {direccion} bloqueada por inactividad.")
+        return caducadas
+
+    def bloquear(self, direccion=None):
+        with self._lock:
+            if direccion is None:
+                self._cuentas.clear()
+            else:
+                self._cuentas.pop(to_checksum_address(direccion), None)
+
+    def _vigilar(self):
+        while not self._detener.wait(max(1.0, min(self.tiempo_inactividad / 2, 60.0))):
+            self.caducar()
+
+    def cerrar(self):
+        self.bloquear()
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
@@ -0,0 +1,129 @@
+import itertools
+import logging
+
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from ContractUtils import format_transaction_receipt
+
+# Etapas que muestra el panel de tareas
+EN_COLA = "En cola"
+EN_CURSO = "En curso"
+FIRMANDO = "Firmando"
+DIFUNDIDA = "Difundida"
+MINADA = "Minada"
+ERROR = "Error"
+
+class SenalesTarea(QObject):
+    # Las señales se emiten desde el hilo del pool y Qt las entrega en el hilo de la interfaz.
+    progreso = pyqtSignal(int, str, str)
+    terminada = pyqtSignal(int, object)
+    fallida = pyqtSignal(int, str)
+
+class TareaBlockchain(QRunnable):
+    """
+        Ejecuta una operación de BlockchainManager fuera del hilo de la interfaz.
+
+        Las transacciones se lanzan con `esperar_recibo=False`, de modo que la tarea informa de cada etapa:
+        firmando, difundida (con el hash de la transacción) y minada (con el recibo) o error.
+    """
+    def __init__(self, idTarea, funcion, args, esTransaccion):
+        super().__init__()
+        self.idTarea = idTarea
+        self.funcion = funcion
+        self.args = args
+        self.esTransaccion = esTransaccion
+        self.senales = SenalesTarea()
+
+    def run(self):
+        try:
+            if self.esTransaccion:
+                self.senales.progreso.emit(self.idTarea, FIRMANDO, "")
+                manejador = self.funcion(*self.args, esperar_recibo=False)
+                self.senales.progreso.emit(self.idTarea, DIFUNDIDA, manejador.tx_hash)
+                recibo = manejador.result()
+                self.senales.progreso.emit(self.idTarea, MINADA, f"Bloque {recibo['blockNumber']}")
+                self.senales.terminada.emit(self.idTarea, format_transaction_receipt(recibo))
+            else:
+                self.senales.progreso.emit(self.idTarea, EN_CURSO, "")
+                self.senales.terminada.emit(self.idTarea, self.funcion(*self.args))
+        except Exception as e:
+            logging.error(f"Error en la tarea {self.idTarea}: {e}")
+            self.senales.fallida.emit(self.idTarea, str(e))
+
+class PanelTareas(QTableWidget):
+    COLUMNAS = ["#", "Operación", "Estado", "Detalle"]
+
+    def __init__(self, parent=None):
+        super().__init__(0, len(self.COLUMNAS), parent)
+        self.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.horizontalHeader().setStretchLastSection(True)
+        self.verticalHeader().setVisible(False)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.filas = {}
+
+    def agregarTarea(self, idTarea, descripcion):
+        fila = self.rowCount()
+        self.insertRow(fila)
+        self.filas[idTarea] = fila
+        for columna, texto in enumerate([str(idTarea), descripcion, EN_COLA, ""]):
+            self.setItem(fila, columna, QTableWidgetItem(texto))
+        self.scrollToBottom()
+
+    def actualizarTarea(self, idTarea, estado, detalle=""):
+        fila = self.filas.get(idTarea)
+        if fila is None:
+            return
+        self.item(fila, 2).setText(estado)
+        if detalle:
+            self.item(fila, 3).setText(detalle)
+            self.item(fila, 3).setToolTip(detalle)
+
+class GestorTareas(QObject):
+    """
+        Encola operaciones de BlockchainManager en un QThreadPool y refleja su avance en un PanelTareas.
+
+        Varias operaciones pueden estar en curso a la vez (hasta `maxHilos`); las transacciones de una misma
+        cuenta no se pisan porque BlockchainManager asigna los nonces localmente.
+    """
+    # Se emite al terminar una tarea con (id, descripción, resultado)
+    tareaTerminada = pyqtSignal(int, str, object)
+    tareaFallida = pyqtSignal(int, str, str)
+
+    def __init__(self, panel, maxHilos=4, parent=None):
+        super().__init__(parent)
+        self.panel = panel
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(maxHilos)
+        self.contador = itertools.count(1)
+        self.tareas = {}
+
+    def encolar(self, descripcion, funcion, *args, esTransaccion=True):
+        idTarea = next(self.contador)
+        tarea = TareaBlockchain(idTarea, funcion, args, esTransaccion)
+        tarea.senales.progreso.connect(self.panel.actualizarTarea)
+        tarea.senales.terminada.connect(self.onTerminada)
+        tarea.senales.fallida.connect(self.onFallida)
+        # Se conserva la referencia hasta que termine para que las señales sigan vivas.
+        self.tareas[idTarea] = (descripcion, tarea)
+        self.panel.agregarTarea(idTarea, descripcion)
+        self.pool.start(tarea)
+        return idTarea
+
+    def pendientes(self):
+        return len(self.tareas)
+
+    def onTerminada(self, idTarea, resultado):
+        descripcion, _ = self.tareas.pop(idTarea, ("", None))
+        if isinstance(resultado, dict) and 'transactionHash' in resultado:
+            self.panel.actualizarTarea(idTarea, MINADA, f"{resultado['transactionHash']} (gas {resultado['gasUsed']})")
+        else:
+            self.panel.actualizarTarea(idTarea, "Completada")
+        self.tareaTerminada.emit(idTarea, descripcion, resultado)
+
+    def onFallida(self, idTarea, mensaje):
+        descripcion, _ = self.tareas.pop(idTarea, ("", None))
+        self.panel.actualizarTarea(idTarea, ERROR, mensaje)
+        self.tareaFallida.emit(idTarea, descripcion, mensaje)
@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from AsyncBlockchainManager import AsyncBlockchainManager
+from BlockchainManager import BlockchainManager
+from NodoSimulado import NodoSimulado
+
+MONTO_PRESTAMO = 10**16  # 0.01 ether
+PLAZO_PRESTAMO = 86400
+
+def preparar(manager, socio, clientes, prestamos):
+    """Registra los clientes, les deposita garantía y crea `prestamos` préstamos pendientes para cada uno."""
+    for cliente in clientes:
+        manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+        manager.depositar_garantia(cliente.address, cliente.key.hex(), 100 * 10**18)
+        for _ in range(prestamos):
+            manager.solicitar_prestamo(cliente.address, cliente.key.hex(), MONTO_PRESTAMO, PLAZO_PRESTAMO)
+
+def medir_sync(manager, cliente, escenario, concurrencia):
+    inicio = time.perf_counter()
+    for i in range(concurrencia):
+        if escenario == 'lectura':
+            manager.obtener_detalle_de_prestamo(cliente.address, i + 1)
+        else:
+            manager.solicitar_prestamo(cliente.address, cliente.key.hex(), MONTO_PRESTAMO, PLAZO_PRESTAMO)
+    return time.perf_counter() - inicio
+
+async def medir_async(manager, cliente, escenario, concurrencia):
+    inicio = time.perf_counter()
+    if escenario == 'lectura':
+        operaciones = [manager.obtener_detalle_de_prestamo(cliente.address, i + 1) for i in range(concurrencia)]
+    else:
+        operaciones = [
+            manager.solicitar_prestamo(cliente.address, cliente.key.hex(), MONTO_PRESTAMO, PLAZO_PRESTAMO)
+            for _ in range(concurrencia)
+        ]
+    await asyncio.gather(*operaciones)
+    return time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara BlockchainManager (síncrono) con AsyncBlockchainManager contra un nodo simulado local.")
+    parser.add_argument('--latencia', type=float, default=0.005,
+                        help="Latencia artificial por petición del nodo simulado, en segundos.")
+    parser.add_argument('--concurrencias', type=int, nargs='+', default=[1, 10, 100],
+                        help="Número de préstamos procesados a la vez en cada medición.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    nodo = NodoSimulado()
+    url = nodo.iniciar()
+    try:
+        # Cada gestor usa su propia cuenta de cliente para que sus nonces no interfieran.
+        cliente_sync, cliente_async = nodo.cuentas[1], nodo.cuentas[2]
+        manager = BlockchainManager(url, nodo.contract_address)
+        preparar(manager, nodo.cuentas[0], [cliente_sync, cliente_async], max(args.concurrencias))
+        nodo.latencia = args.latencia
+
+        async def medir_todo():
+            resultados = []
+            async with AsyncBlockchainManager(url, nodo.contract_address) as async_manager:
+                for escenario in ('lectura', 'solicitud'):
+                    for concurrencia in args.concurrencias:
+                        t_sync = medir_sync(manager, cliente_sync, escenario, concurrencia)
+                        t_async = await medir_async(async_manager, cliente_async, escenario, concurrencia)
+                        resultados.append((escenario, concurrencia, t_sync, t_async))
+            return resultados
+
+        print(f"Latencia simulada por petición: {args.latencia * 1000:.1f} ms")
+        print(f"{'escenario':<10} {'préstamos':>9} {'sync (s)':>10} {'async (s)':>10} {'sync op/s':>10} {'async op/s':>11} {'mejora':>7}")
+        for escenario, concurrencia, t_sync, t_async in asyncio.run(medir_todo()):
+            print(f"{escenario:<10} {concurrencia:>9} {t_sync:>10.3f} {t_async:>10.3f} "
+                  f"{concurrencia / t_sync:>10.1f} {concurrencia / t_async:>11.1f} {t_sync / t_async:>6.1f}x")
+    finally:
+        nodo.detener()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from BlockchainManager import BlockchainManager
+from NodoSimulado import NodoSimulado
+from benchmark_proveedor import percentil
+
+GARANTIA_CLIENTE = 10**18  # 1 ether
+MONTO_PRESTAMO = 10**16  # 0.01 ether
+PLAZO_PRESTAMO = 86400
+# Archivo JSONL donde se acumulan los resultados de cada ejecución, uno por línea.
+HISTORIAL_DEFECTO = 'benchmark_historial.jsonl'
+# Empeoramiento relativo (ops/s o peticiones por operación) a partir del cual una fase se considera una regresión.
+TOLERANCIA_DEFECTO = 0.15
+
+def commit_actual():
+    """Devuelve el hash abreviado del commit de git actual (con '+' si hay cambios sin confirmar), o None."""
+    try:
+        directorio = os.path.dirname(os.path.abspath(__file__))
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=directorio, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        cambios = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=directorio,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('+' if cambios else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def ejecutar_fase(nodo, operacion, tareas, concurrencia):
+    """
+        Ejecuta `operacion(*tarea)` para cada tarea con `concurrencia` hilos y mide la fase.
+
+        Retorna:
+        Un diccionario con 'operaciones', 'errores', 'segundos', 'ops_s', la latencia por operación en
+        milisegundos ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms') y 'rpc_por_operacion' (peticiones JSON-RPC que
+        recibió el nodo, contando cada elemento de los lotes, dividido entre las operaciones).
+    """
+    latencias = []
+    errores = []
+
+    def medir(tarea):
+        inicio = time.perf_counter()
+        try:
+            operacion(*tarea)
+        except Exception as e:
+            errores.append(str(e))
+        latencias.append(time.perf_counter() - inicio)
+
+    peticiones = nodo.peticiones
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        list(ejecutor.map(medir, tareas))
+    segundos = time.perf_counter() - inicio
+    if errores:
+        logging.error(f"{len(errores)} operaciones fallidas, la primera: {errores[0]}")
+    return {
+        'operaciones': len(tareas),
+        'errores': len(errores),
+        'segundos': round(segundos, 4),
+        'ops_s': round(len(tareas) / segundos, 2) if segundos else 0.0,
+        'p50_ms': round(percentil(latencias, 0.50) * 1000, 3),
+        'p95_ms': round(percentil(latencias, 0.95) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 0.99) * 1000, 3),
+        'max_ms': round(max(latencias, default=0.0) * 1000, 3),
+        'rpc_por_operacion': round((nodo.peticiones - peticiones) / len(tareas), 2) if tareas else 0.0,
+    }
+
+def ejecutar_carga(clientes, prestamos, concurrencia, latencia=0.0):
+    """
+        Arranca un nodo simulado con el contrato PrestamoDeFi y recorre el ciclo de vida completo de la cartera
+        con BlockchainManager: `clientes` clientes se registran y depositan garantía, cada uno solicita
+        `prestamos` préstamos, el socio los aprueba todos, se consultan, la mitad se reembolsan y, tras adelantar
+        el reloj más allá del plazo, se liquida la otra mitad. Las cuentas son deterministas, por lo que dos
+        ejecuciones con los mismos parámetros hacen exactamente las mismas operaciones.
+
+        Retorna:
+        Un diccionario fase -> medidas (ver `ejecutar_fase`), en el orden de ejecución.
+    """
+    nodo = NodoSimulado(numero_cuentas=clientes + 1, latencia=latencia)
+    url = nodo.iniciar()
+    manager = BlockchainManager(url, nodo.contract_address)
+    try:
+        socio, cuentas = nodo.cuentas[0], nodo.cuentas[1:]
+        clave_socio = socio.key.hex()
+        ids = range(1, prestamos + 1)
+        todos = [(cuenta, prestamo_id) for cuenta in cuentas for prestamo_id in ids]
+        reembolsados = [(cuenta, prestamo_id) for cuenta, prestamo_id in todos if prestamo_id % 2 == 0]
+        vencidos = [(cuenta, prestamo_id) for cuenta, prestamo_id in todos if prestamo_id % 2 == 1]
+
+        resultados = {}
+        resultados['alta_cliente'] = ejecutar_fase(
+            nodo, lambda cuenta: manager.alta_cliente(socio.address, clave_socio, cuenta.address),
+            [(cuenta,) for cuenta in cuentas], concurrencia)
+        resultados['depositar_garantia'] = ejecutar_fase(
+            nodo, lambda cuenta: manager.depositar_garantia(cuenta.address, cuenta.key.hex(), GARANTIA_CLIENTE),
+            [(cuenta,) for cuenta in cuentas], concurrencia)
+        # Todos los préstamos son iguales, así que los IDs 1..prestamos de cada cliente no dependen del orden.
+        resultados['solicitar_prestamo'] = ejecutar_fase(
+            nodo, lambda cuenta, _: manager.solicitar_prestamo(cuenta.address, cuenta.key.hex(), MONTO_PRESTAMO,
+                                                               PLAZO_PRESTAMO), todos, concurrencia)
+        resultados['aprobar_prestamo'] = ejecutar_fase(
+            nodo, lambda cuenta, prestamo_id: manager.aprobar_prestamo(socio.address, clave_socio, cuenta.address,
+                                                                       prestamo_id), todos, concurrencia)
+        resultados['detalle_prestamo'] = ejecutar_fase(
+            nodo, lambda cuenta, prestamo_id: manager.obtener_detalle_de_prestamo(cuenta.address, prestamo_id),
+            todos, concurrencia)
+        resultados['reembolsar_prestamo'] = ejecutar_fase(
+            nodo, lambda cuenta, prestamo_id: manager.reembolsar_prestamo(cuenta.address, cuenta.key.hex(),
+                                                                          prestamo_id, 0), reembolsados, concurrencia)
+        nodo.avanzar_tiempo(PLAZO_PRESTAMO + 1)
+        resultados['liquidar_garantia'] = ejecutar_fase(
+            nodo, lambda cuenta, prestamo_id: manager.liquidar_garantia(socio.address, clave_socio, cuenta.address,
+                                                                        prestamo_id), vencidos, concurrencia)
+        return resultados
+    finally:
+        manager.receipt_tracker.stop()
+        nodo.detener()
+
+def leer_historial(ruta):
+    """Devuelve las ejecuciones guardadas en el historial JSONL (lista vacía si no existe)."""
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding='utf-8') as archivo:
+        return [json.loads(linea) for linea in archivo if linea.strip()]
+
+def guardar_resultado(ruta, resultado):
+    with open(ruta, 'a', encoding='utf-8') as archivo:
+        archivo.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+
+def buscar_referencia(historial, resultado):
+    """Última ejecución del historial con los mismos parámetros y de otro commit, o None."""
+    for anterior in reversed(historial):
+        if anterior['parametros'] == resultado['parametros'] and anterior['commit'] != resultado['commit']:
+            return anterior
+    return None
+
+def comparar(referencia, resultado, tolerancia):
+    """
+        Compara cada fase con la de `referencia`.
+
+        Retorna:
+        Una lista de (fase, variación relativa de ops/s, peticiones por operación antes, ahora, es_regresion).
+        Es regresión si las operaciones por segundo caen o las peticiones JSON-RPC por operación suben más de
+        `tolerancia` (las peticiones varían algo entre ejecuciones por las consultas de recibos).
+    """
+    comparacion = []
+    for fase, medidas in resultado['resultados'].items():
+        anterior = referencia['resultados'].get(fase)
+        if not anterior or not anterior['ops_s']:
+            continue
+        variacion = medidas['ops_s'] / anterior['ops_s'] - 1
+        regresion = (variacion < -tolerancia
+                     or medidas['rpc_por_operacion'] > anterior['rpc_por_operacion'] * (1 + tolerancia))
+        comparacion.append((fase, variacion, anterior['rpc_por_operacion'], medidas['rpc_por_operacion'], regresion))
+    return comparacion
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prueba de carga de BlockchainManager contra un nodo simulado local con el contrato PrestamoDeFi.")
+    parser.add_argument('--clientes', type=int, default=50, help="Número de clientes.")
+    parser.add_argument('--prestamos', type=int, default=4, help="Préstamos solicitados por cada cliente.")
+    parser.add_argument('--concurrencia', type=int, default=8, help="Número de hilos que operan a la vez.")
+    parser.add_argument('--latencia', type=float, default=0.0,
+                        help="Latencia artificial por petición del nodo simulado, en segundos.")
+    parser.add_argument('--historial', default=HISTORIAL_DEFECTO,
+                        help="Archivo JSONL donde se añade el resultado, con el commit de git, para compararlo.")
+    parser.add_argument('--sin-guardar', action='store_true', help="No añade el resultado al historial.")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_DEFECTO,
+                        help="Empeoramiento relativo tolerado frente a la última ejecución de otro commit.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    parametros = {'clientes': args.clientes, 'prestamos': args.prestamos, 'concurrencia': args.concurrencia,
+                  'latencia': args.latencia}
+    resultado = {
+        'commit': commit_actual(),
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'parametros': parametros,
+        'resultados': ejecutar_carga(args.clientes, args.prestamos, args.concurrencia, args.latencia),
+    }
+
+    print(f"Commit {resultado['commit']}: {args.clientes} clientes, {args.prestamos} préstamos por cliente, "
+          f"{args.concurrencia} hilos, latencia {args.latencia * 1000:.1f} ms")
+    print(f"{'fase':<20} {'ops':>6} {'err':>4} {'ops/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'rpc/op':>7}")
+    for fase, medidas in resultado['resultados'].items():
+        print(f"{fase:<20} {medidas['operaciones']:>6} {medidas['errores']:>4} {medidas['ops_s']:>9.1f} "
+              f"{medidas['p50_ms']:>9.2f} {medidas['p95_ms']:>9.2f} {medidas['p99_ms']:>9.2f} "
+              f"{medidas['rpc_por_operacion']:>7.2f}")
+
+    referencia = buscar_referencia(leer_historial(args.historial), resultado)
+    regresiones = []
+    if referencia:
+        print(f"\nFrente al commit {referencia['commit']} ({referencia['fecha']}):")
+        for fase, variacion, rpc_antes, rpc_ahora, regresion in comparar(referencia, resultado, args.tolerancia):
+            print(f"{fase:<20} {variacion:>+8.1%} ops/s  rpc/op {rpc_antes:.2f} -> {rpc_ahora:.2f}"
+                  f"{'  REGRESIÓN' if regresion else ''}")
+            if regresion:
+                regresiones.append(fase)
+    if not args.sin_guardar:
+        guardar_resultado(args.historial, resultado)
+
+    errores = sum(medidas['errores'] for medidas in resultado['resultados'].values())
+    return 1 if errores or regresiones else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
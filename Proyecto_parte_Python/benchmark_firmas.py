@@ -0,0 +1,38 @@
+import argparse
+import os
+import time
+
+from FirmadorProcesos import FirmadorProcesos
+from NodoSimulado import CHAIN_ID_SIMULADO, DIRECCION_CONTRATO_SIMULADO, cuentas_simuladas
+
+def transacciones_prueba(numero):
+    """Transacciones EIP-1559 sin firmar, como las de una aprobación masiva, con nonces consecutivos."""
+    datos = '0x' + 'ab' * 68
+    return [{'to': DIRECCION_CONTRATO_SIMULADO, 'data': datos, 'value': 0, 'gas': 80000, 'nonce': nonce,
+             'chainId': CHAIN_ID_SIMULADO, 'maxFeePerGas': 2 * 10**10, 'maxPriorityFeePerGas': 10**9}
+            for nonce in range(numero)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide las firmas por segundo de FirmadorProcesos con 1 a N procesos.")
+    parser.add_argument('--transacciones', type=int, default=2000, help="Transacciones firmadas en cada medición.")
+    parser.add_argument('--procesos', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                        help="Número de procesos de firma de cada medición.")
+    args = parser.parse_args()
+
+    clave = cuentas_simuladas(1)[0].key.hex()
+    transacciones = transacciones_prueba(args.transacciones)
+    print(f"{args.transacciones} transacciones, {os.cpu_count()} núcleos")
+    print(f"{'procesos':>8} {'firmas/s':>10} {'mejora':>7}")
+    base = None
+    for procesos in args.procesos:
+        with FirmadorProcesos(procesos=procesos) as firmador:
+            firmador.firmar(transacciones[:procesos * firmador.minimo_paralelo], clave)  # arranca los procesos
+            inicio = time.perf_counter()
+            firmador.firmar(transacciones, clave)
+            segundos = time.perf_counter() - inicio
+        base = base or segundos
+        print(f"{procesos:>8} {args.transacciones / segundos:>10.0f} {base / segundos:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
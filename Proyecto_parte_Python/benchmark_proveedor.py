@@ -0,0 +1,96 @@
+import argparse
+import logging
+import multiprocessing
+import statistics
+import threading
+import time
+
+from web3 import Web3, HTTPProvider
+
+from NodoSimulado import NodoSimulado
+from ProveedorRPC import ProveedorHTTP, crear_sesion
+
+def servir_nodo(latencia, cola_url, parar):
+    """Ejecuta el nodo simulado en un proceso aparte para que no compita por el GIL con los clientes medidos."""
+    nodo = NodoSimulado(latencia=latencia)
+    cola_url.put(nodo.iniciar())
+    parar.wait()
+    nodo.detener()
+
+def crear_web3(configuracion, url, tamano_pool):
+    """Crea una instancia de Web3 con el transporte HTTP que se quiere medir."""
+    if configuracion == 'web3 por defecto':
+        return Web3(HTTPProvider(url))
+    if configuracion == 'sin keep-alive':
+        return Web3(ProveedorHTTP(url, crear_sesion(tamano_pool, keep_alive=False)))
+    return Web3(ProveedorHTTP(url, crear_sesion(tamano_pool)))
+
+def medir(web3, concurrencia, peticiones):
+    """Lanza `concurrencia` hilos que reparten `peticiones` llamadas y devuelve (segundos, latencias)."""
+    latencias = []
+    errores = []
+    lock = threading.Lock()
+    por_hilo = max(peticiones // concurrencia, 1)
+    barrera = threading.Barrier(concurrencia + 1)
+
+    def trabajar():
+        propias = []
+        barrera.wait()
+        for _ in range(por_hilo):
+            inicio = time.perf_counter()
+            try:
+                web3.eth.block_number
+            except Exception as e:
+                with lock:
+                    errores.append(e)
+                continue
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=trabajar) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    if errores:
+        logging.warning(f"{len(errores)} peticiones fallidas (por ejemplo: {errores[0]})")
+    return time.perf_counter() - inicio, latencias
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)] if valores else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mide el rendimiento del transporte HTTP JSON-RPC contra un nodo simulado local.")
+    parser.add_argument('--latencia', type=float, default=0.001,
+                        help="Latencia artificial por petición del nodo simulado, en segundos.")
+    parser.add_argument('--concurrencias', type=int, nargs='+', default=[1, 4, 16, 64, 256],
+                        help="Número de hilos que llaman a la vez.")
+    parser.add_argument('--peticiones', type=int, default=2000, help="Peticiones totales por medición.")
+    parser.add_argument('--tamano-pool', type=int, default=64, help="Conexiones del pool compartido.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    cola_url, parar = multiprocessing.Queue(), multiprocessing.Event()
+    proceso = multiprocessing.Process(target=servir_nodo, args=(args.latencia, cola_url, parar), daemon=True)
+    proceso.start()
+    url = cola_url.get(timeout=30)
+    try:
+        print(f"Latencia simulada por petición: {args.latencia * 1000:.1f} ms, {args.peticiones} peticiones por medición")
+        print(f"{'transporte':<18} {'hilos':>6} {'pet/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        for configuracion in ('web3 por defecto', 'sin keep-alive', 'pool compartido'):
+            for concurrencia in args.concurrencias:
+                web3 = crear_web3(configuracion, url, args.tamano_pool)
+                segundos, latencias = medir(web3, concurrencia, args.peticiones)
+                print(f"{configuracion:<18} {concurrencia:>6} {len(latencias) / segundos:>9.0f} "
+                      f"{statistics.median(latencias) * 1000:>9.2f} {percentil(latencias, 0.99) * 1000:>9.2f}")
+    finally:
+        parar.set()
+        proceso.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import logging
+import multiprocessing
+import statistics
+
+from web3 import Web3
+
+from NodoSimulado import NodoSimulado
+from ProveedorRPC import crear_proveedor
+from benchmark_proveedor import medir, percentil
+
+def servir_nodo(latencia, capacidad, cola_url, parar):
+    """Ejecuta un nodo simulado con capacidad limitada en un proceso aparte."""
+    nodo = NodoSimulado(latencia=latencia, capacidad=capacidad)
+    cola_url.put(nodo.iniciar())
+    parar.wait()
+    nodo.detener()
+
+def iniciar_nodos(latencias, capacidad):
+    """Lanza un nodo simulado por proceso con la latencia indicada y devuelve (urls, procesos, evento de parada)."""
+    parar = multiprocessing.Event()
+    urls, procesos = [], []
+    for latencia in latencias:
+        cola_url = multiprocessing.Queue()
+        proceso = multiprocessing.Process(target=servir_nodo, args=(latencia, capacidad, cola_url, parar),
+                                          daemon=True)
+        proceso.start()
+        urls.append(cola_url.get(timeout=30))
+        procesos.append(proceso)
+    return urls, procesos, parar
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mide las lecturas por segundo y la latencia del router RPC con 1 a N nodos simulados.")
+    parser.add_argument('--nodos', type=int, default=4, help="Número máximo de nodos.")
+    parser.add_argument('--latencia', type=float, default=0.02,
+                        help="Latencia artificial por petición de los nodos normales, en segundos.")
+    parser.add_argument('--latencia-lento', type=float, default=0.1,
+                        help="Latencia del nodo lento que se añade en la última medición, en segundos.")
+    parser.add_argument('--capacidad', type=int, default=2,
+                        help="Peticiones que cada nodo atiende a la vez (el resto espera turno).")
+    parser.add_argument('--concurrencia', type=int, default=32, help="Número de hilos que llaman a la vez.")
+    parser.add_argument('--peticiones', type=int, default=1000, help="Peticiones totales por medición.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    urls, procesos, parar = iniciar_nodos([args.latencia] * args.nodos + [args.latencia_lento], args.capacidad)
+    try:
+        print(f"{args.concurrencia} hilos, {args.peticiones} lecturas por medición, nodos de "
+              f"{args.latencia * 1000:.0f} ms y capacidad {args.capacidad}")
+        print(f"{'nodos':<22} {'pet/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        escenarios = [(f"{n}", urls[:n]) for n in range(1, args.nodos + 1)]
+        escenarios.append((f"{args.nodos} + 1 lento", urls))
+        for nombre, seleccion in escenarios:
+            proveedor = crear_proveedor(seleccion, tamano_pool=args.concurrencia)
+            web3 = Web3(proveedor)
+            segundos, latencias = medir(web3, args.concurrencia, args.peticiones)
+            if hasattr(proveedor, 'detener'):
+                proveedor.detener()
+            print(f"{nombre:<22} {len(latencias) / segundos:>9.0f} "
+                  f"{statistics.median(latencias) * 1000:>9.2f} {percentil(latencias, 0.99) * 1000:>9.2f}")
+    finally:
+        parar.set()
+        for proceso in procesos:
+            proceso.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import argparse
+import csv
+import getpass
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from decimal import Decimal
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+from BlockchainManager import BlockchainManager
+from ContractUtils import format_transaction_receipt
+from DiarioTransacciones import DiarioTransacciones, TIEMPO_ATASCO
+from Metricas import servir_prometheus
+from Registros import Cliente, Prestamo
+from SesionClaves import SesionClaves
+
+URL_DEFECTO = 'http://127.0.0.1:7545'
+CONTRATO_DEFECTO = '0x25238d7855c60436DA77483CDEDB037291958023'
+# Variable de entorno con la clave privada de la cuenta, para no tenerla en la línea de órdenes ni en el historial.
+VARIABLE_CLAVE = 'PRESTAMODEFI_CLAVE_PRIVADA'
+# Variable de entorno con la contraseña del archivo keystore de --keystore.
+VARIABLE_CONTRASENA = 'PRESTAMODEFI_CONTRASENA_KEYSTORE'
+# Transacciones del modo por lotes difundidas y todavía sin recibo a la vez.
+VENTANA_DEFECTO = 50
+
+def _ether(valor):
+    return Web3.to_wei(Decimal(str(valor)), 'ether')
+
+def _dias(valor):
+    return int(valor) * 86400
+
+def _id(valor):
+    prestamo_id = int(valor)
+    if prestamo_id <= 0:
+        raise ValueError("El ID del préstamo debe ser un número positivo.")
+    return prestamo_id
+
+def _direccion(valor):
+    if not Web3.is_address(valor):
+        raise ValueError(f"La dirección {valor} no es válida.")
+    return valor
+
+# Operaciones disponibles: (método de BlockchainManager, [(campo, conversión, ayuda)], es_transaccion).
+# Los mismos campos son los argumentos de cada subcomando y las columnas de los archivos del modo por lotes.
+# Las cantidades se indican en ether y los plazos en días, como en la interfaz gráfica.
+OPERACIONES = {
+    'alta-prestamista': ('alta_prestamista', [('direccion', _direccion, "Dirección del nuevo prestamista")], True),
+    'alta-cliente': ('alta_cliente', [('direccion', _direccion, "Dirección del nuevo cliente")], True),
+    'depositar-garantia': ('depositar_garantia', [('valor', _ether, "Garantía en ether")], True),
+    'solicitar-prestamo': ('solicitar_prestamo', [('monto', _ether, "Monto en ether"),
+                                                  ('plazo', _dias, "Plazo en días")], True),
+    'reembolsar-prestamo': ('reembolsar_prestamo', [('id', _id, "ID del préstamo"),
+                                                    ('valor', _ether, "Importe del reembolso en ether")], True),
+    'aprobar-prestamo': ('aprobar_prestamo', [('prestatario', _direccion, "Dirección del prestatario"),
+                                              ('id', _id, "ID del préstamo")], True),
+    'liquidar-garantia': ('liquidar_garantia', [('prestatario', _direccion, "Dirección del prestatario"),
+                                                ('id', _id, "ID del préstamo")], True),
+    'prestamos': ('obtener_prestamos_por_prestatario', [('prestatario', _direccion, "Dirección del prestatario")],
+                  False),
+    'detalle-prestamo': ('obtener_detalle_de_prestamo', [('prestatario', _direccion, "Dirección del prestatario"),
+                                                         ('id', _id, "ID del préstamo")], False),
+}
+
+def a_json(valor):
+    """Conversión por defecto de json.dumps para los recibos y resultados de Web3."""
+    if isinstance(valor, (bytes, bytearray, HexBytes)):
+        return '0x' + bytes(valor).hex()
+    if isinstance(valor, AttributeDict):
+        return dict(valor)
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (Prestamo, Cliente)):
+        return valor.formatear()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def escribir_json(salida, datos):
+    salida.write(json.dumps(datos, default=a_json, ensure_ascii=False) + '\n')
+    salida.flush()
+
+def obtener_clave(args):
+    """Clave privada de --clave, de la variable de entorno PRESTAMODEFI_CLAVE_PRIVADA o pedida por teclado."""
+    clave = args.clave or os.environ.get(VARIABLE_CLAVE)
+    if not clave:
+        if not sys.stdin.isatty():
+            raise ValueError(f"Falta la clave privada: use --clave o la variable de entorno {VARIABLE_CLAVE}.")
+        clave = getpass.getpass(f"Clave privada de {args.cuenta}: ")
+    clave = clave.strip()
+    return clave if clave.startswith('0x') else '0x' + clave
+
+def abrir_sesion(args, sesion):
+    """
+        Desbloquea en `sesion` la cuenta que firma, una sola vez para todo el proceso: la del archivo de --keystore
+        (con la contraseña de la variable de entorno PRESTAMODEFI_CONTRASENA_KEYSTORE o pedida por teclado) o la
+        de la clave privada (ver `obtener_clave`). Después, las operaciones se refieren a la cuenta solo por su
+        dirección y firman con la clave ya derivada.
+
+        Retorna:
+        La dirección de la cuenta que firma: --cuenta o, si no se indica, la primera del keystore.
+
+        Excepciones:
+        - ValueError: Se lanza si la contraseña no es correcta o la cuenta no corresponde a la clave o al keystore.
+    """
+    if not args.keystore:
+        cuenta = Web3.to_checksum_address(args.cuenta)
+        if sesion.agregar_clave(obtener_clave(args)) != cuenta:
+            sesion.bloquear()
+            raise ValueError(f"La clave privada no corresponde a la cuenta {cuenta}.")
+        return cuenta
+    contrasena = os.environ.get(VARIABLE_CONTRASENA)
+    if contrasena is None:
+        if not sys.stdin.isatty():
+            raise ValueError(f"Falta la contraseña del keystore: use la variable de entorno {VARIABLE_CONTRASENA}.")
+        contrasena = getpass.getpass(f"Contraseña de {args.keystore}: ")
+    direcciones = sesion.desbloquear(args.keystore, contrasena)
+    if not args.cuenta:
+        return direcciones[0]
+    cuenta = Web3.to_checksum_address(args.cuenta)
+    if cuenta not in direcciones:
+        raise ValueError(f"El keystore {args.keystore} no contiene la cuenta {cuenta}.")
+    return cuenta
+
+def ejecutar_operacion(manager, nombre, campos, cuenta, clave):
+    """
+        Ejecuta una operación de OPERACIONES con los campos indicados (cadenas sin convertir).
+
+        Retorna:
+        Para las transacciones, su `TransactionHandle` (sin esperar el recibo); para las consultas, un Future ya
+        resuelto con el resultado. Así el modo por lotes trata igual ambos casos.
+
+        Excepciones:
+        - ValueError: Se lanza si la operación no existe o falta algún campo o no es válido.
+    """
+    if nombre not in OPERACIONES:
+        raise ValueError(f"Operación desconocida: {nombre}")
+    metodo, definicion, es_transaccion = OPERACIONES[nombre]
+    valores = []
+    for campo, conversion, _ in definicion:
+        valor = campos.get(campo)
+        if valor is None or valor == '':
+            raise ValueError(f"Falta el campo '{campo}' para {nombre}.")
+        valores.append(conversion(valor))
+    if es_transaccion:
+        if not cuenta:
+            raise ValueError("Las transacciones necesitan --cuenta.")
+        return getattr(manager, metodo)(cuenta, clave, *valores, esperar_recibo=False)
+    resultado = Future()
+    resultado.set_result(getattr(manager, metodo)(*valores))
+    return resultado
+
+def resultado_operacion(futuro):
+    """Espera una operación lanzada con `ejecutar_operacion` y devuelve su resultado listo para JSON."""
+    resultado = futuro.result()
+    if isinstance(resultado, AttributeDict) and 'transactionHash' in resultado:
+        return format_transaction_receipt(resultado)
+    return resultado
+
+def leer_operaciones(ruta):
+    """Lee las operaciones de un CSV (con cabecera) o de un JSONL, una a una; '-' lee JSONL de la entrada estándar."""
+    archivo = sys.stdin if ruta == '-' else open(ruta, newline='', encoding='utf-8')
+    try:
+        if ruta.lower().endswith('.csv'):
+            for campos in csv.DictReader(archivo):
+                yield {clave.strip(): (valor or '').strip() for clave, valor in campos.items() if clave}
+        else:
+            for linea in archivo:
+                if linea.strip():
+                    yield json.loads(linea)
+    finally:
+        if archivo is not sys.stdin:
+            archivo.close()
+
+def ejecutar_lote_operaciones(manager, operaciones, cuenta, clave, salida, ventana=VENTANA_DEFECTO):
+    """
+        Ejecuta un flujo de operaciones manteniendo hasta `ventana` transacciones difundidas a la vez (los nonces
+        los asigna localmente el NonceManager) y escribe un resultado JSONL por operación, en el orden de entrada.
+
+        Repetir un lote no es idempotente. Las operaciones que cambian el estado de un préstamo o de un cliente
+        (altas, aprobar, reembolsar, liquidar) se revierten al estimar el gas si ya se aplicaron, pero
+        depositar-garantia y solicitar-prestamo se vuelven a aplicar. Tras una caída, el lote debe reanudarse
+        desde la primera línea sin resultado en la salida, comprobando antes con el diario (o con la cadena) las
+        de la ventana que quedaron pendientes.
+
+        Retorna:
+        Una tupla (correctas, fallidas).
+    """
+    pendientes = deque()
+    correctas = fallidas = 0
+
+    def escribir_primera():
+        nonlocal correctas, fallidas
+        linea, operacion, futuro, error = pendientes.popleft()
+        registro = {'linea': linea, 'operacion': operacion.get('operacion'), 'entrada': operacion}
+        if error is None:
+            try:
+                registro['resultado'] = resultado_operacion(futuro)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+        registro['exito'] = error is None
+        registro['error'] = error
+        if futuro is not None and hasattr(futuro, 'tx_hash'):
+            registro['tx_hash'] = futuro.tx_hash
+        correctas += error is None
+        fallidas += error is not None
+        escribir_json(salida, registro)
+
+    for linea, operacion in enumerate(operaciones, start=1):
+        try:
+            futuro = ejecutar_operacion(manager, operacion.get('operacion'), operacion, cuenta, clave)
+            pendientes.append((linea, operacion, futuro, None))
+        except Exception as e:
+            pendientes.append((linea, operacion, None, str(e)))
+        while len(pendientes) > ventana or (pendientes and pendientes[0][2] is None):
+            escribir_primera()
+    while pendientes:
+        escribir_primera()
+    return correctas, fallidas
+
+def liquidar_vencidos(manager, cuenta, clave, args, salida):
+    """
+        Pasada única del escáner de liquidaciones: liquida todos los préstamos aprobados ya vencidos. Con
+        --checkpoint, el índice se guarda al sincronizar y la siguiente ejecución continúa desde el último bloque.
+    """
+    from EscanerLiquidaciones import EscanerLiquidaciones
+    from IndexadorPrestamos import IndexadorPrestamos
+    indexador = IndexadorPrestamos(manager, desde_bloque=args.desde_bloque, ruta_checkpoint=args.checkpoint)
+    escaner = EscanerLiquidaciones(manager, cuenta, clave, indexador=indexador, tamano_lote=args.tamano_lote)
+    resultados = escaner.escanear()
+    for resultado in resultados:
+        recibo = resultado.get('recibo')
+        escribir_json(salida, dict(resultado, recibo=format_transaction_receipt(recibo) if recibo else None))
+    fallidas = sum(1 for resultado in resultados if not resultado['exito'])
+    return len(resultados) - fallidas, fallidas
+
+def exportar_prestamos(manager, args):
+    """Exporta todos los préstamos del contrato a JSONL, CSV o Parquet y devuelve cuántos son."""
+    from ExportadorPrestamos import ExportadorPrestamos
+    exportador = ExportadorPrestamos(manager, desde_bloque=args.desde_bloque, tamano_lote=args.tamano_lote)
+    return exportador.exportar(args.archivo, args.formato, args.bloque)
+
+def informe_riesgo(manager, args):
+    """Métricas de riesgo de toda la cartera (ver AnaliticaRiesgo)."""
+    from AnaliticaRiesgo import AnaliticaRiesgo
+    analitica = AnaliticaRiesgo.desde_contrato(manager, desde_bloque=args.desde_bloque)
+    return analitica.informe(dias=args.dias, umbral_cobertura=args.umbral_cobertura)
+
+def reanudar_diario(manager, cuenta, tiempo_atasco=TIEMPO_ATASCO):
+    """
+        Reconcilia las transacciones pendientes del diario (ver BlockchainManager.reconciliar_diario) y espera a
+        que se minen antes de seguir, de modo que las órdenes siguientes ven la cadena con ellas ya aplicadas. No
+        evita que una operación repetida se envíe otra vez (ver `ejecutar_lote_operaciones`).
+
+        Retorna:
+        Los hashes de cada estado ('minadas', 'descartadas', 'redifundidas', 'reemplazadas', 'pendientes') y
+        'fallidas': las que se revirtieron o no se minaron a tiempo.
+    """
+    resultado = manager.reconciliar_diario(cuenta, None, tiempo_atasco)
+    resultado['fallidas'] = []
+    for manejador in resultado.pop('manejadores'):
+        try:
+            manejador.result()
+        except Exception as e:
+            logging.error(f"La transacción {manejador.tx_hash} del diario no se completó: {e}")
+            resultado['fallidas'].append(manejador.tx_hash)
+    return resultado
+
+def seguir_eventos(manager, cuenta, clave, args, salida):
+    """Escribe en JSONL los eventos de préstamos a medida que se minan y, si se indica, aprueba los que cumplen la
+    política, hasta que se interrumpe con Ctrl+C."""
+    from FlujoEventos import FlujoEventos, PoliticaAprobacion
+    from IndexadorPrestamos import IndexadorPrestamos
+    indexador = IndexadorPrestamos(manager, desde_bloque=args.desde_bloque, ruta_checkpoint=args.checkpoint)
+    flujo = FlujoEventos(manager, indexador=indexador, intervalo=args.intervalo, url_websocket=args.websocket)
+    flujo.suscribir(lambda evento: escribir_json(salida, evento), nombre='salida')
+    if args.aprobar_hasta is not None:
+        flujo.suscribir(PoliticaAprobacion(manager, cuenta, clave, _ether(args.aprobar_hasta),
+                                           _dias(args.plazo_maximo), args.cobertura_minima),
+                        eventos=['SolicitudPrestamo'], nombre='aprobacion')
+    flujo.iniciar()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        flujo.detener()
+        if args.checkpoint:
+            indexador.guardar_checkpoint(args.checkpoint)
+    fallidas = sum(s.errores for s in flujo.suscripciones)
+    return flujo.repartidos, fallidas
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m cli',
+        description="Operaciones de PrestamoDeFi desde la línea de órdenes, sin interfaz gráfica.")
+    parser.add_argument('--url', action='append',
+                        help=f"URL del nodo (por defecto {URL_DEFECTO}); se puede repetir para repartir entre nodos.")
+    parser.add_argument('--contrato', default=CONTRATO_DEFECTO, help="Dirección del contrato PrestamoDeFi.")
+    parser.add_argument('--abi', default='PrestamoDeFi.json', help="Ruta de la ABI del contrato.")
+    parser.add_argument('--cuenta', help="Cuenta que firma las transacciones.")
+    parser.add_argument('--clave', help=f"Clave privada de la cuenta (mejor en la variable {VARIABLE_CLAVE}).")
+    parser.add_argument('--keystore', help="Archivo keystore JSON cifrado con la cuenta que firma, en lugar de la "
+                                           f"clave (contraseña en la variable {VARIABLE_CONTRASENA}).")
+    parser.add_argument('--diario', help="Archivo JSONL donde se anota cada transacción antes de difundirla; al "
+                                         "empezar se reconcilian las que quedaron pendientes.")
+    parser.add_argument('--metricas-puerto', type=int,
+                        help="Sirve las métricas en formato Prometheus en http://127.0.0.1:PUERTO/metrics.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Muestra los mensajes informativos.")
+    subparsers = parser.add_subparsers(dest='orden', required=True)
+
+    for nombre, (_, definicion, es_transaccion) in OPERACIONES.items():
+        sub = subparsers.add_parser(nombre, help=("Transacción: " if es_transaccion else "Consulta: ") + nombre)
+        for campo, _, ayuda in definicion:
+            sub.add_argument(campo, help=ayuda)
+
+    lote = subparsers.add_parser('lote', help="Ejecuta las operaciones de un archivo CSV o JSONL. Repetirlo vuelve "
+                                              "a enviar los depósitos y las solicitudes de préstamo.")
+    lote.add_argument('archivo', help="CSV con cabecera o JSONL con el campo 'operacion' y los de cada operación "
+                                      "('-' para JSONL por la entrada estándar).")
+    lote.add_argument('--salida', default='-', help="Archivo JSONL de resultados ('-' para la salida estándar).")
+    lote.add_argument('--ventana', type=int, default=VENTANA_DEFECTO,
+                      help="Transacciones difundidas sin recibo a la vez.")
+
+    vencidos = subparsers.add_parser('liquidar-vencidos', help="Liquida todos los préstamos aprobados vencidos.")
+    vencidos.add_argument('--desde-bloque', type=int, default=0, help="Bloque de despliegue del contrato.")
+    vencidos.add_argument('--checkpoint', help="Archivo JSON donde guardar el índice de eventos entre ejecuciones.")
+    vencidos.add_argument('--tamano-lote', type=int, default=50, help="Liquidaciones por lote.")
+    vencidos.add_argument('--salida', default='-', help="Archivo JSONL de resultados ('-' para la salida estándar).")
+
+    exportar = subparsers.add_parser('exportar', help="Exporta todos los préstamos a JSONL, CSV o Parquet.")
+    exportar.add_argument('archivo', help="Archivo de salida (.jsonl, .csv o .parquet).")
+    exportar.add_argument('--formato', choices=['jsonl', 'csv', 'parquet'], help="Por defecto, según la extensión.")
+    exportar.add_argument('--desde-bloque', type=int, default=0, help="Bloque de despliegue del contrato.")
+    exportar.add_argument('--bloque', type=int, help="Bloque de la foto (por defecto, el último).")
+    exportar.add_argument('--tamano-lote', type=int, default=500, help="Prestatarios consultados por tanda.")
+
+    eventos = subparsers.add_parser('eventos', help="Sigue los eventos de préstamos y opcionalmente los aprueba.")
+    eventos.add_argument('--desde-bloque', type=int, default=0, help="Bloque de despliegue del contrato.")
+    eventos.add_argument('--checkpoint', help="Archivo JSON donde guardar el índice de eventos entre ejecuciones.")
+    eventos.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre consultas del último bloque.")
+    eventos.add_argument('--websocket', help="URL ws:// del nodo para recibir los bloques nuevos con newHeads.")
+    eventos.add_argument('--aprobar-hasta', help="Aprueba las solicitudes de hasta este monto en ether (con --cuenta).")
+    eventos.add_argument('--plazo-maximo', default='30', help="Plazo máximo en días de las aprobaciones automáticas.")
+    eventos.add_argument('--cobertura-minima', type=float, default=1.0,
+                         help="Garantía mínima del prestatario respecto al monto para aprobar.")
+    eventos.add_argument('--salida', default='-', help="Archivo JSONL de eventos ('-' para la salida estándar).")
+
+    reconciliar = subparsers.add_parser('reconciliar', help="Reconcilia el diario (--diario) con la cadena: vuelve a "
+                                                            "difundir las perdidas y reemplaza las atascadas.")
+    reconciliar.add_argument('--tiempo-atasco', type=float, default=TIEMPO_ATASCO,
+                             help="Segundos sin minarse tras los que una transacción se reemplaza con más tarifa.")
+    reconciliar.add_argument('--compactar', action='store_true',
+                             help="Reescribe el diario solo con las transacciones que siguen pendientes.")
+
+    riesgo = subparsers.add_parser('riesgo', help="Informe de riesgo de la cartera (necesita numpy).")
+    riesgo.add_argument('--desde-bloque', type=int, default=0, help="Bloque de despliegue del contrato.")
+    riesgo.add_argument('--dias', type=int, default=30, help="Días de la previsión de liquidaciones.")
+    riesgo.add_argument('--umbral-cobertura', type=float, default=1.0,
+                        help="Cobertura mínima (garantía / principal aprobado) de cada prestatario.")
+    return parser
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    urls = args.url or [URL_DEFECTO]
+    # La sesión dura lo que el proceso: sin caducidad, para que `eventos` pueda aprobar tras horas sin actividad.
+    sesion = SesionClaves(tiempo_inactividad=None)
+    if args.orden == 'reconciliar' and not args.diario:
+        print("reconciliar necesita --diario.", file=sys.stderr)
+        return 2
+    diario = DiarioTransacciones(args.diario) if args.diario else None
+    try:
+        manager = BlockchainManager(urls if len(urls) > 1 else urls[0], args.contrato, args.abi, sesion=sesion,
+                                    diario=diario)
+    except Exception as e:
+        print(f"No se pudo conectar con el nodo: {e}", file=sys.stderr)
+        return 2
+    if args.metricas_puerto:
+        servir_prometheus(manager.metricas, args.metricas_puerto)
+
+    es_transaccion = (args.orden in ('lote', 'liquidar-vencidos', 'reconciliar')
+                      or args.orden == 'eventos' and args.aprobar_hasta is not None
+                      or args.orden in OPERACIONES and OPERACIONES[args.orden][2])
+    try:
+        # Las operaciones firman con la cuenta de la sesión: se pasa la dirección y la clave como None.
+        clave = None
+        if es_transaccion and (args.cuenta or args.keystore):
+            args.cuenta = abrir_sesion(args, sesion)
+        if diario is not None and es_transaccion:
+            reconciliadas = reanudar_diario(manager, args.cuenta, getattr(args, 'tiempo_atasco', TIEMPO_ATASCO))
+            if args.orden == 'reconciliar':
+                if args.compactar:
+                    diario.compactar()
+                escribir_json(sys.stdout, reconciliadas)
+                return 1 if reconciliadas['fallidas'] else 0
+            if reconciliadas['pendientes']:
+                print(f"Diario: {len(reconciliadas['pendientes'])} transacciones pendientes reanudadas, "
+                      f"{len(reconciliadas['fallidas'])} sin completar", file=sys.stderr)
+        if args.orden in OPERACIONES:
+            campos = {campo: getattr(args, campo) for campo, _, _ in OPERACIONES[args.orden][1]}
+            resultado = resultado_operacion(ejecutar_operacion(manager, args.orden, campos, args.cuenta, clave))
+            escribir_json(sys.stdout, resultado)
+            return 0
+        if args.orden == 'riesgo':
+            escribir_json(sys.stdout, informe_riesgo(manager, args))
+            return 0
+        if args.orden == 'exportar':
+            print(f"{exportar_prestamos(manager, args)} préstamos exportados a {args.archivo}", file=sys.stderr)
+            return 0
+        if not args.cuenta and args.orden in ('liquidar-vencidos', 'eventos') and es_transaccion:
+            raise ValueError(f"{args.orden} necesita --cuenta.")
+        salida = sys.stdout if args.salida == '-' else open(args.salida, 'a', encoding='utf-8')
+        try:
+            if args.orden == 'eventos':
+                correctas, fallidas = seguir_eventos(manager, args.cuenta, clave, args, salida)
+            elif args.orden == 'lote':
+                correctas, fallidas = ejecutar_lote_operaciones(manager, leer_operaciones(args.archivo), args.cuenta,
+                                                                clave, salida, args.ventana)
+            else:
+                correctas, fallidas = liquidar_vencidos(manager, args.cuenta, clave, args, salida)
+        finally:
+            if salida is not sys.stdout:
+                salida.close()
+        print(f"{correctas} operaciones correctas, {fallidas} fallidas", file=sys.stderr)
+        return 1 if fallidas else 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        manager.receipt_tracker.stop()
+        sesion.cerrar()
+        if diario is not None:
+            diario.cerrar()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import logging
+import os
+import sys
+
+import pytest
+
+DIRECTORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO)
+# Las ABI se cargan con rutas relativas y BlockchainManager configura un registro en blockchain_errors.log al
+# importarse: se trabaja desde el directorio del proyecto y con un registro que no escribe en ese archivo.
+os.chdir(DIRECTORIO)
+logging.basicConfig(handlers=[logging.NullHandler()])
+
+from BlockchainManager import BlockchainManager  # noqa: E402
+from NodoSimulado import NodoSimulado  # noqa: E402
+
+@pytest.fixture
+def nodo():
+    nodo = NodoSimulado(numero_cuentas=8)
+    nodo.iniciar()
+    yield nodo
+    nodo.detener()
+
+@pytest.fixture
+def manager(nodo):
+    manager = BlockchainManager(nodo.url, nodo.contract_address)
+    yield manager
+    manager.receipt_tracker.stop()
@@ -0,0 +1,42 @@
+import time
+
+from AlmacenPrestamos import TIEMPO_SIN_LIMITE, AlmacenPrestamos
+
+def test_plazo_enorme_no_bloquea_la_sincronizacion(nodo, manager, tmp_path):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 0, 2 ** 200)
+    manager.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 1)
+    almacen = AlmacenPrestamos(manager, str(tmp_path / 'prestamos.db'))
+    try:
+        assert almacen.sincronizar() == 2
+        prestamo, = almacen.prestamos_de(cliente.address)
+        assert (prestamo['plazo'], prestamo['tiempoLimite']) == (2 ** 200, TIEMPO_SIN_LIMITE)
+        assert almacen.prestamos_vencidos(int(time.time()) + 10 ** 9) == []
+
+        # Al deshacer la aprobación, el préstamo se reconstruye desde la solicitud guardada.
+        almacen.deshacer_hasta(almacen.ultimo_bloque - 1)
+        assert almacen.prestamos_de(cliente.address)[0]['plazo'] == 2 ** 200
+        assert almacen.sincronizar() == 1
+        assert almacen.prestamos_de(cliente.address)[0]['tiempoLimite'] == TIEMPO_SIN_LIMITE
+    finally:
+        almacen.cerrar()
+
+def test_almacen_que_empieza_a_mitad_de_cadena_usa_los_prestamos_del_contrato(nodo, manager, tmp_path):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 2000, 7200)
+    desde_bloque = manager.web3.eth.block_number + 1
+    manager.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 1)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 3000, 3600)
+    almacen = AlmacenPrestamos(manager, str(tmp_path / 'prestamos.db'), desde_bloque=desde_bloque)
+    try:
+        assert almacen.sincronizar() == 2
+        contrato = manager.obtener_prestamos_por_prestatario(cliente.address)
+        assert [tuple(prestamo.values()) for prestamo in almacen.prestamos_de(cliente.address)] == \
+            [tuple(prestamo) for prestamo in contrato]
+        assert [prestamo['estado'] for prestamo in almacen.prestamos_de(cliente.address)] == [1, 0, 0]
+    finally:
+        almacen.cerrar()
@@ -0,0 +1,15 @@
+from AnaliticaRiesgo import TIEMPO_SIN_LIMITE, AnaliticaRiesgo
+
+def test_plazos_uint256_se_limitan_a_no_vence_nunca():
+    prestatario = '0x' + '11' * 20
+    analitica = AnaliticaRiesgo.desde_prestamos([
+        {'prestatario': prestatario, 'id': 1, 'monto': 10, 'plazo': 2 ** 200, 'tiempoSolicitud': 1000,
+         'tiempoLimite': 1000 + 2 ** 200, 'estado': 1},
+        {'prestatario': prestatario, 'id': 2, 'monto': 20, 'plazo': 100, 'tiempoSolicitud': 1000,
+         'tiempoLimite': 1100, 'estado': 1},
+    ], ahora=2000)
+    assert analitica.tiempo_limite.tolist() == [TIEMPO_SIN_LIMITE, 1100]
+
+    tramos = analitica.distribucion_vencimientos()['tramos']
+    assert (tramos[0]['monto'], tramos[-1]['monto']) == (20, 10)
+    assert [dia['monto'] for dia in analitica.liquidaciones_por_dia(3)] == [20, 0, 0]
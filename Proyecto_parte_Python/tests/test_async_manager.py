@@ -0,0 +1,29 @@
+import asyncio
+
+from AsyncBlockchainManager import AsyncBlockchainManager
+
+def test_prestamos_de_un_prestatario_se_leen_en_un_lote_y_la_sesion_se_cierra(nodo, manager, monkeypatch):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    for _ in range(5):
+        manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+
+    peticiones = []
+    procesar = nodo.procesar
+    monkeypatch.setattr(nodo, 'procesar', lambda peticion: peticiones.append(peticion) or procesar(peticion))
+
+    async def leer():
+        async with AsyncBlockchainManager(nodo.url, nodo.contract_address) as async_manager:
+            peticiones.clear()
+            prestamos = await async_manager.obtener_prestamos_por_prestatario(cliente.address)
+            sesion = async_manager.sesion
+        return prestamos, list(peticiones), sesion
+
+    prestamos, leidas, sesion = asyncio.run(leer())
+    assert [prestamo.id for prestamo in prestamos] == [1, 2, 3, 4, 5]
+    assert prestamos == manager.obtener_prestamos_por_prestatario(cliente.address)
+    # Un único lote con el detalle de los cinco préstamos, en lugar de un `eth_call` por préstamo.
+    assert [len(peticion) for peticion in leidas if isinstance(peticion, list)] == [5]
+    assert len(leidas) < 5
+    assert sesion.closed
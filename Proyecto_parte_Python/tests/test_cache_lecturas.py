@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from BlockchainManager import BlockchainManager
+from CacheLecturas import CacheLecturas
+from IndexadorPrestamos import ESTADO_APROBADO, ESTADO_PENDIENTE
+
+class _Eth:
+    """Eth del nodo simulado cuyo `block_number` devuelve una secuencia fijada (respuestas desordenadas)."""
+    def __init__(self, eth, numeros):
+        self._eth = eth
+        self._numeros = list(numeros)
+
+    @property
+    def block_number(self):
+        return self._numeros.pop(0)
+
+    def get_logs(self, filtro):
+        return self._eth.get_logs(filtro)
+
+def test_bloque_no_retrocede_ni_se_salta_invalidaciones(nodo, manager):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 0, 3600)
+    evento = manager.web3.eth.block_number
+    web3 = SimpleNamespace(eth=_Eth(manager.web3.eth, [evento - 2, evento - 3, evento]))
+    cache = CacheLecturas(SimpleNamespace(web3=web3, contract_address=manager.contract_address,
+                                          codificador=manager.codificador,
+                                          direccion_checksum=manager.direccion_checksum), intervalo_bloque=0)
+    clave = ('obtenerDetalleDePrestamo', (cliente.address, 1))
+    assert cache.obtener(*clave, lambda bloque: 'antes') == 'antes'
+    assert cache.bloque == evento - 2
+
+    # Una respuesta que llega tarde no hace retroceder el bloque ni vacía la caché.
+    assert cache.obtener(*clave, lambda bloque: 'otra') == 'antes'
+    assert cache.bloque == evento - 2
+    # Al avanzar se leen los eventos de todos los bloques desde el conocido, incluido el de la solicitud.
+    assert cache.obtener(*clave, lambda bloque: 'despues') == 'despues'
+    assert cache.bloque == evento
+
+def test_lectura_repetida_no_va_al_nodo_hasta_que_otro_proceso_cambia_el_prestamo(nodo, manager):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    manager.cache.intervalo_bloque = 0
+    assert manager.obtener_detalle_de_prestamo(cliente.address, 1).estado == ESTADO_PENDIENTE
+    peticiones = nodo.peticiones
+    assert manager.obtener_detalle_de_prestamo(cliente.address, 1).estado == ESTADO_PENDIENTE
+    # Sin bloques nuevos solo se consulta el número de bloque.
+    assert nodo.peticiones - peticiones == 1
+
+    otro = BlockchainManager(nodo.url, nodo.contract_address)
+    try:
+        otro.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 1)
+    finally:
+        otro.receipt_tracker.stop()
+    assert manager.obtener_detalle_de_prestamo(cliente.address, 1).estado == ESTADO_APROBADO
+
+def test_lecturas_que_se_guardan_se_hacen_en_el_bloque_de_la_cache(nodo, manager, monkeypatch):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.cache.intervalo_bloque = 60
+    manager.consultar('clientes', (cliente.address,))
+    bloque = manager.cache.bloque
+    nodo.avanzar_tiempo(1)
+
+    # Un nodo de lectura por detrás respondería en 'latest' con un estado anterior al bloque de la caché.
+    bloques = []
+    llamar = manager.web3.eth.call
+    monkeypatch.setattr(manager.web3.eth, 'call', lambda transaccion, block_identifier=None:
+                        bloques.append(block_identifier) or llamar(transaccion, block_identifier))
+    manager.consultar('clientes', (socio.address,))
+    assert bloques == [bloque] and manager.cache.bloque == bloque < manager.web3.eth.block_number
+    cargados = []
+    manager.cache.obtener_varios('clientes', [(nodo.cuentas[2].address,)],
+                                 lambda faltan, bloque_lectura: cargados.append(bloque_lectura) or [(False, 0)])
+    assert cargados == [bloque]
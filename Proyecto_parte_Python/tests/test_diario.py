@@ -0,0 +1,75 @@
+import pytest
+
+from BlockchainManager import BlockchainManager
+from DiarioTransacciones import MINADA, RECHAZADA, REEMPLAZADA, DiarioTransacciones
+
+REMITENTE = '0x' + '11' * 20
+
+def firmada(nonce, tx_hash):
+    return {'remitente': REMITENTE, 'nonce': nonce, 'tx_hash': tx_hash, 'raw_transaction': b'\x02' + bytes([nonce])}
+
+def test_diario_se_reconstruye_al_reabrir_y_compactar(tmp_path):
+    ruta = str(tmp_path / 'diario.jsonl')
+    with DiarioTransacciones(ruta) as diario:
+        diario.registrar_firmadas([firmada(0, '0xa0'), firmada(1, '0xa1'), firmada(2, '0xa2')])
+        diario.registrar_firmadas([dict(firmada(1, '0xb1'), reemplaza='0xa1')])
+        diario.registrar_minada('0xb1', {'blockNumber': 7, 'status': 1})
+        diario.registrar_rechazada('0xa2', ValueError('insufficient funds'))
+    with open(ruta, 'a', encoding='utf-8') as archivo:
+        archivo.write('{"tipo": "minada", "tx_ha')
+
+    with DiarioTransacciones(ruta) as diario:
+        assert [diario.registro(h)['estado'] for h in ('0xa1', '0xb1', '0xa2')] == [REEMPLAZADA, MINADA, RECHAZADA]
+        assert diario.registro('0xb1')['bloque'] == 7
+        pendientes = diario.pendientes()
+        assert list(pendientes) == [(REMITENTE, 0)]
+        assert pendientes[(REMITENTE, 0)][0]['raw_transaction'] == '0x0200'
+        assert diario.compactar() == 3
+    with DiarioTransacciones(ruta) as diario:
+        assert list(diario.pendientes(REMITENTE)) == [(REMITENTE, 0)]
+        assert diario.registro('0xb1') is None
+
+def caida_antes_de_difundir(manager, monkeypatch, cliente, wei):
+    """Anota un depósito en el diario y simula que el proceso cae antes de que llegue al nodo."""
+    def sin_conexion(crudo):
+        raise ConnectionError('conexión perdida')
+    with monkeypatch.context() as parche:
+        parche.setattr(manager.web3.eth, 'send_raw_transaction', sin_conexion)
+        with pytest.raises(Exception):
+            manager.depositar_garantia(cliente.address, cliente.key.hex(), wei)
+    (perdida,) = [registro for grupo in manager.diario.pendientes().values() for registro in grupo]
+    return perdida['tx_hash']
+
+@pytest.fixture
+def manager_diario(nodo, tmp_path):
+    diario = DiarioTransacciones(str(tmp_path / 'diario.jsonl'))
+    manager = BlockchainManager(nodo.url, nodo.contract_address, diario=diario)
+    yield manager
+    manager.receipt_tracker.stop()
+    diario.cerrar()
+
+def test_reconciliar_vuelve_a_difundir_la_transaccion_perdida(nodo, manager_diario, monkeypatch):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager_diario.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    tx_hash = caida_antes_de_difundir(manager_diario, monkeypatch, cliente, 10 ** 17)
+
+    resultado = manager_diario.reconciliar_diario()
+    assert resultado['redifundidas'] == [tx_hash] and resultado['pendientes'] == [tx_hash]
+    assert resultado['manejadores'][0].result(10)['status'] == 1
+    assert manager_diario.diario.registro(tx_hash)['estado'] == MINADA
+    assert manager_diario.diario.pendientes() == {}
+    ((_, garantia),) = manager_diario.agregador.consultar([('clientes', (cliente.address,))])
+    assert garantia == 10 ** 17
+
+def test_reconciliar_descarta_la_transaccion_cuyo_nonce_uso_otro_proceso(nodo, manager, manager_diario,
+                                                                         monkeypatch):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager_diario.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    tx_hash = caida_antes_de_difundir(manager_diario, monkeypatch, cliente, 10 ** 17)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 2 * 10 ** 17)
+
+    resultado = manager_diario.reconciliar_diario()
+    assert resultado['descartadas'] == [tx_hash] and resultado['manejadores'] == []
+    assert manager_diario.diario.pendientes() == {}
+    ((_, garantia),) = manager_diario.agregador.consultar([('clientes', (cliente.address,))])
+    assert garantia == 2 * 10 ** 17
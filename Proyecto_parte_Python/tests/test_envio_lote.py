@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+def _fallar(*args, **kwargs):
+    raise ConnectionError('nodo caído')
+
+@pytest.mark.parametrize('etapa', ['firmar_transacciones', 'difundir_transacciones'])
+def test_fallo_al_firmar_o_difundir_devuelve_los_nonces(nodo, manager, monkeypatch, etapa):
+    socio = nodo.cuentas[0]
+    clientes = [(cuenta.address,) for cuenta in nodo.cuentas[1:4]]
+    siguiente = manager.web3.eth.get_transaction_count(socio.address, 'pending')
+    monkeypatch.setattr(manager, etapa, _fallar)
+    with pytest.raises(ConnectionError):
+        manager.enviar_transacciones_lote(socio.address, socio.key.hex(), 'altaCliente', clientes)
+    monkeypatch.undo()
+
+    assert manager.nonce_manager.reserve_nonce(socio.address) == siguiente
+    manager.nonce_manager.release_nonce(socio.address, siguiente)
+    resultados = manager.enviar_transacciones_lote(socio.address, socio.key.hex(), 'altaCliente', clientes)
+    assert all(resultado['exito'] for resultado in resultados)
+
+def test_envios_concurrentes_de_una_cuenta_usan_nonces_consecutivos(nodo, manager):
+    socio = nodo.cuentas[0]
+    siguiente = manager.web3.eth.get_transaction_count(socio.address)
+    clientes = nodo.cuentas[1:]
+    with ThreadPoolExecutor(max_workers=4) as ejecutor:
+        list(ejecutor.map(lambda cuenta: manager.alta_cliente(socio.address, socio.key.hex(), cuenta.address),
+                          clientes))
+    # Cada alta se minó con su propio nonce, sin huecos que dejen transacciones en cola en el nodo.
+    assert manager.web3.eth.get_transaction_count(socio.address) == siguiente + len(clientes)
+    assert nodo.cola.get(socio.address, {}) == {}
+    estados = manager.agregador.consultar([('clientes', (cuenta.address,)) for cuenta in clientes])
+    assert all(activo for activo, _ in estados)
+
+def test_error_de_transporte_al_difundir_no_reutiliza_el_nonce(nodo, manager, monkeypatch):
+    socio = nodo.cuentas[0]
+    siguiente = manager.web3.eth.get_transaction_count(socio.address, 'pending')
+    enviar = manager.web3.eth.send_raw_transaction
+
+    def respuesta_perdida(crudo):
+        enviar(crudo)
+        raise ConnectionError('conexión cerrada antes de la respuesta')
+    monkeypatch.setattr(manager.web3.eth, 'send_raw_transaction', respuesta_perdida)
+    with pytest.raises(Exception):
+        manager.alta_cliente(socio.address, socio.key.hex(), nodo.cuentas[1].address)
+    monkeypatch.undo()
+
+    assert manager.nonce_manager.reserve_nonce(socio.address) == siguiente + 1
+    manager.nonce_manager.release_nonce(socio.address, siguiente + 1)
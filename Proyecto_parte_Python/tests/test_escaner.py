@@ -0,0 +1,62 @@
+from EscanerLiquidaciones import REINTENTO_INICIAL, EscanerLiquidaciones
+from IndexadorPrestamos import ESTADO_APROBADO, IndexadorPrestamos
+
+def test_liquidacion_fallida_se_reintenta_y_la_definitiva_se_descarta(nodo, manager):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    manager.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 1)
+    escaner = EscanerLiquidaciones(manager, socio.address, socio.key.hex())
+
+    # El préstamo 1 aún no ha vencido (fallo transitorio) y el 2 no está aprobado (fallo definitivo).
+    ahora = manager.web3.eth.get_block('latest')['timestamp']
+    resultados = escaner.liquidar([(0, cliente.address, 1), (0, cliente.address, 2)], ahora)
+    assert [resultado['exito'] for resultado in resultados] == [False, False]
+    assert escaner.vencidos(ahora + REINTENTO_INICIAL) == []
+    assert escaner.vencidos(ahora + REINTENTO_INICIAL + 1) == [(ahora + REINTENTO_INICIAL, cliente.address, 1)]
+
+    nodo.avanzar_tiempo(3600 + 1)
+    escaner.programar(cliente.address, 1, ahora)
+    resultados = escaner.escanear()
+    assert [(resultado['args'], resultado['exito']) for resultado in resultados] == [((cliente.address, 1), True)]
+    assert escaner.proximo_vencimiento() is None
+
+def test_escaner_que_empieza_a_mitad_de_cadena_usa_los_prestamos_del_contrato(nodo, manager):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    inicio = manager.web3.eth.block_number + 1
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 500, 7200)
+    manager.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 2)
+    escaner = EscanerLiquidaciones(manager, socio.address, socio.key.hex(),
+                                   indexador=IndexadorPrestamos(manager, desde_bloque=inicio))
+
+    nodo.avanzar_tiempo(60)
+    assert escaner.escanear() == []
+    (prestamo,) = escaner.indexador.prestamos_de(cliente.address)
+    assert (prestamo['id'], prestamo['monto'], prestamo['plazo'], prestamo['estado']) == (2, 500, 7200, ESTADO_APROBADO)
+    assert escaner.proximo_vencimiento() == prestamo['tiempoLimite'] >= prestamo['tiempoSolicitud'] + 7200
+
+def test_escanear_lee_por_rangos_y_guarda_el_checkpoint(nodo, manager, tmp_path, monkeypatch):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    manager.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 1)
+    ruta = str(tmp_path / 'indice.json')
+    indexador = IndexadorPrestamos(manager, ruta_checkpoint=ruta)
+    rangos = []
+    leer_logs = indexador._leer_logs
+    monkeypatch.setattr(indexador, 'TAMANO_RANGO', 2)
+    monkeypatch.setattr(indexador, '_leer_logs', lambda desde, hasta: rangos.append((desde, hasta)) or
+                        leer_logs(desde, hasta))
+    EscanerLiquidaciones(manager, socio.address, socio.key.hex(), indexador=indexador).escanear()
+
+    ultimo = manager.web3.eth.block_number
+    assert rangos == [(desde, min(desde + 1, ultimo)) for desde in range(0, ultimo + 1, 2)]
+    reanudado = IndexadorPrestamos(manager, ruta_checkpoint=ruta)
+    assert reanudado.ultimo_bloque == ultimo
+    assert [p['estado'] for p in reanudado.prestamos_de(cliente.address)] == [ESTADO_APROBADO]
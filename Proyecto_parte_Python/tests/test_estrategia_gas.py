@@ -0,0 +1,34 @@
+from RpcBatch import ejecutar_lote
+
+def test_funciones_con_estado_se_estiman_en_cada_llamada(nodo, manager):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    primero, = manager.aprobar_prestamos_bulk(socio.address, socio.key.hex(), [(cliente.address, 1)])
+    assert primero['exito']
+
+    # El préstamo ya está aprobado: la estimación lo detecta y la transacción no llega a enviarse.
+    segundo, = manager.aprobar_prestamos_bulk(socio.address, socio.key.hex(), [(cliente.address, 1)])
+    assert not segundo['exito'] and segundo['tx_hash'] is None
+    assert 'no esta pendiente' in segundo['error']
+
+def test_aprobaciones_masivas_estiman_el_gas_en_un_solo_lote(nodo, manager, monkeypatch):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    for _ in range(3):
+        manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    manager.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 2)
+
+    def estimacion_suelta(transaccion):
+        raise AssertionError("eth_estimateGas fuera del lote")
+    monkeypatch.setattr(manager.web3.eth, 'estimate_gas', estimacion_suelta)
+    lotes = []
+    monkeypatch.setattr('EstrategiaGas.ejecutar_lote', lambda web3, llamadas: lotes.append(len(llamadas)) or
+                        ejecutar_lote(web3, llamadas))
+    resultados = manager.aprobar_prestamos_bulk(socio.address, socio.key.hex(),
+                                                [(cliente.address, i) for i in (1, 2, 3)])
+    assert lotes == [3]
+    assert [resultado['exito'] for resultado in resultados] == [True, False, True]
+    assert 'no esta pendiente' in resultados[1]['error'] and resultados[1]['tx_hash'] is None
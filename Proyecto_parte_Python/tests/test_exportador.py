@@ -0,0 +1,16 @@
+import pytest
+
+from ExportadorPrestamos import EscritorParquet
+
+parquet = pytest.importorskip('pyarrow.parquet')
+
+def test_parquet_conserva_plazos_uint256(tmp_path):
+    ruta = str(tmp_path / 'prestamos.parquet')
+    escritor = EscritorParquet(ruta)
+    escritor.escribir({'prestatario': '0x' + '11' * 20, 'id': 1, 'monto': 2 ** 255, 'plazo': 2 ** 200,
+                       'tiempoSolicitud': 1700000000, 'tiempoLimite': 1700000000 + 2 ** 200, 'estado': 1})
+    escritor.cerrar()
+
+    fila, = parquet.read_table(ruta).to_pylist()
+    assert [int(fila[campo]) for campo in ('monto', 'plazo', 'tiempoLimite')] == [
+        2 ** 255, 2 ** 200, 1700000000 + 2 ** 200]
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from FlujoEventos import FlujoEventos, PoliticaAprobacion
+from IndexadorPrestamos import IndexadorPrestamos
+from ReceiptTracker import TransactionHandle
+
+def test_detener_con_la_cola_llena_no_avanza_sobre_los_eventos_sin_encolar(nodo, manager):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    inicio = manager.web3.eth.block_number + 1
+    for monto in (1000, 2000, 3000):
+        manager.solicitar_prestamo(cliente.address, cliente.key.hex(), monto, 3600)
+    indexador = IndexadorPrestamos(manager, desde_bloque=inicio)
+    flujo = FlujoEventos(manager, indexador, intervalo=0.05)
+    dentro, soltar, recibidos = threading.Event(), threading.Event(), []
+
+    def consumidor_lento(evento):
+        recibidos.append(evento['prestamo']['id'])
+        dentro.set()
+        soltar.wait()
+    suscripcion = flujo.suscribir(consumidor_lento, tamano_cola=1)
+    resultado = []
+    lectura = threading.Thread(target=lambda: resultado.append(flujo.procesar_nuevos()))
+    lectura.start()
+    assert dentro.wait(5)
+    while not suscripcion.cola.full():
+        time.sleep(0.01)
+    parada = threading.Thread(target=flujo.detener)
+    parada.start()
+    lectura.join(5)
+    soltar.set()
+    parada.join(5)
+
+    assert resultado == [2] and recibidos == [1, 2]
+    assert flujo.siguiente_bloque == inicio + 2
+    assert indexador.ultimo_bloque == inicio + 1
+
+    reanudado, recibidos = FlujoEventos(manager, indexador), []
+    reanudado.suscribir(lambda evento: recibidos.append(evento['prestamo']['id']))
+    assert reanudado.procesar_nuevos() == 1
+    reanudado.detener()
+    assert recibidos == [3]
+    assert [p['id'] for p in indexador.prestamos_de(cliente.address)] == [1, 2, 3]
+
+def test_politica_olvida_las_aprobaciones_que_fallan(nodo, manager, monkeypatch):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 1000, 3600)
+    manejadores = []
+
+    def aprobar_prestamo(*args, esperar_recibo=True):
+        manejadores.append(TransactionHandle('0x' + '00' * 32))
+        return manejadores[-1]
+    monkeypatch.setattr(manager, 'aprobar_prestamo', aprobar_prestamo)
+    politica = PoliticaAprobacion(manager, socio.address, socio.key.hex(), 10 ** 18, 3600)
+    evento = {'evento': 'SolicitudPrestamo', 'args': {'prestatario': cliente.address}}
+
+    politica(evento)
+    assert politica.aprobados == {(cliente.address, 1)}
+    manejadores[0].set_exception(ValueError("La transacción falló."))
+    assert politica.aprobados == set()
+    politica(evento)
+    assert len(manejadores) == 2 and politica.aprobados == {(cliente.address, 1)}
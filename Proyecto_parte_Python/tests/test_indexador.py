@@ -0,0 +1,22 @@
+from IndexadorPrestamos import ESTADO_APROBADO, IndexadorPrestamos
+
+def test_indexar_desde_mitad_de_cadena_usa_ids_y_plazos_del_contrato(nodo, manager):
+    socio, cliente = nodo.cuentas[0], nodo.cuentas[1]
+    manager.alta_cliente(socio.address, socio.key.hex(), cliente.address)
+    manager.depositar_garantia(cliente.address, cliente.key.hex(), 10 ** 18)
+    for monto in (1000, 2000, 3000):
+        manager.solicitar_prestamo(cliente.address, cliente.key.hex(), monto, 3600)
+    inicio = manager.web3.eth.block_number + 1
+
+    manager.aprobar_prestamo(socio.address, socio.key.hex(), cliente.address, 2)
+    manager.solicitar_prestamo(cliente.address, cliente.key.hex(), 4000, 7200)
+    indexador = IndexadorPrestamos(manager, desde_bloque=inicio)
+    assert indexador.sincronizar() == 2
+
+    aprobado = indexador.prestamo(cliente.address, 2)
+    assert (aprobado['monto'], aprobado['plazo'], aprobado['estado']) == (2000, 3600, ESTADO_APROBADO)
+    assert aprobado['tiempoSolicitud'] > 0
+    assert indexador.prestamos_vencidos(aprobado['tiempoLimite']) == []
+    nuevo = indexador.prestamo(cliente.address, 4)
+    assert (nuevo['monto'], nuevo['plazo']) == (4000, 7200)
+    assert [p['id'] for p in indexador.prestamos_de(cliente.address)] == [2, 4]
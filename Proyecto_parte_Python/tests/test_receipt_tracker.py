@@ -0,0 +1,57 @@
+import socket
+
+import pytest
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+
+from FirmadorProcesos import firmar_transacciones
+from ReceiptTracker import ReceiptTracker
+
+def test_seguir_dos_veces_devuelve_el_mismo_manejador(nodo, manager):
+    socio = nodo.cuentas[0]
+    preparadas = manager.construir_transacciones_lote(socio.address, 'altaCliente', [(nodo.cuentas[1].address,)])
+    firmada = firmar_transacciones([preparadas[0]['transaccion']], socio.key.hex())[0]
+    primero = manager.receipt_tracker.track(firmada['tx_hash'], socio.address, firmada['nonce'])
+    segundo = manager.receipt_tracker.track(firmada['tx_hash'], socio.address, firmada['nonce'])
+    assert primero is segundo
+
+    manager.web3.eth.send_raw_transaction(firmada['raw_transaction'])
+    assert primero.result(timeout=10).status == 1
+    assert manager.receipt_tracker.pending_count() == 0
+
+def test_reconectar_traslada_los_manejadores_pendientes(nodo, manager):
+    socio = nodo.cuentas[0]
+    preparadas = manager.construir_transacciones_lote(socio.address, 'altaCliente', [(nodo.cuentas[1].address,)])
+    firmada = firmar_transacciones([preparadas[0]['transaccion']], socio.key.hex())[0]
+    manejador = manager.receipt_tracker.track(firmada['tx_hash'], socio.address, firmada['nonce'])
+    anterior = manager.receipt_tracker
+
+    manager.reconectar()
+    assert manager.receipt_tracker is not anterior
+    assert manager.receipt_tracker.pending_count() == 1 and anterior.pending_count() == 0
+    manager.web3.eth.send_raw_transaction(firmada['raw_transaction'])
+    assert manejador.result(timeout=10).status == 1
+
+def test_manejador_caduca_con_el_nodo_caido():
+    # Un puerto sin servidor: cada consulta de recibos falla con la conexión rechazada.
+    with socket.socket() as libre:
+        libre.bind(('127.0.0.1', 0))
+        puerto = libre.getsockname()[1]
+    seguidor = ReceiptTracker(Web3(Web3.HTTPProvider(f'http://127.0.0.1:{puerto}')), poll_interval=0.05, timeout=0.3)
+    manejador = seguidor.track('0x' + '11' * 32)
+    try:
+        with pytest.raises(TimeExhausted):
+            manejador.result(timeout=10)
+        assert seguidor.pending_count() == 0
+    finally:
+        seguidor.stop()
+
+def test_manejador_caduca_si_el_nodo_devuelve_error(manager, monkeypatch):
+    monkeypatch.setattr('ReceiptTracker.ejecutar_lote', lambda web3, llamadas, tamano: [
+        {'error': {'code': -32000, 'message': 'header not found'}} for _ in llamadas])
+    seguidor = ReceiptTracker(manager.web3, poll_interval=0.05, timeout=0.3)
+    try:
+        with pytest.raises(TimeExhausted):
+            seguidor.track('0x' + '22' * 32).result(timeout=10)
+    finally:
+        seguidor.stop()
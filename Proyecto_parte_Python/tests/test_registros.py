@@ -0,0 +1,13 @@
+from AnaliticaRiesgo import TIEMPO_SIN_LIMITE, AnaliticaRiesgo
+from Registros import VALOR_FUERA_DE_RANGO, ColeccionPrestamos, Prestamo
+
+def test_coleccion_guarda_plazos_fuera_de_rango_sin_perderlos():
+    prestatario = '0x' + '22' * 20
+    structs = [(1, prestatario, 10 ** 18, 2 ** 200, 1700000000, 1700000000 + 2 ** 200, 1),
+               (2, prestatario, 5, 3600, 1700000000, 0, 0)]
+    coleccion = ColeccionPrestamos(structs)
+    assert list(coleccion) == [Prestamo(*struct) for struct in structs]
+    assert coleccion.columnas_numpy()['plazo'].tolist() == [VALOR_FUERA_DE_RANGO, 3600]
+
+    analitica = AnaliticaRiesgo.desde_coleccion(coleccion, ahora=1700000000)
+    assert analitica.tiempo_limite.tolist() == [TIEMPO_SIN_LIMITE, 0]
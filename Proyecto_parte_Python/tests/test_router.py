@@ -0,0 +1,26 @@
+from web3 import Web3
+
+from ProveedorRPC import crear_proveedor, obtener_sesion
+from RpcBatch import ejecutar_lote
+
+def test_lote_con_router_reintenta_en_otro_nodo(nodo):
+    caido = 'http://127.0.0.1:9'
+    router = crear_proveedor([caido, nodo.url], timeout=2)
+    try:
+        web3 = Web3(router)
+        for _ in range(4):
+            respuestas = ejecutar_lote(web3, [('eth_blockNumber', []), ('eth_chainId', [])])
+            assert all('result' in respuesta for respuesta in respuestas)
+        por_url = {nodo_rpc.url: nodo_rpc for nodo_rpc in router.nodos}
+        assert por_url[caido].fallos > 0 and por_url[nodo.url].latencia is not None
+    finally:
+        router.detener()
+
+def test_sesiones_compartidas_respetan_el_tamano_del_pool():
+    url = 'http://127.0.0.1:1'
+    pequena, grande = obtener_sesion(url, 4), obtener_sesion(url, 64)
+    assert pequena is not grande
+    assert [sesion.get_adapter(url)._pool_maxsize for sesion in (pequena, grande)] == [4, 64]
+    assert obtener_sesion(url, 4) is pequena
+    # Las peticiones por lotes, que no piden un tamaño, usan la sesión del endpoint con el pool más grande.
+    assert obtener_sesion(url) is grande
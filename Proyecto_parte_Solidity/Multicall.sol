@@ -0,0 +1,44 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+// Contrato auxiliar de solo lectura que ejecuta muchas llamadas de consulta en una única llamada `eth_call`.
+// Mantiene la interfaz de Multicall3 (`aggregate3`), de modo que la aplicación puede usar tanto este contrato
+// desplegado en la red local como el Multicall3 ya desplegado en 0xcA11bde05977b3631167028862bE2a173976CA11.
+contract Multicall {
+    struct Call3 {
+        address target;
+        bool allowFailure;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    // Ejecuta cada llamada con `call` y devuelve su resultado. Si una llamada falla y no admite fallos, se
+    // revierte toda la agregación con el mismo motivo.
+    function aggregate3(Call3[] calldata calls) public payable returns (Result[] memory returnData) {
+        uint256 length = calls.length;
+        returnData = new Result[](length);
+        for (uint256 i = 0; i < length; i++) {
+            Call3 calldata calli = calls[i];
+            Result memory result = returnData[i];
+            (result.success, result.returnData) = calli.target.call(calli.callData);
+            if (!calli.allowFailure && !result.success) {
+                bytes memory motivo = result.returnData;
+                assembly {
+                    revert(add(motivo, 32), mload(motivo))
+                }
+            }
+        }
+    }
+
+    function getBlockNumber() public view returns (uint256 blockNumber) {
+        blockNumber = block.number;
+    }
+
+    function getCurrentBlockTimestamp() public view returns (uint256 timestamp) {
+        timestamp = block.timestamp;
+    }
+}